@@ -14,19 +14,106 @@ class Settings(BaseSettings):
     debug: bool = True
     environment: str = "development"
     allow_anonymous_api: bool = True
+    # Seconds a resolved user_profiles row is reused by the auth dependency (0 disables)
+    profile_cache_ttl_seconds: float = 30.0
     anonymous_user_id: str = "00000000-0000-0000-0000-000000000000"
     anonymous_user_email: str = "anonymous@local"
+    # ETag/304 handling for polled timetable and notification reads
+    conditional_get_enabled: bool = True
+    # ETags also roll over after this many seconds (bounds staleness across workers; 0 = never)
+    etag_max_age_seconds: float = 60.0
+    # Keep full responses for repeated identical polls (0 disables the response cache)
+    response_cache_ttl_seconds: float = 0.0
+    response_cache_max_entries: int = 512
+    # Server-push event streams (/events/stream, /events/ws)
+    event_stream_heartbeat_seconds: float = 20.0
+    event_stream_queue_size: int = 64
+    event_stream_max_subscribers: int = 5000
+    # Per-recipient unread notification counts (adjusted on insert/read; 0 disables)
+    notification_unread_cache_ttl_seconds: float = 300.0
+    # Seconds each department's ranked timetable versions are reused (0 disables)
+    effective_version_cache_ttl_seconds: float = 60.0
 
     # Email
     smtp_server: str
     smtp_port: int
     smtp_username: str
     smtp_password: str
+    smtp_starttls: bool = True
+    smtp_pool_size: int = 2
+
+    # Email outbox (notification_log rows with status PENDING + email_html; needs
+    # sql/notification_email_outbox.sql). Off = emails are sent inside the request.
+    email_outbox_enabled: bool = False
+    email_outbox_batch_size: int = 100
+    email_outbox_poll_seconds: float = 10.0
+    email_rate_per_second: float = 5.0
+    email_max_attempts: int = 5
+    email_retry_backoff_seconds: float = 30.0
+
+    # Periodic maintenance (version expiry, outbox draining, cache warming, OTP cleanup).
+    # Leader-only jobs run in one process: "file" lock (workers on one host), "lease"
+    # row in maintenance_leases (several hosts) or "none" (single process)
+    maintenance_enabled: bool = True
+    maintenance_leader_election: str = "file"
+    maintenance_lock_path: str = ""
+    maintenance_lease_seconds: float = 60.0
+    maintenance_expiry_interval_seconds: float = 900.0
+    maintenance_cache_warm_interval_seconds: float = 90.0
+    maintenance_otp_cleanup_interval_seconds: float = 3600.0
+    maintenance_otp_retention_hours: float = 24.0
 
     # Agent LLM (Amazon Bedrock)
     bedrock_region: str = "us-east-1"
     bedrock_model: str = "amazon.nova-pro-v1:0"
 
+    # Timetable data access ("supabase" or "sqlite" for local batch jobs/benchmarks)
+    data_backend: str = "supabase"
+    sqlite_database_path: str = ":memory:"
+
+    # Timetable generation: division shift windows chosen by room/faculty pressure (False = round-robin)
+    timetable_shift_planner_enabled: bool = True
+    # Timetable generation: capacity pre-check ("off", "continue" skips unfittable sessions, "fail_fast")
+    timetable_precheck_mode: str = "continue"
+    # Timetable generation: task order ("static" priority order or "dynamic" most-constrained-first)
+    timetable_task_ordering: str = "static"
+    # Timetable generation: optional local-search pass after greedy placement
+    timetable_local_search_enabled: bool = False
+    timetable_local_search_seconds: float = 5.0
+
+    # Timetable generation: solver backend ("greedy" or "cpsat"; cpsat needs ortools)
+    timetable_solver: str = "greedy"
+    timetable_cpsat_seconds: float = 30.0
+    timetable_cpsat_workers: int = 0
+
+    # Timetable generation: rows per `entries` SSE event for compact results
+    timetable_result_chunk_size: int = 500
+
+    # Timetable generation: pinned sessions an incremental run may move
+    timetable_incremental_max_displaced: int = 12
+
+    # Institute-wide generation: parallel department solves (0 = CPU count) and the
+    # negotiation rounds allowed before colliding departments are settled one by one
+    timetable_institute_workers: int = 0
+    timetable_institute_rounds: int = 3
+
+    # Timetable versions: resolver output stored as a copy-on-write delta against its source
+    # version (needs sql/timetable_version_deltas.sql; flatten with POST /timetable-versions/compact
+    # ?max_chain=0 before switching it off again), and the delta chain length after which a
+    # version is stored in full again
+    timetable_delta_versions: bool = False
+    timetable_delta_max_chain: int = 8
+
+    # PDF rendering (0 = size the ReportLab process pool from the CPU count)
+    pdf_render_workers: int = 0
+    # Renders allowed to wait for a worker before requests get 429 + Retry-After
+    pdf_render_queue_depth: int = 8
+
+    # Bulk student CSV import (0 hash workers = CPU count)
+    student_import_hash_workers: int = 0
+    student_import_auth_concurrency: int = 8
+    student_import_batch_size: int = 200
+
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -4,6 +4,10 @@ from jwt import decode, DecodeError, ExpiredSignatureError
 from pydantic import BaseModel
 from uuid import UUID
 from app.config import settings
+from app.services.ttl_cache import TTLCache
+
+# uid -> user_profiles row (None when the user has no profile); see invalidate_profile_cache.
+_profile_cache = TTLCache(ttl_seconds=settings.profile_cache_ttl_seconds)
 
 
 class CurrentUser(BaseModel):
@@ -81,6 +85,60 @@ def resolve_effective_department_id(
     return user_dept
 
 
+def decode_access_token(token: str) -> tuple[dict, bool]:
+    """
+    Decode a bearer token.
+
+    Returns ``(claims, verified)``: ``verified`` is True for our own HS256 tokens and
+    False for legacy Supabase tokens, which are read without signature verification.
+    """
+    try:
+        return decode(token, settings.supabase_service_role_key, algorithms=["HS256"]), True
+    except (DecodeError, ExpiredSignatureError):
+        return decode(token, options={"verify_signature": False}, audience="authenticated"), False
+
+
+def get_request_token_claims(request: Request, token: str) -> tuple[dict, bool]:
+    """Decode ``token`` once per request; middleware and dependencies share the result."""
+    cached = getattr(request.state, "decoded_token", None)
+    if cached and cached[0] == token:
+        return cached[1], cached[2]
+    claims, verified = decode_access_token(token)
+    request.state.decoded_token = (token, claims, verified)
+    return claims, verified
+
+
+def invalidate_profile_cache(*uids: str | None) -> None:
+    """Drop cached profiles after a profile row is changed or removed."""
+    for uid in uids:
+        if uid:
+            _profile_cache.invalidate(str(uid))
+
+
+def profile_cache_stats() -> dict:
+    return _profile_cache.stats()
+
+
+def current_user_from_claims(payload: dict, verified: bool) -> CurrentUser:
+    """Build a ``CurrentUser`` from decoded token claims (``sub`` must be present)."""
+    if verified:
+        return CurrentUser(
+            uid=payload.get("sub"),
+            email=payload.get("email"),
+            aud="authenticated",
+            role=_normalize_role(payload.get("role")),
+            department_id=canonical_department_id(payload.get("department_id")),
+        )
+
+    user_meta = payload.get("user_metadata") or {}
+    return CurrentUser(
+        uid=payload.get("sub"),
+        email=payload.get("email"),
+        aud=payload.get("aud", "authenticated"),
+        role=_normalize_role(user_meta.get("role")),
+    )
+
+
 async def get_current_user(request: Request) -> CurrentUser:
     """
     Extract and validate JWT token from Authorization header.
@@ -137,60 +195,18 @@ async def get_current_user(request: Request) -> CurrentUser:
         )
 
     try:
-        # Try to decode as custom JWT first (with verification)
-        try:
-            payload = decode(
-                token,
-                settings.supabase_service_role_key,
-                algorithms=["HS256"],
-            )
-            
-            # Custom JWT format
-            uid: str = payload.get("sub")
-            email: str | None = payload.get("email")
-            token_role = _normalize_role(payload.get("role"))
-            department_id = canonical_department_id(payload.get("department_id"))
-
-            if uid is None:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Invalid token: missing 'sub' claim",
-                    headers={"WWW-Authenticate": "Bearer"},
-                )
+        # Custom JWT first (verified), then Supabase JWT format (backward compatibility)
+        payload, verified = get_request_token_claims(request, token)
+        uid: str = payload.get("sub")
 
-            return CurrentUser(
-                uid=uid,
-                email=email,
-                aud="authenticated",
-                role=token_role,
-                department_id=department_id,
-            )
-        except (DecodeError, ExpiredSignatureError):
-            # If custom JWT fails, try Supabase JWT format (backward compatibility)
-            payload = decode(
-                token,
-                options={"verify_signature": False},
-                audience="authenticated",
+        if uid is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid token: missing 'sub' claim",
+                headers={"WWW-Authenticate": "Bearer"},
             )
 
-            uid: str = payload.get("sub")
-            email: str | None = payload.get("email")
-            user_meta = payload.get("user_metadata") or {}
-            token_role = _normalize_role(user_meta.get("role"))
-
-            if uid is None:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Invalid token: missing 'sub' claim",
-                    headers={"WWW-Authenticate": "Bearer"},
-                )
-
-            return CurrentUser(
-                uid=uid,
-                email=email,
-                aud=payload.get("aud", "authenticated"),
-                role=token_role,
-            )
+        return current_user_from_claims(payload, verified)
 
     except ExpiredSignatureError:
         raise HTTPException(
@@ -209,6 +225,36 @@ async def get_current_user(request: Request) -> CurrentUser:
         )
 
 
+def _fetch_profile(uid: str) -> dict | None:
+    from app.supabase_client import get_service_supabase
+
+    # Use service role to bypass RLS for profile lookup
+    supabase = get_service_supabase()
+
+    # Prefer `user_id` mapping (newer profile shape), then legacy rows keyed by `id`
+    last_error: Exception | None = None
+    answered = False
+    for column in ("user_id", "id"):
+        try:
+            response = (
+                supabase.table("user_profiles")
+                .select("*")
+                .eq(column, uid)
+                .limit(1)
+                .execute()
+            )
+        except Exception as e:
+            last_error = e
+            continue
+        answered = True
+        if response.data:
+            return response.data[0]
+    if not answered and last_error is not None:
+        # Don't cache "no profile" when the lookups themselves failed.
+        raise last_error
+    return None
+
+
 async def get_current_user_with_profile(
     current_user: CurrentUser = Depends(get_current_user),
 ) -> CurrentUser:
@@ -231,38 +277,7 @@ async def get_current_user_with_profile(
         return current_user
     
     try:
-        from app.supabase_client import get_service_supabase
-        
-        # Use service role to bypass RLS for profile lookup
-        supabase = get_service_supabase()
-        
-        profile = None
-        # Prefer `user_id` mapping (newer profile shape)
-        try:
-            response = (
-                supabase.table("user_profiles")
-                .select("*")
-                .eq("user_id", current_user.uid)
-                .single()
-                .execute()
-            )
-            profile = response.data
-        except Exception:
-            profile = None
-
-        # Backward compatibility: some rows were created with `id` instead of `user_id`
-        if not profile:
-            try:
-                response = (
-                    supabase.table("user_profiles")
-                    .select("*")
-                    .eq("id", current_user.uid)
-                    .single()
-                    .execute()
-                )
-                profile = response.data
-            except Exception:
-                profile = None
+        profile = _profile_cache.get_or_load(current_user.uid, lambda: _fetch_profile(current_user.uid))
 
         if not profile:
             return current_user
@@ -32,8 +32,14 @@ from app.routers import (
     password_reset,
     debug,
     coordinator_transfer,
+    calendar,
+    events,
 )
 from app.config import settings
+from app.middleware.conditional_get import ConditionalGetMiddleware
+from app.services.email_outbox import start_email_outbox_worker, stop_email_outbox_worker
+from app.services.maintenance_scheduler import start_maintenance_scheduler, stop_maintenance_scheduler
+from app.services.pdf_export import shutdown_render_pool
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -54,6 +60,10 @@ _UPLOADS_DIR = _BACKEND_ROOT / "uploads"
 _UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
 app.mount("/uploads", StaticFiles(directory=str(_UPLOADS_DIR)), name="uploads")
 
+# Added before CORS so 304 responses still carry CORS headers
+if settings.conditional_get_enabled:
+    app.add_middleware(ConditionalGetMiddleware)
+
 # CORS Configuration
 app.add_middleware(
     CORSMiddleware,
@@ -67,7 +77,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["Content-Disposition"],
+    expose_headers=["Content-Disposition", "Retry-After", "Server-Timing", "X-Render-Time-Ms", "ETag"],
 )
 
 
@@ -87,12 +97,17 @@ async def startup_event():
             "Use backend/venv to run the API (see backend/run_dev.bat). Import error: %s",
             exc,
         )
+    start_email_outbox_worker()
+    start_maintenance_scheduler()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Application shutdown event."""
     logger.info("Shutting down Timetable Scheduler API")
+    shutdown_render_pool()
+    stop_maintenance_scheduler()
+    stop_email_outbox_worker()
 
 
 @app.get("/health", tags=["health"])
@@ -133,6 +148,8 @@ app.include_router(notifications.router)
 app.include_router(password_reset.router)
 app.include_router(debug.router)
 app.include_router(coordinator_transfer.router)
+app.include_router(calendar.router)
+app.include_router(events.router)
 
 
 @app.exception_handler(Exception)
@@ -0,0 +1,191 @@
+"""Conditional GETs for polled read endpoints and watermark bumps for writes."""
+import re
+
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.dependencies.auth import get_request_token_claims
+from app.services.response_cache import (
+    NOTIFICATIONS,
+    REFERENCE_DATA,
+    TIMETABLE,
+    bump_watermark,
+    compute_etag,
+    etag_matches,
+    get_cached_response,
+    store_cached_response,
+)
+
+# GET endpoints answered from the watermark: path pattern -> topics they read.
+_CACHEABLE_READS = [
+    (re.compile(r"^/timetable-versions/?$"), (TIMETABLE,)),
+    (re.compile(r"^/timetable-entries/?$"), (TIMETABLE,)),
+    (re.compile(r"^/faculty-timetable/my-timetable/?$"), (TIMETABLE,)),
+    (re.compile(r"^/faculty-timetable/division-timetable/[^/]+/?$"), (TIMETABLE,)),
+    (re.compile(r"^/notifications/?$"), (NOTIFICATIONS,)),
+    (re.compile(r"^/notifications/unread-count/?$"), (NOTIFICATIONS,)),
+]
+
+# Successful writes under these prefixes bump the listed topics.
+_WRITE_TOPICS = [
+    ("/auth/login", ()),
+    ("/auth/signup", ()),
+    ("/auth/logout", ()),
+    ("/password", ()),
+    ("/pdf", ()),
+    ("/agents/criticize-timetable", ()),
+    ("/notifications", (NOTIFICATIONS,)),
+    ("/timetable-versions", (TIMETABLE, NOTIFICATIONS)),
+    ("/faculty-leaves", (TIMETABLE, NOTIFICATIONS)),
+    ("/slot-adjustments", (TIMETABLE, NOTIFICATIONS)),
+    ("/auth/coordinator-transfer", (TIMETABLE, NOTIFICATIONS)),
+    ("/divisions", (TIMETABLE, REFERENCE_DATA)),
+    ("/subjects", (TIMETABLE, REFERENCE_DATA)),
+    ("/faculty", (TIMETABLE, REFERENCE_DATA)),
+    ("/rooms", (TIMETABLE, REFERENCE_DATA)),
+    ("/batches", (TIMETABLE, REFERENCE_DATA)),
+    ("/days", (TIMETABLE, REFERENCE_DATA)),
+    ("/time-slots", (TIMETABLE, REFERENCE_DATA)),
+    ("/agents", (TIMETABLE, REFERENCE_DATA)),
+]
+_DEFAULT_WRITE_TOPICS = (TIMETABLE,)
+
+_SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+def _write_topics(path: str) -> tuple[str, ...]:
+    for prefix, topics in _WRITE_TOPICS:
+        if path == prefix or path.startswith(prefix + "/"):
+            return topics
+    return _DEFAULT_WRITE_TOPICS
+
+
+def _read_topics(path: str) -> tuple[str, ...] | None:
+    for pattern, topics in _CACHEABLE_READS:
+        if pattern.match(path):
+            return topics
+    return None
+
+
+def _caller(request: Request) -> tuple[str, str | None, str | None] | None:
+    """``(subject, role, department_id)`` from the bearer token, or None when absent/invalid."""
+    auth_header = request.headers.get("authorization", "")
+    if not auth_header.startswith("Bearer "):
+        return None
+    try:
+        claims, _ = get_request_token_claims(request, auth_header.split(" ", 1)[1])
+    except Exception:
+        return None
+    subject = claims.get("sub")
+    if not subject:
+        return None
+    role = str(claims.get("role") or "").upper() or None
+    department_id = claims.get("department_id")
+    # Admins act across departments, so their writes (and reads) use the global scope.
+    if role == "ADMIN":
+        department_id = None
+    return str(subject), role, (str(department_id) if department_id else None)
+
+
+class ConditionalGetMiddleware:
+    """
+    Pure ASGI middleware (streaming responses pass through untouched).
+
+    Polled GETs get a weak ETag derived from the caller, the URL and the data
+    watermark; a matching ``If-None-Match`` is answered with 304 before the route
+    runs. Successful writes bump the watermark once their response has been sent,
+    so streamed generation runs count when they finish.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"].upper()
+        path = scope.get("path", "")
+        if method not in _SAFE_METHODS:
+            await self._handle_write(scope, receive, send, path)
+            return
+        topics = _read_topics(path) if method == "GET" else None
+        request = Request(scope)
+        caller = _caller(request) if topics else None
+        if not caller:
+            await self.app(scope, receive, send)
+            return
+
+        subject, role, department_id = caller
+        request_key = f"{path}?{request.url.query}#{subject}:{role}"
+        etag = compute_etag(request_key, topics, department_id)
+        validator_headers = [
+            (b"etag", etag.encode("latin-1")),
+            (b"cache-control", b"private, no-cache"),
+        ]
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            await send({"type": "http.response.start", "status": 304, "headers": validator_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        cached = get_cached_response(etag)
+        if cached is not None:
+            status_code, headers, body = cached
+            await send({"type": "http.response.start", "status": status_code, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        start_message: Message | None = None
+        chunks: list[bytes] = []
+
+        async def send_with_etag(message: Message) -> None:
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                if message["status"] != 200:
+                    await send(message)
+                    return
+                headers = [
+                    (name, value)
+                    for name, value in message.get("headers", [])
+                    if name.lower() not in (b"etag", b"cache-control")
+                ]
+                start_message = {**message, "headers": headers + validator_headers}
+                await send(start_message)
+                return
+            if message["type"] == "http.response.body" and start_message is not None:
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    store_cached_response(etag, 200, start_message["headers"], b"".join(chunks))
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
+
+    async def _handle_write(self, scope: Scope, receive: Receive, send: Send, path: str) -> None:
+        topics = _write_topics(path)
+        if not topics:
+            await self.app(scope, receive, send)
+            return
+        may_have_written = False
+        bumped = False
+
+        def bump() -> None:
+            nonlocal bumped
+            if not bumped:
+                bumped = True
+                caller = _caller(Request(scope))
+                bump_watermark(*topics, department_id=caller[2] if caller else None)
+
+        async def send_and_track(message: Message) -> None:
+            nonlocal may_have_written
+            if message["type"] == "http.response.start":
+                # Client errors never write; a 5xx may have failed half-way through.
+                may_have_written = not 400 <= int(message["status"]) < 500
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False) and may_have_written:
+                bump()
+
+        try:
+            await self.app(scope, receive, send_and_track)
+        except Exception:
+            bump()
+            raise
@@ -1,7 +1,8 @@
 """Middleware to set department context for RLS policies."""
 from fastapi import Request
 from starlette.middleware.base import BaseHTTPMiddleware
-import jwt
+
+from app.dependencies.auth import get_request_token_claims
 
 
 class DepartmentContextMiddleware(BaseHTTPMiddleware):
@@ -10,6 +11,9 @@ class DepartmentContextMiddleware(BaseHTTPMiddleware):
     
     This ensures RLS policies can access the user's department_id via
     current_setting('request.jwt.claims').
+
+    The decoded token is kept on ``request.state`` so the auth dependency does not
+    decode it again.
     """
     
     async def dispatch(self, request: Request, call_next):
@@ -20,18 +24,14 @@ class DepartmentContextMiddleware(BaseHTTPMiddleware):
             token = auth_header.split(" ")[1]
             
             try:
-                # Decode JWT without verification (already verified in auth dependency)
-                from app.config import settings
-                payload = jwt.decode(
-                    token,
-                    settings.supabase_service_role_key,
-                    algorithms=["HS256"],
-                )
+                payload, verified = get_request_token_claims(request, token)
                 
-                # Store JWT claims in request state for RLS
-                request.state.jwt_claims = payload
-                request.state.department_id = payload.get("department_id")
-                request.state.user_role = payload.get("role")
+                # Only our own (signature-verified) tokens carry department claims
+                if verified:
+                    # Store JWT claims in request state for RLS
+                    request.state.jwt_claims = payload
+                    request.state.department_id = payload.get("department_id")
+                    request.state.user_role = payload.get("role")
                 
             except Exception as e:
                 # If decode fails, continue without setting context
@@ -4,6 +4,7 @@ from pydantic import BaseModel
 from typing import Optional
 from app.dependencies.auth import get_current_user, CurrentUser
 from app.supabase_client import get_user_supabase
+from app.services.timetable_calendar import invalidate_timetable_calendar
 from app.schemas.common import SuccessResponse
 
 router = APIRouter(prefix="/academic-years", tags=["academic-years"])
@@ -50,6 +51,7 @@ async def create_academic_year(
         response = (
             supabase.table("academic_years").insert(year.model_dump()).execute()
         )
+        invalidate_timetable_calendar()
         return {
             "data": response.data,
             "message": "Academic year created successfully",
@@ -75,6 +77,7 @@ async def delete_academic_year(
             .eq("year_id", year_id)
             .execute()
         )
+        invalidate_timetable_calendar()
         return {
             "data": response.data,
             "message": "Academic year deleted successfully",
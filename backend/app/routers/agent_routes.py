@@ -1,9 +1,10 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Request
 import json
 import logging
 import traceback
-from pydantic import BaseModel
-from fastapi.responses import StreamingResponse
+from typing import Literal
+from pydantic import BaseModel, Field
+from fastapi.responses import Response, StreamingResponse
 from app.config import settings
 from app.dependencies.auth import (
     get_current_user_with_profile,
@@ -12,10 +13,13 @@ from app.dependencies.auth import (
 )
 from app.supabase_client import get_service_supabase
 from app.schemas.common import SuccessResponse
+from app.services.effective_version import get_active_draft, get_effective_version_id
 from app.services.load_management_agents import LoadManagementCrew
 from app.services.timetable_critic_agent import TimetableCriticAgent
 from app.services.timetable_issue_resolver import TimetableIssueResolver
-from app.services.timetable_scheduling_types import ResolverIntegrityError
+from app.services.institute_generation import get_institute_job, start_institute_job
+from app.services.result_encoding import compact_result, iter_stream_events, negotiate_body, sse_message
+from app.services.timetable_scheduling_types import GenerationOptions, ResolverIntegrityError
 from app.services.timetable_orchestrator import (
     TimetableOrchestrationEngine,
     _division_base_name,
@@ -37,6 +41,36 @@ class TimetableOrchestrationRequest(BaseModel):
     department_id: str | None = None
     reason: str | None = None
     dry_run: bool = False
+    local_search: bool | None = None
+    # Each request holds a worker for the whole search
+    local_search_seconds: float | None = Field(None, ge=0, le=60)
+    solver: Literal["greedy", "cpsat"] | None = None
+    cpsat_seconds: float | None = None
+    base_version_id: str | None = None
+    max_displaced_sessions: int | None = None
+    precheck: Literal["off", "continue", "fail_fast"] | None = None
+    task_ordering: Literal["static", "dynamic"] | None = None
+    # "compact": columnar, dictionary-encoded final_timetable (chunked `entries` events when streaming)
+    result_format: Literal["full", "compact"] = "full"
+
+    def generation_options(self, **overrides) -> GenerationOptions:
+        return GenerationOptions.from_settings(
+            precheck=self.precheck,
+            task_ordering=self.task_ordering,
+            local_search=self.local_search,
+            local_search_seconds=self.local_search_seconds,
+            solver=self.solver,
+            cpsat_seconds=self.cpsat_seconds,
+            base_version_id=self.base_version_id,
+            max_displaced_sessions=self.max_displaced_sessions,
+            **overrides,
+        )
+
+
+class InstituteTimetableRequest(TimetableOrchestrationRequest):
+    # None = every department with uploaded load distribution
+    department_ids: list[str] | None = None
+    max_rounds: int | None = None
 
 
 class TimetableCritiqueRequest(BaseModel):
@@ -423,9 +457,14 @@ async def generate_faculty_load(
 @router.post("/create-timetable", response_model=SuccessResponse)
 async def create_timetable_with_agents(
     payload: TimetableOrchestrationRequest,
+    request: Request,
     current_user: CurrentUser = Depends(get_current_user_with_profile),
-) -> dict:
-    """Run multi-agent orchestration to build a timetable from persisted master data."""
+):
+    """Run multi-agent orchestration to build a timetable from persisted master data.
+
+    Answers with msgpack when the Accept header asks for it (and msgpack is installed),
+    otherwise JSON, gzipped when the client accepts gzip.
+    """
     try:
         effective_dept = resolve_effective_department_id(current_user, payload.department_id)
         if current_user.role != "ADMIN" and not effective_dept:
@@ -439,11 +478,60 @@ async def create_timetable_with_agents(
             department_id=effective_dept,
             persist=not payload.dry_run,
             reason=payload.reason,
+            options=payload.generation_options(),
+        )
+        if payload.result_format == "compact":
+            result = compact_result(result)
+        content, media_type, headers = negotiate_body(
+            {
+                "data": result,
+                "message": "Multi-agent timetable orchestration completed successfully.",
+            },
+            accept=request.headers.get("accept"),
+            accept_encoding=request.headers.get("accept-encoding"),
+        )
+        return Response(content=content, media_type=media_type, headers=headers)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Timetable orchestration failed: {str(e)}",
+        )
+
+
+@router.post("/capacity-check", response_model=SuccessResponse)
+async def check_timetable_capacity(
+    payload: TimetableOrchestrationRequest,
+    current_user: CurrentUser = Depends(get_current_user_with_profile),
+) -> dict:
+    """Compile the session tasks and report capacity bounds they violate, without scheduling."""
+    try:
+        effective_dept = resolve_effective_department_id(current_user, payload.department_id)
+        if current_user.role != "ADMIN" and not effective_dept:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Department is required to check timetable capacity.",
+            )
+        orchestrator = TimetableOrchestrationEngine()
+        result = orchestrator.run(
+            user_id=None if _is_anonymous_mode_user(current_user) else current_user.uid,
+            department_id=effective_dept,
+            persist=False,
+            reason=payload.reason,
+            options=payload.generation_options(precheck_only=True),
         )
         return {
             "data": result,
-            "message": "Multi-agent timetable orchestration completed successfully.",
+            "message": "Capacity pre-check completed.",
         }
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -452,7 +540,7 @@ async def create_timetable_with_agents(
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Timetable orchestration failed: {str(e)}",
+            detail=f"Capacity pre-check failed: {str(e)}",
         )
 
 
@@ -461,7 +549,13 @@ async def create_timetable_with_agents_stream(
     payload: TimetableOrchestrationRequest,
     current_user: CurrentUser = Depends(get_current_user_with_profile),
 ):
-    """Stream real-time stage updates for timetable orchestration using SSE."""
+    """Stream real-time stage updates for timetable orchestration using SSE.
+
+    With ``result_format="compact"`` the timetable arrives as columnar ``entries``
+    events before a slim ``result`` event.
+    """
+    compact = payload.result_format == "compact"
+    chunk_size = settings.timetable_result_chunk_size
 
     def event_stream():
         try:
@@ -475,10 +569,10 @@ async def create_timetable_with_agents_stream(
                 department_id=effective_dept,
                 persist=not payload.dry_run,
                 reason=payload.reason,
+                options=payload.generation_options(),
             ):
-                event_type = event.get("type", "message")
-                yield f"event: {event_type}\n"
-                yield f"data: {json.dumps(event)}\n\n"
+                for event_type, message in iter_stream_events(event, payload.result_format, chunk_size):
+                    yield sse_message(event_type, message, compact=compact)
         except ValueError as e:
             error_event = {
                 "type": "error",
@@ -507,6 +601,87 @@ async def create_timetable_with_agents_stream(
     )
 
 
+@router.post("/institute-timetable/jobs", response_model=SuccessResponse)
+async def start_institute_timetable_job(
+    payload: InstituteTimetableRequest,
+    current_user: CurrentUser = Depends(get_current_user_with_profile),
+) -> dict:
+    """Generate every department together; shared rooms and faculty are reconciled before saving."""
+    try:
+        if current_user.role != "ADMIN":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Only admins can generate the institute timetable.",
+            )
+        if payload.base_version_id:
+            raise ValueError("base_version_id applies to single-department runs only.")
+        job = start_institute_job(
+            department_ids=payload.department_ids or ([payload.department_id] if payload.department_id else None),
+            user_id=None if _is_anonymous_mode_user(current_user) else current_user.uid,
+            reason=payload.reason,
+            options=payload.generation_options(),
+            persist=not payload.dry_run,
+            max_rounds=payload.max_rounds,
+        )
+        return {"data": job.snapshot(), "message": "Institute timetable generation started"}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Institute timetable generation failed: {str(e)}",
+        )
+
+
+def _get_institute_job_or_404(job_id: str):
+    job = get_institute_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Institute generation job not found")
+    return job
+
+
+@router.get("/institute-timetable/jobs/{job_id}", response_model=SuccessResponse)
+async def get_institute_timetable_job(
+    job_id: str,
+    current_user: CurrentUser = Depends(get_current_user_with_profile),
+) -> dict:
+    """Current phase, per-department results and coordination report of an institute job."""
+    job = _get_institute_job_or_404(job_id)
+    return {"data": job.snapshot(), "message": f"Institute generation job {job.status}"}
+
+
+@router.get("/institute-timetable/jobs/{job_id}/events")
+async def stream_institute_timetable_job_events(
+    job_id: str,
+    current_user: CurrentUser = Depends(get_current_user_with_profile),
+):
+    """Server-sent progress events for an institute job (ends with a ``done`` event)."""
+    job = _get_institute_job_or_404(job_id)
+
+    async def event_generator():
+        revision = -1
+        while True:
+            revision = await job.wait_for_change(revision, timeout=15.0)
+            yield sse_message("done" if job.done else "progress", job.snapshot())
+            if job.done:
+                break
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
 @router.post("/criticize-timetable", response_model=SuccessResponse)
 async def criticize_timetable_with_special_agent(
     payload: TimetableCritiqueRequest,
@@ -519,26 +694,10 @@ async def criticize_timetable_with_special_agent(
 
         target_version_id = payload.version_id
         if not target_version_id:
-            version_query = (
-                supabase.table("timetable_versions")
-                .select("version_id, created_by, is_active, created_at")
-                .eq("is_active", True)
-                .order("created_at", desc=True)
-                .limit(1)
-            )
-            if current_user.role != "ADMIN":
-                if effective_department:
-                    # department filter is handled indirectly through generated data ownership;
-                    # fallback to creator scope for non-admin users where department-specific
-                    # version metadata is not present.
-                    pass
-                if not _is_anonymous_mode_user(current_user):
-                    version_query = version_query.eq("created_by", current_user.uid)
-
-            rows = version_query.execute().data or []
-            if not rows:
+            # The version this user currently sees for the department
+            target_version_id = get_effective_version_id(supabase, effective_department, current_user.role)
+            if not target_version_id:
                 raise ValueError("No active timetable version found for critique.")
-            target_version_id = rows[0].get("version_id")
 
         critic = TimetableCriticAgent(supabase)
         critique = critic.analyze(
@@ -573,22 +732,11 @@ async def resolve_timetable_issues_with_special_team(
 
         target_version_id = payload.version_id
         if not target_version_id:
-            version_query = (
-                supabase.table("timetable_versions")
-                .select("version_id, created_by, is_active, created_at")
-                .eq("is_active", True)
-                .order("created_at", desc=True)
-                .limit(1)
-            )
-            if current_user.role != "ADMIN":
-                if effective_department:
-                    pass
-                if not _is_anonymous_mode_user(current_user):
-                    version_query = version_query.eq("created_by", current_user.uid)
-            rows = version_query.execute().data or []
-            if not rows:
+            # Repairs work on the department's active draft; frozen versions are rejected below
+            draft = get_active_draft(supabase, effective_department)
+            if not draft:
                 raise ValueError("No active timetable version found for issue resolution.")
-            target_version_id = rows[0].get("version_id")
+            target_version_id = draft.get("version_id")
 
         source_version = (
             supabase.table("timetable_versions")
@@ -1,12 +1,41 @@
 """Department analytics routes for HOD dashboard."""
 from fastapi import APIRouter, HTTPException, status, Depends
-from app.dependencies.auth import get_current_user, CurrentUser, require_role
+from app.dependencies.auth import get_current_user, CurrentUser, require_role, canonical_department_id
 from app.supabase_client import get_service_supabase
 from app.schemas.common import SuccessResponse
+from app.services.effective_version import get_effective_version_id
+from app.services.timetable_version_deltas import fetch_version_entries
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
 
+def _scoped_version_id(supabase, current_user: CurrentUser, version_id: str | None) -> str | None:
+    """``version_id`` if the caller may read it, else the effective version of their department.
+
+    Only admins read across departments; anyone else without a department, or asking for
+    another department's version, gets a 404.
+    """
+    department_id = canonical_department_id(current_user.department_id)
+    is_admin = current_user.role == "ADMIN"
+    if department_id is None and not is_admin:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No timetable version found")
+    if not version_id:
+        return get_effective_version_id(supabase, department_id, current_user.role)
+    if not is_admin:
+        rows = (
+            supabase.table("timetable_versions")
+            .select("department_id")
+            .eq("version_id", version_id)
+            .limit(1)
+            .execute()
+            .data
+            or []
+        )
+        if not rows or canonical_department_id(rows[0].get("department_id")) not in (None, department_id):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Timetable version not found")
+    return version_id
+
+
 @router.get("/department-overview", response_model=SuccessResponse)
 async def get_department_overview(
     current_user: CurrentUser = Depends(require_role("HOD", "COORDINATOR", "ADMIN")),
@@ -92,22 +121,13 @@ async def get_faculty_workload(
         supabase = get_service_supabase()
         department_id = current_user.department_id
         
-        # Get latest version if not specified
+        # Default to the department's current version (approved > verified > active draft)
+        version_id = _scoped_version_id(supabase, current_user, version_id)
         if not version_id:
-            version_response = (
-                supabase.table("timetable_versions")
-                .select("version_id")
-                .order("created_at", desc=True)
-                .limit(1)
-                .execute()
-            )
-            if version_response.data:
-                version_id = version_response.data[0]["version_id"]
-            else:
-                return {
-                    "data": {"workload": []},
-                    "message": "No timetable version found",
-                }
+            return {
+                "data": {"workload": []},
+                "message": "No timetable version found",
+            }
         
         # Get all faculty in department
         faculty_response = (
@@ -120,18 +140,14 @@ async def get_faculty_workload(
         
         faculty_list = faculty_response.data or []
         
-        # Get timetable entries for each faculty
+        # Get timetable entries once and group them by faculty
+        entries_by_faculty: dict[str, list[dict]] = {}
+        for entry in fetch_version_entries(supabase, version_id, "entry_id, faculty_id, session_type"):
+            entries_by_faculty.setdefault(str(entry.get("faculty_id")), []).append(entry)
+
         workload_data = []
         for faculty in faculty_list:
-            entries_response = (
-                supabase.table("timetable_entries")
-                .select("entry_id, session_type")
-                .eq("version_id", version_id)
-                .eq("faculty_id", faculty["faculty_id"])
-                .execute()
-            )
-            
-            entries = entries_response.data or []
+            entries = entries_by_faculty.get(str(faculty["faculty_id"]), [])
             total_slots = len(entries)
             
             # Count by session type
@@ -162,6 +178,8 @@ async def get_faculty_workload(
             "message": "Faculty workload retrieved successfully",
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -178,22 +196,13 @@ async def get_room_utilization(
     try:
         supabase = get_service_supabase()
         
-        # Get latest version if not specified
+        # Default to the department's current version (approved > verified > active draft)
+        version_id = _scoped_version_id(supabase, current_user, version_id)
         if not version_id:
-            version_response = (
-                supabase.table("timetable_versions")
-                .select("version_id")
-                .order("created_at", desc=True)
-                .limit(1)
-                .execute()
-            )
-            if version_response.data:
-                version_id = version_response.data[0]["version_id"]
-            else:
-                return {
-                    "data": {"utilization": []},
-                    "message": "No timetable version found",
-                }
+            return {
+                "data": {"utilization": []},
+                "message": "No timetable version found",
+            }
         
         # Get all rooms - use room_number instead of room_name
         rooms_response = (
@@ -220,17 +229,14 @@ async def get_room_utilization(
             total_possible_slots = 1  # Avoid division by zero
         
         # Get utilization for each room
+        used_slots_by_room: dict[str, int] = {}
+        for entry in fetch_version_entries(supabase, version_id, "entry_id, room_id"):
+            room_key = str(entry.get("room_id"))
+            used_slots_by_room[room_key] = used_slots_by_room.get(room_key, 0) + 1
+
         utilization_data = []
         for room in rooms_list:
-            entries_response = (
-                supabase.table("timetable_entries")
-                .select("entry_id")
-                .eq("version_id", version_id)
-                .eq("room_id", room["room_id"])
-                .execute()
-            )
-            
-            used_slots = len(entries_response.data or [])
+            used_slots = used_slots_by_room.get(str(room["room_id"]), 0)
             utilization_percentage = round((used_slots / total_possible_slots) * 100, 1) if total_possible_slots else 0
             
             utilization_data.append({
@@ -254,6 +260,8 @@ async def get_room_utilization(
             "message": "Room utilization retrieved successfully",
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -352,33 +360,19 @@ async def get_timetable_conflicts(
     try:
         supabase = get_service_supabase()
         
-        # Get latest version if not specified
+        # Default to the department's current version (approved > verified > active draft)
+        version_id = _scoped_version_id(supabase, current_user, version_id)
         if not version_id:
-            version_response = (
-                supabase.table("timetable_versions")
-                .select("version_id")
-                .order("created_at", desc=True)
-                .limit(1)
-                .execute()
-            )
-            if version_response.data:
-                version_id = version_response.data[0]["version_id"]
-            else:
-                return {
-                    "data": {"conflicts": []},
-                    "message": "No timetable version found",
-                }
+            return {
+                "data": {"conflicts": []},
+                "message": "No timetable version found",
+            }
         
         # Get all entries
-        entries_response = (
-            supabase.table("timetable_entries")
-            .select("entry_id, faculty_id, room_id, day_id, slot_id, division_id")
-            .eq("version_id", version_id)
-            .execute()
+        entries = fetch_version_entries(
+            supabase, version_id, "entry_id, faculty_id, room_id, day_id, slot_id, division_id"
         )
         
-        entries = entries_response.data or []
-        
         # Check for conflicts
         conflicts = []
         
@@ -434,6 +428,8 @@ async def get_timetable_conflicts(
             "message": "Timetable conflicts retrieved successfully",
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
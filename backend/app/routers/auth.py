@@ -1,16 +1,33 @@
 """Authentication and user profile routes."""
-import csv
-import io
 import secrets
 import string
 import bcrypt
 import uuid
-from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File
+from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Query
 from pydantic import BaseModel
-from app.dependencies.auth import get_current_user, CurrentUser, get_current_user_with_profile, require_role
+from app.dependencies.auth import (
+    get_current_user,
+    CurrentUser,
+    canonical_department_id,
+    get_current_user_with_profile,
+    invalidate_profile_cache,
+    require_role,
+)
 from app.supabase_client import get_user_supabase, get_service_supabase
 from app.schemas.common import SuccessResponse
 from app.services.email_service import send_user_credentials
+from app.services.student_import import (
+    StudentImportJob,
+    StudentImportRow,
+    create_import_job,
+    fetch_rows_in,
+    find_auth_user_ids,
+    get_import_job,
+    parse_student_csv,
+    run_bounded,
+    run_import_job,
+    upsert_in_batches,
+)
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -98,6 +115,7 @@ def _upsert_profile_with_compat(supabase, payload: dict) -> None:
     user_id = payload.get("user_id")
     try:
         supabase.table("user_profiles").upsert(payload).execute()
+        invalidate_profile_cache(user_id)
         return
     except Exception:
         pass
@@ -107,6 +125,7 @@ def _upsert_profile_with_compat(supabase, payload: dict) -> None:
         fallback["id"] = user_id
     fallback.pop("user_id", None)
     supabase.table("user_profiles").upsert(fallback).execute()
+    invalidate_profile_cache(user_id)
 
 
 @router.post("/signup", response_model=SuccessResponse)
@@ -508,96 +527,157 @@ async def coordinator_create_user(
         )
 
 
+_COORDINATOR_STUDENT_COLUMNS = {
+    "name": ("name",),
+    "email": ("email",),
+    "prn": ("prn",),
+    "department_id": ("department_id",),
+    "division": ("division",),
+}
+
+
+def _import_coordinator_students(job: StudentImportJob, supabase, current_user: CurrentUser) -> None:
+    """Create auth users with bounded concurrency, then upsert profiles in batches."""
+    for row in job.pending_rows():
+        if (
+            current_user.role == "COORDINATOR"
+            and current_user.department_id
+            and row.department_id != current_user.department_id
+        ):
+            job.mark(row, "invalid", "coordinator cannot create students outside their department")
+
+    # Resume support: students whose profile already exists were imported earlier.
+    pending = job.pending_rows()
+    existing_profiles = {
+        str(item.get("email") or "").lower()
+        for item in fetch_rows_in(supabase, "user_profiles", "email", [row.email for row in pending], "email, role")
+        if str(item.get("role") or "").upper() == "STUDENT"
+    }
+    for row in pending:
+        if row.email in existing_profiles:
+            job.mark(row, "skipped", "student account already exists")
+
+    job.phase = "creating_accounts"
+    user_ids: dict[int, str] = {}
+    orphaned: list[StudentImportRow] = []
+
+    def _create_auth_user(row: StudentImportRow) -> str:
+        auth_response = supabase.auth.admin.create_user(
+            {
+                "email": row.email,
+                "password": row.prn,
+                "email_confirm": True,
+                "user_metadata": {
+                    "display_name": row.name or row.email,
+                    "role": "STUDENT",
+                    "prn": row.prn,
+                    "department_id": row.department_id,
+                    "division": row.division,
+                },
+            }
+        )
+        if not auth_response.user:
+            raise ValueError("Auth user creation failed")
+        return str(auth_response.user.id)
+
+    def _on_created(row: StudentImportRow, user_id: str | None, error: Exception | None) -> None:
+        if error is None:
+            user_ids[row.row_number] = user_id
+        elif "already" in str(error).lower():
+            # Auth user left behind by an earlier partial import; reuse it.
+            orphaned.append(row)
+        else:
+            job.mark(row, "failed", str(error))
+
+    run_bounded(_create_auth_user, job.pending_rows(), _on_created)
+    if orphaned:
+        recovered = find_auth_user_ids(supabase, {row.email for row in orphaned})
+        for row in orphaned:
+            if row.email in recovered:
+                user_ids[row.row_number] = recovered[row.email]
+            else:
+                job.mark(row, "failed", "email already registered")
+
+    job.phase = "saving"
+    records = [
+        (
+            row,
+            {
+                "user_id": user_ids[row.row_number],
+                "email": row.email,
+                "role": "STUDENT",
+                "department_id": row.department_id,
+                "prn": row.prn,
+                "division": row.division,
+                "is_hod": False,
+                "is_coordinator": False,
+            },
+        )
+        for row in job.pending_rows()
+        if row.row_number in user_ids
+    ]
+    upsert_in_batches(
+        supabase,
+        "user_profiles",
+        job,
+        records,
+        row_fallback=lambda payload: _upsert_profile_with_compat(supabase, payload),
+    )
+    invalidate_profile_cache(*(payload["user_id"] for _, payload in records))
+
+
 @router.post("/coordinator/students/upload", response_model=SuccessResponse)
 async def coordinator_upload_students_csv(
     file: UploadFile = File(...),
+    dry_run: bool = Query(False, description="Validate the file and report per-row results without writing"),
+    background: bool = Query(False, description="Return immediately; poll /auth/coordinator/students/import-jobs/{job_id}"),
     current_user: CurrentUser = Depends(require_role("COORDINATOR", "ADMIN")),
 ) -> dict:
-    """Coordinator-only CSV upload to create STUDENT accounts (password=PRN, no email sent)."""
+    """Coordinator-only CSV upload to create STUDENT accounts (password=PRN, no email sent).
+
+    The whole file is validated first; re-uploading after a partial failure resumes
+    where the previous run stopped.
+    """
     if not file.filename or not file.filename.lower().endswith(".csv"):
         raise HTTPException(status_code=400, detail="Please upload a valid CSV file.")
 
     try:
         content = await file.read()
-        decoded = content.decode("utf-8-sig")
-        reader = csv.DictReader(io.StringIO(decoded))
-        if not reader.fieldnames:
-            raise HTTPException(status_code=400, detail="CSV file has no headers.")
-
-        headers = {h.strip().lower(): h for h in reader.fieldnames if h}
-        required = ["name", "email", "prn", "department_id", "division"]
-        missing = [col for col in required if col not in headers]
-        if missing:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Missing required columns: {', '.join(missing)}",
-            )
+        rows = parse_student_csv(
+            content,
+            _COORDINATOR_STUDENT_COLUMNS,
+            required=("email", "prn", "department_id", "division"),
+        )
+        job = create_import_job(
+            "coordinator_students",
+            str(current_user.department_id or ""),
+            rows,
+            created_by=current_user.uid,
+            department_id=canonical_department_id(current_user.department_id),
+        )
+        if dry_run:
+            job.status, job.phase = "completed", "done"
+            return {"data": job.snapshot(), "message": f"Validated {len(rows)} rows; nothing was written."}
 
         supabase = get_service_supabase()
-        created = 0
-        failed = 0
-        errors: list[str] = []
-
-        for idx, row in enumerate(reader, start=2):
-            try:
-                name = (row.get(headers["name"]) or "").strip()
-                email = (row.get(headers["email"]) or "").strip().lower()
-                prn = (row.get(headers["prn"]) or "").strip()
-                department_id = (row.get(headers["department_id"]) or "").strip()
-                division = (row.get(headers["division"]) or "").strip()
-
-                if not email or not prn or not department_id or not division:
-                    raise ValueError("email, prn, department_id and division are required")
-                if (
-                    current_user.role == "COORDINATOR"
-                    and current_user.department_id
-                    and department_id != current_user.department_id
-                ):
-                    raise ValueError("coordinator cannot create students outside their department")
-
-                auth_response = supabase.auth.admin.create_user(
-                    {
-                        "email": email,
-                        "password": prn,
-                        "email_confirm": True,
-                        "user_metadata": {
-                            "display_name": name or email,
-                            "role": "STUDENT",
-                            "prn": prn,
-                            "department_id": department_id,
-                            "division": division,
-                        },
-                    }
-                )
-                if not auth_response.user:
-                    raise ValueError("Auth user creation failed")
-
-                user_id = str(auth_response.user.id)
-                _upsert_profile_with_compat(
-                    supabase,
-                    {
-                        "user_id": user_id,
-                        "email": email,
-                        "role": "STUDENT",
-                        "department_id": department_id,
-                        "prn": prn,
-                        "division": division,
-                        "is_hod": False,
-                        "is_coordinator": False,
-                    },
-                )
-                created += 1
-            except Exception as row_error:
-                failed += 1
-                errors.append(f"Row {idx}: {str(row_error)}")
+        await run_import_job(
+            job,
+            lambda j: _import_coordinator_students(j, supabase, current_user),
+            background=background,
+        )
+        data = job.snapshot()
+        if background:
+            return {"data": data, "message": f"Import of {len(rows)} students started."}
 
+        failed_rows = [row for row in data["rows"] if row["status"] in {"invalid", "failed"}]
+        data["failed"] = len(failed_rows)
+        data["errors"] = [f"Row {row['row']}: {row['error']}" for row in failed_rows][:25]
         return {
-            "data": {
-                "created": created,
-                "failed": failed,
-                "errors": errors[:25],
-            },
-            "message": f"Student CSV processed. Created {created}, failed {failed}.",
+            "data": data,
+            "message": (
+                f"Student CSV processed. Created {data['created']}, "
+                f"already existed {data['skipped']}, failed {data['failed']}."
+            ),
         }
         
     except Exception as e:
@@ -607,6 +687,27 @@ async def coordinator_upload_students_csv(
         )
 
 
+@router.get("/coordinator/students/import-jobs/{job_id}", response_model=SuccessResponse)
+async def get_student_import_job(
+    job_id: str,
+    include_rows: bool = Query(True),
+    current_user: CurrentUser = Depends(require_role("COORDINATOR", "ADMIN")),
+) -> dict:
+    """Progress and per-row results of a student CSV import.
+
+    Jobs are kept in the worker process that started them, so poll the same worker.
+    """
+    job = get_import_job(job_id)
+    # Other departments' jobs are reported as missing to everyone but admins
+    if job and current_user.role != "ADMIN" and job.created_by != current_user.uid:
+        department_id = canonical_department_id(current_user.department_id)
+        if department_id is None or canonical_department_id(job.department_id) != department_id:
+            job = None
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found.")
+    return {"data": job.snapshot(include_rows=include_rows), "message": f"Import {job.status} ({job.phase})."}
+
+
 @router.get("/me", response_model=SuccessResponse)
 async def get_current_user_profile(
     current_user: CurrentUser = Depends(get_current_user_with_profile),
@@ -711,6 +812,7 @@ async def update_staff_profile(
             )
         if not (res.data or []):
             raise HTTPException(status_code=404, detail="User profile not found.")
+        invalidate_profile_cache(current_user.uid)
         return {"data": update_data, "message": "Profile updated successfully."}
     except HTTPException:
         raise
@@ -748,6 +850,7 @@ async def update_student_enrollment(
                 .eq("id", current_user.uid)
                 .execute()
             )
+        invalidate_profile_cache(current_user.uid)
 
         return {
             "data": {
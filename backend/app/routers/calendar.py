@@ -0,0 +1,151 @@
+"""Dated timetable queries: classes between dates, cancellations and hours lost."""
+from datetime import date, timedelta
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from app.dependencies.auth import get_current_user, CurrentUser, require_role, canonical_department_id
+from app.supabase_client import get_service_supabase
+from app.schemas.common import SuccessResponse
+from app.services.effective_version import visible_to_role
+from app.services.timetable_calendar import TimetableCalendar, get_timetable_calendar, parse_date
+
+router = APIRouter(prefix="/calendar", tags=["calendar"])
+
+_MAX_RANGE_DAYS = 366
+
+
+def _parse_range(start_date: str | None, end_date: str | None) -> tuple[date, date]:
+    """Defaults to the current calendar month."""
+    today = date.today()
+    start = parse_date(start_date) if start_date else today.replace(day=1)
+    if start is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid start_date (expected YYYY-MM-DD)")
+    if end_date:
+        end = parse_date(end_date)
+        if end is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid end_date (expected YYYY-MM-DD)")
+    else:
+        end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    if end < start:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="end_date must not be before start_date")
+    if (end - start).days > _MAX_RANGE_DAYS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Date range is limited to {_MAX_RANGE_DAYS} days")
+    return start, end
+
+
+def _load_calendar(current_user: CurrentUser, version_id: str | None) -> TimetableCalendar:
+    """Calendar of ``version_id`` (default: the effective version of the caller's department)."""
+    supabase = get_service_supabase()
+    department_id = canonical_department_id(current_user.department_id)
+    # Only admins read across departments; anyone else without a department sees no versions
+    if department_id is None and current_user.role != "ADMIN":
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No timetable version available")
+    version = None
+    if version_id:
+        from app.routers.timetable_versions import _hydrate_version_row
+
+        rows = supabase.table("timetable_versions").select("*").eq("version_id", version_id).limit(1).execute().data or []
+        # Versions of other departments, or not yet released to the role, are reported as missing
+        if rows and current_user.role != "ADMIN":
+            row = rows[0]
+            if canonical_department_id(row.get("department_id")) not in (None, department_id) or not visible_to_role(
+                row, current_user.role
+            ):
+                rows = []
+        if not rows:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Timetable version not found")
+        version = _hydrate_version_row(rows[0])
+    calendar = get_timetable_calendar(supabase, version, department_id, current_user.role)
+    if calendar is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No timetable version available")
+    return calendar
+
+
+@router.get("/faculty/{faculty_id}/classes", response_model=SuccessResponse)
+async def get_faculty_classes(
+    faculty_id: str,
+    start_date: str | None = Query(None),
+    end_date: str | None = Query(None),
+    include_cancelled: bool = Query(True),
+    version_id: str | None = Query(None),
+    current_user: CurrentUser = Depends(get_current_user),
+) -> dict:
+    """All dated classes of a faculty member between two dates."""
+    try:
+        start, end = _parse_range(start_date, end_date)
+        calendar = _load_calendar(current_user, version_id)
+        occurrences = [
+            occ.to_dict()
+            for occ in calendar.occurrences(start, end, faculty_id=faculty_id, include_cancelled=include_cancelled)
+        ]
+        return {
+            "data": {
+                "version_id": calendar.version_id,
+                "faculty_id": faculty_id,
+                "start_date": start.isoformat(),
+                "end_date": end.isoformat(),
+                "classes": occurrences,
+            },
+            "message": f"Found {len(occurrences)} classes",
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch faculty classes: {str(e)}",
+        )
+
+
+@router.get("/cancellations", response_model=SuccessResponse)
+async def get_cancellations(
+    on_date: str = Query(..., alias="date"),
+    division_id: str | None = Query(None),
+    version_id: str | None = Query(None),
+    current_user: CurrentUser = Depends(get_current_user),
+) -> dict:
+    """Classes cancelled on a date by approved leaves or campus events."""
+    try:
+        day, _ = _parse_range(on_date, on_date)
+        calendar = _load_calendar(current_user, version_id)
+        cancelled = [occ.to_dict() for occ in calendar.cancelled_on(day, division_id=division_id)]
+        return {
+            "data": {"version_id": calendar.version_id, "date": day.isoformat(), "cancelled": cancelled},
+            "message": f"Found {len(cancelled)} cancelled classes",
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch cancellations: {str(e)}",
+        )
+
+
+@router.get("/hours-lost", response_model=SuccessResponse)
+async def get_hours_lost(
+    start_date: str | None = Query(None),
+    end_date: str | None = Query(None),
+    version_id: str | None = Query(None),
+    current_user: CurrentUser = Depends(require_role("HOD", "COORDINATOR", "ADMIN")),
+) -> dict:
+    """Cancelled teaching hours per division (defaults to the current month)."""
+    try:
+        start, end = _parse_range(start_date, end_date)
+        calendar = _load_calendar(current_user, version_id)
+        hours = calendar.hours_lost(start, end)
+        return {
+            "data": {
+                "version_id": calendar.version_id,
+                "start_date": start.isoformat(),
+                "end_date": end.isoformat(),
+                "hours_lost_by_division": hours,
+                "total_hours_lost": round(sum(hours.values()), 2),
+            },
+            "message": "Hours lost computed successfully",
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to compute hours lost: {str(e)}",
+        )
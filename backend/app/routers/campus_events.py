@@ -3,6 +3,7 @@ from fastapi import APIRouter, HTTPException, status, Depends
 from pydantic import BaseModel
 from app.dependencies.auth import get_current_user, CurrentUser
 from app.supabase_client import get_user_supabase
+from app.services.timetable_calendar import invalidate_timetable_calendar
 from app.schemas.common import SuccessResponse, EventTypeEnum
 
 router = APIRouter(prefix="/campus-events", tags=["campus-events"])
@@ -88,6 +89,7 @@ async def create_campus_event(
             .insert(event.model_dump())
             .execute()
         )
+        invalidate_timetable_calendar()
         return {
             "data": response.data,
             "message": "Campus event created successfully",
@@ -115,6 +117,7 @@ async def update_campus_event(
             .eq("event_id", event_id)
             .execute()
         )
+        invalidate_timetable_calendar()
         return {
             "data": response.data,
             "message": "Campus event updated successfully",
@@ -140,6 +143,7 @@ async def delete_campus_event(
             .eq("event_id", event_id)
             .execute()
         )
+        invalidate_timetable_calendar()
         return {
             "data": response.data,
             "message": "Campus event deleted successfully",
@@ -10,7 +10,13 @@ import bcrypt
 from fastapi import APIRouter, HTTPException, status, Depends
 from pydantic import BaseModel, EmailStr, Field
 
-from app.dependencies.auth import get_current_user_with_profile, CurrentUser, require_role, canonical_department_id
+from app.dependencies.auth import (
+    get_current_user_with_profile,
+    CurrentUser,
+    require_role,
+    canonical_department_id,
+    invalidate_profile_cache,
+)
 from app.supabase_client import get_service_supabase
 from app.schemas.common import SuccessResponse
 from app.services.email_service import (
@@ -340,6 +346,7 @@ async def complete_coordinator_transfer(
         supabase.table("user_profiles").delete().eq("id", old_uid).execute()
     except Exception:
         pass
+    invalidate_profile_cache(old_uid, new_user_id)
 
     supabase.table("coordinator_transfer_sessions").update(
         {"status": "completed", "updated_at": _utcnow().isoformat()}
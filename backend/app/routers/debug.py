@@ -1,7 +1,8 @@
 """Debug endpoints to diagnose department isolation issues."""
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, status
 from app.dependencies.auth import get_current_user_with_profile, CurrentUser
 from app.supabase_client import get_service_supabase
+from app.services.maintenance_scheduler import get_maintenance_scheduler
 
 router = APIRouter(prefix="/debug", tags=["debug"])
 
@@ -101,3 +102,36 @@ async def debug_rooms(
         "all_rooms_sample": (all_rooms.data or [])[:3],
         "user_rooms_sample": user_rooms[:3],
     }
+
+
+@router.get("/maintenance")
+async def debug_maintenance(
+    current_user: CurrentUser = Depends(get_current_user_with_profile),
+) -> dict:
+    """Maintenance scheduler state and job run metrics for this process (ADMIN only)."""
+    if current_user.role != "ADMIN":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can view maintenance status")
+    return get_maintenance_scheduler().status()
+
+
+@router.post("/maintenance/{job_name}/run")
+def debug_run_maintenance_job(
+    job_name: str,
+    current_user: CurrentUser = Depends(get_current_user_with_profile),
+) -> dict:
+    """Run one maintenance job now instead of at its next interval (ADMIN only)."""
+    if current_user.role != "ADMIN":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can run maintenance jobs")
+    scheduler = get_maintenance_scheduler()
+    try:
+        scheduler.run_job(job_name)
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown maintenance job: {job_name}")
+    except PermissionError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Maintenance job {job_name} failed: {str(e)}",
+        )
+    return scheduler.jobs[job_name].as_dict()
@@ -1,5 +1,5 @@
 """Divisions management routes."""
-from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File
+from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Query
 from pydantic import BaseModel
 from app.dependencies.auth import (
     get_current_user_with_profile,
@@ -9,8 +9,17 @@ from app.dependencies.auth import (
 )
 from app.supabase_client import get_user_supabase, get_service_supabase
 from app.schemas.common import SuccessResponse
-import csv
-import io
+from app.services.student_import import (
+    StudentImportJob,
+    StudentImportRow,
+    create_import_job,
+    fetch_rows_in,
+    hash_passwords,
+    parse_student_csv,
+    run_import_job,
+    upsert_in_batches,
+)
+import asyncio
 import math
 
 router = APIRouter(prefix="/divisions", tags=["divisions"])
@@ -188,180 +197,180 @@ async def get_division_students(
         )
 
 
-import math
+_DIVISION_STUDENT_COLUMNS = {
+    "name": ("student name", "name"),
+    "email": ("email", "student email"),
+    "prn": ("prn", "prn number", "prn_number"),
+}
+
+
+def _load_upload_division(supabase, division_id: str, current_user: CurrentUser) -> str:
+    """Validate the target division and the caller's department; returns its department id."""
+    div_check = (
+        supabase.table("divisions")
+        .select("division_id, department_id")
+        .eq("division_id", division_id)
+        .limit(1)
+        .execute()
+    )
+    if not div_check.data:
+        raise HTTPException(status_code=404, detail="Division not found.")
+    division_department_id = str(div_check.data[0].get("department_id") or "")
+    if not division_department_id:
+        raise HTTPException(status_code=400, detail="Division has no department mapping.")
+
+    if (
+        current_user.role == "COORDINATOR"
+        and current_user.department_id
+        and str(current_user.department_id) != division_department_id
+    ):
+        raise HTTPException(
+            status_code=403,
+            detail="You can upload students only for divisions in your department.",
+        )
+    return division_department_id
+
+
+def _ensure_division_batches(supabase, division_id: str, total_students: int) -> tuple[list[str], dict[str, str]]:
+    """Create/refresh the division's batches.
+
+    Rule: >= 70 students -> 3 batches, < 70 -> 2 batches.
+    """
+    num_batches = 3 if total_students >= 70 else 2
+    batch_codes = [f"B{i+1}" for i in range(num_batches)]
+    max_students = math.ceil(total_students / num_batches) + 5  # Buffer
+
+    existing = (
+        supabase.table("batches")
+        .select("batch_id, batch_code")
+        .eq("division_id", division_id)
+        .in_("batch_code", batch_codes)
+        .execute()
+    )
+    batch_map = {str(row["batch_code"]): row["batch_id"] for row in (existing.data or [])}
+    for code in batch_codes:
+        if code in batch_map:
+            supabase.table("batches").update({"max_students": max_students}).eq("batch_id", batch_map[code]).execute()
+        else:
+            new_batch = supabase.table("batches").insert(
+                {
+                    "division_id": division_id,
+                    "batch_code": code,
+                    "is_active": True,
+                    "max_students": max_students,
+                }
+            ).execute()
+            batch_map[code] = new_batch.data[0]["batch_id"]
+    return batch_codes, batch_map
+
+
+def _import_division_students(job: StudentImportJob, supabase, division_id: str, batch_codes: list[str], batch_map: dict[str, str]) -> None:
+    """Roll numbers follow file order; batches are filled sequentially (B1, B2, ...)."""
+    batch_size = math.ceil(len(job.rows) / len(batch_codes))
+    records: dict[int, dict] = {}
+    for index, row in enumerate(job.rows):
+        if row.status != "pending":
+            continue
+        batch_id = batch_map[batch_codes[min(index // batch_size, len(batch_codes) - 1)]]
+        records[row.row_number] = {
+            "student_name": row.name,
+            "prn_number": row.prn,
+            "email": row.email,
+            "division_id": division_id,
+            "roll_number": index + 1,
+            "batch_id": batch_id,
+        }
+
+    # Resume support: rows already stored with identical placement keep their hash.
+    pending = job.pending_rows()
+    existing = {
+        str(item.get("prn_number")): item
+        for item in fetch_rows_in(
+            supabase,
+            "students",
+            "prn_number",
+            [row.prn for row in pending],
+            "prn_number, email, division_id, roll_number, batch_id, password_hash",
+        )
+    }
+    to_write: list[StudentImportRow] = []
+    for row in pending:
+        current = existing.get(row.prn)
+        record = records[row.row_number]
+        if current and current.get("password_hash") and all(
+            str(current.get(key)) == str(record[key]) for key in ("email", "division_id", "roll_number", "batch_id")
+        ):
+            job.mark(row, "skipped", "already imported")
+        else:
+            to_write.append(row)
+
+    # Password is the PRN.
+    job.phase = "hashing"
+    hashes = hash_passwords([row.prn for row in to_write])
+
+    job.phase = "saving"
+    upsert_in_batches(
+        supabase,
+        "students",
+        job,
+        [
+            (row, {**records[row.row_number], "password_hash": password_hash})
+            for row, password_hash in zip(to_write, hashes)
+        ],
+        on_conflict="prn_number",
+    )
 
-# ... (imports)
 
 @router.post("/{division_id}/students/upload", response_model=SuccessResponse)
 async def upload_student_csv(
     division_id: str,
     file: UploadFile = File(...),
+    dry_run: bool = Query(False, description="Validate the file and report per-row results without writing"),
+    background: bool = Query(False, description="Return immediately; poll /auth/coordinator/students/import-jobs/{job_id}"),
     current_user: CurrentUser = Depends(require_role("COORDINATOR", "ADMIN")),
 ) -> dict:
-    """Upload student CSV, create auth users, and map to selected division/department."""
+    """Upload student CSV and map students to the selected division/department.
+
+    The whole file is validated before anything is written. Re-uploading the same
+    file after a partial failure skips rows that were already imported.
+    """
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="Invalid file type. Please upload a CSV file.")
 
     try:
         content = await file.read()
-        decoded_content = content.decode('utf-8')
-        csv_reader = csv.DictReader(io.StringIO(decoded_content))
-
-        if not csv_reader.fieldnames:
-            raise HTTPException(status_code=400, detail="CSV file has no headers.")
-
-        header_map = {h.strip().lower(): h for h in csv_reader.fieldnames if h}
-        def resolve_header(*aliases: str) -> str | None:
-            for alias in aliases:
-                key = alias.strip().lower()
-                if key in header_map:
-                    return header_map[key]
-            return None
-
-        name_key = resolve_header("student name", "name")
-        email_key = resolve_header("email", "student email")
-        prn_key = resolve_header("prn", "prn number", "prn_number")
-        if not name_key or not email_key or not prn_key:
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid CSV headers. Required columns: name/student name, email, prn/prn number.",
-            )
-
-        students_to_process = list(csv_reader)
-        total_students = len(students_to_process)
-        if not students_to_process:
-             raise HTTPException(status_code=400, detail="CSV file is empty.")
-
+        rows = parse_student_csv(content, _DIVISION_STUDENT_COLUMNS, required=("name", "email", "prn"))
         supabase = get_service_supabase() # Use service role for Auth and Insert
-        results = {"success": 0, "failed": 0, "errors": []}
-
-        # Validate Division Exists
-        div_check = (
-            supabase.table("divisions")
-            .select("division_id, department_id")
-            .eq("division_id", division_id)
-            .single()
-            .execute()
+        # Authorize before anything is reported back, dry runs included
+        department_id = await asyncio.to_thread(_load_upload_division, supabase, division_id, current_user)
+        job = create_import_job(
+            "division_students", division_id, rows, created_by=current_user.uid, department_id=department_id
         )
-        if not div_check.data:
-            raise HTTPException(status_code=404, detail="Division not found.")
-        division_department_id = str(div_check.data.get("department_id") or "")
-        if not division_department_id:
-            raise HTTPException(status_code=400, detail="Division has no department mapping.")
-
-        if (
-            current_user.role == "COORDINATOR"
-            and current_user.department_id
-            and str(current_user.department_id) != division_department_id
-        ):
-            raise HTTPException(
-                status_code=403,
-                detail="You can upload students only for divisions in your department.",
-            )
+        if dry_run:
+            job.status, job.phase = "completed", "done"
+            return {"data": job.snapshot(), "message": f"Validated {len(rows)} rows; nothing was written."}
 
-        # --- Batch Logic ---
-        # Determine number of batches
-        # Rule: >= 70 students -> 3 batches, < 70 -> 2 batches
-        num_batches = 3 if total_students >= 70 else 2
-        batch_codes = [f"B{i+1}" for i in range(num_batches)]
-        
-        # Create/Get Batches
-        batch_map = {} # Code -> ID
-        for code in batch_codes:
-            # Check/Create batch
-            # We use upsert or select then insert. 
-            # Upsert on (division_id, batch_code) unique constraint
-            batch_data = {
-                "division_id": division_id,
-                "batch_code": code,
-                "is_active": True,
-                "max_students": math.ceil(total_students / num_batches) + 5 # Buffer
-            }
-            # Need to get the ID back.
-            # Upserting and returning ID.
-            # Warning: On conflict replace might change ID if we aren't careful, but here we just want the ID for this code.
-            # Ideally we select first.
-            existing = supabase.table("batches").select("batch_id").eq("division_id", division_id).eq("batch_code", code).execute()
-            if existing.data:
-                batch_id = existing.data[0]['batch_id']
-                # Update max_students maybe?
-                supabase.table("batches").update({"max_students": batch_data["max_students"]}).eq("batch_id", batch_id).execute()
-            else:
-                new_batch = supabase.table("batches").insert(batch_data).execute()
-                batch_id = new_batch.data[0]['batch_id']
-            
-            batch_map[code] = batch_id
-
-        # Calculate Split Points for Balanced Distribution
-        # We want to distribute ~evenly.
-        # Simple approach: distribute sequentially.
-        # Students 0 to split1 -> B1
-        # split1 to split2 -> B2
-        # ...
-        
-        batch_size = math.ceil(total_students / num_batches)
-        
-        # Process each student
-        for index, row in enumerate(students_to_process):
-            name = row.get(name_key, '').strip()
-            prn = row.get(prn_key, '').strip()
-            email = row.get(email_key, '').strip().lower()
-
-            if not all([name, prn, email]):
-                results["failed"] += 1
-                results["errors"].append(f"Skipped row with missing data: {row}")
-                continue
-
-            try:
-                # Assign Roll Number (1-based index)
-                roll_number = index + 1
-                
-                # Assign Batch
-                # Determine which batch index this student belongs to
-                batch_idx = min(index // batch_size, num_batches - 1)
-                batch_code = batch_codes[batch_idx]
-                batch_id = batch_map[batch_code]
-                
-                # Hash password (PRN) using bcrypt
-                import bcrypt
-                password_hash = bcrypt.hashpw(prn.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-
-                # Create student record with authentication (students table only - no user_profiles)
-                # Note: user_id is optional now since we removed the foreign key constraint
-                student_data = {
-                    "student_name": name,
-                    "prn_number": prn,
-                    "email": email,
-                    "password_hash": password_hash,  # Add password hash for authentication
-                    "division_id": division_id,
-                    "roll_number": roll_number,
-                    "batch_id": batch_id,
-                }
-                
-                try:
-                    supabase.table("students").upsert(student_data, on_conflict="prn_number").execute()
-                    results["success"] += 1
-                except Exception as student_error:
-                    print(f"[STUDENT UPLOAD] Student creation error for {email}: {str(student_error)}")
-                    raise ValueError(f"Failed to create student: {str(student_error)}")
-
-            except Exception as e:
-                results["failed"] += 1
-                error_msg = f"Error processing {email}: {str(e)}"
-                print(f"[STUDENT UPLOAD] {error_msg}")
-                results["errors"].append(error_msg)
-
-        error_msg = ""
-        if results["errors"]:
-            # Simplify error message for frontend
-            unique_errors = list(set([e.split(':')[0] for e in results["errors"]]))
-            error_msg = f" Encountered errors. Check logs."
+        batch_codes, batch_map = await asyncio.to_thread(_ensure_division_batches, supabase, division_id, len(rows))
 
+        await run_import_job(
+            job,
+            lambda j: _import_division_students(j, supabase, division_id, batch_codes, batch_map),
+            background=background,
+        )
+        data = job.snapshot()
+        if background:
+            return {"data": data, "message": f"Import of {len(rows)} students started."}
+
+        # Keep the legacy summary keys alongside per-row results.
+        data["success"] = data["created"] + data["skipped"]
+        data["errors"] = [f"Row {row['row']} ({row['email']}): {row['error']}" for row in data["rows"] if row["status"] in {"invalid", "failed"}]
+        data["failed"] = data["failed"] + data["invalid"]
         return {
-            "data": results,
+            "data": data,
             "message": (
-                f"Processed {len(students_to_process)} students for division {division_id}. "
-                f"Created {num_batches} batches. Users created: {results['success']}, Failed: {results['failed']}."
+                f"Processed {len(rows)} students for division {division_id}. "
+                f"Created {len(batch_codes)} batches. Users created: {data['created']}, "
+                f"Already imported: {data['skipped']}, Failed: {data['failed']}."
             ),
         }
 
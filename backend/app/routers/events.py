@@ -0,0 +1,142 @@
+"""Server-push channel (SSE and WebSocket) for timetable and notification updates."""
+import json
+from fastapi import APIRouter, HTTPException, status, Depends, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from app.config import settings
+from app.dependencies.auth import (
+    CurrentUser,
+    current_user_from_claims,
+    decode_access_token,
+    get_current_user_with_profile,
+    require_role,
+)
+from app.schemas.common import SuccessResponse
+from app.services.event_bus import (
+    ALL_DEPARTMENTS,
+    BROADCAST,
+    Subscription,
+    department_topic,
+    get_event_bus,
+    user_topic,
+)
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+
+def _heartbeat_seconds() -> float:
+    return float(getattr(settings, "event_stream_heartbeat_seconds", None) or 20.0)
+
+
+async def _subscriber_from_token(token: str | None) -> CurrentUser:
+    """EventSource and browser WebSockets cannot set headers, so the token may come as a query param."""
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing access token")
+    try:
+        claims, verified = decode_access_token(token)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Invalid token: {str(e)}")
+    if not claims.get("sub"):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token: missing 'sub' claim")
+    return await get_current_user_with_profile(current_user_from_claims(claims, verified))
+
+
+def _topics_for(user: CurrentUser) -> list[str]:
+    topics = [BROADCAST]
+    if user.role == "ADMIN":
+        topics.append(ALL_DEPARTMENTS)
+    elif user.department_id:
+        topics.append(department_topic(user.department_id))
+    if user.email:
+        topics.append(user_topic(user.email))
+    return topics
+
+
+def _open_subscription(user: CurrentUser) -> Subscription:
+    subscription = get_event_bus().subscribe(_topics_for(user))
+    if subscription is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many open event streams on this worker",
+            headers={"Retry-After": "30"},
+        )
+    return subscription
+
+
+def _sse(event: dict) -> str:
+    return f"id: {event.get('id', '')}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+@router.get("/stream")
+async def stream_events(request: Request, access_token: str | None = None):
+    """
+    Server-sent events for the caller's department and inbox.
+
+    Events are ``timetable.changed``, ``notifications.changed``,
+    ``notification.created`` and ``resync`` (refetch everything). A comment line is
+    sent every heartbeat interval; reconnecting with ``Last-Event-ID`` replays
+    missed events while they are still buffered.
+    """
+    auth_header = request.headers.get("authorization", "")
+    token = access_token or (auth_header.split(" ", 1)[1] if auth_header.startswith("Bearer ") else None)
+    user = await _subscriber_from_token(token)
+    bus = get_event_bus()
+    subscription = _open_subscription(user)
+
+    missed: list[dict] = []
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        replay = bus.replay_since(int(last_event_id), subscription.topics)
+        missed = replay if replay is not None else [{"id": last_event_id, "type": "resync", "reason": "gap"}]
+
+    async def event_generator():
+        try:
+            yield f"retry: 5000\nevent: ready\ndata: {json.dumps({'topics': sorted(subscription.topics)})}\n\n"
+            for event in missed:
+                yield _sse(event)
+            while True:
+                event = await subscription.get(_heartbeat_seconds())
+                if event is None:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse(event)
+        finally:
+            bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "Connection": "keep-alive", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/ws")
+async def websocket_events(websocket: WebSocket, access_token: str | None = None):
+    """Same events as ``/events/stream`` as JSON messages; heartbeats are ``{"type": "heartbeat"}``."""
+    try:
+        user = await _subscriber_from_token(access_token)
+        subscription = _open_subscription(user)
+    except HTTPException as e:
+        await websocket.close(code=4401 if e.status_code == status.HTTP_401_UNAUTHORIZED else 1013)
+        return
+
+    bus = get_event_bus()
+    try:
+        await websocket.accept()
+        await websocket.send_json({"type": "ready", "topics": sorted(subscription.topics)})
+        while True:
+            event = await subscription.get(_heartbeat_seconds())
+            await websocket.send_json(event if event is not None else {"type": "heartbeat"})
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        bus.unsubscribe(subscription)
+
+
+@router.get("/stats", response_model=SuccessResponse)
+async def get_event_stream_stats(
+    current_user: CurrentUser = Depends(require_role("ADMIN", "HOD", "COORDINATOR")),
+) -> dict:
+    """Subscriber and publish counts for this worker."""
+    return {"data": get_event_bus().stats(), "message": "Event stream stats retrieved successfully"}
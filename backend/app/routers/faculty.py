@@ -12,6 +12,7 @@ from app.dependencies.auth import (
     get_current_user_with_profile,
     CurrentUser,
     canonical_department_id,
+    invalidate_profile_cache,
     resolve_effective_department_id,
 )
 from app.supabase_client import get_user_supabase, get_service_supabase
@@ -609,6 +610,7 @@ def _create_faculty_with_auth(supabase: Any, faculty: FacultyCreate) -> tuple[An
             "is_coordinator": faculty.role.value == "COORDINATOR",
         }
         supabase.table("user_profiles").insert(profile_data).execute()
+        invalidate_profile_cache(user_id)
         print(f"[FACULTY] User profile created for {faculty.email} with user_id: {user_id}")
     except Exception as profile_error:
         print(f"[FACULTY ERROR] Failed to create user profile: {profile_error}")
@@ -626,6 +628,7 @@ def _create_faculty_with_auth(supabase: Any, faculty: FacultyCreate) -> tuple[An
         # Rollback: delete user profile if faculty creation fails
         try:
             supabase.table("user_profiles").delete().eq("user_id", user_id).execute()
+            invalidate_profile_cache(user_id)
             print(f"[FACULTY] Rolled back user profile for {user_id}")
         except:
             pass
@@ -12,6 +12,7 @@ from app.dependencies.auth import (
     canonical_department_id,
 )
 from app.supabase_client import get_user_supabase, get_service_supabase
+from app.services.notification_inbox import log_notifications
 from app.schemas.common import SuccessResponse, LeaveStatusEnum
 from app.services.email_service import (
     send_leave_approval_email,
@@ -20,6 +21,11 @@ from app.services.email_service import (
     send_slot_cancelled_notification,
     send_slot_covered_notification
 )
+from app.services.timetable_calendar import (
+    get_timetable_calendar,
+    invalidate_timetable_calendar,
+    parse_date,
+)
 
 router = APIRouter(prefix="/faculty-leaves", tags=["faculty-leaves"])
 
@@ -79,81 +85,33 @@ def _get_faculty_for_user_email(current_user: CurrentUser) -> dict | None:
     return rows[0] if rows else None
 
 
-def _get_affected_timetable_entries(faculty_id: str, start_date: str, end_date: str, leave_type: str):
-    """Get all timetable entries affected by a leave period."""
-    from datetime import datetime, timedelta
-    
+def _get_affected_timetable_entries(
+    faculty_id: str,
+    start_date: str,
+    end_date: str,
+    leave_type: str,
+    department_id: str | None = None,
+):
+    """Get all timetable entries affected by a leave period in the faculty's effective timetable."""
     supabase = get_service_supabase()
-    
-    # Get the latest timetable version
-    version_response = (
-        supabase.table("timetable_versions")
-        .select("version_id")
-        .order("created_at", desc=True)
-        .limit(1)
-        .execute()
-    )
-    
-    if not version_response.data:
+    if not department_id and faculty_id:
+        rows = (
+            supabase.table("faculty")
+            .select("department_id")
+            .eq("faculty_id", faculty_id)
+            .limit(1)
+            .execute()
+            .data
+            or []
+        )
+        department_id = rows[0].get("department_id") if rows else None
+    calendar = get_timetable_calendar(supabase, department_id=department_id)
+    start, end = parse_date(start_date), parse_date(end_date)
+    if calendar is None or start is None or end is None:
         return []
-    
-    version_id = version_response.data[0]["version_id"]
-    
-    # Get days mapping from database
-    days_response = supabase.table("days").select("day_id, day_name").execute()
-    days_map = {day["day_name"].upper(): day["day_id"] for day in (days_response.data or [])}
-    
-    # Calculate which days of the week are affected
-    start = datetime.strptime(start_date, "%Y-%m-%d")
-    end = datetime.strptime(end_date, "%Y-%m-%d")
-    
-    # Get all dates in the leave period
-    affected_day_ids = set()
-    current = start
-    while current <= end:
-        # Get day name (e.g., "MONDAY", "SUNDAY")
-        day_name = current.strftime("%A").upper()
-        if day_name in days_map:
-            affected_day_ids.add(days_map[day_name])
-        current += timedelta(days=1)
-    
-    print(f"Leave period: {start_date} to {end_date}")
-    print(f"Affected day_ids: {affected_day_ids}")
-    
-    # Get all entries for this faculty in the latest version
-    entries_response = (
-        supabase.table("timetable_entries")
-        .select("*, divisions(division_name), subjects(subject_name), days(day_name, day_id), time_slots(start_time, end_time), rooms(room_number)")
-        .eq("version_id", version_id)
-        .eq("faculty_id", faculty_id)
-        .execute()
-    )
-    
-    all_entries = entries_response.data or []
-    print(f"Total entries for faculty: {len(all_entries)}")
-    
-    # Filter entries by affected day_ids
-    affected_entries = [
-        entry for entry in all_entries
-        if entry.get("day_id") in affected_day_ids
-    ]
-    
-    print(f"Filtered entries by day_id: {len(affected_entries)}")
-    
-    # If half-day leave, further filter by time
-    if leave_type == "HALF_DAY_FIRST":
-        # First half: slots before 13:00
-        affected_entries = [
-            entry for entry in affected_entries
-            if entry.get("time_slots") and entry["time_slots"].get("end_time", "23:59") <= "13:00"
-        ]
-    elif leave_type == "HALF_DAY_SECOND":
-        # Second half: slots after 13:00
-        affected_entries = [
-            entry for entry in affected_entries
-            if entry.get("time_slots") and entry["time_slots"].get("start_time", "00:00") >= "13:00"
-        ]
-    
+
+    affected_entries = calendar.entries_affected_by_leave(faculty_id, start, end, leave_type)
+    print(f"Leave period: {start_date} to {end_date}, affected entries: {len(affected_entries)}")
     return affected_entries
 
 
@@ -235,7 +193,7 @@ def _create_bulk_notifications(
             }
         )
     if rows:
-        supabase.table("notification_log").insert(rows).execute()
+        log_notifications(supabase, rows)
 
 
 @router.get("", response_model=SuccessResponse)
@@ -379,7 +337,7 @@ async def create_faculty_leave(
         # Log notification (email will be sent when HOD approves/rejects)
         if response.data:
             leave_id = response.data[0].get("leave_id")
-            supabase.table("notification_log").insert({
+            log_notifications(supabase, [{
                 "notification_type": "LEAVE_SUBMITTED",
                 "recipient_email": own_faculty.get("email"),
                 "recipient_type": "FACULTY",
@@ -387,7 +345,7 @@ async def create_faculty_leave(
                 "body": f"Your leave request from {leave.start_date} to {leave.end_date} has been submitted for approval.",
                 "related_leave_id": leave_id,
                 "status": "SENT"
-            }).execute()
+            }])
         
         return {
             "data": response.data,
@@ -454,6 +412,7 @@ async def update_faculty_leave(
             .eq("leave_id", leave_id)
             .execute()
         )
+        invalidate_timetable_calendar()
         
         # Send email notification
         faculty_email = faculty_info.get("email")
@@ -510,14 +469,14 @@ async def update_faculty_leave(
                     for coordinator in (coordinators_response.data or []):
                         if coordinator.get("email"):
                             try:
-                                supabase.table("notification_log").insert({
+                                log_notifications(supabase, [{
                                     "notification_type": "LEAVE_APPROVED",
                                     "recipient_email": coordinator["email"],
                                     "recipient_type": "COORDINATOR",
                                     "subject": "Faculty Leave Approved - Action Required",
                                     "body": f"{faculty_name}'s leave from {leave_data.get('start_date')} to {leave_data.get('end_date')} has been approved. Please review slot adjustments.",
                                     "status": "SENT"
-                                }).execute()
+                                }])
                             except Exception as e:
                                 print(f"Failed to send coordinator notification: {e}")
 
@@ -553,6 +512,7 @@ async def update_faculty_leave(
                     start_date=leave_data.get("start_date"),
                     end_date=leave_data.get("end_date"),
                     leave_type=leave_data.get("leave_type"),
+                    department_id=faculty_info.get("department_id"),
                 )
                 affected_division_ids = sorted(
                     {
@@ -627,6 +587,7 @@ async def delete_faculty_leave(
             .eq("leave_id", leave_id)
             .execute()
         )
+        invalidate_timetable_calendar()
         return {
             "data": response.data,
             "message": "Faculty leave deleted successfully",
@@ -1,8 +1,17 @@
 """Faculty timetable viewing routes with access control."""
-from fastapi import APIRouter, HTTPException, status, Depends
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException, status, Depends, Query
 from app.dependencies.auth import get_current_user, CurrentUser, require_role
 from app.supabase_client import get_service_supabase
 from app.schemas.common import SuccessResponse
+from app.services.reference_data import (
+    COMPACT_ENTRY_COLUMNS,
+    build_timetable_view,
+    get_reference_data,
+)
+from app.services.effective_version import get_effective_version_id
+from app.services.timetable_version_deltas import fetch_version_entries
 
 router = APIRouter(prefix="/faculty-timetable", tags=["faculty-timetable"])
 
@@ -23,14 +32,24 @@ def _get_faculty_for_user_email(current_user: CurrentUser) -> dict | None:
     return rows[0] if rows else None
 
 
+def _fetch_version_entries(supabase, version_id: str, view_format: str = "compact", **filters: str) -> list[dict]:
+    """Bare entry rows for a version; labels come from the reference-data cache, not joins."""
+    columns = "*" if view_format == "expanded" else ", ".join(COMPACT_ENTRY_COLUMNS)
+    return fetch_version_entries(supabase, version_id, columns, **filters)
+
+
 @router.get("/my-timetable", response_model=SuccessResponse)
 async def get_my_timetable(
     version_id: str | None = None,
+    view_format: Literal["compact", "grid", "expanded"] = Query("compact", alias="format"),
     current_user: CurrentUser = Depends(require_role("FACULTY")),
 ) -> dict:
     """
     Get timetable for the logged-in faculty member.
     Faculty can only see their own timetable entries.
+
+    ``format=compact`` (default) returns bare entry rows plus one ``lookups`` dict,
+    ``format=grid`` a day x slot matrix, ``format=expanded`` rows with embedded objects.
     """
     try:
         # Get faculty profile
@@ -44,18 +63,10 @@ async def get_my_timetable(
         faculty_id = faculty.get("faculty_id")
         supabase = get_service_supabase()
         
-        # Get latest version if not specified
+        # Default to the version this faculty's department currently publishes to faculty
         if not version_id:
-            version_response = (
-                supabase.table("timetable_versions")
-                .select("version_id")
-                .order("created_at", desc=True)
-                .limit(1)
-                .execute()
-            )
-            if version_response.data:
-                version_id = version_response.data[0]["version_id"]
-            else:
+            version_id = get_effective_version_id(supabase, faculty.get("department_id"), current_user.role)
+            if not version_id:
                 return {
                     "data": {
                         "faculty": faculty,
@@ -66,30 +77,15 @@ async def get_my_timetable(
                 }
         
         # Get timetable entries for this faculty
-        entries_response = (
-            supabase.table("timetable_entries")
-            .select("""
-                *,
-                divisions(division_id, division_name, year),
-                subjects(subject_id, subject_name, subject_code),
-                rooms(room_id, room_name, room_type),
-                batches(batch_id, batch_name),
-                days(day_id, day_name, day_order),
-                time_slots(slot_id, start_time, end_time, slot_order)
-            """)
-            .eq("version_id", version_id)
-            .eq("faculty_id", faculty_id)
-            .order("day_id")
-            .order("slot_id")
-            .execute()
-        )
+        entries = _fetch_version_entries(supabase, version_id, view_format, faculty_id=faculty_id)
+        view = build_timetable_view(entries, get_reference_data(supabase), view_format)
         
         return {
             "data": {
                 "faculty": faculty,
-                "entries": entries_response.data or [],
+                **view,
                 "version_id": version_id,
-                "total_entries": len(entries_response.data or []),
+                "total_entries": len(entries),
             },
             "message": "Faculty timetable retrieved successfully",
         }
@@ -107,11 +103,13 @@ async def get_my_timetable(
 async def get_division_timetable(
     division_id: str,
     version_id: str | None = None,
+    view_format: Literal["compact", "grid", "expanded"] = Query("compact", alias="format"),
     current_user: CurrentUser = Depends(require_role("FACULTY")),
 ) -> dict:
     """
     Get timetable for a specific division.
     Faculty can only view timetables of divisions they teach.
+    Supports the same ``format`` values as ``/my-timetable``.
     """
     try:
         # Get faculty profile
@@ -125,18 +123,10 @@ async def get_division_timetable(
         faculty_id = faculty.get("faculty_id")
         supabase = get_service_supabase()
         
-        # Get latest version if not specified
+        # Default to the version this faculty's department currently publishes to faculty
         if not version_id:
-            version_response = (
-                supabase.table("timetable_versions")
-                .select("version_id")
-                .order("created_at", desc=True)
-                .limit(1)
-                .execute()
-            )
-            if version_response.data:
-                version_id = version_response.data[0]["version_id"]
-            else:
+            version_id = get_effective_version_id(supabase, faculty.get("department_id"), current_user.role)
+            if not version_id:
                 return {
                     "data": {
                         "division_id": division_id,
@@ -147,56 +137,32 @@ async def get_division_timetable(
                 }
         
         # Check if faculty teaches this division
-        faculty_teaches_division = (
-            supabase.table("timetable_entries")
-            .select("entry_id")
-            .eq("version_id", version_id)
-            .eq("faculty_id", faculty_id)
-            .eq("division_id", division_id)
-            .limit(1)
-            .execute()
+        faculty_teaches_division = fetch_version_entries(
+            supabase,
+            version_id,
+            "entry_id",
+            faculty_id=faculty_id,
+            division_id=division_id,
         )
         
-        if not faculty_teaches_division.data:
+        if not faculty_teaches_division:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="You can only view timetables of divisions you teach.",
             )
         
-        # Get division info
-        division_response = (
-            supabase.table("divisions")
-            .select("*")
-            .eq("division_id", division_id)
-            .single()
-            .execute()
-        )
-        
         # Get all timetable entries for this division
-        entries_response = (
-            supabase.table("timetable_entries")
-            .select("""
-                *,
-                faculty(faculty_id, faculty_name, email),
-                subjects(subject_id, subject_name, subject_code),
-                rooms(room_id, room_name, room_type),
-                batches(batch_id, batch_name),
-                days(day_id, day_name, day_order),
-                time_slots(slot_id, start_time, end_time, slot_order)
-            """)
-            .eq("version_id", version_id)
-            .eq("division_id", division_id)
-            .order("day_id")
-            .order("slot_id")
-            .execute()
-        )
+        reference = get_reference_data(supabase)
+        entries = _fetch_version_entries(supabase, version_id, view_format, division_id=division_id)
+        view = build_timetable_view(entries, reference, view_format)
+        division = reference.get("divisions", division_id)
         
         return {
             "data": {
-                "division": division_response.data,
-                "entries": entries_response.data or [],
+                "division": {"division_id": division_id, **division} if division else None,
+                **view,
                 "version_id": version_id,
-                "total_entries": len(entries_response.data or []),
+                "total_entries": len(entries),
             },
             "message": "Division timetable retrieved successfully",
         }
@@ -230,18 +196,10 @@ async def get_my_divisions(
         faculty_id = faculty.get("faculty_id")
         supabase = get_service_supabase()
         
-        # Get latest version if not specified
+        # Default to the version this faculty's department currently publishes to faculty
         if not version_id:
-            version_response = (
-                supabase.table("timetable_versions")
-                .select("version_id")
-                .order("created_at", desc=True)
-                .limit(1)
-                .execute()
-            )
-            if version_response.data:
-                version_id = version_response.data[0]["version_id"]
-            else:
+            version_id = get_effective_version_id(supabase, faculty.get("department_id"), current_user.role)
+            if not version_id:
                 return {
                     "data": {
                         "faculty": faculty,
@@ -252,20 +210,15 @@ async def get_my_divisions(
                 }
         
         # Get distinct divisions taught by this faculty
-        entries_response = (
-            supabase.table("timetable_entries")
-            .select("division_id, divisions(division_id, division_name, year, department_id)")
-            .eq("version_id", version_id)
-            .eq("faculty_id", faculty_id)
-            .execute()
-        )
+        entries = fetch_version_entries(supabase, version_id, "division_id", faculty_id=faculty_id)
         
         # Extract unique divisions
+        reference = get_reference_data(supabase)
         divisions_map = {}
-        for entry in (entries_response.data or []):
-            div = entry.get("divisions")
-            if div and div.get("division_id"):
-                divisions_map[div["division_id"]] = div
+        for entry in entries:
+            div = reference.get("divisions", entry.get("division_id"))
+            if div is not None:
+                divisions_map[entry["division_id"]] = {"division_id": entry["division_id"], **div}
         
         divisions = list(divisions_map.values())
         
@@ -309,18 +262,10 @@ async def get_my_schedule_summary(
         faculty_id = faculty.get("faculty_id")
         supabase = get_service_supabase()
         
-        # Get latest version if not specified
+        # Default to the version this faculty's department currently publishes to faculty
         if not version_id:
-            version_response = (
-                supabase.table("timetable_versions")
-                .select("version_id")
-                .order("created_at", desc=True)
-                .limit(1)
-                .execute()
-            )
-            if version_response.data:
-                version_id = version_response.data[0]["version_id"]
-            else:
+            version_id = get_effective_version_id(supabase, faculty.get("department_id"), current_user.role)
+            if not version_id:
                 return {
                     "data": {
                         "faculty": faculty,
@@ -331,20 +276,8 @@ async def get_my_schedule_summary(
                 }
         
         # Get all entries for this faculty
-        entries_response = (
-            supabase.table("timetable_entries")
-            .select("""
-                *,
-                divisions(division_id, division_name),
-                subjects(subject_id, subject_name),
-                time_slots(start_time, end_time)
-            """)
-            .eq("version_id", version_id)
-            .eq("faculty_id", faculty_id)
-            .execute()
-        )
-        
-        entries = entries_response.data or []
+        entries = _fetch_version_entries(supabase, version_id, faculty_id=faculty_id)
+        reference = get_reference_data(supabase)
         
         # Calculate summary statistics
         divisions = set()
@@ -353,10 +286,12 @@ async def get_my_schedule_summary(
         total_slots = len(entries)
         
         for entry in entries:
-            if entry.get("divisions"):
-                divisions.add(entry["divisions"]["division_name"])
-            if entry.get("subjects"):
-                subjects.add(entry["subjects"]["subject_name"])
+            division = reference.get("divisions", entry.get("division_id"))
+            if division and division.get("division_name"):
+                divisions.add(division["division_name"])
+            subject = reference.get("subjects", entry.get("subject_id"))
+            if subject and subject.get("subject_name"):
+                subjects.add(subject["subject_name"])
             session_type = entry.get("session_type", "THEORY")
             if session_type in session_types:
                 session_types[session_type] += 1
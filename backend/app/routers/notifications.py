@@ -1,36 +1,104 @@
 """Notification management routes."""
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from pydantic import BaseModel, Field
 from app.dependencies.auth import get_current_user, CurrentUser
 from app.supabase_client import get_service_supabase
-from app.schemas.common import SuccessResponse
+from app.schemas.common import SuccessResponse, PageResponse
+from app.services.notification_inbox import (
+    count_unread,
+    encode_cursor,
+    keyset_filter,
+    mark_read,
+    normalize_email,
+)
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
+MAX_PAGE_SIZE = 100
+MAX_BULK_READ = 500
 
-@router.get("", response_model=SuccessResponse)
+
+class MarkReadRequest(BaseModel):
+    """Bulk read-state update for the caller's inbox."""
+
+    notification_ids: list[str] = Field(default_factory=list, max_length=MAX_BULK_READ)
+
+
+def _resolve_recipient(current_user: CurrentUser, recipient_email: str | None) -> str:
+    """Inbox owner: the caller, unless an admin (or anonymous dev mode) names another recipient."""
+    own_email = (current_user.email or "").strip()
+    requested = (recipient_email or "").strip()
+    if not requested:
+        if not own_email:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="recipient_email is required",
+            )
+        return own_email
+    if (
+        own_email
+        and normalize_email(requested) != normalize_email(own_email)
+        and current_user.aud != "anonymous"
+        and (current_user.role or "").upper() != "ADMIN"
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can only access your own notifications",
+        )
+    return requested
+
+
+@router.get("", response_model=PageResponse)
 async def list_notifications(
-    recipient_email: str,
-    limit: int = 10,
+    recipient_email: str | None = None,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    unread_only: bool = True,
     current_user: CurrentUser = Depends(get_current_user),
 ) -> dict:
-    """List notifications for a specific recipient email."""
+    """List a recipient's notifications, newest first.
+
+    Pages are keyed on (sent_at, notification_id): pass the returned ``next_cursor``
+    to fetch the following page. Read notifications are only included with
+    ``unread_only=false``.
+    """
     try:
+        recipient = _resolve_recipient(current_user, recipient_email)
         supabase = get_service_supabase()
-        
-        response = (
+
+        query = (
             supabase.table("notification_log")
             .select("*")
-            .eq("recipient_email", recipient_email)
-            .order("sent_at", desc=True)
-            .limit(limit)
+            .eq("recipient_email", recipient)
+        )
+        if unread_only:
+            query = query.is_("read_at", "null")
+        if cursor:
+            try:
+                query = query.or_(keyset_filter(cursor))
+            except ValueError as exc:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+        response = (
+            query.order("sent_at", desc=True)
+            .order("notification_id", desc=True)
+            .limit(limit + 1)
             .execute()
         )
-        
+
+        rows = response.data or []
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].get("sent_at"), rows[-1].get("notification_id"))
+
         return {
-            "data": response.data,
+            "data": rows,
+            "next_cursor": next_cursor,
             "message": "Notifications retrieved successfully"
         }
-        
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -38,27 +106,81 @@ async def list_notifications(
         )
 
 
+@router.get("/unread-count", response_model=SuccessResponse)
+async def get_unread_count(
+    recipient_email: str | None = None,
+    current_user: CurrentUser = Depends(get_current_user),
+) -> dict:
+    """Number of unread notifications for a recipient (served from the counter cache)."""
+    try:
+        recipient = _resolve_recipient(current_user, recipient_email)
+        supabase = get_service_supabase()
+
+        return {
+            "data": {"unread_count": count_unread(supabase, recipient)},
+            "message": "Unread count retrieved successfully"
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch unread count: {str(e)}"
+        )
+
+
+@router.post("/read", response_model=SuccessResponse)
+async def mark_notifications_as_read(
+    payload: MarkReadRequest,
+    recipient_email: str | None = None,
+    current_user: CurrentUser = Depends(get_current_user),
+) -> dict:
+    """Mark several of a recipient's notifications as read in one update."""
+    try:
+        recipient = _resolve_recipient(current_user, recipient_email)
+        supabase = get_service_supabase()
+
+        notification_ids = list(dict.fromkeys(str(item) for item in payload.notification_ids if item))
+        updated = mark_read(supabase, recipient, notification_ids)
+
+        return {
+            "data": {
+                "updated_count": len(updated),
+                "unread_count": count_unread(supabase, recipient),
+            },
+            "message": "Notifications marked as read"
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to mark notifications as read: {str(e)}"
+        )
+
+
 @router.post("/{notification_id}/read", response_model=SuccessResponse)
 async def mark_notification_as_read(
     notification_id: str,
+    recipient_email: str | None = None,
     current_user: CurrentUser = Depends(get_current_user),
 ) -> dict:
     """Mark a notification as read."""
     try:
+        recipient = _resolve_recipient(current_user, recipient_email)
         supabase = get_service_supabase()
-        
-        response = (
-            supabase.table("notification_log")
-            .delete()
-            .eq("notification_id", notification_id)
-            .execute()
-        )
-        
+
+        updated = mark_read(supabase, recipient, [notification_id])
+
         return {
-            "data": response.data,
+            "data": updated,
             "message": "Notification marked as read"
         }
-        
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -68,25 +190,23 @@ async def mark_notification_as_read(
 
 @router.post("/mark-all-read", response_model=SuccessResponse)
 async def mark_all_notifications_as_read(
-    recipient_email: str,
+    recipient_email: str | None = None,
     current_user: CurrentUser = Depends(get_current_user),
 ) -> dict:
     """Mark all notifications as read for a recipient."""
     try:
+        recipient = _resolve_recipient(current_user, recipient_email)
         supabase = get_service_supabase()
-        
-        response = (
-            supabase.table("notification_log")
-            .delete()
-            .eq("recipient_email", recipient_email)
-            .execute()
-        )
-        
+
+        updated = mark_read(supabase, recipient)
+
         return {
-            "data": {"updated_count": len(response.data or [])},
+            "data": {"updated_count": len(updated)},
             "message": "All notifications marked as read"
         }
-        
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -2,7 +2,7 @@
 from datetime import datetime, timedelta
 from fastapi import APIRouter, HTTPException, status, Depends
 from pydantic import BaseModel, EmailStr
-from app.dependencies.auth import get_current_user, CurrentUser
+from app.dependencies.auth import get_current_user, CurrentUser, invalidate_profile_cache
 from app.supabase_client import get_service_supabase
 from app.schemas.common import SuccessResponse
 import secrets
@@ -166,6 +166,7 @@ async def change_password(
             .eq("user_id", current_user.uid)
             .execute()
         )
+        invalidate_profile_cache(current_user.uid)
         
         print(f"[PASSWORD CHANGE] Password changed successfully for {user_data.get('email')}")
         
@@ -350,6 +351,7 @@ async def reset_password_with_otp(
             "password_hash": new_hash,
             "updated_at": datetime.utcnow().isoformat()
         }).eq("user_id", user_data["user_id"]).execute()
+        invalidate_profile_cache(user_data["user_id"])
         
         print(f"[PASSWORD RESET] Password reset successful for {request.email}")
         
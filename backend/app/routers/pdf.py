@@ -1,16 +1,30 @@
 """PDF generation routes for timetables."""
 
 from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import Response, HTMLResponse
+from fastapi.responses import FileResponse, Response, HTMLResponse, StreamingResponse
+import asyncio
 import html
 import io
+import json
 import re
+import time
 from datetime import datetime
 from urllib.parse import quote
 from xml.sax.saxutils import escape
 
 from app.supabase_client import get_service_supabase
 from app.routers.timetable_versions import _hydrate_version_row
+from app.schemas.common import SuccessResponse
+from app.services.pdf_export import (
+    ExportItem,
+    RenderQueueFull,
+    get_export_job,
+    render_stats,
+    start_export_job,
+    stream_export_zip,
+    submit_render,
+)
+from app.services.timetable_conflict_audit import fetch_timetable_entries_for_version
 
 _REPORTLAB_IMPORT_ERROR: str | None = None
 try:
@@ -730,6 +744,258 @@ def generate_timetable_pdf(entries, days, slots, version_meta, divisions, facult
     return pdf_buffer.getvalue()
 
 
+_EXPORT_SECTIONS = ("division", "faculty", "room")
+_EXPORT_FOLDERS = {"division": "divisions", "faculty": "faculty", "room": "rooms"}
+
+
+def _require_reportlab() -> None:
+    if SimpleDocTemplate:
+        return
+    hint = (
+        "Run the API with backend/venv (ReportLab is listed in requirements.txt). "
+        "Windows: double-click backend/run_dev.bat or: backend\\venv\\Scripts\\python.exe -m uvicorn app.main:app --reload"
+    )
+    detail = f"PDF generation library not available. {hint}"
+    if _REPORTLAB_IMPORT_ERROR:
+        detail = f"{detail} ({_REPORTLAB_IMPORT_ERROR})"
+    raise HTTPException(status_code=500, detail=detail)
+
+
+def _fetch_export_context(supabase, version_id: str) -> dict:
+    """Load a version, all of its entries and the reference tables used by the renderers."""
+    version_response = supabase.table("timetable_versions").select("*").eq("version_id", version_id).limit(1).execute()
+    version_rows = version_response.data or []
+    if not version_rows:
+        raise HTTPException(status_code=404, detail="Timetable version not found")
+
+    context = {
+        "version": _hydrate_version_row(version_rows[0]),
+        "entries": fetch_timetable_entries_for_version(supabase, version_id),
+    }
+    for table in ("days", "time_slots", "divisions", "faculty", "subjects", "rooms", "batches"):
+        context[table] = supabase.table(table).select("*").execute().data or []
+    return context
+
+
+def _scope_entries(entries: list[dict], section: str, entity_id: str | None) -> list[dict]:
+    if not entity_id:
+        return entries
+    key = {"division": "division_id", "room": "room_id"}.get(section, "faculty_id")
+    return [row for row in entries if str(row.get(key)) == str(entity_id)]
+
+
+def _export_scope_label(context: dict, section: str, entity_id: str | None) -> str:
+    if not entity_id:
+        return section
+    if section == "division":
+        lookup = {str(item.get("division_id")): str(item.get("division_name") or item.get("division_id")) for item in context["divisions"]}
+    elif section == "room":
+        lookup = {str(item.get("room_id")): str(item.get("room_number") or item.get("room_name") or item.get("room_id")) for item in context["rooms"]}
+    else:
+        lookup = {str(item.get("faculty_id")): str(item.get("faculty_code") or item.get("faculty_name") or item.get("faculty_id")) for item in context["faculty"]}
+    return lookup.get(str(entity_id), str(entity_id))
+
+
+def _safe_version_name(context: dict) -> str:
+    raw_version_name = context["version"].get("version_name") if context.get("version") else None
+    return _safe_filename_part(raw_version_name if raw_version_name is not None else "export")
+
+
+def _export_filename(context: dict, section: str, entity_id: str | None) -> str:
+    safe_scope_label = _safe_filename_part(_export_scope_label(context, section, entity_id))
+    safe_version_name = _safe_version_name(context)
+    if entity_id:
+        return f"{safe_scope_label}_{safe_version_name}.pdf"
+    return f"timetable_{safe_scope_label}_{safe_version_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+
+
+def _render_payload(context: dict, section: str, entity_id: str | None) -> dict:
+    """Arguments for ``_render_export_pdf``; entries are pre-scoped so workers receive only what they draw."""
+    divisions = context["divisions"]
+    # If exporting a specific division, keep division metadata focused to that division.
+    if entity_id and section == "division":
+        divisions = [row for row in divisions if str(row.get("division_id")) == str(entity_id)]
+    return {
+        "entries": _scope_entries(context["entries"], section, entity_id),
+        "days": context["days"],
+        "slots": context["time_slots"],
+        "version": context["version"],
+        "divisions": divisions,
+        "faculty": context["faculty"],
+        "subjects": context["subjects"],
+        "rooms": context["rooms"],
+        "batches": context["batches"],
+        "section": section,
+        "entity_id": entity_id,
+    }
+
+
+def _render_export_pdf(payload: dict) -> bytes:
+    """Process-pool entry point (must stay module-level so it pickles by reference)."""
+    return generate_timetable_pdf(
+        payload["entries"], payload["days"], payload["slots"], payload["version"],
+        payload["divisions"], payload["faculty"], payload["subjects"], payload["rooms"], payload["batches"],
+        section=payload["section"], entity_id=payload["entity_id"],
+    )
+
+
+def _parse_export_sections(sections: str) -> list[str]:
+    requested = [part.strip().lower() for part in str(sections or "").split(",") if part.strip()]
+    invalid = [part for part in requested if part not in _EXPORT_SECTIONS]
+    if invalid or not requested:
+        raise HTTPException(
+            status_code=400,
+            detail=f"sections must be a comma-separated subset of {', '.join(_EXPORT_SECTIONS)}",
+        )
+    return [section for section in _EXPORT_SECTIONS if section in requested]
+
+
+def _build_bulk_export_items(context: dict, sections: list[str]) -> list[ExportItem]:
+    """One PDF per division / faculty member / room that actually appears in the version."""
+    id_keys = {"division": "division_id", "faculty": "faculty_id", "room": "room_id"}
+    items: list[ExportItem] = []
+    for section in sections:
+        key = id_keys[section]
+        entity_ids = sorted({str(row.get(key)) for row in context["entries"] if row.get(key)})
+        for entity_id in entity_ids:
+            filename = _export_filename(context, section, entity_id)
+            items.append(
+                ExportItem(
+                    section=section,
+                    entity_id=entity_id,
+                    arcname=f"{_EXPORT_FOLDERS[section]}/{filename}",
+                    payload=_render_payload(context, section, entity_id),
+                )
+            )
+    # Give colliding labels (e.g. two faculty with the same code) distinct archive paths.
+    seen: dict[str, int] = {}
+    for item in items:
+        count = seen.get(item.arcname, 0)
+        seen[item.arcname] = count + 1
+        if count:
+            stem, ext = item.arcname.rsplit(".", 1)
+            item.arcname = f"{stem}_{count + 1}.{ext}"
+    return items
+
+
+def _load_bulk_export(version_id: str, sections: list[str]) -> tuple[list[ExportItem], str]:
+    context = _fetch_export_context(get_service_supabase(), version_id)
+    if not context["entries"]:
+        raise HTTPException(status_code=404, detail="No timetable entries found for this version")
+    return _build_bulk_export_items(context, sections), f"timetables_{_safe_version_name(context)}.zip"
+
+
+async def _render_in_pool(render_fn, payload: dict, label: str):
+    try:
+        return await submit_render(render_fn, payload, label=label)
+    except RenderQueueFull as exc:
+        raise HTTPException(
+            status_code=429,
+            detail="PDF renderer is busy, please retry shortly",
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+
+
+def _server_timing(fetch_ms: float, render_ms: float) -> dict[str, str]:
+    return {
+        "Server-Timing": f"fetch;dur={fetch_ms:.1f}, render;dur={render_ms:.1f}",
+        "X-Render-Time-Ms": f"{render_ms:.1f}",
+    }
+
+
+@router.get("/timetable/export-all/{version_id}")
+async def export_all_timetable_pdfs(
+    version_id: str,
+    sections: str = Query("division,faculty,room"),
+):
+    """Stream a ZIP with every division / faculty / room PDF of a version.
+
+    Master data is loaded once; PDFs are rendered in the ReportLab process pool and
+    written into the archive in completion order.
+    """
+    _require_reportlab()
+    selected = _parse_export_sections(sections)
+    try:
+        items, download_name = await asyncio.to_thread(_load_bulk_export, version_id, selected)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"PDF export failed: {str(e)}")
+
+    return StreamingResponse(
+        stream_export_zip(items, _render_export_pdf),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": _content_disposition_attachment(download_name),
+            "X-Export-File-Count": str(len(items)),
+        },
+    )
+
+
+@router.post("/timetable/export-all/{version_id}/jobs", response_model=SuccessResponse)
+async def start_bulk_pdf_export(
+    version_id: str,
+    sections: str = Query("division,faculty,room"),
+):
+    """Start a background bulk export; poll or subscribe to the job for progress."""
+    _require_reportlab()
+    selected = _parse_export_sections(sections)
+    job = start_export_job(
+        version_id,
+        lambda: _load_bulk_export(version_id, selected),
+        _render_export_pdf,
+    )
+    return {"data": job.snapshot(), "message": "Bulk PDF export started"}
+
+
+def _get_export_job_or_404(job_id: str):
+    job = get_export_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job
+
+
+@router.get("/export-jobs/{job_id}", response_model=SuccessResponse)
+async def get_bulk_pdf_export(job_id: str):
+    """Current progress of a bulk export job."""
+    job = _get_export_job_or_404(job_id)
+    return {"data": job.snapshot(), "message": f"Export job {job.status}"}
+
+
+@router.get("/export-jobs/{job_id}/events")
+async def stream_bulk_pdf_export_events(job_id: str):
+    """Server-sent progress events for a bulk export job (ends with a ``done`` event)."""
+    job = _get_export_job_or_404(job_id)
+
+    async def event_generator():
+        revision = -1
+        while True:
+            revision = await job.wait_for_change(revision, timeout=15.0)
+            event_type = "done" if job.done else "progress"
+            yield f"event: {event_type}\ndata: {json.dumps(job.snapshot(), default=str)}\n\n"
+            if job.done:
+                break
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "Connection": "keep-alive", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/export-jobs/{job_id}/download")
+async def download_bulk_pdf_export(job_id: str):
+    """Download the ZIP produced by a finished bulk export job."""
+    job = _get_export_job_or_404(job_id)
+    if job.status != "completed" or not job.zip_path:
+        raise HTTPException(status_code=409, detail=f"Export job is {job.status}")
+    return FileResponse(
+        job.zip_path,
+        media_type="application/zip",
+        headers={"Content-Disposition": _content_disposition_attachment(job.download_name or "timetables.zip")},
+    )
+
+
 @router.get("/timetable/download/{version_id}")
 async def download_timetable_pdf(
     version_id: str,
@@ -738,106 +1004,27 @@ async def download_timetable_pdf(
 ):
     """Generate and download timetable PDF for a specific version."""
     
-    if not SimpleDocTemplate:
-        hint = (
-            "Run the API with backend/venv (ReportLab is listed in requirements.txt). "
-            "Windows: double-click backend/run_dev.bat or: backend\\venv\\Scripts\\python.exe -m uvicorn app.main:app --reload"
-        )
-        detail = f"PDF generation library not available. {hint}"
-        if _REPORTLAB_IMPORT_ERROR:
-            detail = f"{detail} ({_REPORTLAB_IMPORT_ERROR})"
-        raise HTTPException(status_code=500, detail=detail)
+    _require_reportlab()
     
     try:
-        supabase = get_service_supabase()
-        
-        # Fetch version with entries
-        version_response = supabase.table("timetable_versions").select("*").eq("version_id", version_id).single().execute()
-        version_data = version_response.data
-        if not version_data:
-            raise HTTPException(status_code=404, detail="Timetable version not found")
-        
-        # Hydrate metadata
-        version_hydrated = _hydrate_version_row(version_data)
-        
-        # Fetch entries for this version
-        entries_response = supabase.table("timetable_entries").select("*").eq("version_id", version_id).execute()
-        entries = entries_response.data or []
-
-        # Scope export to the selected modal entity when provided.
-        if entity_id:
-            if section == "division":
-                entries = [row for row in entries if str(row.get("division_id")) == str(entity_id)]
-            elif section == "room":
-                entries = [row for row in entries if str(row.get("room_id")) == str(entity_id)]
-            else:
-                entries = [row for row in entries if str(row.get("faculty_id")) == str(entity_id)]
-
-        if not entries:
+        started = time.perf_counter()
+        context = await asyncio.to_thread(_fetch_export_context, get_service_supabase(), version_id)
+        fetch_ms = (time.perf_counter() - started) * 1000.0
+        payload = _render_payload(context, section, entity_id)
+        if not payload["entries"]:
             raise HTTPException(status_code=404, detail="No timetable entries found for the selected export scope")
         
-        # Fetch reference data
-        days_response = supabase.table("days").select("*").execute()
-        days = days_response.data or []
-        
-        slots_response = supabase.table("time_slots").select("*").execute()
-        slots = slots_response.data or []
-        
-        divisions_response = supabase.table("divisions").select("*").execute()
-        divisions = divisions_response.data or []
-        
-        faculty_response = supabase.table("faculty").select("*").execute()
-        faculty = faculty_response.data or []
-        
-        subjects_response = supabase.table("subjects").select("*").execute()
-        subjects = subjects_response.data or []
-        
-        rooms_response = supabase.table("rooms").select("*").execute()
-        rooms = rooms_response.data or []
-        
-        batches_response = supabase.table("batches").select("*").execute()
-        batches = batches_response.data or []
-
-        # If exporting a specific division, keep division metadata focused to that division.
-        if entity_id and section == "division":
-            divisions = [row for row in divisions if str(row.get("division_id")) == str(entity_id)]
-        
-        # Generate PDF
-        pdf_bytes = generate_timetable_pdf(
-            entries, days, slots, version_hydrated,
-            divisions, faculty, subjects, rooms, batches,
-            section=section, entity_id=entity_id
-        )
-        
-        # Create file response (null-safe version name)
-        raw_version_name = version_hydrated.get("version_name") if version_hydrated else None
-        safe_version_name = _safe_filename_part(raw_version_name if raw_version_name is not None else "export")
-        scope_label = section
-        if entity_id:
-            if section == "division":
-                div_lookup = {str(item.get("division_id")): str(item.get("division_name") or item.get("division_id")) for item in divisions}
-                scope_label = div_lookup.get(str(entity_id), str(entity_id))
-            elif section == "room":
-                room_lookup = {str(item.get("room_id")): str(item.get("room_number") or item.get("room_name") or item.get("room_id")) for item in rooms}
-                scope_label = room_lookup.get(str(entity_id), str(entity_id))
-            else:
-                faculty_lookup = {str(item.get("faculty_id")): str(item.get("faculty_code") or item.get("faculty_name") or item.get("faculty_id")) for item in faculty}
-                scope_label = faculty_lookup.get(str(entity_id), str(entity_id))
-
-        safe_scope_label = _safe_filename_part(scope_label)
-        if section == "division" and entity_id:
-            filename = f"{safe_scope_label}_{safe_version_name}.pdf"
-        elif section == "faculty" and entity_id:
-            filename = f"{safe_scope_label}_{safe_version_name}.pdf"
-        elif section == "room" and entity_id:
-            filename = f"{safe_scope_label}_{safe_version_name}.pdf"
-        else:
-            filename = f"timetable_{safe_scope_label}_{safe_version_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        # Generate PDF in the render pool (keeps the event loop free)
+        pdf_bytes, render_ms = await _render_in_pool(_render_export_pdf, payload, f"pdf {section}")
+        filename = _export_filename(context, section, entity_id)
         
         return Response(
             content=pdf_bytes,
             media_type="application/pdf",
-            headers={"Content-Disposition": _content_disposition_attachment(filename)},
+            headers={
+                "Content-Disposition": _content_disposition_attachment(filename),
+                **_server_timing(fetch_ms, render_ms),
+            },
         )
     
     except HTTPException:
@@ -846,6 +1033,298 @@ async def download_timetable_pdf(
         raise HTTPException(status_code=500, detail=f"PDF generation failed: {str(e)}")
 
 
+def _render_preview_html(payload: dict) -> str:
+    """Build the printable HTML preview (runs in the render pool like the PDF path)."""
+    version_hydrated = payload["version"]
+    entries = payload["entries"]
+    days = payload["days"]
+    slots = payload["slots"]
+    divisions = payload["divisions"]
+    faculty = payload["faculty"]
+    subjects = payload["subjects"]
+    rooms = payload["rooms"]
+    batches = payload["batches"]
+    section = payload["section"]
+    entity_id = payload["entity_id"]
+
+    # Build lookups (string keys; normalized day/slot for cell map)
+    day_map = {_norm_day_id(d.get("day_id")): d.get("day_name", f"Day {d.get('day_id')}") for d in days if _norm_day_id(d.get("day_id")) is not None}
+    slot_map: dict[str, str] = {}
+    for s in slots:
+        sid = _norm_slot_id(s.get("slot_id"))
+        if sid:
+            slot_map[sid] = f"{s.get('start_time')}-{s.get('end_time')}"
+    fac_map = {str(f.get("faculty_id")): f.get("faculty_name", f.get("faculty_id")) for f in faculty if f.get("faculty_id")}
+    subj_map = {
+        str(s.get("subject_id")): s.get("short_code", s.get("subject_name", s.get("subject_id")))
+        for s in subjects
+        if s.get("subject_id")
+    }
+    room_map = {str(r.get("room_id")): r.get("room_name", r.get("room_number", r.get("room_id"))) for r in rooms if r.get("room_id")}
+    batch_map = {str(b.get("batch_id")): b.get("batch_code", b.get("batch_name", "")) for b in batches if b.get("batch_id")}
+    batch_lunch_labels = _build_batch_lunch_labels(batches)
+
+    # Group entries
+    cell_map: dict[tuple[int | None, str], list[dict]] = {}
+    for entry in entries:
+        d_id = _norm_day_id(entry.get("day_id"))
+        s_id = _norm_slot_id(entry.get("slot_id"))
+        if d_id is None or not s_id:
+            continue
+        cell_map.setdefault((d_id, s_id), []).append(entry)
+
+    sorted_days = sorted(days, key=lambda d: d.get("day_id", 0))
+    sorted_slots = sorted(slots, key=lambda s: s.get("slot_order", 0))
+
+    # Build table rows
+    rows = []
+    for day in sorted_days:
+        day_id = _norm_day_id(day.get("day_id"))
+        day_name = html.escape(str(day_map.get(day_id, f"Day {day.get('day_id')}")))
+
+        row_cells = [f"<td class='pdf-day'>{day_name}</td>"]
+
+        for slot in sorted_slots:
+            slot_id = _norm_slot_id(slot.get("slot_id"))
+            cell_entries = cell_map.get((day_id, slot_id), []) if day_id is not None else []
+            division_for_lunch = str(entity_id) if section == "division" and entity_id else (
+                str(cell_entries[0].get("division_id")) if section == "division" and cell_entries else ""
+            )
+            lunch_labels = _lunch_labels_for_slot(section, division_for_lunch, slot, batch_lunch_labels)
+
+            cell_html = "<td class='pdf-slot pdf-lunch-slot'>" if lunch_labels else "<td class='pdf-slot'>"
+
+            for label in lunch_labels:
+                cell_html += f"<div class='pdf-lunch-chip'>{html.escape(label)}</div>"
+            if cell_entries:
+                for entry in cell_entries:
+                    subj = html.escape(str(subj_map.get(str(entry.get("subject_id")), "")))
+                    fac = html.escape(str(fac_map.get(str(entry.get("faculty_id")), "")))
+                    session_type_raw = str(entry.get("session_type", "THEORY")).upper()
+                    session_type = html.escape(session_type_raw)
+                    room = html.escape(str(room_map.get(str(entry.get("room_id")), "")))
+                    batch_id = entry.get("batch_id")
+                    batch_code = html.escape(str(batch_map.get(str(batch_id), ""))) if batch_id else ""
+                    batch_prefix = f"<span class='pdf-batch'>[{batch_code}]</span> " if batch_code else ""
+                    st_style = _html_session_badge_style(session_type_raw)
+
+                    cell_html += f"""
+                    <div class='pdf-cell-block'>
+                        <div class='pdf-cell-line1'><span style='{st_style}'>{session_type}</span> {batch_prefix}<span class='pdf-subj'>{subj}</span></div>
+                        <div class='pdf-cell-line2'>{fac} · {room}</div>
+                    </div>
+                    """
+            else:
+                cell_html += "<div class='pdf-empty-cell'></div>"
+
+            cell_html += "</td>"
+            row_cells.append(cell_html)
+
+        rows.append(f"<tr>{''.join(row_cells)}</tr>")
+
+    # Build header
+    header_cells = ["<th class='pdf-th pdf-th-corner'>Day / Slot</th>"]
+    for slot in sorted_slots:
+        slot_label = html.escape(str(slot_map.get(_norm_slot_id(slot.get("slot_id")), _norm_slot_id(slot.get("slot_id")))))
+        header_cells.append(f"<th class='pdf-th'>{slot_label}</th>")
+
+    metadata_html = ""
+    if version_hydrated:
+        version_name = html.escape(str(version_hydrated.get("version_name", "") or "N/A"))
+        academic_year = html.escape(str(version_hydrated.get("academic_year", "") or "N/A"))
+        semester = html.escape(str(version_hydrated.get("semester", "") or "N/A"))
+        wef_date = html.escape(str(version_hydrated.get("wef_date", "") or "N/A"))
+        to_date = html.escape(str(version_hydrated.get("to_date", "") or "N/A"))
+        timetable_divs_raw = _timetable_division_names_caption(entries, divisions)
+        div_scope_html = (
+            f"<p class='pdf-div-scope'><strong>Division(s) in this timetable</strong> "
+            f"<span>{html.escape(timetable_divs_raw)}</span></p>"
+            if timetable_divs_raw
+            else ""
+        )
+
+        metadata_html = f"""
+        <div class="pdf-meta-card">
+            <div class="pdf-meta-grid">
+                <div><span class="pdf-meta-k">Version</span><span class="pdf-meta-v">{version_name}</span></div>
+                <div><span class="pdf-meta-k">Academic year</span><span class="pdf-meta-v">{academic_year}</span></div>
+                <div><span class="pdf-meta-k">Semester</span><span class="pdf-meta-v">{semester}</span></div>
+                <div><span class="pdf-meta-k">Valid</span><span class="pdf-meta-v">{wef_date} → {to_date}</span></div>
+            </div>
+            {div_scope_html}
+        </div>
+        """
+
+    html_content = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <title>Timetable Preview</title>
+        <style>
+            :root {{
+                --brand: #000000;
+                --brand-mid: #1D4ED8;
+                --accent: #1D4ED8;
+                --page: #ffffff;
+                --card: #F5F5F5;
+                --muted: #374151;
+            }}
+            body {{
+                font-family: "Segoe UI", system-ui, -apple-system, sans-serif;
+                margin: 0;
+                padding: 24px 20px 40px;
+                color: #1e293b;
+                background: var(--page);
+                min-height: 100vh;
+            }}
+            .pdf-banner {{
+                background: linear-gradient(90deg, var(--brand) 0%, var(--brand-mid) 100%);
+                color: #fff;
+                padding: 14px 18px;
+                border-radius: 12px;
+                margin-bottom: 18px;
+                border-bottom: 4px solid var(--accent);
+                box-shadow: 0 8px 24px rgba(0, 0, 0, 0.18);
+            }}
+            .pdf-banner h1 {{
+                margin: 0;
+                font-size: 1.35rem;
+                font-weight: 700;
+                letter-spacing: -0.02em;
+            }}
+            .pdf-banner p {{ margin: 6px 0 0; font-size: 0.85rem; opacity: 0.92; }}
+            .pdf-meta-card {{
+                background: var(--card);
+                border: 1px solid var(--brand-mid);
+                border-radius: 10px;
+                padding: 14px 16px;
+                margin-bottom: 22px;
+                box-shadow: 0 2px 12px rgba(21, 101, 192, 0.08);
+            }}
+            .pdf-meta-grid {{
+                display: grid;
+                grid-template-columns: 1fr 1fr;
+                gap: 10px 16px;
+            }}
+            .pdf-meta-k {{
+                display: block;
+                font-size: 0.72rem;
+                font-weight: 700;
+                color: var(--brand);
+                text-transform: uppercase;
+                letter-spacing: 0.04em;
+            }}
+            .pdf-meta-v {{ font-size: 0.9rem; color: var(--muted); }}
+            .pdf-div-scope {{ margin: 12px 0 0; font-size: 0.88rem; color: var(--muted); }}
+            .pdf-div-scope strong {{ color: var(--brand); margin-right: 6px; }}
+            table {{
+                border-collapse: collapse;
+                width: 100%;
+                background: #fff;
+                border-radius: 10px;
+                overflow: hidden;
+                box-shadow: 0 4px 20px rgba(0, 0, 0, 0.08);
+            }}
+            .pdf-th {{
+                background: linear-gradient(90deg, var(--brand) 0%, var(--brand-mid) 100%);
+                color: #fff;
+                padding: 10px 8px;
+                font-size: 0.82rem;
+                font-weight: 600;
+                border-left: 1px solid rgba(255,255,255,0.12);
+                border-bottom: 3px solid var(--accent);
+                text-align: center;
+            }}
+            .pdf-th-corner {{ text-align: left; border-left: none; }}
+            .pdf-day {{
+                background: #F5F5F5;
+                color: #111827;
+                font-weight: 700;
+                padding: 10px 8px;
+                border: 1px solid #C7CCD1;
+                vertical-align: top;
+                white-space: nowrap;
+            }}
+            .pdf-slot {{
+                border: 1px solid #C7CCD1;
+                padding: 6px;
+                vertical-align: top;
+                background: #ffffff;
+            }}
+            tr:nth-child(even) .pdf-slot {{ background: #FAFAFA; }}
+            .pdf-cell-block {{
+                border: 1px solid #cfd8dc;
+                border-radius: 6px;
+                padding: 6px 8px;
+                margin-bottom: 6px;
+                font-size: 10px;
+                background: linear-gradient(145deg, #fff 0%, #f0f7ff 100%);
+            }}
+            .pdf-cell-line1 {{ margin-bottom: 4px; line-height: 1.35; }}
+            .pdf-cell-line2 {{ font-size: 9px; color: #64748b; }}
+            .pdf-subj {{ font-weight: 700; color: #0f172a; }}
+            .pdf-batch {{ color: #546e7a; font-weight: 600; }}
+            .pdf-lunch-slot {{ background: #f1f5f9; }}
+            .pdf-lunch-chip {{
+                border: 1px solid #cbd5e1;
+                border-radius: 5px;
+                background: #e2e8f0;
+                color: #475569;
+                font-size: 9px;
+                font-weight: 700;
+                text-align: center;
+                text-transform: uppercase;
+                padding: 4px 5px;
+                margin-bottom: 5px;
+            }}
+            .pdf-empty-cell {{ min-height: 52px; }}
+            .no-print {{
+                margin: 12px 0 20px;
+                text-align: center;
+            }}
+            .no-print button {{
+                background: linear-gradient(90deg, #000000 0%, #1D4ED8 100%);
+                color: #fff;
+                border: none;
+                padding: 12px 22px;
+                font-size: 14px;
+                font-weight: 600;
+                border-radius: 10px;
+                cursor: pointer;
+                box-shadow: 0 4px 14px rgba(29, 78, 216, 0.25);
+            }}
+            .no-print button:hover {{ filter: brightness(1.06); }}
+            @media print {{
+                .no-print {{ display: none; }}
+                body {{ background: #fff; padding: 0; }}
+            }}
+        </style>
+    </head>
+    <body>
+        <div class="no-print">
+            <button type="button" onclick="window.print()">Print / Save as PDF</button>
+        </div>
+        <div class="pdf-banner">
+            <h1>samayvidya - agentic ai powered time table scheduler</h1>
+            <p>Built by Students of Dept of CSE AI VIT PUNE</p>
+        </div>
+        {metadata_html}
+        <table>
+            <thead>
+                <tr>{''.join(header_cells)}</tr>
+            </thead>
+            <tbody>
+                {''.join(rows)}
+            </tbody>
+        </table>
+    </body>
+    </html>
+    """
+
+    return html_content
+
+
 @router.get("/timetable/preview/{version_id}")
 async def preview_timetable_html(
     version_id: str,
@@ -855,330 +1334,26 @@ async def preview_timetable_html(
     """Preview timetable as HTML (browser print / Save as PDF). Does not require ReportLab."""
     
     try:
-        supabase = get_service_supabase()
-        
-        # Fetch version with entries
-        version_response = supabase.table("timetable_versions").select("*").eq("version_id", version_id).single().execute()
-        version_data = version_response.data
-        if not version_data:
-            raise HTTPException(status_code=404, detail="Timetable version not found")
-        
-        # Hydrate metadata
-        version_hydrated = _hydrate_version_row(version_data)
-        
-        # Fetch entries for this version
-        entries_response = supabase.table("timetable_entries").select("*").eq("version_id", version_id).execute()
-        entries = entries_response.data or []
-
-        if entity_id:
-            if section == "division":
-                entries = [row for row in entries if str(row.get("division_id")) == str(entity_id)]
-            elif section == "room":
-                entries = [row for row in entries if str(row.get("room_id")) == str(entity_id)]
-            else:
-                entries = [row for row in entries if str(row.get("faculty_id")) == str(entity_id)]
+        started = time.perf_counter()
+        context = await asyncio.to_thread(_fetch_export_context, get_service_supabase(), version_id)
+        fetch_ms = (time.perf_counter() - started) * 1000.0
+        payload = _render_payload(context, section, entity_id)
+        payload["divisions"] = context["divisions"]
 
-        if not entries:
+        if not payload["entries"]:
             raise HTTPException(status_code=404, detail="No timetable entries found for the selected preview scope")
         
-        # Fetch reference data
-        days_response = supabase.table("days").select("*").execute()
-        days = days_response.data or []
-        
-        slots_response = supabase.table("time_slots").select("*").execute()
-        slots = slots_response.data or []
-        
-        divisions_response = supabase.table("divisions").select("*").execute()
-        divisions = divisions_response.data or []
-        
-        faculty_response = supabase.table("faculty").select("*").execute()
-        faculty = faculty_response.data or []
+        html_content, render_ms = await _render_in_pool(_render_preview_html, payload, f"preview {section}")
         
-        subjects_response = supabase.table("subjects").select("*").execute()
-        subjects = subjects_response.data or []
-        
-        rooms_response = supabase.table("rooms").select("*").execute()
-        rooms = rooms_response.data or []
-        
-        batches_response = supabase.table("batches").select("*").execute()
-        batches = batches_response.data or []
-        
-        # Build lookups (string keys; normalized day/slot for cell map)
-        day_map = {_norm_day_id(d.get("day_id")): d.get("day_name", f"Day {d.get('day_id')}") for d in days if _norm_day_id(d.get("day_id")) is not None}
-        slot_map: dict[str, str] = {}
-        for s in slots:
-            sid = _norm_slot_id(s.get("slot_id"))
-            if sid:
-                slot_map[sid] = f"{s.get('start_time')}-{s.get('end_time')}"
-        fac_map = {str(f.get("faculty_id")): f.get("faculty_name", f.get("faculty_id")) for f in faculty if f.get("faculty_id")}
-        subj_map = {
-            str(s.get("subject_id")): s.get("short_code", s.get("subject_name", s.get("subject_id")))
-            for s in subjects
-            if s.get("subject_id")
-        }
-        room_map = {str(r.get("room_id")): r.get("room_name", r.get("room_number", r.get("room_id"))) for r in rooms if r.get("room_id")}
-        batch_map = {str(b.get("batch_id")): b.get("batch_code", b.get("batch_name", "")) for b in batches if b.get("batch_id")}
-        batch_lunch_labels = _build_batch_lunch_labels(batches)
-        
-        # Group entries
-        cell_map: dict[tuple[int | None, str], list[dict]] = {}
-        for entry in entries:
-            d_id = _norm_day_id(entry.get("day_id"))
-            s_id = _norm_slot_id(entry.get("slot_id"))
-            if d_id is None or not s_id:
-                continue
-            cell_map.setdefault((d_id, s_id), []).append(entry)
-        
-        sorted_days = sorted(days, key=lambda d: d.get("day_id", 0))
-        sorted_slots = sorted(slots, key=lambda s: s.get("slot_order", 0))
-        
-        # Build table rows
-        rows = []
-        for day in sorted_days:
-            day_id = _norm_day_id(day.get("day_id"))
-            day_name = html.escape(str(day_map.get(day_id, f"Day {day.get('day_id')}")))
-            
-            row_cells = [f"<td class='pdf-day'>{day_name}</td>"]
-
-            for slot in sorted_slots:
-                slot_id = _norm_slot_id(slot.get("slot_id"))
-                cell_entries = cell_map.get((day_id, slot_id), []) if day_id is not None else []
-                division_for_lunch = str(entity_id) if section == "division" and entity_id else (
-                    str(cell_entries[0].get("division_id")) if section == "division" and cell_entries else ""
-                )
-                lunch_labels = _lunch_labels_for_slot(section, division_for_lunch, slot, batch_lunch_labels)
-
-                cell_html = "<td class='pdf-slot pdf-lunch-slot'>" if lunch_labels else "<td class='pdf-slot'>"
-
-                for label in lunch_labels:
-                    cell_html += f"<div class='pdf-lunch-chip'>{html.escape(label)}</div>"
-                if cell_entries:
-                    for entry in cell_entries:
-                        subj = html.escape(str(subj_map.get(str(entry.get("subject_id")), "")))
-                        fac = html.escape(str(fac_map.get(str(entry.get("faculty_id")), "")))
-                        session_type_raw = str(entry.get("session_type", "THEORY")).upper()
-                        session_type = html.escape(session_type_raw)
-                        room = html.escape(str(room_map.get(str(entry.get("room_id")), "")))
-                        batch_id = entry.get("batch_id")
-                        batch_code = html.escape(str(batch_map.get(str(batch_id), ""))) if batch_id else ""
-                        batch_prefix = f"<span class='pdf-batch'>[{batch_code}]</span> " if batch_code else ""
-                        st_style = _html_session_badge_style(session_type_raw)
-
-                        cell_html += f"""
-                        <div class='pdf-cell-block'>
-                            <div class='pdf-cell-line1'><span style='{st_style}'>{session_type}</span> {batch_prefix}<span class='pdf-subj'>{subj}</span></div>
-                            <div class='pdf-cell-line2'>{fac} · {room}</div>
-                        </div>
-                        """
-                else:
-                    cell_html += "<div class='pdf-empty-cell'></div>"
-
-                cell_html += "</td>"
-                row_cells.append(cell_html)
-            
-            rows.append(f"<tr>{''.join(row_cells)}</tr>")
-        
-        # Build header
-        header_cells = ["<th class='pdf-th pdf-th-corner'>Day / Slot</th>"]
-        for slot in sorted_slots:
-            slot_label = html.escape(str(slot_map.get(_norm_slot_id(slot.get("slot_id")), _norm_slot_id(slot.get("slot_id")))))
-            header_cells.append(f"<th class='pdf-th'>{slot_label}</th>")
-        
-        metadata_html = ""
-        if version_hydrated:
-            version_name = html.escape(str(version_hydrated.get("version_name", "") or "N/A"))
-            academic_year = html.escape(str(version_hydrated.get("academic_year", "") or "N/A"))
-            semester = html.escape(str(version_hydrated.get("semester", "") or "N/A"))
-            wef_date = html.escape(str(version_hydrated.get("wef_date", "") or "N/A"))
-            to_date = html.escape(str(version_hydrated.get("to_date", "") or "N/A"))
-            timetable_divs_raw = _timetable_division_names_caption(entries, divisions)
-            div_scope_html = (
-                f"<p class='pdf-div-scope'><strong>Division(s) in this timetable</strong> "
-                f"<span>{html.escape(timetable_divs_raw)}</span></p>"
-                if timetable_divs_raw
-                else ""
-            )
-
-            metadata_html = f"""
-            <div class="pdf-meta-card">
-                <div class="pdf-meta-grid">
-                    <div><span class="pdf-meta-k">Version</span><span class="pdf-meta-v">{version_name}</span></div>
-                    <div><span class="pdf-meta-k">Academic year</span><span class="pdf-meta-v">{academic_year}</span></div>
-                    <div><span class="pdf-meta-k">Semester</span><span class="pdf-meta-v">{semester}</span></div>
-                    <div><span class="pdf-meta-k">Valid</span><span class="pdf-meta-v">{wef_date} → {to_date}</span></div>
-                </div>
-                {div_scope_html}
-            </div>
-            """
-        
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <title>Timetable Preview</title>
-            <style>
-                :root {{
-                    --brand: #000000;
-                    --brand-mid: #1D4ED8;
-                    --accent: #1D4ED8;
-                    --page: #ffffff;
-                    --card: #F5F5F5;
-                    --muted: #374151;
-                }}
-                body {{
-                    font-family: "Segoe UI", system-ui, -apple-system, sans-serif;
-                    margin: 0;
-                    padding: 24px 20px 40px;
-                    color: #1e293b;
-                    background: var(--page);
-                    min-height: 100vh;
-                }}
-                .pdf-banner {{
-                    background: linear-gradient(90deg, var(--brand) 0%, var(--brand-mid) 100%);
-                    color: #fff;
-                    padding: 14px 18px;
-                    border-radius: 12px;
-                    margin-bottom: 18px;
-                    border-bottom: 4px solid var(--accent);
-                    box-shadow: 0 8px 24px rgba(0, 0, 0, 0.18);
-                }}
-                .pdf-banner h1 {{
-                    margin: 0;
-                    font-size: 1.35rem;
-                    font-weight: 700;
-                    letter-spacing: -0.02em;
-                }}
-                .pdf-banner p {{ margin: 6px 0 0; font-size: 0.85rem; opacity: 0.92; }}
-                .pdf-meta-card {{
-                    background: var(--card);
-                    border: 1px solid var(--brand-mid);
-                    border-radius: 10px;
-                    padding: 14px 16px;
-                    margin-bottom: 22px;
-                    box-shadow: 0 2px 12px rgba(21, 101, 192, 0.08);
-                }}
-                .pdf-meta-grid {{
-                    display: grid;
-                    grid-template-columns: 1fr 1fr;
-                    gap: 10px 16px;
-                }}
-                .pdf-meta-k {{
-                    display: block;
-                    font-size: 0.72rem;
-                    font-weight: 700;
-                    color: var(--brand);
-                    text-transform: uppercase;
-                    letter-spacing: 0.04em;
-                }}
-                .pdf-meta-v {{ font-size: 0.9rem; color: var(--muted); }}
-                .pdf-div-scope {{ margin: 12px 0 0; font-size: 0.88rem; color: var(--muted); }}
-                .pdf-div-scope strong {{ color: var(--brand); margin-right: 6px; }}
-                table {{
-                    border-collapse: collapse;
-                    width: 100%;
-                    background: #fff;
-                    border-radius: 10px;
-                    overflow: hidden;
-                    box-shadow: 0 4px 20px rgba(0, 0, 0, 0.08);
-                }}
-                .pdf-th {{
-                    background: linear-gradient(90deg, var(--brand) 0%, var(--brand-mid) 100%);
-                    color: #fff;
-                    padding: 10px 8px;
-                    font-size: 0.82rem;
-                    font-weight: 600;
-                    border-left: 1px solid rgba(255,255,255,0.12);
-                    border-bottom: 3px solid var(--accent);
-                    text-align: center;
-                }}
-                .pdf-th-corner {{ text-align: left; border-left: none; }}
-                .pdf-day {{
-                    background: #F5F5F5;
-                    color: #111827;
-                    font-weight: 700;
-                    padding: 10px 8px;
-                    border: 1px solid #C7CCD1;
-                    vertical-align: top;
-                    white-space: nowrap;
-                }}
-                .pdf-slot {{
-                    border: 1px solid #C7CCD1;
-                    padding: 6px;
-                    vertical-align: top;
-                    background: #ffffff;
-                }}
-                tr:nth-child(even) .pdf-slot {{ background: #FAFAFA; }}
-                .pdf-cell-block {{
-                    border: 1px solid #cfd8dc;
-                    border-radius: 6px;
-                    padding: 6px 8px;
-                    margin-bottom: 6px;
-                    font-size: 10px;
-                    background: linear-gradient(145deg, #fff 0%, #f0f7ff 100%);
-                }}
-                .pdf-cell-line1 {{ margin-bottom: 4px; line-height: 1.35; }}
-                .pdf-cell-line2 {{ font-size: 9px; color: #64748b; }}
-                .pdf-subj {{ font-weight: 700; color: #0f172a; }}
-                .pdf-batch {{ color: #546e7a; font-weight: 600; }}
-                .pdf-lunch-slot {{ background: #f1f5f9; }}
-                .pdf-lunch-chip {{
-                    border: 1px solid #cbd5e1;
-                    border-radius: 5px;
-                    background: #e2e8f0;
-                    color: #475569;
-                    font-size: 9px;
-                    font-weight: 700;
-                    text-align: center;
-                    text-transform: uppercase;
-                    padding: 4px 5px;
-                    margin-bottom: 5px;
-                }}
-                .pdf-empty-cell {{ min-height: 52px; }}
-                .no-print {{
-                    margin: 12px 0 20px;
-                    text-align: center;
-                }}
-                .no-print button {{
-                    background: linear-gradient(90deg, #000000 0%, #1D4ED8 100%);
-                    color: #fff;
-                    border: none;
-                    padding: 12px 22px;
-                    font-size: 14px;
-                    font-weight: 600;
-                    border-radius: 10px;
-                    cursor: pointer;
-                    box-shadow: 0 4px 14px rgba(29, 78, 216, 0.25);
-                }}
-                .no-print button:hover {{ filter: brightness(1.06); }}
-                @media print {{
-                    .no-print {{ display: none; }}
-                    body {{ background: #fff; padding: 0; }}
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="no-print">
-                <button type="button" onclick="window.print()">Print / Save as PDF</button>
-            </div>
-            <div class="pdf-banner">
-                <h1>samayvidya - agentic ai powered time table scheduler</h1>
-                <p>Built by Students of Dept of CSE AI VIT PUNE</p>
-            </div>
-            {metadata_html}
-            <table>
-                <thead>
-                    <tr>{''.join(header_cells)}</tr>
-                </thead>
-                <tbody>
-                    {''.join(rows)}
-                </tbody>
-            </table>
-        </body>
-        </html>
-        """
-        
-        return HTMLResponse(content=html_content)
+        return HTMLResponse(content=html_content, headers=_server_timing(fetch_ms, render_ms))
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"HTML generation failed: {str(e)}")
+
+
+@router.get("/render-stats")
+async def get_render_stats():
+    """Render pool occupancy and per-render timing."""
+    return {"data": render_stats(), "message": "PDF render statistics"}
@@ -3,10 +3,16 @@ from datetime import datetime
 import json
 from fastapi import APIRouter, HTTPException, status, Depends
 from pydantic import BaseModel
+from app.config import settings
 from app.dependencies.auth import get_current_user, CurrentUser
 from app.supabase_client import get_service_supabase
 from app.schemas.common import SuccessResponse
-from app.services.email_service import send_revised_timetable_update_email
+from app.services.effective_version import get_effective_version_id
+from app.services.email_outbox import enqueue_emails
+from app.services.email_service import render_revised_timetable_update_email, send_revised_timetable_update_email
+from app.services.notification_inbox import log_notifications
+from app.services.substitute_recommender import get_availability_index
+from app.services.timetable_version_deltas import fetch_version_entries
 
 router = APIRouter(prefix="/slot-adjustments", tags=["slot-adjustments"])
 DAY_TABLE_MARKER = "__DAY_TABLE__:"
@@ -153,26 +159,35 @@ def _notify_students_and_email_revised_timetable(
             f"on {leave.get('start_date')}: "
             + ("; ".join(update_lines) if update_lines else "No affected slots.")
         )
-        notification_rows.append(
-            {
-                "notification_type": "REVISED_DAY_TIMETABLE",
-                "recipient_email": email,
-                "recipient_type": "STUDENT",
-                "subject": "Revised Day Timetable Update",
-                "body": body,
-                "related_leave_id": leave.get("leave_id"),
-                "status": "SENT",
-            }
-        )
-        send_revised_timetable_update_email(
-            to_email=email,
-            student_name=student.get("full_name") or "Student",
-            leave_date=str(leave.get("start_date") or ""),
-            update_lines=update_lines,
-        )
+        row = {
+            "notification_type": "REVISED_DAY_TIMETABLE",
+            "recipient_email": email,
+            "recipient_type": "STUDENT",
+            "subject": "Revised Day Timetable Update",
+            "body": body,
+            "related_leave_id": leave.get("leave_id"),
+        }
+        if settings.email_outbox_enabled:
+            row["email_subject"], row["email_html"] = render_revised_timetable_update_email(
+                student_name=student.get("full_name") or "Student",
+                leave_date=str(leave.get("start_date") or ""),
+                update_lines=update_lines,
+            )
+        else:
+            row["status"] = "SENT"
+            send_revised_timetable_update_email(
+                to_email=email,
+                student_name=student.get("full_name") or "Student",
+                leave_date=str(leave.get("start_date") or ""),
+                update_lines=update_lines,
+            )
+        notification_rows.append(row)
 
-    if notification_rows:
-        supabase.table("notification_log").insert(notification_rows).execute()
+    if settings.email_outbox_enabled:
+        # Delivered by the email outbox worker (status PENDING -> SENT/FAILED).
+        enqueue_emails(supabase, notification_rows)
+    elif notification_rows:
+        log_notifications(supabase, notification_rows)
 
 def _maybe_publish_revised_timetable(supabase, request_id: str) -> None:
     """Publish revised timetable updates based on acceptance/cutoff rules."""
@@ -303,18 +318,6 @@ def _notify_division_students_for_slot_decision(supabase, slot: dict, decision:
     if not students:
         return
 
-    # Build revised day timetable snapshot (table payload) for this division/day.
-    version_rows = (
-        supabase.table("timetable_versions")
-        .select("version_id")
-        .order("created_at", desc=True)
-        .limit(1)
-        .execute()
-        .data
-        or []
-    )
-    version_id = version_rows[0]["version_id"] if version_rows else None
-
     day_row = (
         supabase.table("days")
         .select("day_name")
@@ -328,7 +331,7 @@ def _notify_division_students_for_slot_decision(supabase, slot: dict, decision:
 
     division_row = (
         supabase.table("divisions")
-        .select("division_name")
+        .select("division_name, department_id")
         .eq("division_id", division_id)
         .limit(1)
         .execute()
@@ -337,22 +340,22 @@ def _notify_division_students_for_slot_decision(supabase, slot: dict, decision:
     )
     division_name = division_row[0].get("division_name") if division_row else str(division_id)
 
+    # Build revised day timetable snapshot (table payload) from the version students see.
+    version_id = get_effective_version_id(
+        supabase, division_row[0].get("department_id") if division_row else None, "STUDENT"
+    )
+
     entry_rows = []
     if version_id and day_id:
-        entry_rows = (
-            supabase.table("timetable_entries")
-            .select(
-                "slot_id, "
-                "subjects(subject_name), "
-                "faculty(faculty_name), "
-                "time_slots(start_time, end_time, slot_order)"
-            )
-            .eq("version_id", version_id)
-            .eq("division_id", division_id)
-            .eq("day_id", day_id)
-            .execute()
-            .data
-            or []
+        entry_rows = fetch_version_entries(
+            supabase,
+            version_id,
+            "slot_id, "
+            "subjects(subject_name), "
+            "faculty(faculty_name), "
+            "time_slots(start_time, end_time, slot_order)",
+            division_id=division_id,
+            day_id=day_id,
         )
 
     # Apply slot adjustments for this request/day/division to show revised day timetable.
@@ -455,7 +458,7 @@ def _notify_division_students_for_slot_decision(supabase, slot: dict, decision:
             }
         )
     if recipient_rows:
-        supabase.table("notification_log").insert(recipient_rows).execute()
+        log_notifications(supabase, recipient_rows)
 
 
 @router.post("/create", response_model=SuccessResponse)
@@ -562,21 +565,19 @@ async def create_adjustment_request(
         
         affected_slots = affected_slots_response.data or []
         
-        # 6. Find available faculty for each affected slot
+        # 6. Rank substitutes for all affected slots at once from the version's availability index
+        entry_versions = {str(entry["entry_id"]): str(entry.get("version_id") or "") for entry in affected_entries}
+        slots_by_version: dict[str, list[dict]] = {}
         for affected_slot in affected_slots:
-            available_faculty = await _find_available_faculty(
-                supabase,
-                affected_slot["day_id"],
-                affected_slot["slot_id"],
-                affected_slot["division_id"],
-                affected_slot["subject_id"],
-                faculty_id
-            )
-            
-            # Insert available faculty records
-            if available_faculty:
-                availability_data = []
-                for fac in available_faculty:
+            version_id = entry_versions.get(str(affected_slot.get("entry_id")), "")
+            slots_by_version.setdefault(version_id, []).append(affected_slot)
+
+        availability_data = []
+        for version_id, version_slots in slots_by_version.items():
+            index = get_availability_index(supabase, version_id)
+            ranked = index.recommend_for_slots(version_slots, exclude_faculty_id=faculty_id)
+            for affected_slot in version_slots:
+                for fac in ranked.get(str(affected_slot["affected_slot_id"]), []):
                     availability_data.append({
                         "affected_slot_id": affected_slot["affected_slot_id"],
                         "faculty_id": fac["faculty_id"],
@@ -585,8 +586,9 @@ async def create_adjustment_request(
                         "teaches_subject": fac["teaches_subject"],
                         "priority_score": fac["priority_score"]
                     })
-                
-                supabase.table("available_faculty_for_slots").insert(availability_data).execute()
+
+        if availability_data:
+            supabase.table("available_faculty_for_slots").insert(availability_data).execute()
         
         return {
             "data": {
@@ -606,88 +608,6 @@ async def create_adjustment_request(
         )
 
 
-async def _find_available_faculty(
-    supabase,
-    day_id: int,
-    slot_id: str,
-    division_id: str,
-    subject_id: str,
-    exclude_faculty_id: str
-) -> list[dict]:
-    """
-    Find faculty available for a specific slot.
-    Priority: teaches same division & subject > teaches division > teaches subject > free
-    """
-    # Get all faculty
-    all_faculty = supabase.table("faculty").select("faculty_id, faculty_name").execute().data or []
-    
-    # Get faculty already assigned to this slot
-    busy_faculty_response = (
-        supabase.table("timetable_entries")
-        .select("faculty_id")
-        .eq("day_id", day_id)
-        .eq("slot_id", slot_id)
-        .execute()
-    )
-    busy_faculty_ids = {entry["faculty_id"] for entry in (busy_faculty_response.data or [])}
-    
-    # Get faculty teaching this division
-    division_faculty_response = (
-        supabase.table("timetable_entries")
-        .select("faculty_id")
-        .eq("division_id", division_id)
-        .execute()
-    )
-    division_faculty_ids = {entry["faculty_id"] for entry in (division_faculty_response.data or [])}
-    
-    # Get faculty teaching this subject
-    subject_faculty_response = (
-        supabase.table("timetable_entries")
-        .select("faculty_id")
-        .eq("subject_id", subject_id)
-        .execute()
-    )
-    subject_faculty_ids = {entry["faculty_id"] for entry in (subject_faculty_response.data or [])}
-    
-    available_faculty = []
-    for faculty in all_faculty:
-        fac_id = faculty["faculty_id"]
-        
-        # Skip the faculty on leave
-        if fac_id == exclude_faculty_id:
-            continue
-        
-        is_free = fac_id not in busy_faculty_ids
-        teaches_division = fac_id in division_faculty_ids
-        teaches_subject = fac_id in subject_faculty_ids
-        
-        # Calculate priority score
-        priority_score = 0
-        if teaches_division and teaches_subject:
-            priority_score = 3
-        elif teaches_division:
-            priority_score = 2
-        elif teaches_subject:
-            priority_score = 1
-        
-        # Faculty should only see/receive slots for divisions they already teach.
-        # Busy/free is still shown for decision-making inside that division scope.
-        if teaches_division:
-            available_faculty.append({
-                "faculty_id": fac_id,
-                "faculty_name": faculty["faculty_name"],
-                "is_free": is_free,
-                "teaches_division": teaches_division,
-                "teaches_subject": teaches_subject,
-                "priority_score": priority_score
-            })
-    
-    # Sort by priority score (highest first)
-    available_faculty.sort(key=lambda x: x["priority_score"], reverse=True)
-    
-    return available_faculty
-
-
 @router.get("/requests", response_model=SuccessResponse)
 async def list_adjustment_requests(
     status_filter: str | None = None,
@@ -869,14 +789,14 @@ async def assign_replacement_faculty(
             
             if faculty_response.data and faculty_response.data.get("email"):
                 try:
-                    supabase.table("notification_log").insert({
+                    log_notifications(supabase, [{
                         "notification_type": "SLOT_ADJUSTMENT_ACTION_REQUIRED",
                         "recipient_email": faculty_response.data["email"],
                         "recipient_type": "FACULTY",
                         "subject": "Slot Adjustment Request",
                         "body": "You have a slot adjustment request pending your acceptance.",
                         "status": "SENT"
-                    }).execute()
+                    }])
                 except Exception as e:
                     # Log but don't fail the assignment
                     print(f"Failed to send notification: {e}")
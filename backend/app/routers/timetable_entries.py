@@ -1,5 +1,7 @@
 """Timetable entries management routes."""
-from fastapi import APIRouter, HTTPException, status, Depends
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException, status, Depends, Query
 from pydantic import BaseModel
 from app.config import settings
 from app.dependencies.auth import (
@@ -9,6 +11,17 @@ from app.dependencies.auth import (
 )
 from app.supabase_client import get_user_supabase, get_service_supabase
 from app.schemas.common import SuccessResponse, SubjectTypeEnum
+from app.services.reference_data import COMPACT_ENTRY_COLUMNS, build_timetable_view, get_reference_data
+from app.services.substitute_recommender import invalidate_availability_index
+from app.services.timetable_calendar import invalidate_timetable_calendar
+from app.services.timetable_repository import as_timetable_repository
+from app.services.timetable_version_deltas import (
+    detach_children,
+    fetch_version_entries,
+    fork_entry,
+    inherits_entry,
+    invalidate_version_entries,
+)
 
 router = APIRouter(prefix="/timetable-entries", tags=["timetable-entries"])
 
@@ -27,15 +40,12 @@ def _slot_conflicts_for_entry(
     room_id: str,
     exclude_entry_id: str | None = None,
 ) -> tuple[list[dict], list[dict]]:
-    rows = (
-        supabase.table("timetable_entries")
-        .select("entry_id, division_id, faculty_id, room_id, subject_id, batch_id, session_type")
-        .eq("version_id", version_id)
-        .eq("day_id", day_id)
-        .eq("slot_id", slot_id)
-        .execute()
-        .data
-        or []
+    rows = fetch_version_entries(
+        supabase,
+        version_id,
+        "entry_id, division_id, faculty_id, room_id, subject_id, batch_id, session_type",
+        day_id=day_id,
+        slot_id=slot_id,
     )
 
     if exclude_entry_id:
@@ -74,17 +84,59 @@ class TimetableEntryUpdate(BaseModel):
     session_type: SubjectTypeEnum | None = None
 
 
+def _list_compact_entries(supabase, version_id: str | None, view_format: str, current_user: CurrentUser) -> dict:
+    version_query = supabase.table("timetable_versions").select("version_id, department_id")
+    if version_id:
+        version_query = version_query.eq("version_id", version_id)
+    department_by_version = {
+        str(row["version_id"]): canonical_department_id(row.get("department_id"))
+        for row in (version_query.execute().data or [])
+        if row.get("version_id")
+    }
+
+    columns = ", ".join(("version_id",) + COMPACT_ENTRY_COLUMNS)
+    if version_id:
+        entries = fetch_version_entries(supabase, version_id, columns)
+    else:
+        entries = supabase.table("timetable_entries").select(columns).execute().data or []
+
+    if current_user.role != "ADMIN":
+        user_d = canonical_department_id(current_user.department_id)
+        entries = [
+            entry
+            for entry in entries
+            if user_d and department_by_version.get(str(entry.get("version_id"))) == user_d
+        ]
+
+    # Rows only need their version when several versions are listed together.
+    extra_columns = () if version_id else ("version_id",)
+    view = build_timetable_view(entries, get_reference_data(supabase), view_format, extra_columns=extra_columns)
+    view["total_entries"] = len(entries)
+    return view
+
+
 @router.get("", response_model=SuccessResponse)
 async def list_timetable_entries(
     version_id: str | None = None,
+    view_format: Literal["expanded", "compact", "grid"] = Query("expanded", alias="format"),
     current_user: CurrentUser = Depends(get_current_user_with_profile),
 ) -> dict:
-    """List all timetable entries with department filtering enforced."""
+    """List all timetable entries with department filtering enforced.
+
+    ``format=compact``/``grid`` skip the per-row joins and return bare rows (or a
+    day x slot matrix) with one ``lookups`` dict from the reference-data cache.
+    """
     try:
         supabase = get_service_supabase() if _is_anonymous_mode_user(current_user) else get_service_supabase()
+
+        if view_format != "expanded":
+            return {
+                "data": _list_compact_entries(supabase, version_id, view_format, current_user),
+                "message": "Timetable entries retrieved successfully",
+            }
         
         # Join with related tables to get names instead of just IDs
-        query = supabase.table("timetable_entries").select(
+        columns = (
             "*,"
             "subjects(subject_id, subject_name, subject_type, sub_short_form),"
             "faculty(faculty_id, faculty_name, faculty_code),"
@@ -97,27 +149,26 @@ async def list_timetable_entries(
         )
         
         if version_id:
-            query = query.eq("version_id", version_id)
-        
-        response = query.execute()
+            rows = fetch_version_entries(supabase, version_id, columns)
+        else:
+            rows = supabase.table("timetable_entries").select(columns).execute().data or []
 
         if current_user.role != "ADMIN":
             user_d = canonical_department_id(current_user.department_id)
             if not user_d:
-                response.data = []
+                rows = []
             else:
-                filtered_data = [
+                rows = [
                     entry
-                    for entry in (response.data or [])
+                    for entry in rows
                     if canonical_department_id(
                         (entry.get("timetable_versions") or {}).get("department_id")
                     )
                     == user_d
                 ]
-                response.data = filtered_data
         
         return {
-            "data": response.data,
+            "data": rows,
             "message": "Timetable entries retrieved successfully",
         }
     except HTTPException:
@@ -212,11 +263,16 @@ async def create_timetable_entry(
                 ),
             )
 
+        # Delta versions reading through this one must not pick up the new row.
+        detach_children(as_timetable_repository(supabase), [entry.version_id])
         response = (
             supabase.table("timetable_entries")
             .insert(entry.model_dump())
             .execute()
         )
+        invalidate_version_entries(entry.version_id)
+        invalidate_availability_index(entry.version_id)
+        invalidate_timetable_calendar()
         return {
             "data": response.data,
             "message": "Timetable entry created successfully",
@@ -281,14 +337,27 @@ async def update_timetable_entry(
                 ),
             )
 
-        response = (
-            supabase.table("timetable_entries")
-            .update(update_data)
-            .eq("entry_id", entry_id)
-            .execute()
-        )
+        repository = as_timetable_repository(supabase)
+        owner_version_id = str(existing.get("version_id") or "")
+        target_version_id = str(candidate.get("version_id") or "")
+        if target_version_id != owner_version_id and inherits_entry(repository, target_version_id, existing):
+            # The row belongs to a parent of the edited version: fork it instead of changing the parent.
+            changes = {key: value for key, value in update_data.items() if key != "version_id"}
+            data = [fork_entry(repository, target_version_id, existing, changes)]
+        else:
+            detach_children(repository, [owner_version_id, target_version_id])
+            data = (
+                supabase.table("timetable_entries")
+                .update(update_data)
+                .eq("entry_id", entry_id)
+                .execute()
+                .data
+            )
+        invalidate_version_entries(owner_version_id, target_version_id)
+        invalidate_availability_index(existing.get("version_id"), candidate.get("version_id"))
+        invalidate_timetable_calendar()
         return {
-            "data": response.data,
+            "data": data,
             "message": "Timetable entry updated successfully",
         }
     except Exception as e:
@@ -301,19 +370,39 @@ async def update_timetable_entry(
 @router.delete("/{entry_id}", response_model=SuccessResponse)
 async def delete_timetable_entry(
     entry_id: str,
+    version_id: str | None = None,
     current_user: CurrentUser = Depends(get_current_user_with_profile),
 ) -> dict:
-    """Delete a timetable entry."""
+    """Delete a timetable entry.
+
+    ``version_id`` names the version being edited when the entry is inherited from
+    its parent; the entry is then dropped from that version only.
+    """
     try:
         supabase = get_service_supabase() if _is_anonymous_mode_user(current_user) else get_user_supabase()
-        response = (
-            supabase.table("timetable_entries")
-            .delete()
-            .eq("entry_id", entry_id)
-            .execute()
+        repository = as_timetable_repository(supabase)
+        existing = (
+            supabase.table("timetable_entries").select("*").eq("entry_id", entry_id).limit(1).execute().data or []
         )
+        if existing and version_id and inherits_entry(repository, version_id, existing[0]):
+            fork_entry(repository, version_id, existing[0])
+            data = [{**existing[0], "version_id": version_id}]
+        else:
+            if existing:
+                detach_children(repository, [existing[0].get("version_id")])
+            data = (
+                supabase.table("timetable_entries")
+                .delete()
+                .eq("entry_id", entry_id)
+                .execute()
+                .data
+            )
+        for row in data or []:
+            invalidate_version_entries(row.get("version_id"))
+            invalidate_availability_index(row.get("version_id"))
+        invalidate_timetable_calendar()
         return {
-            "data": response.data,
+            "data": data,
             "message": "Timetable entry deleted successfully",
         }
     except Exception as e:
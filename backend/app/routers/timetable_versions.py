@@ -3,18 +3,30 @@ from __future__ import annotations
 
 from typing import Any
 
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Query
 from pydantic import BaseModel
 import json
 from app.config import settings
 from app.dependencies.auth import (
     get_current_user_with_profile,
     CurrentUser,
+    canonical_department_id,
     resolve_effective_department_id,
 )
 from app.supabase_client import get_user_supabase, get_service_supabase
 from app.schemas.common import SuccessResponse
+from app.services.effective_version import invalidate_effective_versions, versions_for_role
 from app.services.timetable_conflict_audit import audit_timetable_conflicts, fetch_timetable_entries_for_version
+from app.services.timetable_repository import as_timetable_repository
+from app.services.timetable_version_deltas import (
+    compact_long_chains,
+    detach_children,
+    diff_versions,
+    invalidate_version_entries,
+)
+from app.services.notification_inbox import log_notifications
+from app.services.maintenance_jobs import TIMETABLE_EXPIRY
+from app.services.maintenance_scheduler import get_maintenance_scheduler
 
 router = APIRouter(prefix="/timetable-versions", tags=["timetable-versions"])
 _META_MARKER = "__TT_META__:"
@@ -57,7 +69,7 @@ def _notify_users_for_timetable_approval(
                 }
             )
         if rows:
-            supabase.table("notification_log").insert(rows).execute()
+            log_notifications(supabase, rows)
 
     # Fallback: include students from students table if user_profiles lacks student emails.
     student_query = supabase.table("students").select("email")
@@ -93,7 +105,7 @@ def _notify_users_for_timetable_approval(
             }
         )
     if fallback_rows:
-        supabase.table("notification_log").insert(fallback_rows).execute()
+        log_notifications(supabase, fallback_rows)
 
 
 def _split_reason_and_meta(reason: str | None) -> tuple[str | None, dict]:
@@ -235,59 +247,13 @@ async def list_timetable_versions(
                     "message": "No timetables found. Please contact admin to assign you to a department.",
                 }
 
-        query = supabase.table("timetable_versions").select("*")
-
-        if current_user.role != "ADMIN":
-            query = query.eq("department_id", target_dept_id)
-            print(f"[TIMETABLE_VERSIONS] Filtering by department_id: {target_dept_id}")
-        elif target_dept_id:
-            query = query.eq("department_id", target_dept_id)
-        
-        # Students should only see HOD approved timetables
-        # Faculty can see both COORDINATOR_VERIFIED and HOD_APPROVED timetables
-        if current_user.role == "STUDENT":
-            query = query.eq("is_frozen", True).eq("approval_status", "HOD_APPROVED")
-            print(f"[TIMETABLE_VERSIONS] Filtering for frozen+approved timetables only (role: {current_user.role})")
-        elif current_user.role == "FACULTY":
-            query = query.eq("is_frozen", True).in_("approval_status", ["COORDINATOR_VERIFIED", "HOD_APPROVED"])
-            print(f"[TIMETABLE_VERSIONS] Filtering for frozen+verified/approved timetables (role: {current_user.role})")
-            
-        response = query.execute()
-        print(f"[TIMETABLE_VERSIONS] Raw response data count: {len(response.data or [])}")
-        if response.data:
-            print(f"[TIMETABLE_VERSIONS] First row sample: {response.data[0]}")
-        rows = [_hydrate_version_row(row) for row in (response.data or [])]
-        
-        # Sort to show the correct latest version:
-        # Priority 1: Frozen/Approved timetables (HOD_APPROVED + is_frozen) - these are FINAL
-        # Priority 2: Frozen/Verified timetables (COORDINATOR_VERIFIED + is_frozen) - ready for HOD review
-        # Priority 3: Active timetables that are not frozen - working drafts
-        # Priority 4: Approved but inactive timetables - archived approved versions
-        # Priority 5: Other timetables - drafts, rejected, etc.
-        def sort_key(row):
-            is_active = row.get("is_active", False)
-            is_frozen = row.get("is_frozen", False)
-            approval_status = row.get("approval_status", "")
-            created_at = row.get("created_at", "")
-            
-            # Frozen + Approved timetables are FINAL and should always be shown first
-            if is_frozen and approval_status == "HOD_APPROVED":
-                priority = 5
-            # Frozen + Verified timetables are ready for HOD review
-            elif is_frozen and approval_status == "COORDINATOR_VERIFIED":
-                priority = 4
-            elif is_active:
-                priority = 3
-            elif approval_status == "HOD_APPROVED":
-                priority = 2
-            else:
-                priority = 1
-            
-            # Return tuple for sorting: higher priority first, then newer created_at first
-            return (-priority, created_at)
-        
-        # Sort with reverse=True to get newest created_at first within each priority
-        rows.sort(key=sort_key, reverse=True)
+        # Ranked current-first (frozen approved, frozen verified, active draft, archived
+        # approved, rest; newest first within each) and filtered to what the role may see.
+        # Students only get frozen HOD-approved versions, faculty frozen verified/approved ones.
+        rows = [
+            _hydrate_version_row(row)
+            for row in versions_for_role(supabase, target_dept_id, current_user.role)
+        ]
         print(f"[TIMETABLE_VERSIONS] Found {len(rows)} timetable versions")
         if rows:
             print(f"[TIMETABLE_VERSIONS] Latest version: {rows[0].get('version_id')} (active={rows[0].get('is_active')}, frozen={rows[0].get('is_frozen')}, status={rows[0].get('approval_status')}, created={rows[0].get('created_at')})")
@@ -366,6 +332,80 @@ async def audit_timetable_version_conflicts(
         )
 
 
+@router.get("/{version_id}/diff", response_model=SuccessResponse)
+async def diff_timetable_version(
+    version_id: str,
+    against: str | None = None,
+    current_user: CurrentUser = Depends(get_current_user_with_profile),
+) -> dict:
+    """Entries moved, added, removed or reassigned to another faculty since ``against``.
+
+    ``against`` defaults to the version this one was derived from (its parent).
+    """
+    try:
+        repository = as_timetable_repository(get_service_supabase())
+        version = repository.fetch_version(version_id)
+        if not version:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Timetable version not found")
+        base_version_id = against or version.get("parent_version_id")
+        if not base_version_id:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="This version has no parent version; pass `against` to compare it with another version.",
+            )
+        base_version = repository.fetch_version(str(base_version_id))
+        if not base_version:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Base timetable version not found")
+        if current_user.role != "ADMIN":
+            user_d = canonical_department_id(current_user.department_id)
+            if not user_d or any(
+                canonical_department_id(row.get("department_id")) != user_d for row in (version, base_version)
+            ):
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Timetable version not found")
+        return {
+            "data": diff_versions(repository, str(base_version_id), version_id),
+            "message": "Timetable version diff computed.",
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to diff timetable versions: {str(e)}",
+        )
+
+
+@router.post("/compact", response_model=SuccessResponse)
+async def compact_timetable_versions(
+    max_chain: int | None = Query(None, ge=0),
+    department_id: str | None = None,
+    current_user: CurrentUser = Depends(get_current_user_with_profile),
+) -> dict:
+    """Store delta versions deeper than ``max_chain`` (default: settings) in full again."""
+    if current_user.role != "ADMIN":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can compact timetable versions")
+    try:
+        report = compact_long_chains(
+            as_timetable_repository(get_service_supabase()),
+            max_chain=max_chain,
+            department_id=department_id,
+        )
+        invalidate_effective_versions(canonical_department_id(department_id))
+        return {
+            "data": report,
+            "message": f"Compacted {len(report['compacted'])} timetable version(s).",
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to compact timetable versions: {str(e)}",
+        )
+
+
 @router.get("/{version_id}", response_model=SuccessResponse)
 async def get_timetable_version(
     version_id: str,
@@ -408,6 +448,7 @@ async def create_timetable_version(
             .insert(create_data)
             .execute()
         )
+        invalidate_effective_versions(create_data.get("department_id"))
         rows = [_hydrate_version_row(row) for row in (response.data or [])]
         return {
             "data": rows,
@@ -440,6 +481,8 @@ async def update_timetable_version(
             .eq("version_id", version_id)
             .execute()
         )
+        for row in response.data or []:
+            invalidate_effective_versions(row.get("department_id"))
         rows = [_hydrate_version_row(row) for row in (response.data or [])]
         return {
             "data": rows,
@@ -460,6 +503,8 @@ async def delete_timetable_version(
     """Delete a timetable version and its associated entries."""
     try:
         supabase = get_service_supabase()
+        # Versions stored as deltas against this one get their own copy of its entries first
+        detach_children(as_timetable_repository(supabase), [version_id])
         # Delete child timetable_entries first to satisfy foreign key constraint
         supabase.table("timetable_entries").delete().eq("version_id", version_id).execute()
         response = (
@@ -468,6 +513,8 @@ async def delete_timetable_version(
             .eq("version_id", version_id)
             .execute()
         )
+        invalidate_version_entries(version_id)
+        invalidate_effective_versions((response.data or [{}])[0].get("department_id"))
         return {
             "data": response.data,
             "message": "Timetable version deleted successfully",
@@ -523,6 +570,7 @@ async def debug_freeze_verified_timetables(
             .eq("is_frozen", False)
             .execute()
         )
+        invalidate_effective_versions()
         
         return {
             "data": {
@@ -604,6 +652,7 @@ async def verify_timetable_version(
         # Get department HOD
         version_data = response.data[0] if response.data else {}
         dept_id = version_data.get("department_id")
+        invalidate_effective_versions(dept_id)
         
         if dept_id:
             hod_response = (
@@ -617,14 +666,14 @@ async def verify_timetable_version(
             if hod_response.data:
                 for hod in hod_response.data:
                     try:
-                        supabase.table("notification_log").insert({
+                        log_notifications(supabase, [{
                             "notification_type": "TIMETABLE_VERIFICATION",
                             "recipient_email": hod["email"],
                             "recipient_type": "HOD",
                             "subject": "Timetable Ready for Approval",
                             "body": f"A timetable version has been verified by coordinator and is ready for your approval.",
                             "status": "SENT"
-                        }).execute()
+                        }])
                     except Exception as e:
                         print(f"Failed to send notification: {e}")
         
@@ -708,6 +757,7 @@ async def approve_timetable_version(
             supabase.table("timetable_versions").update({
                 "is_active": False
             }).eq("department_id", dept_id).neq("version_id", version_id).execute()
+        invalidate_effective_versions(dept_id)
         
         # Send notification to coordinator about approval
         try:
@@ -722,14 +772,14 @@ async def approve_timetable_version(
             for coordinator in (coordinators_response.data or []):
                 if coordinator.get("email"):
                     try:
-                        supabase.table("notification_log").insert({
+                        log_notifications(supabase, [{
                             "notification_type": "TIMETABLE_APPROVED",
                             "recipient_email": coordinator["email"],
                             "recipient_type": "COORDINATOR",
                             "subject": "Timetable Approved and Frozen",
                             "body": f"The timetable has been approved by HOD and is now frozen for the period {wef_date} to {to_date}.",
                             "status": "SENT"
-                        }).execute()
+                        }])
                     except Exception as e:
                         print(f"Failed to send coordinator notification: {e}")
         except Exception as e:
@@ -788,6 +838,7 @@ async def reject_timetable_version(
             .eq("version_id", version_id)
             .execute()
         )
+        invalidate_effective_versions((response.data or [{}])[0].get("department_id"))
         
         return {
             "data": _hydrate_version_row(response.data[0] if response.data else {}),
@@ -876,6 +927,7 @@ async def extend_timetable_validity(
         
         # Notify HOD about extension
         dept_id = version_data.get("department_id")
+        invalidate_effective_versions(dept_id)
         if dept_id:
             try:
                 hod_response = (
@@ -889,14 +941,14 @@ async def extend_timetable_validity(
                 for hod in (hod_response.data or []):
                     if hod.get("email"):
                         try:
-                            supabase.table("notification_log").insert({
+                            log_notifications(supabase, [{
                                 "notification_type": "TIMETABLE_EXTENDED",
                                 "recipient_email": hod["email"],
                                 "recipient_type": "HOD",
                                 "subject": "Timetable Validity Extended",
                                 "body": f"Coordinator has extended the timetable validity to {request.new_to_date}.",
                                 "status": "SENT"
-                            }).execute()
+                            }])
                         except Exception as e:
                             print(f"Failed to send HOD notification: {e}")
             except Exception as e:
@@ -969,6 +1021,7 @@ async def unfreeze_timetable_version(
         
         # Notify coordinator about unfreeze
         dept_id = version_data.get("department_id")
+        invalidate_effective_versions(dept_id)
         if dept_id:
             try:
                 coordinators_response = (
@@ -982,14 +1035,14 @@ async def unfreeze_timetable_version(
                 for coordinator in (coordinators_response.data or []):
                     if coordinator.get("email"):
                         try:
-                            supabase.table("notification_log").insert({
+                            log_notifications(supabase, [{
                                 "notification_type": "TIMETABLE_UNFROZEN",
                                 "recipient_email": coordinator["email"],
                                 "recipient_type": "COORDINATOR",
                                 "subject": "Timetable Unfrozen",
                                 "body": "The HOD has unfrozen the timetable. You can now make modifications or regenerate it.",
                                 "status": "SENT"
-                            }).execute()
+                            }])
                         except Exception as e:
                             print(f"Failed to send coordinator notification: {e}")
             except Exception as e:
@@ -1013,7 +1066,11 @@ async def unfreeze_timetable_version(
 async def check_expiring_timetables(
     current_user: CurrentUser = Depends(get_current_user_with_profile),
 ) -> dict:
-    """Check for timetables that are expiring soon or need deletion."""
+    """Report timetables that are expiring soon or due for deletion.
+
+    Read-only: notifications and auto-deletion are done by the maintenance
+    scheduler's ``timetable_expiry`` job, whose last run is included.
+    """
     try:
         supabase = get_service_supabase()
         
@@ -1021,58 +1078,14 @@ async def check_expiring_timetables(
         response = supabase.rpc("check_expiring_timetables").execute()
         
         expiring = response.data or []
-        
-        # Process notifications and deletions
-        for item in expiring:
-            version_id = item.get("version_id")
-            should_notify = item.get("should_notify")
-            should_delete = item.get("should_delete")
-            
-            if should_notify:
-                # Send notification to coordinator
-                dept_id = item.get("department_id")
-                if dept_id:
-                    try:
-                        coordinators = (
-                            supabase.table("user_profiles")
-                            .select("email")
-                            .eq("department_id", dept_id)
-                            .eq("role", "COORDINATOR")
-                            .execute()
-                        )
-                        
-                        for coordinator in (coordinators.data or []):
-                            if coordinator.get("email"):
-                                supabase.table("notification_log").insert({
-                                    "notification_type": "TIMETABLE_EXPIRING",
-                                    "recipient_email": coordinator["email"],
-                                    "recipient_type": "COORDINATOR",
-                                    "subject": "Timetable Expiring Soon",
-                                    "body": f"A timetable will expire on {item.get('to_date')}. Please extend it if needed, or it will be auto-deleted 7 days after expiry.",
-                                    "status": "SENT"
-                                }).execute()
-                        
-                        # Mark as notified
-                        from datetime import datetime
-                        supabase.table("timetable_versions").update({
-                            "expiry_notified_at": datetime.utcnow().isoformat()
-                        }).eq("version_id", version_id).execute()
-                    except Exception as e:
-                        print(f"Failed to notify about expiring timetable: {e}")
-            
-            if should_delete:
-                # Auto-delete expired timetable
-                try:
-                    supabase.table("timetable_versions").delete().eq("version_id", version_id).execute()
-                    print(f"Auto-deleted expired timetable: {version_id}")
-                except Exception as e:
-                    print(f"Failed to auto-delete timetable: {e}")
+        expiry_job = get_maintenance_scheduler().jobs.get(TIMETABLE_EXPIRY)
         
         return {
             "data": {
                 "expiring_count": len([x for x in expiring if x.get("should_notify")]),
                 "deleted_count": len([x for x in expiring if x.get("should_delete")]),
-                "details": expiring
+                "details": expiring,
+                "maintenance": expiry_job.as_dict() if expiry_job else None,
             },
             "message": "Expiry check completed"
         }
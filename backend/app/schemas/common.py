@@ -82,3 +82,10 @@ class SuccessResponse(BaseModel):
 
     data: dict | list | None = None
     message: str = "Success"
+
+
+class PageResponse(SuccessResponse):
+    """Success response for keyset-paginated lists."""
+
+    next_cursor: str | None = None
+    """Opaque cursor for the next page, or None on the last page."""
@@ -0,0 +1,102 @@
+"""Which timetable version is current for a department, as each role sees it.
+
+Versions rank frozen HOD-approved first, then frozen coordinator-verified, then the
+active draft, then archived approved versions, then everything else; newest first
+within a rank. Students only see frozen approved versions and faculty frozen
+verified/approved ones. The ranked list is loaded once per department and cached;
+status changes and generation call :func:`invalidate_effective_versions`.
+"""
+from __future__ import annotations
+
+from typing import Any
+
+from app.config import settings
+from app.services.ttl_cache import TTLCache
+
+# approval_status values each restricted role may see (frozen versions only).
+ROLE_VISIBLE_STATUSES: dict[str, tuple[str, ...]] = {
+    "STUDENT": ("HOD_APPROVED",),
+    "FACULTY": ("COORDINATOR_VERIFIED", "HOD_APPROVED"),
+}
+
+_ALL_DEPARTMENTS = "*"
+
+# department_id (or "*" for all departments) -> ranked version rows
+_rankings = TTLCache(ttl_seconds=settings.effective_version_cache_ttl_seconds, max_entries=256)
+
+
+def version_rank(row: dict[str, Any]) -> int:
+    is_frozen = bool(row.get("is_frozen"))
+    approval_status = row.get("approval_status") or ""
+    if is_frozen and approval_status == "HOD_APPROVED":
+        return 5
+    if is_frozen and approval_status == "COORDINATOR_VERIFIED":
+        return 4
+    if row.get("is_active"):
+        return 3
+    if approval_status == "HOD_APPROVED":
+        return 2
+    return 1
+
+
+def visible_to_role(row: dict[str, Any], role: str | None) -> bool:
+    statuses = ROLE_VISIBLE_STATUSES.get(str(role or "").upper())
+    if statuses is None:
+        return True
+    return bool(row.get("is_frozen")) and row.get("approval_status") in statuses
+
+
+def _department_key(department_id: str | None) -> str:
+    text = str(department_id or "").strip()
+    return text or _ALL_DEPARTMENTS
+
+
+def ranked_versions(supabase: Any, department_id: str | None = None) -> list[dict[str, Any]]:
+    """Every version of a department (``None`` = all departments), current first."""
+    key = _department_key(department_id)
+
+    def _load() -> tuple[dict[str, Any], ...]:
+        query = supabase.table("timetable_versions").select("*")
+        if key != _ALL_DEPARTMENTS:
+            query = query.eq("department_id", key)
+        rows = query.order("created_at", desc=True).execute().data or []
+        # Stable sort: newest first within a rank comes from the query order.
+        return tuple(sorted(rows, key=version_rank, reverse=True))
+
+    return list(_rankings.get_or_load(key, _load))
+
+
+def versions_for_role(supabase: Any, department_id: str | None, role: str | None) -> list[dict[str, Any]]:
+    return [row for row in ranked_versions(supabase, department_id) if visible_to_role(row, role)]
+
+
+def get_effective_version(supabase: Any, department_id: str | None, role: str | None = None) -> dict[str, Any] | None:
+    """The version ``role`` should be shown for ``department_id`` (``None`` if it may see none)."""
+    return next(iter(versions_for_role(supabase, department_id, role)), None)
+
+
+def get_effective_version_id(supabase: Any, department_id: str | None, role: str | None = None) -> str | None:
+    version = get_effective_version(supabase, department_id, role)
+    return str(version["version_id"]) if version and version.get("version_id") else None
+
+
+def get_active_draft(supabase: Any, department_id: str | None) -> dict[str, Any] | None:
+    """The newest active, unfrozen version: what critique and repair runs work on."""
+    return next(
+        (row for row in ranked_versions(supabase, department_id) if row.get("is_active") and not row.get("is_frozen")),
+        None,
+    )
+
+
+def invalidate_effective_versions(department_id: str | None = None) -> None:
+    """A version of ``department_id`` changed status, appeared or went away (``None`` = unknown)."""
+    key = _department_key(department_id)
+    if key == _ALL_DEPARTMENTS:
+        _rankings.clear()
+        return
+    _rankings.invalidate(key)
+    _rankings.invalidate(_ALL_DEPARTMENTS)
+
+
+def effective_version_cache_stats() -> dict[str, Any]:
+    return _rankings.stats()
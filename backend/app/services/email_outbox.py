@@ -0,0 +1,284 @@
+"""Durable email outbox over ``notification_log``.
+
+Rows enqueued with ``status='PENDING'`` and an ``email_html`` body are claimed in
+batches by a background worker, sent over the pooled SMTP connections and marked
+``SENT`` (with ``delivered_at``) or retried with exponential backoff until
+``email_max_attempts`` is reached, after which they become ``FAILED``.
+Rows without ``email_html`` are in-app notifications only and are never touched.
+"""
+from __future__ import annotations
+
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable
+
+from app.config import settings
+from app.services.email_service import build_email_message
+from app.services.notification_inbox import note_notifications_logged
+from app.services.response_cache import NOTIFICATIONS, bump_watermark
+from app.services.smtp_pool import SMTPConnectionPool, get_smtp_pool
+
+_CLAIM_LEASE_SECONDS = 300
+_BACKOFF_CAP_SECONDS = 3600
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _setting(name: str, default: Any) -> Any:
+    value = getattr(settings, name, None)
+    return default if value in (None, "") else value
+
+
+class RateLimiter:
+    """Token bucket shared by all sender threads (``rate_per_second <= 0`` disables it)."""
+
+    def __init__(self, rate_per_second: float, burst: int | None = None):
+        self.rate = float(rate_per_second)
+        self.capacity = float(burst or max(1, int(self.rate) or 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def enqueue_emails(supabase, rows: list[dict]) -> int:
+    """Insert outbox rows; each needs ``recipient_email``, ``email_subject`` and ``email_html``.
+
+    The usual notification_log columns (type, subject, body, ...) are kept so the rows
+    still show up in the in-app inbox.
+    """
+    now_iso = _now().isoformat()
+    payload = []
+    for row in rows:
+        if not (row.get("recipient_email") or "").strip() or not row.get("email_html"):
+            continue
+        payload.append(
+            {
+                **row,
+                "status": "PENDING",
+                "attempts": 0,
+                "next_attempt_at": now_iso,
+            }
+        )
+    if not payload:
+        return 0
+    batch_size = int(_setting("email_outbox_batch_size", 100))
+    for start in range(0, len(payload), batch_size):
+        supabase.table("notification_log").insert(payload[start:start + batch_size]).execute()
+    note_notifications_logged(payload)
+    wake_email_outbox()
+    return len(payload)
+
+
+class EmailOutboxWorker:
+    """Claims due outbox rows and delivers them; ``run_once`` is usable without the thread."""
+
+    def __init__(
+        self,
+        supabase_factory: Callable[[], Any] | None = None,
+        pool: SMTPConnectionPool | None = None,
+        *,
+        batch_size: int | None = None,
+        rate_per_second: float | None = None,
+        max_attempts: int | None = None,
+        backoff_seconds: float | None = None,
+        poll_seconds: float | None = None,
+    ):
+        if supabase_factory is None:
+            from app.supabase_client import get_service_supabase
+
+            supabase_factory = get_service_supabase
+        self._supabase_factory = supabase_factory
+        self._pool = pool
+        self.batch_size = int(batch_size or _setting("email_outbox_batch_size", 100))
+        self.max_attempts = int(max_attempts or _setting("email_max_attempts", 5))
+        self.backoff_seconds = float(backoff_seconds or _setting("email_retry_backoff_seconds", 30.0))
+        self.poll_seconds = float(poll_seconds or _setting("email_outbox_poll_seconds", 10.0))
+        self.rate_limiter = RateLimiter(
+            rate_per_second if rate_per_second is not None else float(_setting("email_rate_per_second", 5.0))
+        )
+        self.metrics = {"sent": 0, "retried": 0, "failed": 0, "batches": 0, "last_run_at": None}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def pool(self) -> SMTPConnectionPool:
+        return self._pool or get_smtp_pool()
+
+    def _claim(self, supabase) -> list[dict]:
+        now = _now()
+        due = (
+            supabase.table("notification_log")
+            .select("notification_id")
+            .in_("status", ["PENDING", "SENDING"])
+            .lte("next_attempt_at", now.isoformat())
+            .not_.is_("email_html", "null")
+            .order("next_attempt_at")
+            .limit(self.batch_size)
+            .execute()
+            .data
+            or []
+        )
+        ids = [row["notification_id"] for row in due if row.get("notification_id")]
+        if not ids:
+            return []
+        # Conditional update: only rows still due are returned, so concurrent workers
+        # (other API processes) never claim the same row.
+        lease_until = (now + timedelta(seconds=_CLAIM_LEASE_SECONDS)).isoformat()
+        return (
+            supabase.table("notification_log")
+            .update({"status": "SENDING", "next_attempt_at": lease_until})
+            .in_("notification_id", ids)
+            .in_("status", ["PENDING", "SENDING"])
+            .lte("next_attempt_at", now.isoformat())
+            .execute()
+            .data
+            or []
+        )
+
+    def _deliver(self, row: dict) -> tuple[str | None, bool]:
+        """Returns ``(error, permanent)``; 5xx rejections are not retried."""
+        self.rate_limiter.acquire()
+        try:
+            message = build_email_message(
+                str(row.get("recipient_email") or ""),
+                str(row.get("email_subject") or row.get("subject") or ""),
+                str(row.get("email_html") or ""),
+            )
+            self.pool.send(message)
+            return None, False
+        except smtplib.SMTPRecipientsRefused as exc:
+            return str(exc), True
+        except smtplib.SMTPResponseException as exc:
+            return str(exc), 500 <= int(exc.smtp_code or 0) < 600
+        except Exception as exc:
+            return str(exc) or exc.__class__.__name__, False
+
+    def run_once(self) -> dict[str, int]:
+        """Claim and send one batch; returns counts for that batch."""
+        supabase = self._supabase_factory()
+        rows = self._claim(supabase)
+        result = {"claimed": len(rows), "sent": 0, "retried": 0, "failed": 0}
+        if not rows:
+            return result
+
+        with ThreadPoolExecutor(max_workers=self.pool.size) as executor:
+            outcomes = list(executor.map(self._deliver, rows))
+
+        now = _now()
+        sent_ids = [row["notification_id"] for row, (error, _) in zip(rows, outcomes) if error is None]
+        if sent_ids:
+            supabase.table("notification_log").update(
+                {"status": "SENT", "delivered_at": now.isoformat(), "last_error": None}
+            ).in_("notification_id", sent_ids).execute()
+            result["sent"] = len(sent_ids)
+
+        for row, (error, permanent) in zip(rows, outcomes):
+            if error is None:
+                continue
+            attempts = int(row.get("attempts") or 0) + 1
+            update: dict[str, Any] = {"attempts": attempts, "last_error": error[:500]}
+            if permanent or attempts >= self.max_attempts:
+                update["status"] = "FAILED"
+                result["failed"] += 1
+            else:
+                delay = min(_BACKOFF_CAP_SECONDS, self.backoff_seconds * (2 ** (attempts - 1)))
+                update["status"] = "PENDING"
+                update["next_attempt_at"] = (now + timedelta(seconds=delay)).isoformat()
+                result["retried"] += 1
+            supabase.table("notification_log").update(update).eq("notification_id", row["notification_id"]).execute()
+
+        bump_watermark(NOTIFICATIONS)
+        self.metrics["sent"] += result["sent"]
+        self.metrics["retried"] += result["retried"]
+        self.metrics["failed"] += result["failed"]
+        self.metrics["batches"] += 1
+        return result
+
+    def drain(self, max_batches: int = 1000) -> dict[str, int]:
+        """Send until nothing is due (or ``max_batches`` is reached)."""
+        totals = {"claimed": 0, "sent": 0, "retried": 0, "failed": 0}
+        for _ in range(max_batches):
+            batch = self.run_once()
+            for key in totals:
+                totals[key] += batch[key]
+            if batch["claimed"] < self.batch_size:
+                break
+        self.metrics["last_run_at"] = _now().isoformat()
+        return totals
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.drain()
+            except Exception as exc:
+                print(f"[EMAIL OUTBOX] Drain failed: {exc}")
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="email-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+
+
+_worker: EmailOutboxWorker | None = None
+
+
+def get_email_outbox_worker() -> EmailOutboxWorker:
+    global _worker
+    if _worker is None:
+        _worker = EmailOutboxWorker()
+    return _worker
+
+
+def start_email_outbox_worker() -> None:
+    # With the maintenance scheduler on, draining is one of its jobs instead of a thread here
+    if _setting("email_outbox_enabled", False) and not _setting("maintenance_enabled", True):
+        get_email_outbox_worker().start()
+
+
+def stop_email_outbox_worker() -> None:
+    if _worker is not None:
+        _worker.stop()
+    get_smtp_pool().close()
+
+
+def wake_email_outbox() -> None:
+    """Nudge the worker so freshly enqueued mail goes out without waiting for the next poll."""
+    if _worker is not None:
+        _worker.wake()
+    from app.services.maintenance_scheduler import wake_maintenance_job
+
+    wake_maintenance_job("email_outbox")
@@ -1,7 +1,7 @@
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from app.config import settings
+from app.services.smtp_pool import get_smtp_pool
 
 def send_user_credentials(to_email: str, name: str, password: str, role: str, identifier: str | None = None):
     """Send credentials email for non-student users."""
@@ -30,21 +30,7 @@ def send_user_credentials(to_email: str, name: str, password: str, role: str, id
     </html>
     """
 
-    message = MIMEMultipart()
-    message["From"] = settings.smtp_username
-    message["To"] = to_email
-    message["Subject"] = subject
-    message.attach(MIMEText(html_content, "html"))
-
-    try:
-        with smtplib.SMTP(settings.smtp_server, settings.smtp_port) as server:
-            server.starttls()
-            server.login(settings.smtp_username, settings.smtp_password)
-            server.send_message(message)
-        return True
-    except Exception as e:
-        print(f"Failed to send email: {e}")
-        return False
+    return _send_email(to_email, subject, html_content)
 
 
 def send_faculty_credentials(to_email: str, name: str, password: str, faculty_id: str):
@@ -233,13 +219,12 @@ def send_slot_covered_notification(to_email: str, student_name: str, original_fa
     return _send_email(to_email, subject, html_content)
 
 
-def send_revised_timetable_update_email(
-    to_email: str,
+def render_revised_timetable_update_email(
     student_name: str,
     leave_date: str,
     update_lines: list[str],
-) -> bool:
-    """Send revised day timetable updates to student."""
+) -> tuple[str, str]:
+    """Subject and HTML body of the revised day timetable email."""
     rows_html = "".join(f"<li>{line}</li>" for line in (update_lines or []))
     if not rows_html:
         rows_html = "<li>No revised slots for your division.</li>"
@@ -264,6 +249,17 @@ def send_revised_timetable_update_email(
         </body>
     </html>
     """
+    return subject, html_content
+
+
+def send_revised_timetable_update_email(
+    to_email: str,
+    student_name: str,
+    leave_date: str,
+    update_lines: list[str],
+) -> bool:
+    """Send revised day timetable updates to student."""
+    subject, html_content = render_revised_timetable_update_email(student_name, leave_date, update_lines)
     return _send_email(to_email, subject, html_content)
 
 
@@ -327,19 +323,19 @@ def send_coordinator_transfer_complete_notice(*, old_email: str, new_name: str,
     return _send_email(old_email, subject, html_content)
 
 
-def _send_email(to_email: str, subject: str, html_content: str) -> bool:
-    """Internal helper to send email."""
+def build_email_message(to_email: str, subject: str, html_content: str) -> MIMEMultipart:
     message = MIMEMultipart()
     message["From"] = settings.smtp_username
     message["To"] = to_email
     message["Subject"] = subject
     message.attach(MIMEText(html_content, "html"))
+    return message
+
 
+def _send_email(to_email: str, subject: str, html_content: str) -> bool:
+    """Internal helper to send email (over the shared SMTP connection pool)."""
     try:
-        with smtplib.SMTP(settings.smtp_server, settings.smtp_port) as server:
-            server.starttls()
-            server.login(settings.smtp_username, settings.smtp_password)
-            server.send_message(message)
+        get_smtp_pool().send(build_email_message(to_email, subject, html_content))
         return True
     except Exception as e:
         print(f"Failed to send email to {to_email}: {e}")
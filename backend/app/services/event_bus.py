@@ -0,0 +1,188 @@
+"""In-process pub/sub that fans data-change events out to SSE/WebSocket subscribers.
+
+Topics are ``department:<id>``, ``user:<email>`` and ``broadcast``; subscribers to
+``department:*`` (admins) see every department event. Publishing is thread-safe and
+non-blocking: each subscriber owns a bounded queue on its event loop, and a slow
+consumer whose queue overflows is sent a single ``resync`` event instead of the
+backlog.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import threading
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from typing import Any, Iterable
+
+from app.config import settings
+
+BROADCAST = "broadcast"
+ALL_DEPARTMENTS = "department:*"
+
+_REPLAY_BUFFER_SIZE = 512
+
+
+def department_topic(department_id: str) -> str:
+    return f"department:{department_id}"
+
+
+def user_topic(email: str) -> str:
+    return f"user:{str(email).strip().lower()}"
+
+
+def _setting(name: str, default: Any) -> Any:
+    value = getattr(settings, name, None)
+    return default if value in (None, 0) else value
+
+
+class Subscription:
+    """One connected client; ``get`` is awaited on the loop that created it."""
+
+    def __init__(self, topics: Iterable[str], loop: asyncio.AbstractEventLoop, queue_size: int):
+        self.topics = frozenset(topics)
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(2, queue_size))
+        self.dropped = 0
+        self.closed = False
+
+    def offer(self, event: dict[str, Any]) -> None:
+        """Runs on ``self.loop``; never blocks the publisher."""
+        if self.closed:
+            return
+        if self.queue.full():
+            # The client is too slow to keep up: drop the backlog and ask it to refetch.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait({"id": event.get("id"), "type": "resync", "reason": "overflow"})
+            return
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: float) -> dict[str, Any] | None:
+        """Next event, or None when ``timeout`` passes (time for a heartbeat)."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBus:
+    def __init__(self, queue_size: int | None = None, max_subscribers: int | None = None):
+        self.queue_size = int(queue_size or _setting("event_stream_queue_size", 64))
+        self.max_subscribers = int(max_subscribers or _setting("event_stream_max_subscribers", 5000))
+        self._by_topic: dict[str, set[Subscription]] = defaultdict(set)
+        self._count = 0
+        self._ids = itertools.count(1)
+        self._recent: deque[tuple[int, frozenset, dict]] = deque(maxlen=_REPLAY_BUFFER_SIZE)
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, topics: Iterable[str]) -> Subscription | None:
+        """Register the calling coroutine's loop; None when the worker is at capacity."""
+        subscription = Subscription(topics, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                return None
+            for topic in subscription.topics:
+                self._by_topic[topic].add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            if subscription.closed:
+                return
+            subscription.closed = True
+            for topic in subscription.topics:
+                subscribers = self._by_topic.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        self._by_topic.pop(topic, None)
+            self._count -= 1
+
+    def publish(self, topics: Iterable[str], event_type: str, payload: dict[str, Any] | None = None) -> int:
+        """Deliver one event to every subscriber of any of ``topics``; returns the fan-out."""
+        topics = frozenset(topics)
+        if any(topic.startswith("department:") for topic in topics):
+            topics = topics | {ALL_DEPARTMENTS}
+        with self._lock:
+            event = {
+                "id": next(self._ids),
+                "type": event_type,
+                "at": datetime.now(timezone.utc).isoformat(),
+                **(payload or {}),
+            }
+            self._recent.append((event["id"], topics, event))
+            targets: set[Subscription] = set()
+            for topic in topics:
+                targets.update(self._by_topic.get(topic, ()))
+            self.published += 1
+
+        # One callback per event loop rather than one per subscriber.
+        by_loop: dict[asyncio.AbstractEventLoop, list[Subscription]] = defaultdict(list)
+        for subscription in targets:
+            by_loop[subscription.loop].append(subscription)
+        for loop, subscriptions in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_fan_out, subscriptions, event)
+            except RuntimeError:
+                # Loop already closed (worker shutting down).
+                pass
+        return len(targets)
+
+    def replay_since(self, last_event_id: int, topics: Iterable[str]) -> list[dict[str, Any]] | None:
+        """Events after ``last_event_id`` for ``topics``; None if they left the buffer."""
+        topics = frozenset(topics)
+        with self._lock:
+            if not self._recent or last_event_id < self._recent[0][0] - 1:
+                return None
+            return [event for event_id, event_topics, event in self._recent if event_id > last_event_id and event_topics & topics]
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "subscribers": self._count,
+                "topics": len(self._by_topic),
+                "published": self.published,
+                "max_subscribers": self.max_subscribers,
+            }
+
+
+def _fan_out(subscriptions: list[Subscription], event: dict[str, Any]) -> None:
+    for subscription in subscriptions:
+        subscription.offer(event)
+
+
+_bus = EventBus()
+
+
+def get_event_bus() -> EventBus:
+    return _bus
+
+
+def publish_change(topics: Iterable[str], department_id: str | None = None) -> None:
+    """Announce that data under ``topics`` changed (clients refetch, usually a cheap 304)."""
+    scope = department_topic(department_id) if department_id else BROADCAST
+    for topic in topics:
+        _bus.publish([scope], f"{topic}.changed", {"department_id": department_id})
+
+
+def publish_notifications(rows: Iterable[dict[str, Any]]) -> None:
+    """Tell each recipient of freshly inserted notification_log rows about them."""
+    by_email: dict[str, list[dict]] = defaultdict(list)
+    for row in rows:
+        email = str(row.get("recipient_email") or "").strip().lower()
+        if email:
+            by_email[email].append(row)
+    for email, items in by_email.items():
+        _bus.publish(
+            [user_topic(email)],
+            "notification.created",
+            {
+                "count": len(items),
+                "notification_types": sorted({str(item.get("notification_type") or "") for item in items}),
+                "subject": items[-1].get("subject"),
+            },
+        )
@@ -0,0 +1,545 @@
+"""Institute-wide timetable generation: departments solved in parallel, then reconciled.
+
+Room and faculty rows belong to one department, so resources shared between departments
+are matched by identity (room number; faculty email, else name). After the independent
+solves every (resource, day, slot) cell held by more than one department is a collision.
+In each collision the larger department keeps the cell and the others yield; yielding
+departments are re-solved with every other department's cells reserved. After
+``timetable_institute_rounds`` rounds, departments still colliding are re-solved one at a
+time, which cannot collide. Versions are only written once the institute is consistent
+and every department has a timetable.
+"""
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterable
+from uuid import uuid4
+
+from app.config import settings
+from app.services.timetable_orchestrator import TimetableOrchestrationEngine
+from app.services.timetable_repository import TimetableRepository, get_timetable_repository, set_timetable_repository
+from app.services.timetable_scheduling_types import GenerationOptions, faculty_resource_key, room_resource_key
+
+_MAX_RETAINED_JOBS = 20
+_MAX_JOB_EVENTS = 200
+
+# (shared resource key, day_id, slot_id)
+Cell = tuple[str, int, str]
+
+_jobs: dict[str, "InstituteGenerationJob"] = {}
+
+
+def institute_worker_count(departments: int) -> int:
+    configured = int(getattr(settings, "timetable_institute_workers", 0) or 0)
+    return max(1, min(configured or os.cpu_count() or 1, max(departments, 1)))
+
+
+def _init_worker() -> None:
+    # Workers are spawned, not forked (the parent runs threads and holds open clients);
+    # each opens its own repository from settings.
+    set_timetable_repository(None)
+
+
+def _solve_department(
+    department_id: str,
+    user_id: str | None,
+    reason: str | None,
+    options: GenerationOptions,
+    repository: TimetableRepository | None = None,
+) -> dict[str, Any]:
+    """One department subproblem; in a worker process the repository comes from settings."""
+    result = TimetableOrchestrationEngine(repository).run(
+        user_id=user_id,
+        department_id=department_id,
+        persist=False,
+        reason=reason,
+        options=options,
+    )
+    return {key: result.get(key) for key in ("run_id", "final_timetable", "summary")}
+
+
+@dataclass
+class DepartmentOutcome:
+    department_id: str
+    # pending | solved | fixed (frozen + approved, kept as is) | failed | persisted
+    status: str = "pending"
+    solves: int = 0
+    requested_sessions: int = 0
+    result: dict[str, Any] | None = field(default=None, repr=False)
+    cells: set[Cell] = field(default_factory=set, repr=False)
+    version_id: str | None = None
+    error: str | None = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in {"solved", "fixed", "persisted"}
+
+    def as_dict(self) -> dict[str, Any]:
+        summary = (self.result or {}).get("summary") or {}
+        return {
+            "department_id": self.department_id,
+            "status": self.status,
+            "solves": self.solves,
+            "requested_sessions": summary.get("requested_sessions", self.requested_sessions),
+            "scheduled_sessions": summary.get("scheduled_sessions"),
+            "unscheduled_sessions": summary.get("unscheduled_sessions"),
+            "is_valid": (summary.get("validation") or {}).get("is_valid"),
+            "shared_cells": len(self.cells),
+            "version_id": self.version_id,
+            "error": self.error,
+        }
+
+
+@dataclass
+class CoordinationReport:
+    executor: str = "process"
+    workers: int = 1
+    shared_rooms: int = 0
+    shared_faculty: int = 0
+    initial_collisions: int = 0
+    rounds: list[dict[str, Any]] = field(default_factory=list)
+    settled_one_by_one: list[str] = field(default_factory=list)
+    remaining_collisions: int = 0
+    # True only once every department was saved; see persisted_departments otherwise.
+    persisted: bool = False
+    persisted_departments: list[str] = field(default_factory=list)
+    persist_failed_department: str | None = None
+    elapsed_ms: float = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "executor": self.executor,
+            "workers": self.workers,
+            "shared_rooms": self.shared_rooms,
+            "shared_faculty": self.shared_faculty,
+            "initial_collisions": self.initial_collisions,
+            "rounds": list(self.rounds),
+            "settled_one_by_one": list(self.settled_one_by_one),
+            "remaining_collisions": self.remaining_collisions,
+            "persisted": self.persisted,
+            "persisted_departments": list(self.persisted_departments),
+            "persist_failed_department": self.persist_failed_department,
+            "elapsed_ms": round(self.elapsed_ms, 1),
+        }
+
+
+class InstituteCoordinator:
+    """Solves every department, negotiates shared cells and persists consistent versions."""
+
+    def __init__(
+        self,
+        *,
+        repository: TimetableRepository | None = None,
+        user_id: str | None = None,
+        reason: str | None = None,
+        options: GenerationOptions | None = None,
+        max_rounds: int | None = None,
+        on_progress: Callable[[dict[str, Any]], None] | None = None,
+    ) -> None:
+        self.repository = repository or get_timetable_repository()
+        self.engine = TimetableOrchestrationEngine(self.repository)
+        self.user_id = user_id
+        self.reason = reason
+        self.options = options or GenerationOptions.from_settings()
+        if max_rounds is None:
+            max_rounds = getattr(settings, "timetable_institute_rounds", None)
+        # 0 rounds skips negotiation: colliding departments are settled one by one.
+        self.max_rounds = max(0, int(3 if max_rounds is None else max_rounds))
+        self.on_progress = on_progress
+        self.outcomes: dict[str, DepartmentOutcome] = {}
+        self.report = CoordinationReport()
+        self._room_keys: dict[str, str] = {}
+        self._faculty_keys: dict[str, str] = {}
+        # Worker processes open their own repository from settings; anything else (an
+        # in-memory SQLite database, an overridden repository) is shared with worker threads.
+        sqlite_path = getattr(self.repository, "path", None)
+        self._use_processes = self.repository is get_timetable_repository() and (
+            self.repository.backend == "supabase"
+            or (sqlite_path not in (None, ":memory:") and sqlite_path == getattr(settings, "sqlite_database_path", None))
+        )
+
+    def _progress(self, phase: str, message: str, **details: Any) -> None:
+        if self.on_progress is not None:
+            self.on_progress({"phase": phase, "message": message, **details})
+
+    def department_ids(self, requested: Iterable[str] | None = None) -> list[str]:
+        """The requested departments, or every department with uploaded load rows."""
+        if requested:
+            return list(dict.fromkeys(str(item) for item in requested if item))
+        rows = self.repository.fetch_load_distribution()
+        return sorted({str(row["department_id"]) for row in rows if row.get("department_id")})
+
+    def _load_shared_resources(self, department_ids: list[str]) -> None:
+        """Map room/faculty ids to identities held by more than one of ``department_ids``."""
+        wanted = set(department_ids)
+        owners: dict[str, set[str]] = defaultdict(set)
+        room_keys: dict[str, str] = {}
+        faculty_keys: dict[str, str] = {}
+        for room in self.repository.fetch_rooms():
+            if str(room.get("department_id") or "") in wanted:
+                key = room_resource_key(room)
+                room_keys[str(room["room_id"])] = key
+                owners[key].add(str(room["department_id"]))
+        for faculty in self.repository.fetch_faculty():
+            if str(faculty.get("department_id") or "") in wanted:
+                key = faculty_resource_key(faculty)
+                faculty_keys[str(faculty["faculty_id"])] = key
+                owners[key].add(str(faculty["department_id"]))
+        shared = {key for key, departments in owners.items() if len(departments) > 1}
+        self._room_keys = {room_id: key for room_id, key in room_keys.items() if key in shared}
+        self._faculty_keys = {faculty_id: key for faculty_id, key in faculty_keys.items() if key in shared}
+        self.report.shared_rooms = len(set(self._room_keys.values()))
+        self.report.shared_faculty = len(set(self._faculty_keys.values()))
+
+    def _cells(self, entries: Iterable[dict[str, Any]]) -> set[Cell]:
+        cells: set[Cell] = set()
+        for entry in entries:
+            day_id = int(entry.get("day_id") or 0)
+            slot_id = str(entry.get("slot_id") or "")
+            room_key = self._room_keys.get(str(entry.get("room_id") or ""))
+            if room_key:
+                cells.add((room_key, day_id, slot_id))
+            faculty_key = self._faculty_keys.get(str(entry.get("faculty_id") or ""))
+            if faculty_key:
+                cells.add((faculty_key, day_id, slot_id))
+        return cells
+
+    def _frozen_entries(self, department_id: str) -> list[dict[str, Any]]:
+        for version in self.repository.fetch_versions(department_id=department_id, is_frozen=True):
+            if version.get("approval_status") == "HOD_APPROVED" and version.get("version_id"):
+                return self.repository.fetch_entries(str(version["version_id"]))
+        return []
+
+    def _reserved_for(self, department_id: str) -> set[Cell]:
+        reserved: set[Cell] = set()
+        for other in self.outcomes.values():
+            if other.department_id != department_id and other.active:
+                reserved |= other.cells
+        return reserved
+
+    def _record_solve(self, department_id: str, result: dict[str, Any] | None, error: Exception | None) -> None:
+        outcome = self.outcomes[department_id]
+        outcome.solves += 1
+        if error is not None:
+            outcome.status = "failed"
+            outcome.error = str(error)
+            outcome.cells = set()
+            self._progress("solve", f"Department {department_id} failed: {error}", department_id=department_id)
+            return
+        outcome.status = "solved"
+        outcome.result = result
+        outcome.requested_sessions = int(((result or {}).get("summary") or {}).get("requested_sessions") or 0)
+        outcome.cells = self._cells((result or {}).get("final_timetable") or [])
+        self._progress("solve", f"Department {department_id} solved", department=outcome.as_dict())
+
+    def _solve(self, pool: Executor, department_ids: list[str]) -> None:
+        """Re-solve ``department_ids`` in parallel, each against everyone else's current cells."""
+        repository = None if self._use_processes else self.repository
+        futures = {
+            department_id: pool.submit(
+                _solve_department,
+                department_id,
+                self.user_id,
+                self.reason,
+                replace(self.options, reserved_resource_slots=self._reserved_for(department_id)),
+                repository,
+            )
+            for department_id in department_ids
+        }
+        for department_id, future in futures.items():
+            try:
+                self._record_solve(department_id, future.result(), None)
+            except Exception as exc:
+                self._record_solve(department_id, None, exc)
+
+    def collisions(self) -> dict[Cell, set[str]]:
+        owners: dict[Cell, set[str]] = defaultdict(set)
+        for outcome in self.outcomes.values():
+            if outcome.active:
+                for cell in outcome.cells:
+                    owners[cell].add(outcome.department_id)
+        return {cell: departments for cell, departments in owners.items() if len(departments) > 1}
+
+    def _priority(self, department_id: str) -> tuple[int, int, str]:
+        """Higher keeps a contested cell: frozen timetables, then larger departments."""
+        outcome = self.outcomes[department_id]
+        return (outcome.status == "fixed", outcome.requested_sessions, department_id)
+
+    def _yielding(self, collisions: dict[Cell, set[str]]) -> list[str]:
+        yielding: set[str] = set()
+        for departments in collisions.values():
+            keeper = max(departments, key=self._priority)
+            yielding.update(department for department in departments if department != keeper)
+        return sorted(yielding, key=self._priority)
+
+    def _executor(self, workers: int) -> Executor:
+        if self._use_processes:
+            return ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="institute-solve")
+
+    def _persist(self, job_id: str | None) -> None:
+        """Save every solved department, or nothing when any of them has no timetable.
+
+        Saving replaces a department's versions and cannot be undone, so a failure part
+        way leaves the departments before it saved; the report names them and the failure.
+        """
+        to_save = [outcome for outcome in self.outcomes.values() if outcome.status != "fixed"]
+        unsolved = [
+            outcome.department_id
+            for outcome in to_save
+            if outcome.status != "solved" or not (outcome.result or {}).get("final_timetable")
+        ]
+        if unsolved:
+            self._progress(
+                "persist",
+                f"Nothing was saved: no timetable for department(s) {', '.join(unsolved)}",
+                departments=unsolved,
+            )
+            return
+        self._progress("persist", "Saving versions for all departments")
+        for outcome in to_save:
+            try:
+                outcome.version_id = self.engine.persist_version(
+                    department_id=outcome.department_id,
+                    user_id=self.user_id,
+                    reason=self.reason or f"Institute generation job {job_id or 'run'}",
+                    entries=outcome.result["final_timetable"],
+                )
+            except Exception as exc:
+                outcome.error = str(exc)
+                self.report.persist_failed_department = outcome.department_id
+                saved = self.report.persisted_departments
+                self._progress(
+                    "persist",
+                    f"Saving department {outcome.department_id} failed after {len(saved)} of {len(to_save)} "
+                    f"department(s) were saved; the others keep their previous timetables",
+                    department_id=outcome.department_id,
+                    persisted_departments=list(saved),
+                )
+                return
+            outcome.status = "persisted"
+            self.report.persisted_departments.append(outcome.department_id)
+        self.report.persisted = True
+
+    def run(
+        self,
+        department_ids: Iterable[str] | None = None,
+        *,
+        persist: bool = True,
+        job_id: str | None = None,
+    ) -> dict[str, Any]:
+        started = time.perf_counter()
+        selected = self.department_ids(department_ids)
+        if not selected:
+            raise ValueError("No departments with uploaded load distribution found for institute generation.")
+        self.outcomes = {department_id: DepartmentOutcome(department_id) for department_id in selected}
+        self._load_shared_resources(selected)
+
+        pending: list[str] = []
+        for department_id in selected:
+            try:
+                self.engine.ensure_not_frozen(department_id)
+                pending.append(department_id)
+            except ValueError:
+                # A frozen, approved timetable stays; its shared cells are fixed for the others.
+                outcome = self.outcomes[department_id]
+                outcome.status = "fixed"
+                outcome.cells = self._cells(self._frozen_entries(department_id))
+
+        workers = institute_worker_count(len(pending))
+        self.report.executor = "process" if self._use_processes else "thread"
+        self.report.workers = workers
+        self._progress(
+            "solve",
+            f"Solving {len(pending)} department(s) with {workers} {self.report.executor} worker(s)",
+            departments=len(pending),
+            fixed=len(selected) - len(pending),
+        )
+        with self._executor(workers) as pool:
+            # Independent solves: frozen departments' cells are the only reservations.
+            self._solve(pool, pending)
+            collisions = self.collisions()
+            self.report.initial_collisions = len(collisions)
+            for round_index in range(1, self.max_rounds + 1):
+                if not collisions:
+                    break
+                yielding = self._yielding(collisions)
+                self._progress(
+                    "negotiate",
+                    f"Round {round_index}: {len(collisions)} shared cell(s) contested, re-solving {len(yielding)} department(s)",
+                    round=round_index,
+                    collisions=len(collisions),
+                    departments=yielding,
+                )
+                round_started = time.perf_counter()
+                self._solve(pool, yielding)
+                collisions = self.collisions()
+                self.report.rounds.append(
+                    {
+                        "round": round_index,
+                        "re_solved": yielding,
+                        "collisions_after": len(collisions),
+                        "elapsed_ms": round((time.perf_counter() - round_started) * 1000.0, 1),
+                    }
+                )
+            if collisions:
+                # Parallel re-solves can meet in cells neither held before; settle the rest one by one.
+                for department_id in self._yielding(collisions):
+                    self._progress("settle", f"Re-solving department {department_id} against all others", department_id=department_id)
+                    self._solve(pool, [department_id])
+                    self.report.settled_one_by_one.append(department_id)
+                collisions = self.collisions()
+        self.report.remaining_collisions = len(collisions)
+
+        if persist and not collisions:
+            self._persist(job_id)
+        elif collisions:
+            print(f"Warning: institute generation left {len(collisions)} shared cell(s) contested; nothing was saved")
+        self.report.elapsed_ms = (time.perf_counter() - started) * 1000.0
+        return {
+            "departments": [outcome.as_dict() for outcome in self.outcomes.values()],
+            "coordination": self.report.as_dict(),
+        }
+
+
+@dataclass
+class InstituteGenerationJob:
+    """In-process institute generation; progress is observable via ``snapshot`` / ``wait_for_change``."""
+
+    job_id: str
+    department_ids: list[str]
+    status: str = "queued"
+    phase: str | None = None
+    message: str | None = None
+    departments: dict[str, dict[str, Any]] = field(default_factory=dict)
+    events: list[dict[str, Any]] = field(default_factory=list)
+    result: dict[str, Any] | None = None
+    created_at: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    finished_at: str | None = None
+    _revision: int = 0
+    _task: asyncio.Task | None = field(default=None, repr=False)
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in {"completed", "failed"}
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "department_ids": list(self.department_ids),
+            "status": self.status,
+            "phase": self.phase,
+            "message": self.message,
+            "departments": list(self.departments.values()),
+            "events": list(self.events[-20:]),
+            "result": self.result,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+    def record(self, event: dict[str, Any]) -> None:
+        self.phase = event.get("phase")
+        self.message = event.get("message")
+        department = event.get("department")
+        if isinstance(department, dict):
+            self.departments[department["department_id"]] = department
+        self.events.append({key: value for key, value in event.items() if key != "department"})
+        del self.events[:-_MAX_JOB_EVENTS]
+        self.touch()
+
+    def touch(self) -> None:
+        self._revision += 1
+        self._changed.set()
+
+    async def wait_for_change(self, revision: int, timeout: float) -> int:
+        """Block until the job moves past ``revision`` (or ``timeout`` seconds elapse)."""
+        while self._revision == revision and not self.done:
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                break
+        return self._revision
+
+
+def _prune_jobs() -> None:
+    finished = sorted((job for job in _jobs.values() if job.done), key=lambda job: job.created_at)
+    for job in finished[: max(0, len(_jobs) - _MAX_RETAINED_JOBS)]:
+        _jobs.pop(job.job_id, None)
+
+
+def get_institute_job(job_id: str) -> InstituteGenerationJob | None:
+    return _jobs.get(job_id)
+
+
+def start_institute_job(
+    *,
+    department_ids: list[str] | None,
+    user_id: str | None,
+    reason: str | None,
+    options: GenerationOptions,
+    persist: bool = True,
+    max_rounds: int | None = None,
+) -> InstituteGenerationJob:
+    """Schedule an institute generation on the running event loop and return its job handle."""
+    _prune_jobs()
+    job = InstituteGenerationJob(job_id=str(uuid4()), department_ids=list(department_ids or []))
+    _jobs[job.job_id] = job
+    loop = asyncio.get_running_loop()
+    coordinator = InstituteCoordinator(
+        user_id=user_id,
+        reason=reason,
+        options=options,
+        max_rounds=max_rounds,
+        # The coordinator runs in a worker thread; job state is only touched on the loop.
+        on_progress=lambda event: loop.call_soon_threadsafe(job.record, event),
+    )
+
+    async def _run() -> None:
+        try:
+            job.status = "running"
+            job.touch()
+            job.result = await asyncio.to_thread(coordinator.run, department_ids, persist=persist, job_id=job.job_id)
+            job.departments = {item["department_id"]: item for item in job.result["departments"]}
+            coordination = job.result["coordination"]
+            job.status = "completed"
+            job.phase = "done"
+            failed_department = coordination["persist_failed_department"]
+            if coordination["remaining_collisions"]:
+                job.message = (
+                    f"{coordination['remaining_collisions']} shared cell collision(s) could not be resolved; nothing was saved"
+                )
+            elif failed_department:
+                saved = coordination["persisted_departments"]
+                job.message = (
+                    f"Saving department {failed_department} failed; only {len(saved)} department(s) were saved"
+                    + (f" ({', '.join(saved)})" if saved else "")
+                )
+            elif persist and not coordination["persisted"]:
+                job.message = "Not every department produced a timetable; nothing was saved"
+            else:
+                job.message = (
+                    f"Generated {len(job.departments)} department(s) with "
+                    f"{coordination['initial_collisions']} shared cell collision(s) resolved"
+                )
+        except Exception as exc:
+            job.status = "failed"
+            job.message = str(exc)
+        finally:
+            job.finished_at = datetime.now(timezone.utc).isoformat()
+            job.touch()
+
+    job._task = loop.create_task(_run())
+    return job
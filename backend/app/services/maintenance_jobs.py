@@ -0,0 +1,149 @@
+"""Periodic maintenance jobs run by the maintenance scheduler.
+
+Each job does its writes in set-based batches (one insert or update per kind of row,
+not one per version or recipient) and returns counts for the job run metrics.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+from app.config import settings
+from app.services.effective_version import (
+    get_effective_version,
+    invalidate_effective_versions,
+    ranked_versions,
+)
+from app.services.email_outbox import get_email_outbox_worker
+from app.services.notification_inbox import log_notifications
+from app.services.reference_data import get_reference_data
+from app.services.response_cache import NOTIFICATIONS, bump_watermark
+from app.services.timetable_calendar import get_timetable_calendar
+from app.services.timetable_repository import as_timetable_repository
+
+TIMETABLE_EXPIRY = "timetable_expiry"
+EMAIL_OUTBOX = "email_outbox"
+CACHE_WARMING = "cache_warming"
+OTP_CLEANUP = "otp_cleanup"
+
+
+def expire_timetable_versions(supabase) -> dict[str, Any]:
+    """Warn coordinators about versions nearing ``to_date`` and delete those past their grace period."""
+    items = supabase.rpc("check_expiring_timetables").execute().data or []
+    to_notify = [item for item in items if item.get("should_notify") and item.get("department_id")]
+    to_delete = [item for item in items if item.get("should_delete") and item.get("version_id")]
+
+    notifications: list[dict[str, Any]] = []
+    if to_notify:
+        department_ids = sorted({str(item["department_id"]) for item in to_notify})
+        coordinators = (
+            supabase.table("user_profiles")
+            .select("email, department_id")
+            .in_("department_id", department_ids)
+            .eq("role", "COORDINATOR")
+            .execute()
+            .data
+            or []
+        )
+        emails_by_department: dict[str, list[str]] = defaultdict(list)
+        for coordinator in coordinators:
+            if coordinator.get("email"):
+                emails_by_department[str(coordinator.get("department_id"))].append(coordinator["email"])
+        notifications = [
+            {
+                "notification_type": "TIMETABLE_EXPIRING",
+                "recipient_email": email,
+                "recipient_type": "COORDINATOR",
+                "subject": "Timetable Expiring Soon",
+                "body": f"A timetable will expire on {item.get('to_date')}. Please extend it if needed, or it will be auto-deleted 7 days after expiry.",
+                "status": "SENT",
+            }
+            for item in to_notify
+            for email in emails_by_department.get(str(item["department_id"]), [])
+        ]
+        log_notifications(supabase, notifications)
+        # Marked only after the notifications are in, so a failed run is retried
+        supabase.table("timetable_versions").update(
+            {"expiry_notified_at": datetime.utcnow().isoformat()}
+        ).in_("version_id", [str(item["version_id"]) for item in to_notify]).execute()
+        for department_id in department_ids:
+            bump_watermark(NOTIFICATIONS, department_id=department_id)
+
+    if to_delete:
+        # Flattens delta versions reading through them, then deletes rows with one query per table
+        as_timetable_repository(supabase).delete_versions([str(item["version_id"]) for item in to_delete])
+        for department_id in {item.get("department_id") for item in to_delete}:
+            invalidate_effective_versions(department_id)
+            bump_watermark(department_id=department_id)
+
+    return {
+        "checked": len(items),
+        "notified_versions": len(to_notify),
+        "notifications": len(notifications),
+        "deleted_versions": len(to_delete),
+    }
+
+
+def drain_email_outbox() -> dict[str, Any]:
+    return get_email_outbox_worker().drain()
+
+
+def warm_frozen_version_caches(supabase) -> dict[str, Any]:
+    """Rebuild the calendars of departments whose effective version is frozen.
+
+    Runs more often than the calendar ttl, so reads of published timetables never
+    hit a cold cache. Caches are per process, so every process runs this job.
+    """
+    from app.routers.timetable_versions import _hydrate_version_row
+
+    get_reference_data(supabase)
+    department_ids = sorted(
+        {str(row["department_id"]) for row in ranked_versions(supabase) if row.get("is_frozen") and row.get("department_id")}
+    )
+    warmed = 0
+    for department_id in department_ids:
+        version = get_effective_version(supabase, department_id)
+        if not version or not version.get("is_frozen"):
+            continue
+        get_timetable_calendar(supabase, _hydrate_version_row(version), refresh=True)
+        warmed += 1
+    return {"departments": len(department_ids), "calendars_warmed": warmed}
+
+
+def purge_stale_password_reset_otps(supabase, retention_hours: float) -> dict[str, Any]:
+    """Delete OTPs that expired (or were used) more than ``retention_hours`` ago."""
+    cutoff = (datetime.utcnow() - timedelta(hours=float(retention_hours))).isoformat()
+    expired = supabase.table("password_reset_otps").delete().lt("expires_at", cutoff).execute().data or []
+    used = (
+        supabase.table("password_reset_otps").delete().eq("used", True).lt("created_at", cutoff).execute().data or []
+    )
+    return {"expired_deleted": len(expired), "used_deleted": len(used)}
+
+
+def register_maintenance_jobs(scheduler, supabase_factory: Callable[[], Any] | None = None) -> None:
+    if supabase_factory is None:
+        from app.supabase_client import get_service_supabase
+
+        supabase_factory = get_service_supabase
+
+    scheduler.register(
+        TIMETABLE_EXPIRY,
+        settings.maintenance_expiry_interval_seconds,
+        lambda: expire_timetable_versions(supabase_factory()),
+    )
+    scheduler.register(
+        OTP_CLEANUP,
+        settings.maintenance_otp_cleanup_interval_seconds,
+        lambda: purge_stale_password_reset_otps(supabase_factory(), settings.maintenance_otp_retention_hours),
+    )
+    # Claims are conditional updates, so every process can drain the outbox safely
+    if settings.email_outbox_enabled:
+        scheduler.register(EMAIL_OUTBOX, settings.email_outbox_poll_seconds, drain_email_outbox, leader_only=False)
+    scheduler.register(
+        CACHE_WARMING,
+        settings.maintenance_cache_warm_interval_seconds,
+        lambda: warm_frozen_version_caches(supabase_factory()),
+        leader_only=False,
+        initial_delay_seconds=5.0,
+    )
@@ -0,0 +1,370 @@
+"""In-process scheduler for periodic maintenance jobs.
+
+Every API process runs one scheduler thread. Jobs registered as ``leader_only``
+(version expiry, OTP cleanup) run in just one of them, the process holding the
+leader lock: an exclusive lock file when all workers share a host, or a lease row
+in ``maintenance_leases`` when they do not. Per-process jobs (outbox draining,
+cache warming) run everywhere. Each job keeps run metrics; a failing job is logged
+and tried again at its next interval.
+"""
+from __future__ import annotations
+
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable
+
+from app.config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines
+    fcntl = None
+    import msvcrt
+
+_LOCK_FILE_NAME = "samayvidya-maintenance.lock"
+_LEASE_NAME = "maintenance"
+_MAX_IDLE_SECONDS = 30.0
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _setting(name: str, default: Any) -> Any:
+    value = getattr(settings, name, None)
+    return default if value in (None, "") else value
+
+
+class LeaderElector:
+    """No election: this process is always the leader (single-process deployments)."""
+
+    backend = "none"
+
+    def acquire(self) -> bool:
+        """Take or renew leadership; called on every scheduler tick."""
+        return True
+
+    def release(self) -> None:
+        pass
+
+
+class FileLockElector(LeaderElector):
+    """Leader = the process holding an exclusive lock on ``path``; the OS drops it if that process dies."""
+
+    backend = "file"
+
+    def __init__(self, path: str | None = None):
+        self.path = path or os.path.join(tempfile.gettempdir(), _LOCK_FILE_NAME)
+        self._handle = None
+
+    def acquire(self) -> bool:
+        if self._handle is not None:
+            return True
+        handle = open(self.path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            handle.close()
+            return False
+        self._handle = handle
+        return True
+
+    def release(self) -> None:
+        handle, self._handle = self._handle, None
+        if handle is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            handle.close()
+
+
+class LeaseElector(LeaderElector):
+    """Leader = holder of the unexpired ``maintenance_leases`` row, renewed on every tick.
+
+    Renewal and takeover are conditional updates, so two processes racing for an
+    expired lease cannot both win it.
+    """
+
+    backend = "lease"
+
+    def __init__(self, supabase_factory: Callable[[], Any] | None = None, lease_seconds: float | None = None):
+        if supabase_factory is None:
+            from app.supabase_client import get_service_supabase
+
+            supabase_factory = get_service_supabase
+        self._supabase_factory = supabase_factory
+        self.lease_seconds = float(lease_seconds or _setting("maintenance_lease_seconds", 60.0))
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def acquire(self) -> bool:
+        supabase = self._supabase_factory()
+        now = _now()
+        lease = {"holder": self.holder, "expires_at": (now + timedelta(seconds=self.lease_seconds)).isoformat()}
+        renewed = (
+            supabase.table("maintenance_leases")
+            .update(lease)
+            .eq("lease_name", _LEASE_NAME)
+            .eq("holder", self.holder)
+            .execute()
+            .data
+        )
+        if renewed:
+            return True
+        taken_over = (
+            supabase.table("maintenance_leases")
+            .update(lease)
+            .eq("lease_name", _LEASE_NAME)
+            .lt("expires_at", now.isoformat())
+            .execute()
+            .data
+        )
+        if taken_over:
+            return True
+        try:
+            supabase.table("maintenance_leases").insert({"lease_name": _LEASE_NAME, **lease}).execute()
+        except Exception:
+            # Primary key conflict: another process holds a live lease
+            return False
+        return True
+
+    def release(self) -> None:
+        try:
+            self._supabase_factory().table("maintenance_leases").update(
+                {"expires_at": _now().isoformat()}
+            ).eq("lease_name", _LEASE_NAME).eq("holder", self.holder).execute()
+        except Exception as exc:
+            print(f"[MAINTENANCE] Failed to release lease: {exc}")
+
+
+def build_leader_elector(mode: str | None = None) -> LeaderElector:
+    mode = str(mode or _setting("maintenance_leader_election", "file")).strip().lower()
+    if mode == "none":
+        return LeaderElector()
+    if mode == "lease":
+        return LeaseElector()
+    if mode == "file":
+        return FileLockElector(_setting("maintenance_lock_path", None))
+    raise ValueError(f"Unknown maintenance_leader_election: {mode!r} (expected file, lease or none)")
+
+
+@dataclass
+class MaintenanceJob:
+    name: str
+    interval_seconds: float
+    run: Callable[[], dict[str, Any]]
+    leader_only: bool = True
+    next_run_at: float = 0.0
+    runs: int = 0
+    failures: int = 0
+    skipped: int = 0
+    last_started_at: str | None = None
+    last_duration_ms: float | None = None
+    last_result: dict[str, Any] | None = None
+    last_error: str | None = None
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "interval_seconds": self.interval_seconds,
+            "leader_only": self.leader_only,
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped_not_leader": self.skipped,
+            "last_started_at": self.last_started_at,
+            "last_duration_ms": self.last_duration_ms,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+            "next_run_in_seconds": round(max(0.0, self.next_run_at - time.monotonic()), 1),
+        }
+
+
+class MaintenanceScheduler:
+    """Runs registered jobs at their intervals on one daemon thread; ``tick`` is usable without it."""
+
+    def __init__(self, elector: LeaderElector | None = None):
+        self.elector = elector or LeaderElector()
+        self.jobs: dict[str, MaintenanceJob] = {}
+        self.is_leader = False
+        self.ticks = 0
+        # How often leadership is re-checked (a lease must be renewed well before it expires)
+        lease_seconds = getattr(self.elector, "lease_seconds", None)
+        self.idle_seconds = min(_MAX_IDLE_SECONDS, lease_seconds / 3.0) if lease_seconds else _MAX_IDLE_SECONDS
+        self._run_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def register(
+        self,
+        name: str,
+        interval_seconds: float,
+        run: Callable[[], dict[str, Any]],
+        *,
+        leader_only: bool = True,
+        initial_delay_seconds: float = 0.0,
+    ) -> MaintenanceJob:
+        job = MaintenanceJob(
+            name=name,
+            interval_seconds=max(1.0, float(interval_seconds)),
+            run=run,
+            leader_only=leader_only,
+            next_run_at=time.monotonic() + max(0.0, float(initial_delay_seconds)),
+        )
+        self.jobs[name] = job
+        return job
+
+    def _elect(self) -> bool:
+        try:
+            leader = bool(self.elector.acquire())
+        except Exception as exc:
+            print(f"[MAINTENANCE] Leader election failed: {exc}")
+            leader = False
+        if leader != self.is_leader:
+            print(f"[MAINTENANCE] {'Acquired' if leader else 'Lost'} maintenance leadership ({self.elector.backend})")
+        self.is_leader = leader
+        return leader
+
+    def _execute(self, job: MaintenanceJob) -> dict[str, Any]:
+        started = time.perf_counter()
+        job.last_started_at = _now().isoformat()
+        job.runs += 1
+        try:
+            result = job.run() or {}
+            job.last_result = result
+            job.last_error = None
+            return result
+        except Exception as exc:
+            job.failures += 1
+            job.last_error = str(exc) or exc.__class__.__name__
+            print(f"[MAINTENANCE] Job {job.name} failed: {job.last_error}")
+            raise
+        finally:
+            job.last_duration_ms = round((time.perf_counter() - started) * 1000.0, 2)
+            job.next_run_at = time.monotonic() + job.interval_seconds
+
+    def run_job(self, name: str) -> dict[str, Any]:
+        """Run one job now in this process; leader-only jobs need this process to lead."""
+        job = self.jobs.get(name)
+        if job is None:
+            raise KeyError(name)
+        with self._run_lock:
+            if job.leader_only and not self._elect():
+                raise PermissionError(f"Another process is the maintenance leader; {name} runs there.")
+            return self._execute(job)
+
+    def tick(self) -> int:
+        """Run every due job once; returns how many ran."""
+        ran = 0
+        with self._run_lock:
+            self.ticks += 1
+            leader = self._elect()
+            now = time.monotonic()
+            for job in list(self.jobs.values()):
+                if job.next_run_at > now:
+                    continue
+                if job.leader_only and not leader:
+                    job.skipped += 1
+                    job.next_run_at = now + job.interval_seconds
+                    continue
+                try:
+                    self._execute(job)
+                except Exception:
+                    pass
+                ran += 1
+        return ran
+
+    def _seconds_until_due(self) -> float:
+        now = time.monotonic()
+        due = min((job.next_run_at for job in self.jobs.values()), default=now + self.idle_seconds)
+        return max(0.0, min(self.idle_seconds, due - now))
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as exc:
+                print(f"[MAINTENANCE] Tick failed: {exc}")
+            self._wake.wait(self._seconds_until_due())
+            self._wake.clear()
+
+    def wake(self, name: str | None = None) -> None:
+        """Run ``name`` (or just re-check due jobs) without waiting for the next interval."""
+        job = self.jobs.get(name) if name else None
+        if job is not None:
+            job.next_run_at = 0.0
+        self._wake.set()
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+        if self.is_leader:
+            self.elector.release()
+            self.is_leader = False
+
+    @property
+    def running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def status(self) -> dict[str, Any]:
+        return {
+            "running": self.running,
+            "leader": self.is_leader,
+            "leader_election": self.elector.backend,
+            "pid": os.getpid(),
+            "ticks": self.ticks,
+            "jobs": [job.as_dict() for job in self.jobs.values()],
+        }
+
+
+_scheduler: MaintenanceScheduler | None = None
+
+
+def get_maintenance_scheduler() -> MaintenanceScheduler:
+    global _scheduler
+    if _scheduler is None:
+        from app.services.maintenance_jobs import register_maintenance_jobs
+
+        _scheduler = MaintenanceScheduler(build_leader_elector())
+        register_maintenance_jobs(_scheduler)
+    return _scheduler
+
+
+def start_maintenance_scheduler() -> None:
+    if _setting("maintenance_enabled", True):
+        get_maintenance_scheduler().start()
+
+
+def stop_maintenance_scheduler() -> None:
+    if _scheduler is not None:
+        _scheduler.stop()
+
+
+def wake_maintenance_job(name: str) -> None:
+    """Nudge a job if this process runs the scheduler (no-op otherwise)."""
+    if _scheduler is not None and _scheduler.running:
+        _scheduler.wake(name)
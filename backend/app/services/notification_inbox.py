@@ -0,0 +1,160 @@
+"""Per-recipient notification inbox: keyset cursors, read state and cached unread counts.
+
+Read state lives in ``notification_log.read_at`` (see ``sql/notification_inbox.sql``).
+Unread counts are cached per recipient and adjusted in place whenever notifications
+are logged through :func:`log_notifications` or marked read here; entries still expire
+after ``notification_unread_cache_ttl_seconds`` so writes made by other workers are
+picked up eventually.
+"""
+from __future__ import annotations
+
+import base64
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterable
+
+from app.config import settings
+from app.services.event_bus import publish_notifications
+
+
+def normalize_email(email: str | None) -> str:
+    return str(email or "").strip().lower()
+
+
+def encode_cursor(sent_at: Any, notification_id: Any) -> str:
+    raw = f"{sent_at}|{notification_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    """Return ``(sent_at, notification_id)``; raises ValueError for malformed cursors."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sent_at, notification_id = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8").split("|", 1)
+    except Exception as exc:
+        raise ValueError("Invalid cursor") from exc
+    if not sent_at or not notification_id or '"' in sent_at or '"' in notification_id:
+        raise ValueError("Invalid cursor")
+    return sent_at, notification_id
+
+
+def keyset_filter(cursor: str) -> str:
+    """PostgREST ``or`` filter selecting rows strictly after ``cursor`` in newest-first order."""
+    sent_at, notification_id = decode_cursor(cursor)
+    return (
+        f'sent_at.lt."{sent_at}",'
+        f'and(sent_at.eq."{sent_at}",notification_id.lt."{notification_id}")'
+    )
+
+
+class UnreadCounter:
+    """Recipient -> unread count, adjusted in place; entries expire after ``ttl_seconds``."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 10000):
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_entries = max(1, int(max_entries))
+        self._counts: dict[str, tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, email: str, loader: Callable[[], int]) -> int:
+        key = normalize_email(email)
+        now = time.monotonic()
+        with self._lock:
+            item = self._counts.get(key)
+            if item is not None and item[0] >= now:
+                return item[1]
+        count = max(0, int(loader() or 0))
+        self.set(key, count)
+        return count
+
+    def set(self, email: str, count: int) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        key = normalize_email(email)
+        with self._lock:
+            if key not in self._counts and len(self._counts) >= self.max_entries:
+                now = time.monotonic()
+                for stale in [name for name, (expires, _) in self._counts.items() if expires < now]:
+                    del self._counts[stale]
+                if len(self._counts) >= self.max_entries:
+                    self._counts.pop(next(iter(self._counts)))
+            self._counts[key] = (time.monotonic() + self.ttl_seconds, max(0, int(count)))
+
+    def adjust(self, email: str, delta: int) -> None:
+        """Apply ``delta`` to a cached count; uncached recipients are loaded on their next read."""
+        key = normalize_email(email)
+        with self._lock:
+            item = self._counts.get(key)
+            if item is not None:
+                # Keep the original expiry so drift from other workers stays bounded.
+                self._counts[key] = (item[0], max(0, item[1] + int(delta)))
+
+    def invalidate(self, email: str) -> None:
+        with self._lock:
+            self._counts.pop(normalize_email(email), None)
+
+
+_unread_counter = UnreadCounter(float(getattr(settings, "notification_unread_cache_ttl_seconds", 300.0) or 0.0))
+
+
+def get_unread_counter() -> UnreadCounter:
+    return _unread_counter
+
+
+def note_notifications_logged(rows: Iterable[dict[str, Any]]) -> None:
+    """Bump cached unread counts and notify recipients for rows just inserted."""
+    rows = list(rows)
+    per_email: dict[str, int] = {}
+    for row in rows:
+        email = normalize_email(row.get("recipient_email"))
+        if email and not row.get("read_at"):
+            per_email[email] = per_email.get(email, 0) + 1
+    for email, count in per_email.items():
+        _unread_counter.adjust(email, count)
+    publish_notifications(rows)
+
+
+def log_notifications(supabase, rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Insert notification_log rows (skipping ones without a recipient) in one request."""
+    rows = [row for row in rows if normalize_email(row.get("recipient_email"))]
+    if not rows:
+        return []
+    response = supabase.table("notification_log").insert(rows).execute()
+    note_notifications_logged(rows)
+    return response.data or []
+
+
+def count_unread(supabase, recipient_email: str) -> int:
+    def load() -> int:
+        response = (
+            supabase.table("notification_log")
+            .select("notification_id", count="exact")
+            .eq("recipient_email", recipient_email)
+            .is_("read_at", "null")
+            .limit(1)
+            .execute()
+        )
+        return int(response.count or 0)
+
+    return _unread_counter.get(recipient_email, load)
+
+
+def mark_read(supabase, recipient_email: str, notification_ids: list[str] | None = None) -> list[dict[str, Any]]:
+    """Set ``read_at`` on the recipient's unread notifications (all of them when ``notification_ids`` is None)."""
+    query = (
+        supabase.table("notification_log")
+        .update({"read_at": datetime.now(timezone.utc).isoformat()})
+        .eq("recipient_email", recipient_email)
+        .is_("read_at", "null")
+    )
+    if notification_ids is not None:
+        if not notification_ids:
+            return []
+        query = query.in_("notification_id", notification_ids)
+    updated = query.execute().data or []
+    if notification_ids is None:
+        _unread_counter.set(recipient_email, 0)
+    else:
+        _unread_counter.adjust(recipient_email, -len(updated))
+    return updated
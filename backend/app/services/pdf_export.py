@@ -0,0 +1,380 @@
+"""Timetable PDF/HTML rendering pool with admission control, plus bulk ZIP export."""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import math
+import os
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Callable
+from uuid import uuid4
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_MAX_RETAINED_JOBS = 20
+
+_render_pool: ProcessPoolExecutor | None = None
+_jobs: dict[str, "PdfExportJob"] = {}
+
+
+def render_pool_size() -> int:
+    configured = int(getattr(settings, "pdf_render_workers", 0) or 0)
+    return max(1, configured or min(4, os.cpu_count() or 1))
+
+
+def get_render_pool() -> ProcessPoolExecutor:
+    """Shared ReportLab worker pool (created lazily, reused across requests)."""
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = ProcessPoolExecutor(max_workers=render_pool_size())
+    return _render_pool
+
+
+def shutdown_render_pool() -> None:
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+        _render_pool = None
+
+
+class RenderQueueFull(Exception):
+    """Raised when the render pool and its wait queue are both full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"PDF renderer is busy; retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+@dataclass
+class RenderStats:
+    in_flight: int = 0
+    completed: int = 0
+    failed: int = 0
+    rejected: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    ewma_ms: float = 0.0
+
+    def record(self, elapsed_ms: float, ok: bool) -> None:
+        if ok:
+            self.completed += 1
+        else:
+            self.failed += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.ewma_ms = elapsed_ms if self.ewma_ms <= 0 else 0.8 * self.ewma_ms + 0.2 * elapsed_ms
+
+    def snapshot(self) -> dict[str, Any]:
+        finished = self.completed + self.failed
+        return {
+            "workers": render_pool_size(),
+            "capacity": render_capacity(),
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_ms": round(self.total_ms / finished, 1) if finished else 0.0,
+            "recent_ms": round(self.ewma_ms, 1),
+            "max_ms": round(self.max_ms, 1),
+        }
+
+
+_stats = RenderStats()
+
+
+def render_capacity() -> int:
+    """Renders allowed at once: one per worker plus ``pdf_render_queue_depth`` waiting."""
+    queue_depth = int(getattr(settings, "pdf_render_queue_depth", 8) or 0)
+    return render_pool_size() + max(0, queue_depth)
+
+
+def render_stats() -> dict[str, Any]:
+    return _stats.snapshot()
+
+
+def _retry_after_seconds() -> int:
+    workers = render_pool_size()
+    waiting = max(1, _stats.in_flight - workers + 1)
+    estimate_ms = (_stats.ewma_ms or 1000.0) * waiting / workers
+    return max(1, math.ceil(estimate_ms / 1000.0))
+
+
+async def submit_render(
+    render_fn: Callable[[dict[str, Any]], Any],
+    payload: dict[str, Any],
+    *,
+    label: str = "render",
+) -> tuple[Any, float]:
+    """Run one interactive render in the pool; returns ``(result, elapsed_ms)``.
+
+    Raises ``RenderQueueFull`` instead of queueing unboundedly when saturated.
+    """
+    if _stats.in_flight >= render_capacity():
+        _stats.rejected += 1
+        raise RenderQueueFull(_retry_after_seconds())
+
+    _stats.in_flight += 1
+    started = time.perf_counter()
+    ok = False
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(get_render_pool(), render_fn, payload)
+        ok = True
+        return result, (time.perf_counter() - started) * 1000.0
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        _stats.in_flight -= 1
+        _stats.record(elapsed_ms, ok)
+        logger.info("%s %s in %.1f ms (in flight: %d)", label, "rendered" if ok else "failed", elapsed_ms, _stats.in_flight)
+
+
+@dataclass
+class ExportItem:
+    """One file in the bulk export: an archive path plus the picklable render arguments."""
+
+    section: str
+    entity_id: str
+    arcname: str
+    payload: dict[str, Any]
+
+
+@dataclass
+class ExportResult:
+    item: ExportItem
+    content: bytes | None
+    error: str | None
+    elapsed_ms: float
+
+
+class _ZipChunkWriter:
+    """Write-only sink for ``zipfile`` that hands back bytes as they are produced.
+
+    It deliberately has no ``tell``/``seek`` so ``zipfile`` falls back to its
+    streaming mode (local headers + data descriptors).
+    """
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        return None
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+async def iter_rendered(
+    items: list[ExportItem],
+    render_fn: Callable[[dict[str, Any]], bytes],
+) -> AsyncIterator[ExportResult]:
+    """Render every item in the process pool and yield results in completion order.
+
+    At most one render per worker is outstanding, so a bulk export never queues
+    ahead of interactive downloads by more than one round. Its renders count as in
+    flight, so interactive downloads arriving while it fills the pool get only the
+    ``pdf_render_queue_depth`` waiting slots (then 429) rather than queueing unseen.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_render_pool()
+    window = render_pool_size()
+
+    async def _run(item: ExportItem) -> ExportResult:
+        _stats.in_flight += 1
+        started = time.perf_counter()
+        try:
+            content = await loop.run_in_executor(pool, render_fn, item.payload)
+            result = ExportResult(item, content, None, (time.perf_counter() - started) * 1000.0)
+        except Exception as exc:
+            result = ExportResult(item, None, str(exc), (time.perf_counter() - started) * 1000.0)
+        finally:
+            _stats.in_flight -= 1
+        _stats.record(result.elapsed_ms, result.error is None)
+        return result
+
+    pending_items = list(items)
+    running: set[asyncio.Task] = set()
+    try:
+        while pending_items or running:
+            while pending_items and len(running) < window:
+                running.add(asyncio.ensure_future(_run(pending_items.pop(0))))
+            done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in running:
+            task.cancel()
+
+
+async def stream_export_zip(
+    items: list[ExportItem],
+    render_fn: Callable[[dict[str, Any]], bytes],
+    on_result: Callable[[ExportResult], Any] | None = None,
+) -> AsyncIterator[bytes]:
+    """Yield ZIP bytes incrementally; each PDF is written as soon as its render completes.
+
+    A ``manifest.json`` listing every file (with failures and render times) closes the archive.
+    """
+    sink = _ZipChunkWriter()
+    manifest: list[dict[str, Any]] = []
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        async for result in iter_rendered(items, render_fn):
+            if result.content is not None:
+                archive.writestr(result.item.arcname, result.content)
+            manifest.append(
+                {
+                    "file": result.item.arcname,
+                    "section": result.item.section,
+                    "entity_id": result.item.entity_id,
+                    "status": "ok" if result.error is None else "failed",
+                    "error": result.error,
+                    "render_ms": round(result.elapsed_ms, 1),
+                }
+            )
+            if on_result is not None:
+                on_result(result)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+    tail = sink.drain()
+    if tail:
+        yield tail
+
+
+@dataclass
+class PdfExportJob:
+    """In-process background export; progress is observable via ``snapshot`` / ``wait_for_change``."""
+
+    job_id: str
+    version_id: str
+    status: str = "queued"
+    total: int = 0
+    completed: int = 0
+    failed: int = 0
+    current_file: str | None = None
+    errors: list[dict[str, str]] = field(default_factory=list)
+    message: str | None = None
+    zip_path: str | None = None
+    download_name: str | None = None
+    created_at: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    finished_at: str | None = None
+    _revision: int = 0
+    _task: asyncio.Task | None = field(default=None, repr=False)
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in {"completed", "failed"}
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "version_id": self.version_id,
+            "status": self.status,
+            "total": self.total,
+            "completed": self.completed,
+            "failed": self.failed,
+            "current_file": self.current_file,
+            "errors": list(self.errors),
+            "message": self.message,
+            "download_name": self.download_name,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+    def touch(self) -> None:
+        self._revision += 1
+        self._changed.set()
+
+    async def wait_for_change(self, revision: int, timeout: float) -> int:
+        """Block until the job moves past ``revision`` (or ``timeout`` seconds elapse)."""
+        while self._revision == revision and not self.done:
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                break
+        return self._revision
+
+
+def _export_dir() -> str:
+    path = os.path.join(tempfile.gettempdir(), "samayvidya-exports")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _prune_jobs() -> None:
+    finished = sorted((job for job in _jobs.values() if job.done), key=lambda job: job.created_at)
+    for job in finished[: max(0, len(_jobs) - _MAX_RETAINED_JOBS)]:
+        _jobs.pop(job.job_id, None)
+        if job.zip_path:
+            try:
+                os.remove(job.zip_path)
+            except OSError:
+                pass
+
+
+def get_export_job(job_id: str) -> PdfExportJob | None:
+    return _jobs.get(job_id)
+
+
+def start_export_job(
+    version_id: str,
+    build_items: Callable[[], tuple[list[ExportItem], str]],
+    render_fn: Callable[[dict[str, Any]], bytes],
+) -> PdfExportJob:
+    """Schedule a bulk export on the running event loop and return its job handle.
+
+    ``build_items`` is a blocking loader (runs in a worker thread) returning the
+    export items and the archive's download filename.
+    """
+    _prune_jobs()
+    job = PdfExportJob(job_id=str(uuid4()), version_id=version_id)
+    _jobs[job.job_id] = job
+
+    async def _run() -> None:
+        try:
+            items, download_name = await asyncio.to_thread(build_items)
+            job.status = "running"
+            job.total = len(items)
+            job.download_name = download_name
+            job.touch()
+
+            def _on_result(result: ExportResult) -> None:
+                job.completed += 1
+                job.current_file = result.item.arcname
+                if result.error is not None:
+                    job.failed += 1
+                    job.errors.append({"file": result.item.arcname, "error": result.error})
+                job.touch()
+
+            zip_path = os.path.join(_export_dir(), f"{job.job_id}.zip")
+            with open(zip_path, "wb") as handle:
+                async for chunk in stream_export_zip(items, render_fn, on_result=_on_result):
+                    handle.write(chunk)
+            job.zip_path = zip_path
+            job.status = "completed"
+            job.message = f"Exported {job.completed - job.failed} of {job.total} PDFs"
+        except Exception as exc:
+            job.status = "failed"
+            job.message = str(exc)
+        finally:
+            job.current_file = None
+            job.finished_at = datetime.now(timezone.utc).isoformat()
+            job.touch()
+
+    job._task = asyncio.get_running_loop().create_task(_run())
+    return job
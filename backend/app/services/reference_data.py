@@ -0,0 +1,210 @@
+"""Shared in-process cache of the small reference tables timetable views are labelled with.
+
+Views fetch bare ``timetable_entries`` rows and ship one deduplicated lookup dictionary
+(only the referenced ids) instead of embedding division/subject/room/... objects in
+every row. The cache is keyed on the ``REFERENCE_DATA`` watermark, so writes through the
+master-data routes reload it on the next read.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any
+
+from app.services.response_cache import REFERENCE_DATA, get_data_watermark
+from app.services.ttl_cache import TTLCache
+
+# table -> (lookup name, id column, columns kept when present)
+REFERENCE_TABLES: dict[str, tuple[str, str, tuple[str, ...]]] = {
+    "divisions": ("divisions", "division_id", ("division_name", "year", "department_id")),
+    "subjects": ("subjects", "subject_id", ("subject_name", "subject_code", "subject_type", "sub_short_form")),
+    "faculty": ("faculty", "faculty_id", ("faculty_name", "faculty_code", "email")),
+    "rooms": ("rooms", "room_id", ("room_name", "room_number", "room_type")),
+    "batches": ("batches", "batch_id", ("batch_name", "batch_code")),
+    "days": ("days", "day_id", ("day_name", "day_order", "is_working_day")),
+    "time_slots": ("slots", "slot_id", ("start_time", "end_time", "slot_order", "is_break")),
+}
+
+# Entry column -> lookup it references.
+_ENTRY_REFERENCES = {
+    "division_id": "divisions",
+    "subject_id": "subjects",
+    "faculty_id": "faculty",
+    "room_id": "rooms",
+    "batch_id": "batches",
+    "day_id": "days",
+    "slot_id": "slots",
+}
+
+COMPACT_ENTRY_COLUMNS = (
+    "entry_id",
+    "day_id",
+    "slot_id",
+    "division_id",
+    "subject_id",
+    "faculty_id",
+    "room_id",
+    "batch_id",
+    "session_type",
+)
+
+VIEW_FORMATS = ("compact", "grid", "expanded")
+
+_PAGE_SIZE = 1000
+_CACHE_TTL_SECONDS = 600.0
+
+_reference_cache = TTLCache(ttl_seconds=_CACHE_TTL_SECONDS, max_entries=4)
+
+
+def _key(value: Any) -> str:
+    return "" if value in (None, "") else str(value)
+
+
+@dataclass
+class ReferenceData:
+    """Reference rows by lookup name and id (ids as strings, as in JSON objects)."""
+
+    tables: dict[str, dict[str, dict[str, Any]]] = field(default_factory=dict)
+
+    def get(self, lookup: str, row_id: Any) -> dict[str, Any] | None:
+        return self.tables.get(lookup, {}).get(_key(row_id))
+
+    def lookups_for(self, entries: list[dict[str, Any]]) -> dict[str, dict[str, dict[str, Any]]]:
+        """Only the reference rows the entries point at, one copy each."""
+        wanted: dict[str, set[str]] = defaultdict(set)
+        for entry in entries:
+            for column, lookup in _ENTRY_REFERENCES.items():
+                value = _key(entry.get(column))
+                if value:
+                    wanted[lookup].add(value)
+        result: dict[str, dict[str, dict[str, Any]]] = {}
+        for lookup, ids in wanted.items():
+            rows = self.tables.get(lookup, {})
+            result[lookup] = {row_id: rows[row_id] for row_id in sorted(ids) if row_id in rows}
+        return result
+
+    def ordered_days(self) -> list[str]:
+        rows = self.tables.get("days", {})
+        working = [
+            row_id
+            for row_id, row in rows.items()
+            if row.get("is_working_day") is not False
+        ]
+        return sorted(working, key=lambda row_id: (rows[row_id].get("day_order") or 0, _sort_id(row_id)))
+
+    def ordered_slots(self) -> list[str]:
+        rows = self.tables.get("slots", {})
+        return sorted(rows, key=lambda row_id: (rows[row_id].get("slot_order") or 0, str(rows[row_id].get("start_time") or "")))
+
+
+def _sort_id(value: str) -> tuple[int, str]:
+    return (int(value), "") if value.isdigit() else (0, value)
+
+
+def _fetch_table(supabase, table: str) -> list[dict[str, Any]]:
+    rows: list[dict[str, Any]] = []
+    start = 0
+    while True:
+        page = supabase.table(table).select("*").range(start, start + _PAGE_SIZE - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < _PAGE_SIZE:
+            return rows
+        start += _PAGE_SIZE
+
+
+def load_reference_data(supabase) -> ReferenceData:
+    reference = ReferenceData()
+    for table, (lookup, id_column, columns) in REFERENCE_TABLES.items():
+        by_id: dict[str, dict[str, Any]] = {}
+        for row in _fetch_table(supabase, table):
+            row_id = _key(row.get(id_column))
+            if row_id:
+                by_id[row_id] = {column: row[column] for column in columns if column in row}
+        reference.tables[lookup] = by_id
+    return reference
+
+
+def get_reference_data(supabase) -> ReferenceData:
+    """Cached reference tables; reloaded after master-data writes (see ``REFERENCE_DATA``)."""
+    token = get_data_watermark().token((REFERENCE_DATA,))
+    return _reference_cache.get_or_load(token, lambda: load_reference_data(supabase))
+
+
+def invalidate_reference_data() -> None:
+    _reference_cache.clear()
+
+
+def compact_entry(entry: dict[str, Any], extra_columns: tuple[str, ...] = ()) -> dict[str, Any]:
+    return {
+        column: entry.get(column)
+        for column in COMPACT_ENTRY_COLUMNS + extra_columns
+        if entry.get(column) is not None
+    }
+
+
+def _sort_entries(entries: list[dict[str, Any]], reference: ReferenceData) -> list[dict[str, Any]]:
+    day_rank = {row_id: rank for rank, row_id in enumerate(reference.ordered_days())}
+    slot_rank = {row_id: rank for rank, row_id in enumerate(reference.ordered_slots())}
+    return sorted(
+        entries,
+        key=lambda entry: (
+            day_rank.get(_key(entry.get("day_id")), len(day_rank)),
+            slot_rank.get(_key(entry.get("slot_id")), len(slot_rank)),
+            _key(entry.get("division_id")),
+            _key(entry.get("batch_id")),
+        ),
+    )
+
+
+def expand_entry(entry: dict[str, Any], reference: ReferenceData) -> dict[str, Any]:
+    """Legacy shape: the entry with its reference rows embedded under the table names."""
+    expanded = dict(entry)
+    for table, (lookup, id_column, _columns) in REFERENCE_TABLES.items():
+        if entry.get(id_column) is None:
+            continue
+        row = reference.get(lookup, entry.get(id_column))
+        expanded[table] = {id_column: entry.get(id_column), **row} if row else None
+    return expanded
+
+
+def build_timetable_view(
+    entries: list[dict[str, Any]],
+    reference: ReferenceData,
+    view_format: str = "compact",
+    *,
+    extra_columns: tuple[str, ...] = (),
+) -> dict[str, Any]:
+    """Entries plus lookups as ``compact`` rows, a ``grid`` (day x slot matrix) or ``expanded`` rows."""
+    ordered = _sort_entries(entries, reference)
+    if view_format == "expanded":
+        return {"format": "expanded", "entries": [expand_entry(entry, reference) for entry in ordered]}
+
+    lookups = reference.lookups_for(ordered)
+    if view_format != "grid":
+        return {"format": "compact", "entries": [compact_entry(entry, extra_columns) for entry in ordered], "lookups": lookups}
+
+    day_ids = reference.ordered_days()
+    slot_ids = reference.ordered_slots()
+    extra_days = sorted({_key(entry.get("day_id")) for entry in ordered} - set(day_ids) - {""}, key=_sort_id)
+    extra_slots = sorted({_key(entry.get("slot_id")) for entry in ordered} - set(slot_ids) - {""})
+    day_ids += extra_days
+    slot_ids += extra_slots
+    day_index = {row_id: index for index, row_id in enumerate(day_ids)}
+    slot_index = {row_id: index for index, row_id in enumerate(slot_ids)}
+    cells: list[list[list[dict[str, Any]]]] = [[[] for _ in slot_ids] for _ in day_ids]
+    for entry in ordered:
+        day = day_index.get(_key(entry.get("day_id")))
+        slot = slot_index.get(_key(entry.get("slot_id")))
+        if day is None or slot is None:
+            continue
+        cell = compact_entry(entry, extra_columns)
+        cell.pop("day_id", None)
+        cell.pop("slot_id", None)
+        cells[day][slot].append(cell)
+    lookups.setdefault("days", {}).update({row_id: reference.tables.get("days", {}).get(row_id, {}) for row_id in day_ids})
+    lookups.setdefault("slots", {}).update({row_id: reference.tables.get("slots", {}).get(row_id, {}) for row_id in slot_ids})
+    return {
+        "format": "grid",
+        "grid": {"days": day_ids, "slots": slot_ids, "cells": cells},
+        "lookups": lookups,
+    }
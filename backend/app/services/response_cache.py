@@ -0,0 +1,131 @@
+"""Per-department data watermarks, ETags and a short-lived response cache.
+
+A watermark is a set of in-process counters per ``(topic, department)``; writes bump
+them and read endpoints derive their ETag from the counters they depend on, so a
+repeated poll can be answered with 304 before any query runs.
+
+Counters live in the worker process. With several workers a write is only seen by
+the worker that handled it, so ETags also roll over every ``etag_max_age_seconds``
+to bound how long another worker can keep answering 304 for stale data.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Iterable
+
+from app.config import settings
+from app.services.event_bus import publish_change
+from app.services.ttl_cache import TTLCache
+
+TIMETABLE = "timetable"
+NOTIFICATIONS = "notifications"
+# Divisions, subjects, faculty, rooms, batches, days and time slots.
+REFERENCE_DATA = "reference"
+
+_ALL_DEPARTMENTS = "*"
+
+
+def _setting(name: str, default: Any) -> Any:
+    value = getattr(settings, name, None)
+    return default if value is None else value
+
+
+class DataWatermark:
+    """Monotonic write counters per topic, kept globally and per department."""
+
+    def __init__(self) -> None:
+        # A restart must never reproduce an ETag handed out by the previous process.
+        self.epoch = uuid.uuid4().hex[:8]
+        self._counters: dict[tuple[str, str], int] = defaultdict(int)
+        self._totals: dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def bump(self, *topics: str, department_id: str | None = None) -> None:
+        """Record a write; ``department_id=None`` means it may affect every department."""
+        scope = str(department_id) if department_id else _ALL_DEPARTMENTS
+        with self._lock:
+            for topic in topics:
+                self._counters[(topic, scope)] += 1
+                self._totals[topic] += 1
+
+    def token(self, topics: Iterable[str], department_id: str | None = None) -> str:
+        """Changes whenever a write visible to ``department_id`` happens on any of ``topics``.
+
+        Without a department every write counts, since the reader's scope is unknown.
+        """
+        parts = [self.epoch]
+        with self._lock:
+            for topic in sorted(topics):
+                if department_id:
+                    parts.append(
+                        f"{topic}:{self._counters.get((topic, _ALL_DEPARTMENTS), 0)}"
+                        f".{self._counters.get((topic, str(department_id)), 0)}"
+                    )
+                else:
+                    parts.append(f"{topic}:{self._totals.get(topic, 0)}")
+        max_age = float(_setting("etag_max_age_seconds", 60.0))
+        if max_age > 0:
+            parts.append(str(int(time.time() // max_age)))
+        return "|".join(parts)
+
+
+_watermark = DataWatermark()
+
+
+def get_data_watermark() -> DataWatermark:
+    return _watermark
+
+
+def bump_watermark(*topics: str, department_id: str | None = None) -> None:
+    """Invalidate ETags (and cached responses) derived from ``topics`` and notify subscribers."""
+    topics = topics or (TIMETABLE, NOTIFICATIONS)
+    _watermark.bump(*topics, department_id=department_id)
+    publish_change(topics, department_id)
+
+
+def compute_etag(request_key: str, topics: Iterable[str], department_id: str | None) -> str:
+    digest = hashlib.sha1(
+        f"{request_key}#{_watermark.token(topics, department_id)}".encode("utf-8")
+    ).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+# etag -> (status, headers, body). ETags already encode the watermark, so entries never
+# need explicit invalidation; the ttl only bounds memory for abandoned ones.
+_responses = TTLCache(
+    ttl_seconds=float(_setting("response_cache_ttl_seconds", 0.0)),
+    max_entries=int(_setting("response_cache_max_entries", 512)),
+)
+_MAX_CACHED_BODY_BYTES = 2 * 1024 * 1024
+
+
+def get_cached_response(etag: str) -> tuple[int, list, bytes] | None:
+    return _responses.get(etag)
+
+
+def store_cached_response(etag: str, status_code: int, headers: list, body: bytes) -> None:
+    if len(body) <= _MAX_CACHED_BODY_BYTES:
+        _responses.set(etag, (status_code, headers, body))
+
+
+def response_cache_stats() -> dict[str, Any]:
+    return _responses.stats()
@@ -0,0 +1,181 @@
+"""Compact wire formats for timetable generation results.
+
+``final_timetable`` rows repeat the same handful of UUIDs thousands of times. The compact
+format ships them column by column with every column dictionary-encoded: each distinct
+value is sent once and rows refer to it by index. Streams split the rows into ``entries``
+events whose dictionaries only carry values not sent by an earlier chunk. ``msgpack`` is
+an optional dependency; without it responses stay JSON (gzipped when accepted).
+"""
+from __future__ import annotations
+
+import gzip
+import json
+from typing import Any, Iterator
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+RESULT_FORMATS = ("full", "compact")
+COLUMNAR_FORMAT = "columnar"
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+_MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+DEFAULT_ENTRY_CHUNK_SIZE = 500
+# Smaller JSON bodies are not worth a gzip pass.
+_GZIP_MIN_BYTES = 1024
+
+
+def _column_names(rows: list[dict[str, Any]]) -> list[str]:
+    return list(dict.fromkeys(column for row in rows for column in row))
+
+
+def _dictionary_key(value: Any) -> Any:
+    # Keep 1 and "1" (and True) apart; rows can mix id types across tables.
+    return (type(value).__name__, value)
+
+
+class ColumnarEncoder:
+    """Dictionary-encodes rows column by column, remembering values already sent."""
+
+    def __init__(self) -> None:
+        self._codes: dict[str, dict[Any, int]] = {}
+
+    def encode(self, rows: list[dict[str, Any]], *, offset: int = 0, total: int | None = None) -> dict[str, Any]:
+        """One chunk: new dictionary values per column plus one code per row (missing = null)."""
+        columns: dict[str, list[int]] = {}
+        dictionaries: dict[str, list[Any]] = {}
+        for column in _column_names(rows):
+            known = self._codes.setdefault(column, {})
+            added: list[Any] = []
+            codes: list[int] = []
+            for row in rows:
+                value = row.get(column)
+                key = _dictionary_key(value)
+                code = known.get(key)
+                if code is None:
+                    code = known[key] = len(known)
+                    added.append(value)
+                codes.append(code)
+            columns[column] = codes
+            if added:
+                dictionaries[column] = added
+        return {
+            "format": COLUMNAR_FORMAT,
+            "offset": offset,
+            "count": len(rows),
+            "total": len(rows) if total is None else total,
+            "dictionaries": dictionaries,
+            "columns": columns,
+        }
+
+
+def encode_columnar(rows: list[dict[str, Any]]) -> dict[str, Any]:
+    return ColumnarEncoder().encode(rows)
+
+
+def iter_columnar_chunks(rows: list[dict[str, Any]], chunk_size: int = DEFAULT_ENTRY_CHUNK_SIZE) -> Iterator[dict[str, Any]]:
+    """Consecutive chunks of ``rows``; decode them in order with one shared set of dictionaries."""
+    chunk_size = max(int(chunk_size or DEFAULT_ENTRY_CHUNK_SIZE), 1)
+    encoder = ColumnarEncoder()
+    total = len(rows)
+    for start in range(0, total, chunk_size):
+        yield encoder.encode(rows[start:start + chunk_size], offset=start, total=total)
+
+
+def decode_columnar(chunks: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Rows back from ``encode_columnar`` output or an ordered list of chunks."""
+    dictionaries: dict[str, list[Any]] = {}
+    rows: list[dict[str, Any]] = []
+    for chunk in chunks:
+        for column, added in (chunk.get("dictionaries") or {}).items():
+            dictionaries.setdefault(column, []).extend(added)
+        columns = chunk.get("columns") or {}
+        for index in range(int(chunk.get("count") or 0)):
+            row: dict[str, Any] = {}
+            for column, codes in columns.items():
+                value = dictionaries[column][codes[index]]
+                if value is not None:
+                    row[column] = value
+            rows.append(row)
+    return rows
+
+
+def compact_result(result: dict[str, Any], *, include_entries: bool = True) -> dict[str, Any]:
+    """The result with ``final_timetable`` columnar (or left out when streamed separately)."""
+    entries = result.get("final_timetable")
+    if not isinstance(entries, list):
+        return result
+    compacted = {key: value for key, value in result.items() if key != "final_timetable"}
+    compacted["result_format"] = "compact"
+    compacted["entry_count"] = len(entries)
+    if include_entries:
+        compacted["final_timetable"] = encode_columnar(entries)
+    return compacted
+
+
+def iter_stream_events(
+    event: dict[str, Any],
+    result_format: str = "full",
+    chunk_size: int = DEFAULT_ENTRY_CHUNK_SIZE,
+) -> Iterator[tuple[str, dict[str, Any]]]:
+    """``(event type, payload)`` pairs for one orchestrator event.
+
+    In compact mode the final result is preceded by ``entries`` events and drops
+    ``stages`` (already streamed one by one).
+    """
+    event_type = event.get("type", "message")
+    result = event.get("result")
+    if result_format != "compact" or event_type != "result" or not isinstance(result, dict):
+        yield event_type, event
+        return
+    entries = result.get("final_timetable")
+    if isinstance(entries, list):
+        for chunk in iter_columnar_chunks(entries, chunk_size):
+            yield "entries", {"type": "entries", "run_id": event.get("run_id"), **chunk}
+    compacted = compact_result(result, include_entries=False)
+    compacted.pop("stages", None)
+    yield event_type, {**event, "result": compacted}
+
+
+def sse_message(event_type: str, payload: dict[str, Any], *, compact: bool = False) -> str:
+    separators = (",", ":") if compact else None
+    return f"event: {event_type}\ndata: {json.dumps(payload, separators=separators, default=str)}\n\n"
+
+
+def _accepts(header: str | None, media_types: tuple[str, ...]) -> bool:
+    """Whether an Accept-style header lists one of ``media_types`` with a non-zero quality."""
+    for part in (header or "").split(","):
+        media_type, *params = [item.strip() for item in part.split(";")]
+        if media_type.lower() not in media_types:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            return True
+    return False
+
+
+def negotiate_body(
+    body: dict[str, Any],
+    *,
+    accept: str | None = None,
+    accept_encoding: str | None = None,
+) -> tuple[bytes, str, dict[str, str]]:
+    """``(content, media type, extra headers)``: msgpack when accepted and installed, else JSON (gzipped if accepted)."""
+    if msgpack is not None and _accepts(accept, _MSGPACK_MEDIA_TYPES):
+        return msgpack.packb(body, use_bin_type=True, default=str), MSGPACK_MEDIA_TYPE, {"Vary": "Accept"}
+    content = json.dumps(body, separators=(",", ":"), default=str).encode("utf-8")
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if len(content) >= _GZIP_MIN_BYTES and _accepts(accept_encoding, ("gzip",)):
+        content = gzip.compress(content, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return content, "application/json", headers
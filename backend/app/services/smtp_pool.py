@@ -0,0 +1,127 @@
+"""Pool of long-lived SMTP connections shared by direct sends and the email outbox."""
+from __future__ import annotations
+
+import queue
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from email.message import Message
+from typing import Callable, Iterator
+
+from app.config import settings
+
+
+def _default_connect() -> smtplib.SMTP:
+    server = smtplib.SMTP(settings.smtp_server, settings.smtp_port, timeout=30)
+    if getattr(settings, "smtp_starttls", True):
+        server.starttls()
+    if settings.smtp_username and settings.smtp_password:
+        server.login(settings.smtp_username, settings.smtp_password)
+    return server
+
+
+class SMTPConnectionPool:
+    """At most ``size`` authenticated connections, reused until idle for ``max_idle_seconds``.
+
+    Connections that fail mid-send are discarded; one reconnect is attempted when the
+    server has silently dropped an idle connection.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        connect: Callable[[], smtplib.SMTP] | None = None,
+        max_idle_seconds: float = 60.0,
+        max_messages_per_connection: int = 200,
+    ):
+        self.size = max(1, int(size))
+        self._connect = connect or _default_connect
+        self.max_idle_seconds = max_idle_seconds
+        self.max_messages_per_connection = max_messages_per_connection
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self.opened = 0
+
+    def _checkout(self) -> list:
+        while True:
+            try:
+                item = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if time.monotonic() - item[1] <= self.max_idle_seconds:
+                return item
+            self._quit(item[0])
+        self.opened += 1
+        return [self._connect(), time.monotonic(), 0]
+
+    @staticmethod
+    def _quit(server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    @contextmanager
+    def connection(self) -> Iterator[list]:
+        """Yield ``[server, last_used, sent_count]``; broken connections are not returned."""
+        self._slots.acquire()
+        item = None
+        try:
+            item = self._checkout()
+            yield item
+            item[1] = time.monotonic()
+            if item[2] >= self.max_messages_per_connection:
+                self._quit(item[0])
+            else:
+                self._idle.put(item)
+        except Exception:
+            if item is not None:
+                self._quit(item[0])
+            raise
+        finally:
+            self._slots.release()
+
+    def send(self, message: Message) -> None:
+        with self.connection() as item:
+            try:
+                item[0].send_message(message)
+            except smtplib.SMTPServerDisconnected:
+                # Idle connection was dropped by the server; reconnect once.
+                self._quit(item[0])
+                item[0] = self._connect()
+                self.opened += 1
+                item[0].send_message(message)
+            item[2] += 1
+
+    def close(self) -> None:
+        while True:
+            try:
+                item = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._quit(item[0])
+
+
+_pool: SMTPConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_smtp_pool() -> SMTPConnectionPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SMTPConnectionPool(size=int(getattr(settings, "smtp_pool_size", 2) or 1))
+        return _pool
+
+
+def set_smtp_pool(pool: SMTPConnectionPool | None) -> None:
+    """Swap the shared pool (e.g. one pointed at a local SMTP stand-in)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool is not pool:
+            _pool.close()
+        _pool = pool
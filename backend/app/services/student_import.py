@@ -0,0 +1,332 @@
+"""Bulk student CSV onboarding: validate up front, hash in a worker pool, write in batches."""
+from __future__ import annotations
+
+import asyncio
+import csv
+import io
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterable
+from uuid import uuid4
+
+import bcrypt
+
+from app.config import settings
+
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+_LOOKUP_CHUNK = 200
+_MAX_RETAINED_JOBS = 20
+_AUTH_USER_PAGE_SIZE = 1000
+_AUTH_USER_MAX_PAGES = 50
+
+# Jobs live in this worker process only: with several workers, poll the job on the worker
+# that started it (sticky sessions) or run the import in the foreground instead.
+_jobs: dict[str, "StudentImportJob"] = {}
+
+
+class StudentCsvError(ValueError):
+    """File-level problem (encoding, headers, no rows) that rejects the whole upload."""
+
+
+@dataclass
+class StudentImportRow:
+    row_number: int
+    name: str
+    email: str
+    prn: str
+    department_id: str = ""
+    division: str = ""
+    status: str = "pending"
+    error: str | None = None
+
+    def result(self) -> dict[str, Any]:
+        return {
+            "row": self.row_number,
+            "email": self.email,
+            "prn": self.prn,
+            "status": self.status,
+            "error": self.error,
+        }
+
+
+def parse_student_csv(
+    content: bytes,
+    columns: dict[str, tuple[str, ...]],
+    required: Iterable[str],
+) -> list[StudentImportRow]:
+    """Parse and validate every row before anything is written.
+
+    ``columns`` maps a field (name, email, prn, department_id, division) to accepted
+    header aliases. Rows failing validation come back with ``status="invalid"``.
+    """
+    try:
+        decoded = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise StudentCsvError("CSV file must be UTF-8 encoded.")
+
+    reader = csv.DictReader(io.StringIO(decoded))
+    if not reader.fieldnames:
+        raise StudentCsvError("CSV file has no headers.")
+
+    header_map = {h.strip().lower(): h for h in reader.fieldnames if h}
+    resolved: dict[str, str] = {}
+    for field_name, aliases in columns.items():
+        for alias in aliases:
+            if alias.strip().lower() in header_map:
+                resolved[field_name] = header_map[alias.strip().lower()]
+                break
+    required = list(required)
+    missing = [columns[name][0] for name in required if name not in resolved]
+    if missing:
+        raise StudentCsvError(f"Missing required columns: {', '.join(missing)}")
+
+    rows: list[StudentImportRow] = []
+    seen_emails: dict[str, int] = {}
+    seen_prns: dict[str, int] = {}
+    for line_number, raw in enumerate(reader, start=2):
+        values = {name: str(raw.get(header) or "").strip() for name, header in resolved.items()}
+        if not any(values.values()):
+            continue
+        row = StudentImportRow(
+            row_number=line_number,
+            name=values.get("name", ""),
+            email=values.get("email", "").lower(),
+            prn=values.get("prn", ""),
+            department_id=values.get("department_id", ""),
+            division=values.get("division", ""),
+        )
+        blank = [name for name in required if not values.get(name)]
+        if blank:
+            row.status, row.error = "invalid", f"missing {', '.join(blank)}"
+        elif not _EMAIL_RE.match(row.email):
+            row.status, row.error = "invalid", "invalid email address"
+        elif row.email in seen_emails:
+            row.status, row.error = "invalid", f"duplicate email (first seen on row {seen_emails[row.email]})"
+        elif row.prn in seen_prns:
+            row.status, row.error = "invalid", f"duplicate PRN (first seen on row {seen_prns[row.prn]})"
+        else:
+            seen_emails[row.email] = line_number
+            seen_prns[row.prn] = line_number
+        rows.append(row)
+
+    if not rows:
+        raise StudentCsvError("CSV file is empty.")
+    return rows
+
+
+@dataclass
+class StudentImportJob:
+    """Progress and per-row outcome of one upload; safe to update from worker threads."""
+
+    job_id: str
+    kind: str
+    scope: str
+    rows: list[StudentImportRow]
+    # Who may read the job besides admins: its creator and their department.
+    created_by: str | None = None
+    department_id: str | None = None
+    status: str = "running"
+    phase: str = "validating"
+    message: str | None = None
+    created_at: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    finished_at: str | None = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    _task: Any = field(default=None, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in {"completed", "failed"}
+
+    def pending_rows(self) -> list[StudentImportRow]:
+        return [row for row in self.rows if row.status == "pending"]
+
+    def mark(self, row: StudentImportRow, status: str, error: str | None = None) -> None:
+        with self._lock:
+            row.status = status
+            row.error = error
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            counts = {"total": len(self.rows), "pending": 0, "invalid": 0, "created": 0, "skipped": 0, "failed": 0}
+            for row in self.rows:
+                counts[row.status] = counts.get(row.status, 0) + 1
+        counts["processed"] = counts["total"] - counts["pending"]
+        return counts
+
+    def snapshot(self, include_rows: bool = True) -> dict[str, Any]:
+        data: dict[str, Any] = {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "scope": self.scope,
+            "status": self.status,
+            "phase": self.phase,
+            "message": self.message,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            **self.counts(),
+        }
+        if include_rows:
+            data["rows"] = [row.result() for row in self.rows]
+        return data
+
+
+def create_import_job(
+    kind: str,
+    scope: str,
+    rows: list[StudentImportRow],
+    *,
+    created_by: str | None = None,
+    department_id: str | None = None,
+) -> StudentImportJob:
+    finished = sorted((job for job in _jobs.values() if job.done), key=lambda job: job.created_at)
+    for job in finished[: max(0, len(_jobs) + 1 - _MAX_RETAINED_JOBS)]:
+        _jobs.pop(job.job_id, None)
+    job = StudentImportJob(
+        job_id=str(uuid4()),
+        kind=kind,
+        scope=scope,
+        rows=rows,
+        created_by=created_by,
+        department_id=department_id,
+    )
+    _jobs[job.job_id] = job
+    return job
+
+
+def get_import_job(job_id: str) -> StudentImportJob | None:
+    """The job if this worker process started it (see ``_jobs``)."""
+    return _jobs.get(job_id)
+
+
+async def run_import_job(
+    job: StudentImportJob,
+    pipeline: Callable[[StudentImportJob], None],
+    *,
+    background: bool = False,
+) -> StudentImportJob:
+    """Run the blocking pipeline in a worker thread, awaiting it unless ``background``."""
+
+    def _run() -> None:
+        try:
+            pipeline(job)
+            counts = job.counts()
+            job.status = "completed"
+            job.message = (
+                f"Created {counts['created']}, skipped {counts['skipped']} already imported, "
+                f"failed {counts['failed'] + counts['invalid']}."
+            )
+        except Exception as exc:
+            job.status = "failed"
+            job.message = str(exc)
+            for row in job.pending_rows():
+                job.mark(row, "failed", "import aborted before this row was processed")
+        finally:
+            job.phase = "done"
+            job.finished_at = datetime.now(timezone.utc).isoformat()
+
+    future = asyncio.get_running_loop().run_in_executor(None, _run)
+    if background:
+        job._task = future
+    else:
+        await future
+    return job
+
+
+def hash_passwords(passwords: list[str], on_hashed: Callable[[], None] | None = None) -> list[str]:
+    """bcrypt-hash in a thread pool (bcrypt releases the GIL while hashing)."""
+    workers = int(getattr(settings, "student_import_hash_workers", 0) or 0) or (os.cpu_count() or 2)
+
+    def _hash(password: str) -> str:
+        hashed = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+        if on_hashed is not None:
+            on_hashed()
+        return hashed
+
+    if not passwords:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return list(pool.map(_hash, passwords))
+
+
+def run_bounded(
+    fn: Callable[[StudentImportRow], Any],
+    rows: list[StudentImportRow],
+    on_done: Callable[[StudentImportRow, Any, Exception | None], None],
+) -> None:
+    """Call ``fn`` for every row with at most ``student_import_auth_concurrency`` in flight."""
+    concurrency = int(getattr(settings, "student_import_auth_concurrency", 8) or 1)
+    if not rows:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = {pool.submit(fn, row): row for row in rows}
+        for future in as_completed(futures):
+            row = futures[future]
+            try:
+                on_done(row, future.result(), None)
+            except Exception as exc:
+                on_done(row, None, exc)
+
+
+def fetch_rows_in(supabase, table: str, column: str, values: list[str], select: str) -> list[dict]:
+    """``SELECT ... WHERE column IN (...)`` in chunks small enough for the REST URL."""
+    unique = sorted({value for value in values if value})
+    rows: list[dict] = []
+    for start in range(0, len(unique), _LOOKUP_CHUNK):
+        chunk = unique[start:start + _LOOKUP_CHUNK]
+        rows.extend(supabase.table(table).select(select).in_(column, chunk).execute().data or [])
+    return rows
+
+
+def upsert_in_batches(
+    supabase,
+    table: str,
+    job: StudentImportJob,
+    records: list[tuple[StudentImportRow, dict]],
+    *,
+    on_conflict: str | None = None,
+    row_fallback: Callable[[dict], None] | None = None,
+) -> None:
+    """Upsert ``records`` in batches; a failing batch is retried row by row to isolate bad rows."""
+    batch_size = int(getattr(settings, "student_import_batch_size", 200) or 200)
+    for start in range(0, len(records), batch_size):
+        chunk = records[start:start + batch_size]
+        try:
+            query = supabase.table(table)
+            payloads = [payload for _, payload in chunk]
+            (query.upsert(payloads, on_conflict=on_conflict) if on_conflict else query.upsert(payloads)).execute()
+            for row, _ in chunk:
+                job.mark(row, "created")
+            continue
+        except Exception as batch_error:
+            print(f"[STUDENT IMPORT] Batch upsert into {table} failed, retrying per row: {batch_error}")
+        for row, payload in chunk:
+            try:
+                if row_fallback is not None:
+                    row_fallback(payload)
+                elif on_conflict:
+                    supabase.table(table).upsert(payload, on_conflict=on_conflict).execute()
+                else:
+                    supabase.table(table).upsert(payload).execute()
+                job.mark(row, "created")
+            except Exception as row_error:
+                job.mark(row, "failed", f"Failed to save student: {row_error}")
+
+
+def find_auth_user_ids(supabase, emails: set[str]) -> dict[str, str]:
+    """Map emails to existing Supabase auth user ids (used to resume after a partial import)."""
+    found: dict[str, str] = {}
+    if not emails:
+        return found
+    for page in range(1, _AUTH_USER_MAX_PAGES + 1):
+        users = supabase.auth.admin.list_users(page=page, per_page=_AUTH_USER_PAGE_SIZE) or []
+        for user in users:
+            email = str(getattr(user, "email", "") or "").lower()
+            if email in emails:
+                found[email] = str(user.id)
+        if len(found) == len(emails) or len(users) < _AUTH_USER_PAGE_SIZE:
+            break
+    return found
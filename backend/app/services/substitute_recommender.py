@@ -0,0 +1,147 @@
+"""Substitute-faculty recommendations from a cached per-version availability index."""
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any
+
+from app.services.timetable_repository import as_timetable_repository
+from app.services.ttl_cache import TTLCache
+
+_INDEX_TTL_SECONDS = 300.0
+
+_indexes = TTLCache(ttl_seconds=_INDEX_TTL_SECONDS, max_entries=32)
+
+
+@dataclass
+class FacultyAvailabilityIndex:
+    """Occupancy and affinity of every faculty member within one timetable version."""
+
+    version_id: str
+    faculty_names: dict[str, str] = field(default_factory=dict)
+    busy: dict[tuple[int, str], set[str]] = field(default_factory=lambda: defaultdict(set))
+    division_faculty: dict[str, set[str]] = field(default_factory=lambda: defaultdict(set))
+    subject_faculty: dict[str, set[str]] = field(default_factory=lambda: defaultdict(set))
+    daily_slots: dict[tuple[str, int], set[str]] = field(default_factory=lambda: defaultdict(set))
+    weekly_slots: dict[str, set[tuple[int, str]]] = field(default_factory=lambda: defaultdict(set))
+
+    @classmethod
+    def build(cls, version_id: str, entries: list[dict], faculty_rows: list[dict]) -> "FacultyAvailabilityIndex":
+        index = cls(version_id=str(version_id))
+        for row in faculty_rows:
+            if row.get("faculty_id"):
+                index.faculty_names[str(row["faculty_id"])] = str(row.get("faculty_name") or row["faculty_id"])
+        for entry in entries:
+            faculty_id = str(entry.get("faculty_id") or "")
+            if not faculty_id:
+                continue
+            day_id = int(entry.get("day_id") or 0)
+            slot_id = str(entry.get("slot_id") or "")
+            index.busy[(day_id, slot_id)].add(faculty_id)
+            if entry.get("division_id"):
+                index.division_faculty[str(entry["division_id"])].add(faculty_id)
+            if entry.get("subject_id"):
+                index.subject_faculty[str(entry["subject_id"])].add(faculty_id)
+            # Load counts distinct (day, slot) cells so parallel batch rows count once.
+            index.daily_slots[(faculty_id, day_id)].add(slot_id)
+            index.weekly_slots[faculty_id].add((day_id, slot_id))
+        return index
+
+    def recommend(
+        self,
+        *,
+        day_id: int,
+        slot_id: str,
+        division_id: str,
+        subject_id: str,
+        exclude_faculty_id: str | None,
+        extra_load: dict[tuple[str, int], int] | None = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Candidates for one slot.
+
+        Only faculty who already teach the division are offered. Ranking: affinity
+        (division & subject > division > subject), then free before busy, then the
+        lightest load that day, then the lightest weekly load.
+        """
+        day_id = int(day_id)
+        slot_id = str(slot_id)
+        busy = self.busy.get((day_id, slot_id), set())
+        teaches_subject_ids = self.subject_faculty.get(str(subject_id), set())
+        candidates = []
+        for fac_id in self.division_faculty.get(str(division_id), set()):
+            if fac_id == str(exclude_faculty_id or ""):
+                continue
+            teaches_subject = fac_id in teaches_subject_ids
+            daily_load = len(self.daily_slots.get((fac_id, day_id), ())) + int((extra_load or {}).get((fac_id, day_id), 0))
+            candidates.append(
+                {
+                    "faculty_id": fac_id,
+                    "faculty_name": self.faculty_names.get(fac_id, fac_id),
+                    "is_free": fac_id not in busy,
+                    "teaches_division": True,
+                    "teaches_subject": teaches_subject,
+                    "priority_score": 3 if teaches_subject else 2,
+                    "daily_load": daily_load,
+                    "weekly_load": len(self.weekly_slots.get(fac_id, ())),
+                }
+            )
+        candidates.sort(
+            key=lambda c: (
+                -c["priority_score"],
+                not c["is_free"],
+                c["daily_load"],
+                c["weekly_load"],
+                c["faculty_name"],
+            )
+        )
+        return candidates
+
+    def recommend_for_slots(self, slots: list[dict], exclude_faculty_id: str | None) -> dict[str, list[dict[str, Any]]]:
+        """
+        Rank candidates for every affected slot of a leave in one pass.
+
+        Each slot's top free candidate is provisionally charged one period on that day,
+        so a multi-slot leave spreads cover across faculty instead of piling it on one.
+        """
+        extra_load: dict[tuple[str, int], int] = defaultdict(int)
+        ordered = sorted(slots, key=lambda s: (int(s.get("day_id") or 0), str(s.get("slot_id") or "")))
+        result: dict[str, list[dict[str, Any]]] = {}
+        for slot in ordered:
+            candidates = self.recommend(
+                day_id=int(slot.get("day_id") or 0),
+                slot_id=str(slot.get("slot_id") or ""),
+                division_id=str(slot.get("division_id") or ""),
+                subject_id=str(slot.get("subject_id") or ""),
+                exclude_faculty_id=exclude_faculty_id,
+                extra_load=extra_load,
+            )
+            top = next((c for c in candidates if c["is_free"]), None)
+            if top:
+                extra_load[(top["faculty_id"], int(slot.get("day_id") or 0))] += 1
+            result[str(slot.get("affected_slot_id") or slot.get("entry_id"))] = candidates
+        return result
+
+
+def get_availability_index(supabase, version_id: str) -> FacultyAvailabilityIndex:
+    """Cached index for ``version_id`` (rebuilt after invalidation or ``_INDEX_TTL_SECONDS``)."""
+
+    def _build() -> FacultyAvailabilityIndex:
+        repository = as_timetable_repository(supabase)
+        return FacultyAvailabilityIndex.build(
+            version_id,
+            repository.fetch_entries(version_id),
+            repository.fetch_faculty(),
+        )
+
+    return _indexes.get_or_load(str(version_id), _build)
+
+
+def invalidate_availability_index(*version_ids: str | None) -> None:
+    """Drop cached indexes after entries of a version change (no ids = drop all)."""
+    if not version_ids:
+        _indexes.clear()
+        return
+    for version_id in version_ids:
+        if version_id:
+            _indexes.invalidate(str(version_id))
@@ -0,0 +1,341 @@
+"""Dated view of the weekly timetable: occurrences, leaves, campus events and academic years."""
+from __future__ import annotations
+
+from bisect import bisect_right
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any, Generic, Iterator, TypeVar
+
+from app.services.effective_version import get_effective_version
+from app.services.timetable_version_deltas import fetch_version_entries
+from app.services.ttl_cache import TTLCache
+
+T = TypeVar("T")
+
+_WEEKDAYS = ("MONDAY", "TUESDAY", "WEDNESDAY", "THURSDAY", "FRIDAY", "SATURDAY", "SUNDAY")
+_HALF_DAY_SPLIT_MINUTES = 13 * 60
+_ENTRY_SELECT = (
+    "*, divisions(division_name), subjects(subject_name), days(day_name, day_id), "
+    "time_slots(start_time, end_time), rooms(room_number)"
+)
+_PAGE_SIZE = 1000
+_CALENDAR_TTL_SECONDS = 120.0
+
+_calendars = TTLCache(ttl_seconds=_CALENDAR_TTL_SECONDS, max_entries=16)
+
+
+def parse_date(value: Any) -> date | None:
+    if value in (None, ""):
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def _minutes(value: Any) -> int:
+    parts = str(value or "").split(":")
+    try:
+        return int(parts[0]) * 60 + int(parts[1])
+    except (ValueError, IndexError):
+        return 0
+
+
+class IntervalIndex(Generic[T]):
+    """Static index of closed date intervals; ``overlapping`` is O(log n + k) for typical data."""
+
+    def __init__(self, intervals: list[tuple[date, date, T]]):
+        ordered = sorted((iv for iv in intervals if iv[0] <= iv[1]), key=lambda iv: (iv[0], iv[1]))
+        self._starts = [iv[0] for iv in ordered]
+        self._items = ordered
+        # Running maximum of end dates lets the backwards scan stop early.
+        self._max_end: list[date] = []
+        running: date | None = None
+        for _, end, _ in ordered:
+            running = end if running is None or end > running else running
+            self._max_end.append(running)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def overlapping(self, start: date, end: date) -> list[T]:
+        hits: list[T] = []
+        i = bisect_right(self._starts, end) - 1
+        while i >= 0 and self._max_end[i] >= start:
+            iv_start, iv_end, payload = self._items[i]
+            if iv_end >= start and iv_start <= end:
+                hits.append(payload)
+            i -= 1
+        hits.reverse()
+        return hits
+
+    def at(self, day: date) -> list[T]:
+        return self.overlapping(day, day)
+
+
+@dataclass
+class Occurrence:
+    """One weekly timetable entry on a concrete date."""
+
+    date: date
+    entry: dict[str, Any]
+    cancelled_by: list[dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def is_cancelled(self) -> bool:
+        return bool(self.cancelled_by)
+
+    def duration_hours(self) -> float:
+        slot = self.entry.get("time_slots") or {}
+        minutes = _minutes(slot.get("end_time")) - _minutes(slot.get("start_time"))
+        return max(minutes, 0) / 60.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "date": self.date.isoformat(),
+            "entry_id": self.entry.get("entry_id"),
+            "day_id": self.entry.get("day_id"),
+            "slot_id": self.entry.get("slot_id"),
+            "division_id": self.entry.get("division_id"),
+            "faculty_id": self.entry.get("faculty_id"),
+            "subject_id": self.entry.get("subject_id"),
+            "room_id": self.entry.get("room_id"),
+            "batch_id": self.entry.get("batch_id"),
+            "session_type": self.entry.get("session_type"),
+            "time_slots": self.entry.get("time_slots"),
+            "status": "CANCELLED" if self.is_cancelled else "SCHEDULED",
+            "cancelled_by": self.cancelled_by,
+        }
+
+
+def leave_covers_entry(leave_type: str | None, entry: dict[str, Any]) -> bool:
+    """Half-day leaves only cover slots ending by 13:00 (first half) or starting from 13:00 (second half)."""
+    slot = entry.get("time_slots") or {}
+    if leave_type == "HALF_DAY_FIRST":
+        return bool(slot) and _minutes(slot.get("end_time") or "23:59") <= _HALF_DAY_SPLIT_MINUTES
+    if leave_type == "HALF_DAY_SECOND":
+        return bool(slot) and _minutes(slot.get("start_time") or "00:00") >= _HALF_DAY_SPLIT_MINUTES
+    return True
+
+
+def _event_covers_entry(event: dict[str, Any], entry: dict[str, Any]) -> bool:
+    divisions = {str(x) for x in (event.get("affected_divisions") or [])}
+    rooms = {str(x) for x in (event.get("affected_rooms") or [])}
+    if not divisions and not rooms:
+        return True  # campus-wide
+    return str(entry.get("division_id")) in divisions or str(entry.get("room_id")) in rooms
+
+
+class TimetableCalendar:
+    """
+    Lazily expands one version's weekly entries into dated occurrences.
+
+    Entries are indexed by weekday (and by faculty / division within a weekday);
+    approved leaves, campus events and dated academic years sit in interval
+    indexes, so every query touches only the dates and entries it needs.
+    """
+
+    def __init__(
+        self,
+        version: dict[str, Any] | None,
+        entries: list[dict[str, Any]],
+        days: list[dict[str, Any]],
+        leaves: list[dict[str, Any]],
+        events: list[dict[str, Any]],
+        academic_years: list[dict[str, Any]] | None = None,
+    ):
+        self.version = version or {}
+        self.version_id = str(self.version.get("version_id") or "")
+        weekday_by_day_id: dict[int, int] = {}
+        for day in days:
+            name = str(day.get("day_name") or "").strip().upper()
+            if name in _WEEKDAYS and day.get("day_id") is not None:
+                weekday_by_day_id[int(day["day_id"])] = _WEEKDAYS.index(name)
+
+        self.entries = entries
+        self._by_weekday: dict[int, list[dict]] = defaultdict(list)
+        self._by_weekday_faculty: dict[tuple[int, str], list[dict]] = defaultdict(list)
+        self._by_weekday_division: dict[tuple[int, str], list[dict]] = defaultdict(list)
+        for entry in entries:
+            try:
+                weekday = weekday_by_day_id.get(int(entry.get("day_id")))
+            except (TypeError, ValueError):
+                weekday = None
+            if weekday is None:
+                continue
+            self._by_weekday[weekday].append(entry)
+            self._by_weekday_faculty[(weekday, str(entry.get("faculty_id")))].append(entry)
+            self._by_weekday_division[(weekday, str(entry.get("division_id")))].append(entry)
+
+        leaves_by_faculty: dict[str, list[tuple[date, date, dict]]] = defaultdict(list)
+        for leave in leaves:
+            start, end = parse_date(leave.get("start_date")), parse_date(leave.get("end_date"))
+            if start and end and leave.get("faculty_id"):
+                leaves_by_faculty[str(leave["faculty_id"])].append((start, end, leave))
+        self._leaves = {fid: IntervalIndex(items) for fid, items in leaves_by_faculty.items()}
+
+        self._events = IntervalIndex(
+            [
+                (parse_date(event.get("start_date")), parse_date(event.get("end_date")) or parse_date(event.get("start_date")), event)
+                for event in events
+                if parse_date(event.get("start_date"))
+            ]
+        )
+        # academic_years rows only bound the calendar when they carry dates.
+        self._terms = IntervalIndex(
+            [
+                (parse_date(year.get("start_date")), parse_date(year.get("end_date")), year)
+                for year in (academic_years or [])
+                if parse_date(year.get("start_date")) and parse_date(year.get("end_date"))
+            ]
+        )
+        self.valid_from = parse_date(self.version.get("wef_date"))
+        self.valid_to = parse_date(self.version.get("to_date"))
+
+    def _in_session(self, day: date) -> bool:
+        if self.valid_from and day < self.valid_from:
+            return False
+        if self.valid_to and day > self.valid_to:
+            return False
+        return not len(self._terms) or bool(self._terms.at(day))
+
+    def _cancellations(self, day: date, entry: dict[str, Any]) -> list[dict[str, Any]]:
+        reasons: list[dict[str, Any]] = []
+        leave_index = self._leaves.get(str(entry.get("faculty_id")))
+        if leave_index:
+            for leave in leave_index.at(day):
+                if leave_covers_entry(leave.get("leave_type"), entry):
+                    reasons.append({"type": "FACULTY_LEAVE", "id": leave.get("leave_id"), "leave_type": leave.get("leave_type")})
+        for event in self._events.at(day):
+            if _event_covers_entry(event, entry):
+                reasons.append({"type": "CAMPUS_EVENT", "id": event.get("event_id"), "name": event.get("event_name")})
+        return reasons
+
+    def occurrences(
+        self,
+        start: date,
+        end: date,
+        *,
+        faculty_id: str | None = None,
+        division_id: str | None = None,
+        include_cancelled: bool = True,
+    ) -> Iterator[Occurrence]:
+        """Yield dated occurrences in ``[start, end]``, optionally for one faculty or division."""
+        day = start
+        while day <= end:
+            if self._in_session(day):
+                weekday = day.weekday()
+                if faculty_id is not None:
+                    entries = self._by_weekday_faculty.get((weekday, str(faculty_id)), [])
+                elif division_id is not None:
+                    entries = self._by_weekday_division.get((weekday, str(division_id)), [])
+                else:
+                    entries = self._by_weekday.get(weekday, [])
+                for entry in entries:
+                    if division_id is not None and str(entry.get("division_id")) != str(division_id):
+                        continue
+                    occurrence = Occurrence(day, entry, self._cancellations(day, entry))
+                    if include_cancelled or not occurrence.is_cancelled:
+                        yield occurrence
+            day += timedelta(days=1)
+
+    def entries_affected_by_leave(self, faculty_id: str, start: date, end: date, leave_type: str | None) -> list[dict[str, Any]]:
+        """Distinct weekly entries of ``faculty_id`` that fall inside a (proposed) leave."""
+        seen: dict[str, dict[str, Any]] = {}
+        day = start
+        weekdays: set[int] = set()
+        while day <= end and len(weekdays) < 7:
+            weekdays.add(day.weekday())
+            day += timedelta(days=1)
+        for weekday in sorted(weekdays):
+            for entry in self._by_weekday_faculty.get((weekday, str(faculty_id)), []):
+                if leave_covers_entry(leave_type, entry):
+                    seen.setdefault(str(entry.get("entry_id")), entry)
+        return list(seen.values())
+
+    def cancelled_on(self, day: date, *, division_id: str | None = None) -> list[Occurrence]:
+        return [occ for occ in self.occurrences(day, day, division_id=division_id) if occ.is_cancelled]
+
+    def hours_lost(self, start: date, end: date, *, group_by: str = "division_id") -> dict[str, float]:
+        """Cancelled teaching hours in ``[start, end]`` grouped by an entry column."""
+        lost: dict[str, float] = defaultdict(float)
+        for occurrence in self.occurrences(start, end):
+            if occurrence.is_cancelled:
+                lost[str(occurrence.entry.get(group_by))] += occurrence.duration_hours()
+        return {key: round(hours, 2) for key, hours in sorted(lost.items())}
+
+
+def _fetch_all(query_factory) -> list[dict]:
+    rows: list[dict] = []
+    start = 0
+    while True:
+        page = query_factory().range(start, start + _PAGE_SIZE - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < _PAGE_SIZE:
+            return rows
+        start += _PAGE_SIZE
+
+
+def resolve_calendar_version(
+    supabase, department_id: str | None = None, role: str | None = None
+) -> dict[str, Any] | None:
+    """The department's effective version as ``role`` sees it (approved > verified > active draft; ``None`` = any)."""
+    version = get_effective_version(supabase, department_id, role)
+    if not version:
+        return None
+    from app.routers.timetable_versions import _hydrate_version_row
+
+    return _hydrate_version_row(version)
+
+
+def get_timetable_calendar(
+    supabase,
+    version: dict[str, Any] | None = None,
+    department_id: str | None = None,
+    role: str | None = None,
+    *,
+    refresh: bool = False,
+) -> TimetableCalendar | None:
+    """Cached calendar for ``version`` (default: the department's effective version for ``role``).
+
+    ``refresh`` rebuilds and re-caches it even when a cached copy exists (cache warming).
+    """
+    version = version or resolve_calendar_version(supabase, department_id, role)
+    if not version:
+        return None
+    version_id = str(version.get("version_id"))
+
+    def _build() -> TimetableCalendar:
+        if version.get("parent_version_id"):
+            entries = sorted(
+                fetch_version_entries(supabase, version_id, _ENTRY_SELECT),
+                key=lambda row: str(row.get("entry_id")),
+            )
+        else:
+            entries = _fetch_all(
+                lambda: supabase.table("timetable_entries").select(_ENTRY_SELECT).eq("version_id", version_id).order("entry_id")
+            )
+        days = supabase.table("days").select("day_id, day_name").execute().data or []
+        leaves = supabase.table("faculty_leaves").select("*").eq("status", "APPROVED").execute().data or []
+        events = supabase.table("campus_events").select("*").execute().data or []
+        try:
+            academic_years = supabase.table("academic_years").select("*").execute().data or []
+        except Exception:
+            academic_years = []
+        return TimetableCalendar(version, entries, days, leaves, events, academic_years)
+
+    if refresh:
+        calendar = _build()
+        _calendars.set(version_id, calendar)
+        return calendar
+    return _calendars.get_or_load(version_id, _build)
+
+
+def invalidate_timetable_calendar() -> None:
+    """Leaves, events, academic years or entries changed: rebuild on next use."""
+    _calendars.clear()
@@ -8,25 +8,10 @@ from typing import Any
 
 
 def fetch_timetable_entries_for_version(supabase: Any, version_id: str) -> list[dict]:
-    """Paginated fetch of all rows for a version (PostgREST range limit safe)."""
-    rows: list[dict] = []
-    start = 0
-    page = 1000
-    while True:
-        chunk = (
-            supabase.table("timetable_entries")
-            .select("*")
-            .eq("version_id", version_id)
-            .range(start, start + page - 1)
-            .execute()
-            .data
-            or []
-        )
-        rows.extend(chunk)
-        if len(chunk) < page:
-            break
-        start += page
-    return rows
+    """Fetch all rows for a version; accepts a Supabase client or a TimetableRepository."""
+    from app.services.timetable_repository import as_timetable_repository
+
+    return as_timetable_repository(supabase).fetch_entries(version_id)
 
 
 def _parse_minutes(t: object) -> int:
@@ -0,0 +1,431 @@
+"""Optional CP-SAT backend that places timetable sessions exactly under the hard constraints.
+
+The greedy scheduler in ``timetable_orchestrator`` relaxes constraints pass by pass when
+it gets stuck. This module compiles the same session tasks into a boolean CP-SAT model
+(one variable per task and candidate block) and maximises the number of placed
+sessions, so a tight department either gets a complete strict timetable or a proof of
+how many sessions cannot fit. ``ortools`` is an optional dependency.
+"""
+from __future__ import annotations
+
+import os
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable
+
+_ORTOOLS_IMPORT_ERROR: str | None = None
+try:
+    from ortools.sat.python import cp_model
+except ImportError as exc:
+    _ORTOOLS_IMPORT_ERROR = str(exc)
+    cp_model = None
+
+Block = tuple[int, tuple[str, ...]]
+
+
+def cpsat_available() -> bool:
+    return cp_model is not None
+
+
+def cpsat_import_error() -> str | None:
+    return _ORTOOLS_IMPORT_ERROR
+
+
+@dataclass
+class CpSatProblem:
+    """Everything the model needs, detached from the orchestrator's mutable state.
+
+    ``tasks`` maps task keys to ``_SessionTask`` objects. ``candidate_blocks`` returns
+    the ``(day_id, slot_ids)`` blocks that pass the static checks (shift window, lunch,
+    contiguity) for a task. ``day_patterns`` lists ``(division_id, batch_id, lunch_order)``
+    rows whose daily slot pattern must stay gapless around the lunch slot.
+    """
+
+    tasks: dict[Hashable, Any]
+    candidate_blocks: Callable[[Any], list[tuple[int, list[str]]]]
+    slot_order_by_id: dict[str, int]
+    theory_room_ids: list[str]
+    lab_room_ids: list[str]
+    batches_by_division: dict[str, list[str]]
+    day_patterns: list[tuple[str, str | None, int | None]] = field(default_factory=list)
+    heavy_subject_ids: set[str] = field(default_factory=set)
+    parallel_group_ids: set[str] = field(default_factory=set)
+    division_daily_limit: int = 6
+    faculty_daily_limit: int = 6
+    max_theory_per_subject_day: int = 2
+    gapless: bool = True
+    break_orders: set[int] = field(default_factory=set)
+    max_idle_slots: int = 2
+    hint: dict[Hashable, tuple[int, list[str], str]] = field(default_factory=dict)
+
+
+@dataclass
+class CpSatResult:
+    status: str
+    placements: dict[Hashable, tuple[int, list[str], str]] = field(default_factory=dict)
+    unscheduled: list[Hashable] = field(default_factory=list)
+    total_tasks: int = 0
+    scheduled_upper_bound: int = 0
+    wall_seconds: float = 0.0
+    workers: int = 0
+    variables: int = 0
+    constraints: int = 0
+    conflicts: int = 0
+    branches: int = 0
+
+    @property
+    def complete(self) -> bool | None:
+        """True when every task is placed, False when the solver proved that impossible."""
+        if len(self.placements) == self.total_tasks:
+            return True
+        if self.status in ("OPTIMAL", "FEASIBLE", "INFEASIBLE") and self.scheduled_upper_bound < self.total_tasks:
+            return False
+        return None
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "status": self.status,
+            "complete": self.complete,
+            "scheduled": len(self.placements),
+            "unscheduled": len(self.unscheduled),
+            "total_tasks": self.total_tasks,
+            "scheduled_upper_bound": self.scheduled_upper_bound,
+            "proven_unschedulable": max(self.total_tasks - self.scheduled_upper_bound, 0),
+            "wall_seconds": round(self.wall_seconds, 3),
+            "workers": self.workers,
+            "variables": self.variables,
+            "constraints": self.constraints,
+            "conflicts": self.conflicts,
+            "branches": self.branches,
+        }
+
+
+class _Unit:
+    """Tasks that share one set of block variables.
+
+    Either a strict parallel-lab group (every member takes the same block, so each
+    member consumes resources) or interchangeable sessions of one division, subject,
+    faculty and batch (pooled: one block per session, so the model has no symmetric
+    copies to search through).
+    """
+
+    def __init__(self, keys: list[Hashable], blocks: list[Block], pooled: bool):
+        self.keys = keys
+        self.blocks = blocks
+        self.pooled = pooled
+        self.members = keys[:1] if pooled else keys
+        self.x: list[Any] = []
+        # member key -> block index -> room_id -> BoolVar, only for multi-slot sessions.
+        self.rooms: dict[Hashable, list[dict[str, Any]]] = {}
+
+
+def _is_multi_slot(task: Any) -> bool:
+    return max(int(task.duration_slots or 1), 1) > 1
+
+
+class CpSatTimetableSolver:
+    def __init__(self, problem: CpSatProblem, time_limit_seconds: float = 30.0, workers: int = 0):
+        self.problem = problem
+        self.time_limit_seconds = max(float(time_limit_seconds), 0.1)
+        self.workers = int(workers) if workers and int(workers) > 0 else (os.cpu_count() or 1)
+
+    def _rooms_for(self, task: Any) -> list[str]:
+        if task.session_type == "LAB":
+            return list(self.problem.lab_room_ids) + list(self.problem.theory_room_ids)
+        return list(self.problem.theory_room_ids)
+
+    def _build_units(self) -> tuple[list[_Unit], list[Hashable]]:
+        problem = self.problem
+        by_group: dict[str, list[Hashable]] = defaultdict(list)
+        by_signature: dict[tuple, list[Hashable]] = defaultdict(list)
+        for key, task in problem.tasks.items():
+            if task.group_id and task.group_id in problem.parallel_group_ids:
+                by_group[task.group_id].append(key)
+            else:
+                signature = (
+                    str(task.division_id),
+                    str(task.faculty_id),
+                    str(task.subject_id),
+                    str(task.batch_id or ""),
+                    task.session_type,
+                    max(int(task.duration_slots or 1), 1),
+                )
+                by_signature[signature].append(key)
+
+        units: list[_Unit] = []
+        impossible: list[Hashable] = []
+        block_cache: dict[Hashable, list[Block]] = {}
+        for key in problem.tasks:
+            block_cache[key] = [
+                (int(day_id), tuple(str(slot_id) for slot_id in slot_ids))
+                for day_id, slot_ids in problem.candidate_blocks(problem.tasks[key])
+            ]
+        for keys in by_signature.values():
+            if block_cache[keys[0]]:
+                units.append(_Unit(keys, block_cache[keys[0]], pooled=True))
+            else:
+                impossible.extend(keys)
+        for keys in by_group.values():
+            shared = set(block_cache[keys[0]])
+            for key in keys[1:]:
+                shared &= set(block_cache[key])
+            blocks = [block for block in block_cache[keys[0]] if block in shared]
+            if blocks:
+                units.append(_Unit(keys, blocks, pooled=False))
+            else:
+                impossible.extend(keys)
+        return units, impossible
+
+    def solve(self) -> CpSatResult:
+        if cp_model is None:
+            raise RuntimeError(f"ortools is not installed: {_ORTOOLS_IMPORT_ERROR}")
+        problem = self.problem
+        tasks = problem.tasks
+        model = cp_model.CpModel()
+        units, impossible = self._build_units()
+
+        # (day_id, slot_id) -> [(coefficient-1 var, task)] for every variable covering that cell.
+        covering: dict[tuple[int, str], list[tuple[Any, Any]]] = defaultdict(list)
+        # Multi-slot sessions get explicit room variables; single-slot ones are counted
+        # per room pool and get rooms after solving (exact, since each slot is independent).
+        explicit_room_use: dict[tuple[int, str, str], list[Any]] = defaultdict(list)
+        single_pool_use: dict[tuple[int, str], dict[str, list[Any]]] = defaultdict(lambda: {"THEORY": [], "ANY": []})
+        theory_rooms = set(problem.theory_room_ids)
+        objective_terms = []
+
+        for unit_index, unit in enumerate(units):
+            unit.x = [model.NewBoolVar(f"u{unit_index}_b{block_index}") for block_index in range(len(unit.blocks))]
+            if unit.pooled:
+                model.Add(sum(unit.x) <= len(unit.keys))
+                objective_terms.append(sum(unit.x))
+            else:
+                model.AddAtMostOne(unit.x)
+                objective_terms.append(len(unit.keys) * sum(unit.x))
+            for key in unit.members:
+                task = tasks[key]
+                rooms = self._rooms_for(task)
+                per_block_rooms: list[dict[str, Any]] = []
+                for block_index, (day_id, slot_ids) in enumerate(unit.blocks):
+                    var = unit.x[block_index]
+                    for slot_id in slot_ids:
+                        covering[(day_id, slot_id)].append((var, task))
+                    if _is_multi_slot(task):
+                        room_vars = {room_id: model.NewBoolVar(f"u{unit_index}_{block_index}_{room_id}") for room_id in rooms}
+                        model.Add(sum(room_vars.values()) == var)
+                        for room_id, room_var in room_vars.items():
+                            for slot_id in slot_ids:
+                                explicit_room_use[(day_id, slot_id, room_id)].append(room_var)
+                        per_block_rooms.append(room_vars)
+                    else:
+                        pool = "ANY" if task.session_type == "LAB" else "THEORY"
+                        for slot_id in slot_ids:
+                            single_pool_use[(day_id, slot_id)][pool].append(var)
+                if per_block_rooms:
+                    unit.rooms[key] = per_block_rooms
+
+        # Faculty, division/batch, subject spread and daily caps, per cell and per day.
+        faculty_cells: dict[tuple[str, int, str], list[Any]] = defaultdict(list)
+        batch_cells: dict[tuple[str, str | None, int, str], list[Any]] = defaultdict(list)
+        faculty_day_hours: dict[tuple[str, int], list[Any]] = defaultdict(list)
+        division_day_hours: dict[tuple[str, int], list[Any]] = defaultdict(list)
+        subject_day: dict[tuple[str, str, int], list[Any]] = defaultdict(list)
+        subject_cells: dict[tuple[str, str, int, int], list[Any]] = defaultdict(list)
+        heavy_cells: dict[tuple[str, int, int], list[Any]] = defaultdict(list)
+        for (day_id, slot_id), items in covering.items():
+            order = problem.slot_order_by_id.get(slot_id, 0)
+            for var, task in items:
+                division_id = str(task.division_id)
+                faculty_cells[(str(task.faculty_id), day_id, slot_id)].append(var)
+                if task.batch_id:
+                    batch_cells[(division_id, str(task.batch_id), day_id, slot_id)].append(var)
+                else:
+                    for batch_id in problem.batches_by_division.get(division_id) or [None]:
+                        batch_cells[(division_id, batch_id, day_id, slot_id)].append(var)
+                if task.session_type in ("THEORY", "LAB"):
+                    faculty_day_hours[(str(task.faculty_id), day_id)].append(var)
+                    division_day_hours[(division_id, day_id)].append(var)
+                if task.session_type == "THEORY":
+                    subject_cells[(division_id, str(task.subject_id), day_id, order)].append(var)
+                    if str(task.subject_id) in problem.heavy_subject_ids:
+                        heavy_cells[(division_id, day_id, order)].append(var)
+        for unit in units:
+            for key in unit.members:
+                task = tasks[key]
+                if task.session_type == "THEORY":
+                    for block_index, (day_id, _) in enumerate(unit.blocks):
+                        subject_day[(str(task.division_id), str(task.subject_id), day_id)].append(unit.x[block_index])
+
+        for group in (faculty_cells, batch_cells):
+            for variables in group.values():
+                if len(variables) > 1:
+                    model.Add(sum(variables) <= 1)
+        for variables in division_day_hours.values():
+            if len(variables) > problem.division_daily_limit:
+                model.Add(sum(variables) <= problem.division_daily_limit)
+        for variables in faculty_day_hours.values():
+            if len(variables) > problem.faculty_daily_limit:
+                model.Add(sum(variables) <= problem.faculty_daily_limit)
+        for variables in subject_day.values():
+            if len(variables) > problem.max_theory_per_subject_day:
+                model.Add(sum(variables) <= problem.max_theory_per_subject_day)
+        # No back-to-back theory of the same subject, nor of two heavy subjects.
+        for (division_id, subject_id, day_id, order), variables in subject_cells.items():
+            following = subject_cells.get((division_id, subject_id, day_id, order + 1))
+            if following:
+                model.Add(sum(variables) + sum(following) <= 1)
+        for (division_id, day_id, order), variables in heavy_cells.items():
+            following = heavy_cells.get((division_id, day_id, order + 1))
+            if following:
+                model.Add(sum(variables) + sum(following) <= 1)
+
+        # Rooms: one session per explicit room, and per-pool capacity for the rest.
+        theory_capacity = len(problem.theory_room_ids)
+        total_capacity = theory_capacity + len(problem.lab_room_ids)
+        explicit_by_cell: dict[tuple[int, str], dict[str, list[Any]]] = defaultdict(lambda: {"THEORY": [], "ANY": []})
+        for (day_id, slot_id, room_id), variables in explicit_room_use.items():
+            if len(variables) > 1:
+                model.Add(sum(variables) <= 1)
+            explicit_by_cell[(day_id, slot_id)]["ANY"].extend(variables)
+            if room_id in theory_rooms:
+                explicit_by_cell[(day_id, slot_id)]["THEORY"].extend(variables)
+        for cell in set(single_pool_use) | set(explicit_by_cell):
+            singles = single_pool_use.get(cell, {"THEORY": [], "ANY": []})
+            explicit = explicit_by_cell.get(cell, {"THEORY": [], "ANY": []})
+            if singles["THEORY"]:
+                model.Add(sum(singles["THEORY"]) + sum(explicit["THEORY"]) <= theory_capacity)
+            if singles["THEORY"] or singles["ANY"]:
+                model.Add(sum(singles["THEORY"]) + sum(singles["ANY"]) + sum(explicit["ANY"]) <= total_capacity)
+
+        if problem.gapless:
+            self._add_gapless(model, covering)
+
+        model.Maximize(sum(objective_terms))
+        self._add_hints(model, units)
+
+        solver = cp_model.CpSolver()
+        solver.parameters.max_time_in_seconds = self.time_limit_seconds
+        solver.parameters.num_workers = self.workers
+        status_code = solver.Solve(model)
+        status = solver.StatusName(status_code)
+        proto = model.Proto()
+        result = CpSatResult(
+            status=status,
+            total_tasks=len(tasks),
+            wall_seconds=solver.WallTime(),
+            workers=self.workers,
+            variables=len(proto.variables),
+            constraints=len(proto.constraints),
+            conflicts=solver.NumConflicts(),
+            branches=solver.NumBranches(),
+        )
+        if status_code not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            result.unscheduled = list(tasks)
+            result.scheduled_upper_bound = len(tasks)
+            return result
+        result.scheduled_upper_bound = int(round(solver.BestObjectiveBound()))
+        result.placements = self._extract(solver, units)
+        result.unscheduled = [key for key in tasks if key not in result.placements]
+        return result
+
+    def _add_gapless(self, model: Any, covering: dict[tuple[int, str], list[tuple[Any, Any]]]) -> None:
+        """Each (division, batch, day) pattern is contiguous on both sides of its lunch slot."""
+        problem = self.problem
+        occupancy: dict[tuple[str, str | None, int], dict[int, list[Any]]] = defaultdict(lambda: defaultdict(list))
+        for (day_id, slot_id), items in covering.items():
+            order = problem.slot_order_by_id.get(slot_id, 0)
+            for var, task in items:
+                division_id = str(task.division_id)
+                if task.batch_id:
+                    occupancy[(division_id, str(task.batch_id), day_id)][order].append(var)
+                else:
+                    for batch_id in problem.batches_by_division.get(division_id) or [None]:
+                        occupancy[(division_id, batch_id, day_id)][order].append(var)
+        lunch_by_pattern = {(str(division_id), batch_id): lunch for division_id, batch_id, lunch in problem.day_patterns}
+        for (division_id, batch_id, day_id), by_order in occupancy.items():
+            lunch = lunch_by_pattern.get((division_id, batch_id))
+            orders = sorted(by_order)
+            sides = [orders] if lunch is None else [[o for o in orders if o < lunch], [o for o in orders if o > lunch]]
+            for side in sides:
+                if len(side) < 2:
+                    continue
+                starts = []
+                previous = None
+                for order in range(side[0], side[-1] + 1):
+                    current = sum(by_order.get(order, [])) if order in by_order else 0
+                    start = model.NewBoolVar(f"start_{division_id}_{batch_id}_{day_id}_{order}")
+                    # start >= occupied(order) - occupied(order - 1): every run of sessions opens once.
+                    model.Add(start >= current - (previous if previous is not None else 0))
+                    starts.append(start)
+                    previous = current
+                model.Add(sum(starts) <= 1)
+            if lunch is None or not sides[0] or not sides[1]:
+                continue
+            # Both runs are contiguous, so the only idle stretch is the one around lunch;
+            # the validator allows at most ``max_idle_slots`` of it (break slots excluded).
+            for before in sides[0]:
+                for after in sides[1]:
+                    idle = [order for order in range(before + 1, after) if order not in problem.break_orders]
+                    if len(idle) <= problem.max_idle_slots:
+                        continue
+                    between = [var for order in range(before + 1, after) for var in by_order.get(order, [])]
+                    model.Add(sum(by_order[before]) + sum(by_order[after]) - sum(between) <= 1)
+
+    def _add_hints(self, model: Any, units: list[_Unit]) -> None:
+        hint = self.problem.hint
+        if not hint:
+            return
+        for unit in units:
+            # block -> hinted room per member key
+            hinted: dict[Block, dict[Hashable, str]] = defaultdict(dict)
+            for key in unit.keys:
+                placed = hint.get(key)
+                if placed:
+                    block = (int(placed[0]), tuple(str(slot_id) for slot_id in placed[1]))
+                    hinted[block][unit.members[0] if unit.pooled else key] = str(placed[2])
+            for block_index, block in enumerate(unit.blocks):
+                model.AddHint(unit.x[block_index], 1 if block in hinted else 0)
+            for key, per_block_rooms in unit.rooms.items():
+                for block_index, room_vars in enumerate(per_block_rooms):
+                    room_hint = hinted.get(unit.blocks[block_index], {}).get(key)
+                    for room_id, room_var in room_vars.items():
+                        model.AddHint(room_var, 1 if room_id == room_hint else 0)
+
+    def _extract(self, solver: Any, units: list[_Unit]) -> dict[Hashable, tuple[int, list[str], str]]:
+        problem = self.problem
+        placements: dict[Hashable, tuple[int, list[str], str]] = {}
+        taken: set[tuple[int, str, str]] = set()
+        pending_singles: list[tuple[Hashable, Block]] = []
+
+        def place(key: Hashable, block: Block, room_vars: dict[str, Any] | None) -> None:
+            if room_vars is None:
+                pending_singles.append((key, block))
+                return
+            day_id, slot_ids = block
+            room_id = next(room for room, var in room_vars.items() if solver.Value(var))
+            placements[key] = (day_id, list(slot_ids), room_id)
+            taken.update((day_id, slot_id, room_id) for slot_id in slot_ids)
+
+        for unit in units:
+            chosen = [index for index, var in enumerate(unit.x) if solver.Value(var)]
+            if unit.pooled:
+                per_block_rooms = unit.rooms.get(unit.members[0])
+                for key, block_index in zip(unit.keys, chosen):
+                    place(key, unit.blocks[block_index], per_block_rooms[block_index] if per_block_rooms else None)
+            elif chosen:
+                for key in unit.keys:
+                    per_block_rooms = unit.rooms.get(key)
+                    place(key, unit.blocks[chosen[0]], per_block_rooms[chosen[0]] if per_block_rooms else None)
+
+        # Theory-only sessions first so labs take whatever lab room or classroom is left.
+        pending_singles.sort(key=lambda item: problem.tasks[item[0]].session_type == "LAB")
+        for key, (day_id, slot_ids) in pending_singles:
+            task = problem.tasks[key]
+            room_id = next(
+                (room for room in self._rooms_for(task) if all((day_id, slot_id, room) not in taken for slot_id in slot_ids)),
+                None,
+            )
+            if room_id is None:
+                continue
+            placements[key] = (day_id, list(slot_ids), room_id)
+            taken.update((day_id, slot_id, room_id) for slot_id in slot_ids)
+        return placements
@@ -8,6 +8,7 @@ from app.config import settings
 from app.services.timetable_constraint_validator import TimetableConstraintValidator, TimetableSnapshot
 from app.services.timetable_conflict_audit import audit_timetable_conflicts
 from app.services.timetable_orchestrator import _division_level_from_name, _normalize_year_level
+from app.services.timetable_repository import as_timetable_repository
 from app.services.timetable_scheduling_types import MasterData, SHIFT_WINDOWS, TimetableEntry
 
 
@@ -15,7 +16,8 @@ class TimetableCriticAgent:
     """Hybrid critic: deterministic checks + Nova Pro narrative critique."""
 
     def __init__(self, supabase: Any) -> None:
-        self.supabase = supabase
+        # Accepts a Supabase client or any TimetableRepository (e.g. the SQLite backend).
+        self.repository = as_timetable_repository(supabase)
 
     def analyze(
         self,
@@ -23,44 +25,20 @@ class TimetableCriticAgent:
         version_id: str,
         stress_hour_threshold: int = 4,
     ) -> dict[str, Any]:
-        version_row = (
-            self.supabase.table("timetable_versions")
-            .select("version_id, department_id")
-            .eq("version_id", version_id)
-            .single()
-            .execute()
-            .data
-        ) or {}
+        version_row = self.repository.fetch_version(version_id) or {}
         department_id = version_row.get("department_id")
 
-        entries = (
-            self.supabase.table("timetable_entries")
-            .select(
-                "entry_id, version_id, day_id, slot_id, faculty_id, room_id, division_id, "
-                "subject_id, session_type, batch_id"
-            )
-            .eq("version_id", version_id)
-            .execute()
-            .data
-            or []
-        )
+        entries = self.repository.fetch_entries(version_id)
         if not entries:
             raise ValueError("No timetable entries found for this version.")
 
-        days = self.supabase.table("days").select("day_id, day_name").execute().data or []
-        slots = (
-            self.supabase.table("time_slots")
-            .select("slot_id, slot_order, start_time, end_time, is_break")
-            .order("slot_order")
-            .execute()
-            .data
-            or []
-        )
-        faculty = self.supabase.table("faculty").select("faculty_id, faculty_name").execute().data or []
-        rooms = self.supabase.table("rooms").select("room_id, room_number").execute().data or []
-        divisions = self.supabase.table("divisions").select("division_id, division_name").execute().data or []
-        subjects = self.supabase.table("subjects").select("subject_id, subject_name").execute().data or []
-        batches = self.supabase.table("batches").select("batch_id, batch_code").execute().data or []
+        days = self.repository.fetch_days()
+        slots = self.repository.fetch_time_slots()
+        faculty = self.repository.fetch_faculty()
+        rooms = self.repository.fetch_rooms()
+        divisions = self.repository.fetch_divisions()
+        subjects = self.repository.fetch_subjects()
+        batches = self.repository.fetch_batches()
 
         days_by_id = {str(row["day_id"]): row for row in days}
         faculty_by_id = {str(row["faculty_id"]): row for row in faculty}
@@ -142,46 +120,13 @@ class TimetableCriticAgent:
 
     def _build_master_data(self, department_id: str | None) -> MasterData:
         """Build MasterData consistent with generator/validator expectations."""
-        slot_rows = (
-            self.supabase.table("time_slots")
-            .select("slot_id, slot_order, is_break, start_time, end_time")
-            .order("slot_order")
-            .execute()
-            .data
-            or []
-        )
-        day_rows = (
-            self.supabase.table("days")
-            .select("day_id, day_name, is_working_day")
-            .eq("is_working_day", True)
-            .order("day_id")
-            .execute()
-            .data
-            or []
-        )
-
-        room_query = self.supabase.table("rooms").select("room_id, room_type, is_active, room_number")
-        if department_id:
-            room_query = room_query.eq("department_id", department_id)
-        room_rows = [r for r in (room_query.execute().data or []) if r.get("is_active", True)]
-
-        division_query = self.supabase.table("divisions").select("division_id, division_name, year")
-        if department_id:
-            division_query = division_query.eq("department_id", department_id)
-        division_rows = division_query.execute().data or []
-
-        subject_query = self.supabase.table("subjects").select("subject_id, subject_name")
-        if department_id:
-            subject_query = subject_query.eq("department_id", department_id)
-        subject_rows = subject_query.execute().data or []
-
-        faculty_query = self.supabase.table("faculty").select("faculty_id, faculty_name")
-        if department_id:
-            faculty_query = faculty_query.eq("department_id", department_id)
-        faculty_rows = faculty_query.execute().data or []
-
-        batch_query = self.supabase.table("batches").select("batch_id, division_id, is_active")
-        batch_rows = [b for b in (batch_query.execute().data or []) if b.get("is_active", True)]
+        slot_rows = self.repository.fetch_time_slots()
+        day_rows = self.repository.fetch_days(working_only=True)
+        room_rows = [r for r in self.repository.fetch_rooms(department_id=department_id) if r.get("is_active", True)]
+        division_rows = self.repository.fetch_divisions(department_id=department_id)
+        subject_rows = self.repository.fetch_subjects(department_id=department_id)
+        faculty_rows = self.repository.fetch_faculty(department_id=department_id)
+        batch_rows = [b for b in self.repository.fetch_batches() if b.get("is_active", True)]
 
         slot_order_by_id = {str(s["slot_id"]): int(s.get("slot_order") or 0) for s in slot_rows if s.get("slot_id")}
         slot_id_by_order = {int(s.get("slot_order") or 0): str(s["slot_id"]) for s in slot_rows if s.get("slot_id")}
@@ -0,0 +1,394 @@
+"""Pre-solve capacity analysis of a compiled session task set.
+
+Cheap counting bounds that no placement can beat: a faculty member's teaching time
+against the slots in a week, a division's time against its daily caps and shift
+window, and room-slots (2-slot lab blocks in particular) against the rooms open
+in each shift. Violations are reported per resource with the tasks that cannot fit,
+so a run can fail fast or carry on without them.
+"""
+from __future__ import annotations
+
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from app.services.timetable_scheduling_types import (
+    DIVISION_DAILY_CAP_RELAXED,
+    DIVISION_DAILY_CAP_STRICT,
+    FACULTY_DAILY_CAP_RELAXED,
+    FACULTY_DAILY_CAP_STRICT,
+    SHIFT_LUNCH_SLOT_TIMES,
+)
+
+PRECHECK_MODES = ("off", "continue", "fail_fast")
+
+INFEASIBLE = "infeasible"
+TIGHT = "tight"
+
+# Lab blocks are the hardest to place, so shedding them first leaves a set the solver can finish.
+_DROP_ORDER = {"LAB": 0, "TUTORIAL": 1, "THEORY": 2}
+
+
+def _minutes(value: Any) -> int | None:
+    parts = str(value or "").strip().split(":")
+    try:
+        return int(parts[0]) * 60 + int(parts[1])
+    except (ValueError, IndexError):
+        return None
+
+
+@dataclass
+class CapacityIssue:
+    resource: str
+    resource_id: str
+    label: str
+    severity: str
+    demand: int
+    capacity: int
+    detail: str
+    tasks: list[Any] = field(default_factory=list)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "resource": self.resource,
+            "resource_id": self.resource_id,
+            "label": self.label,
+            "severity": self.severity,
+            "demand": self.demand,
+            "capacity": self.capacity,
+            "detail": self.detail,
+            "unfittable_sessions": len(self.tasks),
+        }
+
+
+@dataclass
+class FeasibilityReport:
+    issues: list[CapacityIssue] = field(default_factory=list)
+    checked: dict[str, int] = field(default_factory=dict)
+    elapsed_ms: float = 0.0
+
+    @property
+    def infeasible(self) -> list[CapacityIssue]:
+        return [issue for issue in self.issues if issue.severity == INFEASIBLE]
+
+    @property
+    def tight(self) -> list[CapacityIssue]:
+        return [issue for issue in self.issues if issue.severity == TIGHT]
+
+    @property
+    def unfittable_tasks(self) -> list[Any]:
+        seen: set[int] = set()
+        result: list[Any] = []
+        for issue in self.infeasible:
+            for task in issue.tasks:
+                if id(task) not in seen:
+                    seen.add(id(task))
+                    result.append(task)
+        return result
+
+    def explanation(self, limit: int = 10) -> str:
+        lines = [f"{issue.label}: {issue.detail}" for issue in self.infeasible[:limit]]
+        if len(self.infeasible) > limit:
+            lines.append(f"... and {len(self.infeasible) - limit} more")
+        return "; ".join(lines)
+
+    def as_dict(self, task_key: Callable[[Any], str] | None = None) -> dict[str, Any]:
+        payload: dict[str, Any] = {
+            "feasible": not self.infeasible,
+            "infeasible_count": len(self.infeasible),
+            "tight_count": len(self.tight),
+            "issues": [issue.as_dict() for issue in self.issues],
+            "unfittable_sessions": len(self.unfittable_tasks),
+            "checked": dict(self.checked),
+            "elapsed_ms": round(self.elapsed_ms, 2),
+        }
+        if task_key is not None:
+            payload["unfittable_task_keys"] = [task_key(task) for task in self.unfittable_tasks]
+        return payload
+
+
+def _duration(task: Any) -> int:
+    return max(int(task.duration_slots or 1), 1)
+
+
+def _shared_lab_group(task: Any) -> str | None:
+    # Batches of one lab group run side by side under the same faculty member.
+    if task.session_type == "LAB" and task.batch_id and task.group_id:
+        return str(task.group_id)
+    return None
+
+
+def _pick_to_cover(tasks: list[Any], excess: int) -> list[Any]:
+    """Tasks to skip (labs, then tutorials, then theory; latest first) covering ``excess`` slots.
+
+    Lab groups are dropped whole so the remaining batches stay parallel.
+    """
+    if excess <= 0:
+        return []
+    units: list[list[Any]] = []
+    grouped: dict[str, list[Any]] = {}
+    for task in tasks:
+        group = _shared_lab_group(task)
+        if group is None:
+            units.append([task])
+        elif group in grouped:
+            grouped[group].append(task)
+        else:
+            grouped[group] = [task]
+            units.append(grouped[group])
+    ordered = sorted(
+        enumerate(units),
+        key=lambda item: (_DROP_ORDER.get(item[1][0].session_type, 2), -item[0]),
+    )
+    picked: list[Any] = []
+    covered = 0
+    for _, unit in ordered:
+        if covered >= excess:
+            break
+        picked.extend(unit)
+        covered += _duration(unit[0])
+    return picked
+
+
+class CapacityAnalyzer:
+    """Counting bounds over one week; all figures are in slots (one slot = one teaching hour)."""
+
+    def __init__(
+        self,
+        *,
+        slot_rows: list[dict[str, Any]],
+        working_days: int,
+        division_windows: dict[str, tuple[str, tuple[int, int]]],
+        theory_rooms: int,
+        lab_rooms: int,
+        names: dict[str, dict[str, str]] | None = None,
+    ) -> None:
+        self.working_days = max(int(working_days), 1)
+        self.division_windows = division_windows
+        self.theory_rooms = max(int(theory_rooms), 0)
+        self.lab_rooms = max(int(lab_rooms), 0)
+        self.names = names or {}
+        self._slots: list[tuple[int, int, int]] = []
+        for row in sorted(slot_rows, key=lambda item: int(item.get("slot_order") or 0)):
+            start, end = _minutes(row.get("start_time")), _minutes(row.get("end_time"))
+            if start is None or end is None or row.get("is_break"):
+                continue
+            self._slots.append((int(row.get("slot_order") or 0), start, end))
+
+    def _label(self, kind: str, resource_id: str) -> str:
+        name = self.names.get(kind, {}).get(resource_id)
+        return f"{kind.title()} {name or resource_id}"
+
+    def _window_orders(self, shift_name: str | None, window: tuple[int, int] | None) -> list[int]:
+        lunch = SHIFT_LUNCH_SLOT_TIMES.get(shift_name or "")
+        lunch_bounds = (_minutes(lunch[0]), _minutes(lunch[1])) if lunch else None
+        return [
+            order
+            for order, start, end in self._slots
+            if (window is None or (window[0] <= start and end <= window[1])) and (start, end) != lunch_bounds
+        ]
+
+    @staticmethod
+    def _blocks_per_day(orders: list[int], duration: int) -> int:
+        """Disjoint ``duration``-slot runs of consecutive slot orders."""
+        blocks = 0
+        run = 0
+        previous: int | None = None
+        for order in sorted(set(orders)):
+            run = run + 1 if previous is not None and order == previous + 1 else 1
+            previous = order
+            if run == duration:
+                blocks += 1
+                run = 0
+        return blocks
+
+    def analyse(self, tasks: list[Any]) -> FeasibilityReport:
+        started = time.perf_counter()
+        report = FeasibilityReport()
+        days = self.working_days
+        day_slots = len(self._slots)
+
+        # Faculty: one place at a time; theory + lab also under the validator's daily cap.
+        by_faculty: dict[str, list[Any]] = defaultdict(list)
+        for task in tasks:
+            by_faculty[str(task.faculty_id)].append(task)
+        for faculty_id, faculty_tasks in by_faculty.items():
+            seen_groups: set[str] = set()
+            total = 0
+            theory_lab = 0
+            window_orders: set[int] = set()
+            for task in faculty_tasks:
+                group = _shared_lab_group(task)
+                if group is not None:
+                    if group in seen_groups:
+                        continue
+                    seen_groups.add(group)
+                total += _duration(task)
+                if task.session_type in ("THEORY", "LAB"):
+                    theory_lab += _duration(task)
+                    shift_name, window = self.division_windows.get(str(task.division_id), (None, None))
+                    window_orders.update(self._window_orders(shift_name, window))
+            hard_capacity = days * day_slots
+            cap_capacity = days * FACULTY_DAILY_CAP_RELAXED
+            excess = max(total - hard_capacity, theory_lab - cap_capacity)
+            if excess > 0:
+                over_cap = theory_lab - cap_capacity >= total - hard_capacity
+                report.issues.append(
+                    CapacityIssue(
+                        resource="faculty",
+                        resource_id=faculty_id,
+                        label=self._label("faculty", faculty_id),
+                        severity=INFEASIBLE,
+                        demand=theory_lab if over_cap else total,
+                        capacity=cap_capacity if over_cap else hard_capacity,
+                        detail=(
+                            f"{theory_lab} theory/lab slots exceed {days} days x {FACULTY_DAILY_CAP_RELAXED} daily cap"
+                            if over_cap
+                            else f"{total} teaching slots exceed {days} days x {day_slots} slots"
+                        ),
+                        tasks=_pick_to_cover(faculty_tasks, excess),
+                    )
+                )
+            elif theory_lab > days * FACULTY_DAILY_CAP_STRICT or theory_lab > days * len(window_orders):
+                capacity = min(days * FACULTY_DAILY_CAP_STRICT, days * len(window_orders))
+                report.issues.append(
+                    CapacityIssue(
+                        resource="faculty",
+                        resource_id=faculty_id,
+                        label=self._label("faculty", faculty_id),
+                        severity=TIGHT,
+                        demand=theory_lab,
+                        capacity=capacity,
+                        detail=f"{theory_lab} theory/lab slots need relaxed daily caps or shift windows (strict bound {capacity})",
+                    )
+                )
+        report.checked["faculty"] = len(by_faculty)
+
+        # Divisions: whole-division sessions plus the busiest batch's own sessions.
+        by_division: dict[str, list[Any]] = defaultdict(list)
+        for task in tasks:
+            by_division[str(task.division_id)].append(task)
+        for division_id, division_tasks in by_division.items():
+            shift_name, window = self.division_windows.get(division_id, (None, None))
+            full_total = sum(_duration(task) for task in division_tasks if not task.batch_id)
+            full_theory_lab = sum(
+                _duration(task) for task in division_tasks if not task.batch_id and task.session_type in ("THEORY", "LAB")
+            )
+            batch_total: dict[str, int] = defaultdict(int)
+            batch_theory_lab: dict[str, int] = defaultdict(int)
+            for task in division_tasks:
+                if task.batch_id:
+                    batch_total[str(task.batch_id)] += _duration(task)
+                    if task.session_type in ("THEORY", "LAB"):
+                        batch_theory_lab[str(task.batch_id)] += _duration(task)
+            total = full_total + max(batch_total.values(), default=0)
+            theory_lab = full_theory_lab + max(batch_theory_lab.values(), default=0)
+            day_orders = self._window_orders(shift_name, None)
+            in_window = self._window_orders(shift_name, window)
+            hard_capacity = days * len(day_orders)
+            cap_capacity = days * DIVISION_DAILY_CAP_RELAXED
+            excess = max(total - hard_capacity, theory_lab - cap_capacity)
+            if excess > 0:
+                over_cap = theory_lab - cap_capacity >= total - hard_capacity
+                report.issues.append(
+                    CapacityIssue(
+                        resource="division",
+                        resource_id=division_id,
+                        label=self._label("division", division_id),
+                        severity=INFEASIBLE,
+                        demand=theory_lab if over_cap else total,
+                        capacity=cap_capacity if over_cap else hard_capacity,
+                        detail=(
+                            f"{theory_lab} theory/lab slots exceed {days} days x DIVISION_DAILY_CAP_RELAXED ({DIVISION_DAILY_CAP_RELAXED})"
+                            if over_cap
+                            else f"{total} slots exceed {days} days x {len(day_orders)} teaching slots"
+                        ),
+                        tasks=_pick_to_cover([task for task in division_tasks if not task.batch_id] or division_tasks, excess),
+                    )
+                )
+            elif theory_lab > days * DIVISION_DAILY_CAP_STRICT or theory_lab > days * len(in_window):
+                capacity = min(days * DIVISION_DAILY_CAP_STRICT, days * len(in_window))
+                report.issues.append(
+                    CapacityIssue(
+                        resource="division",
+                        resource_id=division_id,
+                        label=self._label("division", division_id),
+                        severity=TIGHT,
+                        demand=theory_lab,
+                        capacity=capacity,
+                        detail=(
+                            f"{theory_lab} theory/lab slots exceed {days} days x "
+                            f"min(DIVISION_DAILY_CAP_STRICT, {len(in_window)} {shift_name or 'window'} slots)"
+                        ),
+                    )
+                )
+        report.checked["divisions"] = len(by_division)
+
+        # Rooms per shift window: lab blocks against lab rooms, theory hours against classrooms.
+        all_rooms = self.theory_rooms + self.lab_rooms
+        by_shift: dict[str, list[Any]] = defaultdict(list)
+        for task in tasks:
+            shift_name, _window = self.division_windows.get(str(task.division_id), (None, None))
+            by_shift[shift_name or "UNASSIGNED"].append(task)
+        for shift_name, shift_tasks in sorted(by_shift.items()):
+            _name, window = next(
+                (value for value in self.division_windows.values() if value[0] == shift_name),
+                (None, None),
+            )
+            orders = self._window_orders(shift_name, window)
+            lab_blocks: dict[int, int] = defaultdict(int)
+            for task in shift_tasks:
+                if task.session_type == "LAB":
+                    lab_blocks[_duration(task)] += 1
+            for duration, blocks in sorted(lab_blocks.items()):
+                per_room = days * self._blocks_per_day(orders, duration)
+                if blocks <= self.lab_rooms * per_room:
+                    continue
+                severity = INFEASIBLE if blocks > all_rooms * per_room else TIGHT
+                report.issues.append(
+                    CapacityIssue(
+                        resource="lab_rooms",
+                        resource_id=shift_name,
+                        label=f"Lab rooms in {shift_name}",
+                        severity=severity,
+                        demand=blocks,
+                        capacity=self.lab_rooms * per_room,
+                        detail=(
+                            f"{blocks} {duration}-slot lab blocks but {self.lab_rooms} lab rooms x {per_room} block positions"
+                            + ("" if severity == INFEASIBLE else "; the rest must spill into classrooms")
+                        ),
+                    )
+                )
+            # Every batch of a lab group holds its own room; tutorials may leave the window.
+            room_hours = sum(_duration(task) for task in shift_tasks if task.session_type != "TUTORIAL")
+            room_capacity = all_rooms * days * len(orders)
+            if room_hours > room_capacity:
+                report.issues.append(
+                    CapacityIssue(
+                        resource="rooms",
+                        resource_id=shift_name,
+                        label=f"Rooms in {shift_name}",
+                        severity=TIGHT,
+                        demand=room_hours,
+                        capacity=room_capacity,
+                        detail=f"{room_hours} room-slots but {all_rooms} rooms x {days} days x {len(orders)} slots; needs shift relaxation",
+                    )
+                )
+        total_room_hours = sum(_duration(task) for task in tasks)
+        total_room_capacity = all_rooms * days * day_slots
+        if total_room_hours > total_room_capacity:
+            report.issues.append(
+                CapacityIssue(
+                    resource="rooms",
+                    resource_id="ALL",
+                    label="All rooms",
+                    severity=INFEASIBLE,
+                    demand=total_room_hours,
+                    capacity=total_room_capacity,
+                    detail=f"{total_room_hours} room-slots but {all_rooms} rooms x {days} days x {day_slots} slots",
+                )
+            )
+        report.checked["shifts"] = len(by_shift)
+        report.elapsed_ms = (time.perf_counter() - started) * 1000.0
+        return report
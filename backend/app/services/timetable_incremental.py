@@ -0,0 +1,154 @@
+"""Warm-start support: reuse a base version's placements when regenerating a timetable.
+
+Timetable entries are stored one row per slot. Rows of the same session are regrouped
+into blocks and matched against the freshly built session tasks, so unchanged sessions
+can be pinned where they were and only added or changed ones need scheduling.
+"""
+from __future__ import annotations
+
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+Placement = tuple[int, list[str], str]
+
+
+def _entry_value(row: dict[str, Any], name: str) -> str:
+    value = row.get(name)
+    return "" if value in (None, "") else str(value)
+
+
+@dataclass
+class BasePins:
+    placements: dict[str, Placement] = field(default_factory=dict)
+    # Pins that moved to a task whose faculty changed (same division/subject/batch/type).
+    rehomed_keys: set[str] = field(default_factory=set)
+    base_blocks: int = 0
+    dropped_blocks: int = 0
+    new_tasks: int = 0
+
+    def as_dict(self) -> dict[str, int]:
+        return {
+            "base_blocks": self.base_blocks,
+            "pinned": len(self.placements) - len(self.rehomed_keys),
+            "rehomed": len(self.rehomed_keys),
+            "dropped_blocks": self.dropped_blocks,
+            "new_tasks": self.new_tasks,
+        }
+
+
+def pins_from_base_entries(
+    tasks: list[Any],
+    entries: list[dict[str, Any]],
+    slot_order_by_id: dict[str, int],
+    task_key: Callable[[Any], str],
+) -> BasePins:
+    """Match base-version entry blocks to tasks.
+
+    Blocks first match tasks with the same division, faculty, subject, batch, session
+    type and duration; leftovers then match ignoring the faculty, so a faculty swap
+    keeps the old slot instead of being rescheduled from scratch.
+    """
+    duration_by_session: dict[tuple[str, str, str, str], int] = {}
+    for task in tasks:
+        duration_by_session[(str(task.division_id), str(task.subject_id), str(task.batch_id or ""), task.session_type)] = max(
+            int(task.duration_slots or 1), 1
+        )
+
+    rows_by_session: dict[tuple[str, ...], list[int]] = defaultdict(list)
+    slot_id_by_order: dict[int, str] = {order: slot_id for slot_id, order in slot_order_by_id.items()}
+    for row in entries:
+        slot_id = _entry_value(row, "slot_id")
+        if slot_id not in slot_order_by_id or not row.get("day_id"):
+            continue
+        session = (
+            _entry_value(row, "division_id"),
+            _entry_value(row, "faculty_id"),
+            _entry_value(row, "subject_id"),
+            _entry_value(row, "batch_id"),
+            str(row.get("session_type") or "THEORY").upper(),
+            str(int(row["day_id"])),
+            _entry_value(row, "room_id"),
+        )
+        rows_by_session[session].append(slot_order_by_id[slot_id])
+
+    # (division, faculty, subject, batch, type, duration) -> [(day_id, slot_ids, room_id)]
+    blocks_by_signature: dict[tuple[str, str, str, str, str, int], list[Placement]] = defaultdict(list)
+    result = BasePins()
+    for (division_id, faculty_id, subject_id, batch_id, session_type, day_id, room_id), orders in rows_by_session.items():
+        duration = duration_by_session.get((division_id, subject_id, batch_id, session_type), 1)
+        run: list[int] = []
+        for order in sorted(set(orders)) + [None]:
+            if order is not None and (not run or order == run[-1] + 1):
+                run.append(order)
+                continue
+            for start in range(0, len(run) - duration + 1, duration):
+                chunk = run[start : start + duration]
+                blocks_by_signature[(division_id, faculty_id, subject_id, batch_id, session_type, duration)].append(
+                    (int(day_id), [slot_id_by_order[item] for item in chunk], room_id)
+                )
+                result.base_blocks += 1
+            run = [order] if order is not None else []
+    for blocks in blocks_by_signature.values():
+        blocks.sort(key=lambda block: (block[0], slot_order_by_id.get(block[1][0], 0), block[2]))
+
+    unmatched: list[Any] = []
+    tasks_by_signature: dict[tuple, list[Any]] = defaultdict(list)
+    for task in tasks:
+        tasks_by_signature[
+            (
+                str(task.division_id),
+                str(task.faculty_id),
+                str(task.subject_id),
+                str(task.batch_id or ""),
+                task.session_type,
+                max(int(task.duration_slots or 1), 1),
+            )
+        ].append(task)
+    for signature, signature_tasks in tasks_by_signature.items():
+        blocks = blocks_by_signature.get(signature, [])
+        for task, block in zip(signature_tasks, blocks):
+            result.placements[task_key(task)] = block
+        unmatched.extend(signature_tasks[len(blocks) :])
+        del blocks[: len(signature_tasks)]
+
+    leftover_by_loose: dict[tuple, list[Placement]] = defaultdict(list)
+    for (division_id, _faculty_id, subject_id, batch_id, session_type, duration), blocks in blocks_by_signature.items():
+        leftover_by_loose[(division_id, subject_id, batch_id, session_type, duration)].extend(blocks)
+    for task in unmatched:
+        loose = (
+            str(task.division_id),
+            str(task.subject_id),
+            str(task.batch_id or ""),
+            task.session_type,
+            max(int(task.duration_slots or 1), 1),
+        )
+        candidates = leftover_by_loose.get(loose)
+        if candidates:
+            key = task_key(task)
+            result.placements[key] = candidates.pop(0)
+            result.rehomed_keys.add(key)
+        else:
+            result.new_tasks += 1
+    result.dropped_blocks = sum(len(blocks) for blocks in leftover_by_loose.values())
+    return result
+
+
+def entry_churn(base_entries: list[dict[str, Any]], new_entries: list[dict[str, Any]]) -> dict[str, Any]:
+    """Slot-level difference between two entry sets, as students would see it."""
+
+    def identity(row: dict[str, Any]) -> tuple[str, ...]:
+        return tuple(
+            _entry_value(row, name)
+            for name in ("division_id", "batch_id", "subject_id", "faculty_id", "session_type", "day_id", "slot_id", "room_id")
+        )
+
+    before = Counter(identity(row) for row in base_entries)
+    after = Counter(identity(row) for row in new_entries)
+    unchanged = sum((before & after).values())
+    return {
+        "entries_unchanged": unchanged,
+        "entries_added": sum(after.values()) - unchanged,
+        "entries_removed": sum(before.values()) - unchanged,
+        "churn_percent": round(100.0 * (sum(before.values()) - unchanged) / max(sum(before.values()), 1), 2),
+    }
@@ -12,6 +12,7 @@ from app.services.timetable_orchestrator import (
     _division_level_from_name,
     _normalize_year_level,
 )
+from app.services.timetable_repository import as_timetable_repository
 from app.services.timetable_resolution_snapshot import ResolutionSnapshot
 from app.services.timetable_scheduling_types import (
     PASS_LAST,
@@ -27,6 +28,8 @@ from app.services.timetable_scheduling_types import (
     TimetableEntry,
     ViolationReport,
 )
+from app.services.timetable_version_deltas import create_delta_version
+from app.services.effective_version import invalidate_effective_versions
 
 SUGGESTED_ACTIONS: dict[str, str] = {
     "parallel_lab_group_bound": "Parallel lab groups cannot be moved automatically; adjust all batches together in the editor.",
@@ -51,49 +54,19 @@ SUGGESTED_ACTIONS: dict[str, str] = {
 
 
 def build_master_data(supabase: Any, *, department_id: str | None) -> MasterData:
-    slot_rows = (
-        supabase.table("time_slots")
-        .select("slot_id, slot_order, is_break, start_time, end_time")
-        .order("slot_order")
-        .execute()
-        .data
-        or []
-    )
-    day_result = (
-        supabase.table("days")
-        .select("day_id, day_name, is_working_day")
-        .eq("is_working_day", True)
-        .order("day_id")
-        .execute()
-    )
-    day_rows = day_result.data if day_result and day_result.data else []
+    repository = as_timetable_repository(supabase)
+    slot_rows = repository.fetch_time_slots()
+    day_rows = repository.fetch_days(working_only=True)
     # Ensure day_rows is a flat list of dicts, not nested
     if day_rows and isinstance(day_rows, list) and len(day_rows) > 0:
         if isinstance(day_rows[0], list):
             # Flatten if nested
             day_rows = [item for sublist in day_rows for item in (sublist if isinstance(sublist, list) else [sublist])]
-    room_query = supabase.table("rooms").select("room_id, room_type, is_active, room_number")
-    if department_id:
-        room_query = room_query.eq("department_id", department_id)
-    room_rows = [r for r in (room_query.execute().data or []) if r.get("is_active", True)]
-
-    division_query = supabase.table("divisions").select("division_id, division_name, year")
-    if department_id:
-        division_query = division_query.eq("department_id", department_id)
-    division_rows = division_query.execute().data or []
-
-    subject_query = supabase.table("subjects").select("subject_id, subject_name")
-    if department_id:
-        subject_query = subject_query.eq("department_id", department_id)
-    subject_rows = subject_query.execute().data or []
-
-    faculty_query = supabase.table("faculty").select("faculty_id, faculty_name")
-    if department_id:
-        faculty_query = faculty_query.eq("department_id", department_id)
-    faculty_rows = faculty_query.execute().data or []
-
-    batch_query = supabase.table("batches").select("batch_id, division_id, is_active")
-    batch_rows = [b for b in (batch_query.execute().data or []) if b.get("is_active", True)]
+    room_rows = [r for r in repository.fetch_rooms(department_id=department_id) if r.get("is_active", True)]
+    division_rows = repository.fetch_divisions(department_id=department_id)
+    subject_rows = repository.fetch_subjects(department_id=department_id)
+    faculty_rows = repository.fetch_faculty(department_id=department_id)
+    batch_rows = [b for b in repository.fetch_batches() if b.get("is_active", True)]
 
     slot_order_by_id = {str(s["slot_id"]): int(s.get("slot_order") or 0) for s in slot_rows}
     slot_id_by_order = {int(s.get("slot_order") or 0): str(s["slot_id"]) for s in slot_rows if s.get("slot_id")}
@@ -216,8 +189,8 @@ class TimetableIssueResolver:
     """Repairs timetable issues using shared constraint validation."""
 
     def __init__(self, supabase: Any) -> None:
-        self.supabase = supabase
-        self.critic = TimetableCriticAgent(supabase)
+        self.repository = as_timetable_repository(supabase)
+        self.critic = TimetableCriticAgent(self.repository)
 
     def resolve(
         self,
@@ -230,23 +203,19 @@ class TimetableIssueResolver:
         dry_run: bool = False,
         department_id: str | None = None,
     ) -> dict[str, Any]:
-        source_version = (
-            self.supabase.table("timetable_versions").select("*").eq("version_id", version_id).single().execute().data
-        ) or {}
+        source_version = self.repository.fetch_version(version_id) or {}
         if source_version.get("is_frozen"):
             raise ValueError("Cannot resolve issues on a frozen timetable version.")
 
         baseline = self.critic.analyze(version_id=version_id, stress_hour_threshold=stress_hour_threshold)
         baseline_issues = int((baseline.get("summary") or {}).get("total_issues") or 0)
 
-        raw_rows = (
-            self.supabase.table("timetable_entries").select("*").eq("version_id", version_id).execute().data or []
-        )
+        raw_rows = self.repository.fetch_entries(version_id)
         if not raw_rows:
             raise ValueError("No timetable entries found for this version.")
 
         dept_id = department_id or source_version.get("department_id")
-        master = build_master_data(self.supabase, department_id=str(dept_id) if dept_id else None)
+        master = build_master_data(self.repository, department_id=str(dept_id) if dept_id else None)
         entries = [TimetableEntry.from_row(r) for r in raw_rows]
         snapshot = ResolutionSnapshot(entries, master)
 
@@ -321,30 +290,39 @@ class TimetableIssueResolver:
 
         new_version_id: str | None = None
         if not dry_run:
-            self.supabase.table("timetable_versions").update({"is_active": False}).eq("is_active", True).execute()
-            inserted = (
-                self.supabase.table("timetable_versions")
-                .insert(
-                    {
-                        "created_by": user_id or settings.anonymous_user_id,
-                        "reason": f"Issue resolver run from source version {version_id}",
-                        "is_active": True,
-                        "department_id": dept_id,
-                    }
+            self.repository.deactivate_active_versions()
+            version_payload = {
+                "created_by": user_id or settings.anonymous_user_id,
+                "reason": f"Issue resolver run from source version {version_id}",
+                "is_active": True,
+                "department_id": dept_id,
+            }
+            rows = [
+                {k: v for k, v in row.items() if k not in {"entry_id", "created_at", "updated_at"}}
+                for row in snapshot.commit_to_db_batch()
+            ]
+            if settings.timetable_delta_versions:
+                # Only the moved entries are written; the rest is read through the source version.
+                inserted, storage = create_delta_version(
+                    self.repository,
+                    parent_version_id=version_id,
+                    payload=version_payload,
+                    rows=rows,
+                    parent_rows=raw_rows,
                 )
-                .execute()
-                .data
-                or []
-            )
+            else:
+                inserted = self.repository.create_version(version_payload)
+                storage = {"storage": "full", "added": len(rows)}
+                if inserted:
+                    self.repository.insert_entries(
+                        [{**row, "version_id": str(inserted.get("version_id"))} for row in rows]
+                    )
             if not inserted:
                 raise ValueError("Failed to create resolved timetable version.")
-            new_version_id = str(inserted[0].get("version_id"))
-            rows = []
-            for row in snapshot.commit_to_db_batch():
-                clean = {k: v for k, v in row.items() if k not in {"entry_id", "created_at", "updated_at"}}
-                clean["version_id"] = new_version_id
-                rows.append(clean)
-            self.supabase.table("timetable_entries").insert(rows).execute()
+            new_version_id = str(inserted.get("version_id"))
+            # Every department's active flag may have moved, not just this one's.
+            invalidate_effective_versions()
+            stages.append({"name": "Version Storage", "status": "done", "metrics": storage})
 
         post = (
             self.critic.analyze(version_id=str(new_version_id), stress_hour_threshold=stress_hour_threshold)
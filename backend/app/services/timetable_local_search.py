@@ -0,0 +1,364 @@
+"""Local-search post-optimisation of a feasible timetable.
+
+Runs simulated annealing over single-session relocations and same-division swaps,
+with a short tabu list. Every move goes through the orchestrator's own strict
+placement check, so hard constraints are never traded for soft-score gains. Moves
+are scored by delta: only the (division, day) cells a move touches are re-costed.
+"""
+from __future__ import annotations
+
+import math
+import random
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable, Iterable
+
+Placement = tuple[int, list[str], str]
+
+# Same weights as compute_quality_score; pair-counted adjacencies are halved there.
+_SAME_SUBJECT_WEIGHT = 100
+_HEAVY_ADJACENT_WEIGHT = 75
+_IDLE_WEIGHT = 50
+_ISOLATED_LATE_WEIGHT = 100
+_SYNC_EDGE_WEIGHT = 100
+_SYNC_GAP_WEIGHT = 50
+_TUTORIAL_FAIRNESS_WEIGHT = 80
+_COMPACT_DAY_REWARD = 100
+_EARLY_START_REWARD = 50
+
+
+@dataclass
+class SoftObjective:
+    """Soft penalties of ``compute_quality_score`` split into per-(division, day) and per-division terms."""
+
+    slot_order_by_id: dict[str, int]
+    batches_by_division: dict[str, list[str]]
+    break_orders: set[int]
+    is_heavy_subject: Callable[[str], bool]
+    max_order: int = 6
+
+    def _orders(self, assignment: dict[str, Any]) -> list[int]:
+        return [self.slot_order_by_id.get(str(slot_id), 0) for slot_id in assignment["slot_ids"]]
+
+    def _batches(self, task: Any) -> list[str | None]:
+        if task.batch_id:
+            return [task.batch_id]
+        return list(self.batches_by_division.get(task.division_id, [])) or [None]
+
+    def division_day_cost(self, items: list[dict[str, Any]]) -> float:
+        theory = [
+            (item["task"].subject_id, set(self._orders(item)), self.is_heavy_subject(item["task"].subject_id))
+            for item in items
+            if item["task"].session_type == "THEORY"
+        ]
+        same_subject = heavy = 0
+        for i, (subject_i, orders_i, heavy_i) in enumerate(theory):
+            for j, (subject_j, orders_j, heavy_j) in enumerate(theory):
+                if i == j:
+                    continue
+                touching = sum(1 for o in orders_i if (o - 1) in orders_j or (o + 1) in orders_j)
+                if subject_i == subject_j:
+                    same_subject += touching
+                elif heavy_i and heavy_j:
+                    heavy += touching
+
+        batch_orders: dict[str | None, set[int]] = defaultdict(set)
+        for item in items:
+            orders = self._orders(item)
+            for batch_id in self._batches(item["task"]):
+                batch_orders[batch_id].update(orders)
+
+        cost = same_subject * _SAME_SUBJECT_WEIGHT + heavy * _HEAVY_ADJACENT_WEIGHT
+        starts, ends, gaps = [], [], []
+        for batch_id, orders in batch_orders.items():
+            if not orders:
+                continue
+            low, high = min(orders), max(orders)
+            idle = sum(1 for o in range(low, high) if o not in orders and o not in self.break_orders)
+            late = sum(1 for o in orders if o >= self.max_order - 1 and (o - 1) not in orders)
+            cost += idle * _IDLE_WEIGHT + late * _ISOLATED_LATE_WEIGHT
+            if idle == 0:
+                cost -= _COMPACT_DAY_REWARD
+            if low <= 2:
+                cost -= _EARLY_START_REWARD
+            if batch_id is not None:
+                starts.append(low)
+                ends.append(high)
+                gaps.append(idle)
+        if len(starts) >= 2:
+            cost += (max(starts) - min(starts)) * _SYNC_EDGE_WEIGHT
+            cost += (max(ends) - min(ends)) * _SYNC_EDGE_WEIGHT
+            cost += (max(gaps) - min(gaps)) * _SYNC_GAP_WEIGHT
+        return cost
+
+    def division_cost(self, items: list[dict[str, Any]]) -> float:
+        """Tutorial fairness: spread of early/late tutorial slots across a division's batches."""
+        extremes: dict[str, int] = defaultdict(int)
+        for item in items:
+            if item["task"].session_type != "TUTORIAL":
+                continue
+            for batch_id in self._batches(item["task"]):
+                if batch_id is None:
+                    continue
+                extremes[batch_id] += sum(1 for o in self._orders(item) if o <= 2 or o >= 5)
+        if len(extremes) < 2:
+            return 0
+        return (max(extremes.values()) - min(extremes.values())) * _TUTORIAL_FAIRNESS_WEIGHT
+
+
+@dataclass
+class LocalSearchResult:
+    iterations: int = 0
+    moves_tried: int = 0
+    moves_feasible: int = 0
+    relocations_accepted: int = 0
+    swaps_accepted: int = 0
+    uphill_accepted: int = 0
+    cost_before: float = 0.0
+    cost_after: float = 0.0
+    elapsed_ms: float = 0.0
+    stopped_by: str = "time_budget"
+    changed_sessions: int = 0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "iterations": self.iterations,
+            "moves_tried": self.moves_tried,
+            "moves_feasible": self.moves_feasible,
+            "relocations_accepted": self.relocations_accepted,
+            "swaps_accepted": self.swaps_accepted,
+            "uphill_accepted": self.uphill_accepted,
+            "soft_cost_before": round(self.cost_before, 2),
+            "soft_cost_after": round(self.cost_after, 2),
+            "elapsed_ms": round(self.elapsed_ms, 1),
+            "stopped_by": self.stopped_by,
+            "changed_sessions": self.changed_sessions,
+        }
+
+
+@dataclass
+class LocalSearchOptimizer:
+    """
+    Improves ``assignments`` in place through the orchestrator's placement callbacks.
+
+    ``can_place`` must apply the strict (unrelaxed) hard constraints; ``source_ok``
+    is asked after a session is lifted out of ``(day_id, slot_ids)`` and rejects
+    moves that would leave the vacated day in a state the hard constraints forbid.
+    """
+
+    assignments: dict[Hashable, dict[str, Any]]
+    movable_keys: list[Hashable]
+    objective: SoftObjective
+    day_ids: list[int]
+    slot_ids_ordered: list[str]
+    can_place: Callable[[Any, int, list[str], str], bool]
+    apply: Callable[[Any, int, list[str], str], None]
+    remove: Callable[[dict[str, Any]], None]
+    source_ok: Callable[[Any, int, list[str]], bool]
+    room_pool: Callable[[Any], list[str]]
+    seed: int = 0
+    time_budget_seconds: float = 5.0
+    max_iterations: int = 200_000
+    initial_temperature: float = 120.0
+    final_temperature: float = 1.0
+    tabu_size: int = 16
+    _by_division_day: dict[tuple[str, int], set[Hashable]] = field(default_factory=lambda: defaultdict(set))
+    _by_division: dict[str, set[Hashable]] = field(default_factory=lambda: defaultdict(set))
+
+    def __post_init__(self) -> None:
+        self._rng = random.Random(self.seed)
+        for key, assignment in self.assignments.items():
+            task = assignment["task"]
+            self._by_division_day[(task.division_id, int(assignment["day_id"]))].add(key)
+            self._by_division[task.division_id].add(key)
+        self._swap_partners: dict[tuple, list[Hashable]] = defaultdict(list)
+        for key in self.movable_keys:
+            task = self.assignments[key]["task"]
+            self._swap_partners[(task.division_id, task.session_type, task.batch_id, task.duration_slots)].append(key)
+
+    # -- cost -------------------------------------------------------------
+
+    def _cell_cost(self, division_id: str, day_id: int) -> float:
+        keys = self._by_division_day.get((division_id, day_id), ())
+        return self.objective.division_day_cost([self.assignments[key] for key in keys])
+
+    def _division_cost(self, division_id: str) -> float:
+        return self.objective.division_cost([self.assignments[key] for key in self._by_division.get(division_id, ())])
+
+    def total_cost(self) -> float:
+        cells = sum(self._cell_cost(division_id, day_id) for division_id, day_id in list(self._by_division_day))
+        return cells + sum(self._division_cost(division_id) for division_id in list(self._by_division))
+
+    def _local_cost(self, division_id: str, day_ids: Iterable[int], with_division_term: bool) -> float:
+        cost = sum(self._cell_cost(division_id, day_id) for day_id in set(day_ids))
+        return cost + (self._division_cost(division_id) if with_division_term else 0.0)
+
+    # -- state ------------------------------------------------------------
+
+    def _placement(self, key: Hashable) -> Placement:
+        assignment = self.assignments[key]
+        return int(assignment["day_id"]), list(assignment["slot_ids"]), str(assignment["room_id"])
+
+    def _lift(self, key: Hashable) -> Placement:
+        placement = self._placement(key)
+        task = self.assignments[key]["task"]
+        self.remove(self.assignments[key])
+        self._by_division_day[(task.division_id, placement[0])].discard(key)
+        return placement
+
+    def _place(self, key: Hashable, task: Any, placement: Placement) -> None:
+        day_id, slot_ids, room_id = placement
+        self.apply(task, day_id, list(slot_ids), room_id)
+        self._by_division_day[(task.division_id, day_id)].add(key)
+
+    def _try_place(self, key: Hashable, task: Any, day_id: int, slot_ids: list[str], rooms: list[str]) -> Placement | None:
+        for room_id in rooms:
+            if self.can_place(task, day_id, slot_ids, room_id):
+                placement = (day_id, list(slot_ids), room_id)
+                self._place(key, task, placement)
+                return placement
+        return None
+
+    def _rooms_for(self, task: Any, preferred: list[str]) -> list[str]:
+        pool = [room for room in self.room_pool(task) if room not in preferred]
+        return preferred + self._rng.sample(pool, min(3, len(pool)))
+
+    # -- moves ------------------------------------------------------------
+
+    def _accept(self, delta: float, temperature: float) -> bool:
+        if delta <= 0:
+            return True
+        return self._rng.random() < math.exp(-delta / max(temperature, 1e-6))
+
+    def _relocate(self, key: Hashable, temperature: float, result: LocalSearchResult) -> float | None:
+        task = self.assignments[key]["task"]
+        duration = max(int(task.duration_slots or 1), 1)
+        if len(self.slot_ids_ordered) < duration:
+            return None
+        day_id = self._rng.choice(self.day_ids)
+        start = self._rng.randrange(0, len(self.slot_ids_ordered) - duration + 1)
+        slot_ids = self.slot_ids_ordered[start : start + duration]
+        old = self._placement(key)
+        if old[0] == day_id and old[1] == slot_ids:
+            return None
+
+        with_division_term = task.session_type == "TUTORIAL"
+        before = self._local_cost(task.division_id, (old[0], day_id), with_division_term)
+        self._lift(key)
+        if not self.source_ok(task, old[0], old[1]):
+            self._place(key, task, old)
+            return None
+        if self._try_place(key, task, day_id, slot_ids, self._rooms_for(task, [old[2]])) is None:
+            self._place(key, task, old)
+            return None
+        result.moves_feasible += 1
+        delta = self._local_cost(task.division_id, (old[0], day_id), with_division_term) - before
+        if self._accept(delta, temperature):
+            result.relocations_accepted += 1
+            result.uphill_accepted += int(delta > 0)
+            return delta
+        self._lift(key)
+        self._place(key, task, old)
+        return None
+
+    def _swap(self, key: Hashable, temperature: float, result: LocalSearchResult) -> float | None:
+        task = self.assignments[key]["task"]
+        partners = self._swap_partners.get((task.division_id, task.session_type, task.batch_id, task.duration_slots), [])
+        if len(partners) < 2:
+            return None
+        other_key = self._rng.choice(partners)
+        if other_key == key:
+            return None
+        other_task = self.assignments[other_key]["task"]
+        first, second = self._placement(key), self._placement(other_key)
+        if first[0] == second[0] and first[1] == second[1]:
+            return None
+
+        with_division_term = task.session_type == "TUTORIAL"
+        days = (first[0], second[0])
+        before = self._local_cost(task.division_id, days, with_division_term)
+        self._lift(key)
+        self._lift(other_key)
+
+        def restore() -> None:
+            self._place(key, task, first)
+            self._place(other_key, other_task, second)
+
+        if not (self.source_ok(task, first[0], first[1]) and self.source_ok(other_task, second[0], second[1])):
+            restore()
+            return None
+        placed = self._try_place(key, task, second[0], second[1], self._rooms_for(task, [first[2], second[2]]))
+        if placed is None:
+            restore()
+            return None
+        if self._try_place(other_key, other_task, first[0], first[1], self._rooms_for(other_task, [second[2], first[2]])) is None:
+            self._lift(key)
+            restore()
+            return None
+        result.moves_feasible += 1
+        delta = self._local_cost(task.division_id, days, with_division_term) - before
+        if self._accept(delta, temperature):
+            result.swaps_accepted += 1
+            result.uphill_accepted += int(delta > 0)
+            return delta
+        self._lift(key)
+        self._lift(other_key)
+        restore()
+        return None
+
+    # -- driver -----------------------------------------------------------
+
+    def run(self) -> LocalSearchResult:
+        result = LocalSearchResult()
+        started = time.perf_counter()
+        initial = {key: self._placement(key) for key in self.assignments}
+        current_cost = result.cost_before = self.total_cost()
+        best_cost = current_cost
+        best: dict[Hashable, Placement] | None = None
+        tabu: deque[Hashable] = deque(maxlen=max(1, min(self.tabu_size, len(self.movable_keys) // 4 or 1)))
+
+        if not self.movable_keys or self.time_budget_seconds <= 0:
+            result.stopped_by = "nothing_to_do"
+            result.cost_after = current_cost
+            return result
+
+        cooling = self.final_temperature / self.initial_temperature
+        while True:
+            elapsed = time.perf_counter() - started
+            if elapsed >= self.time_budget_seconds:
+                break
+            if result.iterations >= self.max_iterations:
+                result.stopped_by = "max_iterations"
+                break
+            result.iterations += 1
+            temperature = self.initial_temperature * cooling ** (elapsed / self.time_budget_seconds)
+            key = self._rng.choice(self.movable_keys)
+            if key in tabu:
+                continue
+            result.moves_tried += 1
+            move = self._swap if self._rng.random() < 0.3 else self._relocate
+            delta = move(key, temperature, result)
+            if delta is not None:
+                tabu.append(key)
+                current_cost += delta
+                if current_cost < best_cost - 1e-9:
+                    best_cost = current_cost
+                    best = {k: self._placement(k) for k in self.assignments}
+
+        if best is not None and current_cost > best_cost:
+            self._restore(best)
+        elif best is None and current_cost > result.cost_before:
+            self._restore(initial)
+        result.cost_after = self.total_cost()
+        result.changed_sessions = sum(1 for key, placement in initial.items() if self._placement(key) != placement)
+        result.elapsed_ms = (time.perf_counter() - started) * 1000
+        return result
+
+    def _restore(self, target: dict[Hashable, Placement]) -> None:
+        changed = [key for key, placement in target.items() if self._placement(key) != placement]
+        tasks = {key: self.assignments[key]["task"] for key in changed}
+        for key in changed:
+            self._lift(key)
+        for key in changed:
+            self._place(key, tasks[key], target[key])
@@ -2,6 +2,8 @@ from __future__ import annotations
 
 
 
+from collections import Counter
+
 from dataclasses import dataclass
 
 import hashlib
@@ -11,6 +13,8 @@ from datetime import datetime, timedelta
 import re
 import copy
 
+import time
+
 from typing import Any, Iterator
 
 from uuid import uuid4
@@ -19,7 +23,23 @@ from uuid import uuid4
 
 from app.config import settings
 
-from app.supabase_client import get_service_supabase
+from app.services.effective_version import invalidate_effective_versions
+
+from app.services.timetable_repository import TimetableRepository, get_timetable_repository
+
+from app.services.timetable_local_search import LocalSearchOptimizer, SoftObjective
+
+from app.services.timetable_cpsat import CpSatProblem, CpSatTimetableSolver, cpsat_available, cpsat_import_error
+
+from app.services.timetable_incremental import BasePins, entry_churn, pins_from_base_entries
+
+from app.services.timetable_scheduling_types import GenerationOptions, faculty_resource_key, room_resource_key
+from app.services.timetable_feasibility import CapacityAnalyzer
+from app.services.timetable_shift_planner import ShiftAssignmentPlanner, ShiftPlan, demands_from_tasks, windows_from_entries
+
+from app.services.timetable_ordering import MostConstrainedFirstPlacer
+
+from app.services.timetable_trail import SolverTrail, TrailedDict, TrailedSet
 
 
 
@@ -275,6 +295,17 @@ def _block_within_window(slot_rows: list[dict], window: tuple[int | None, int |
 
 
 
+def _index_fingerprint(index: Any) -> Any:
+    """Order-insensitive copy of a placement index; empty sets and zero counters count as absent."""
+    if isinstance(index, dict):
+        return {key: _index_fingerprint(value) for key, value in index.items() if value}
+    if isinstance(index, (set, frozenset)):
+        return frozenset(index)
+    if isinstance(index, list):
+        return tuple(sorted(index, key=repr))
+    return index
+
+
 def _is_gapless_day_pattern(slot_orders: set[int], lunch_slot_order: int | None) -> bool:
 
     """Validate no-gap day pattern with conditional 12:00-13:00 lunch break.
@@ -337,9 +368,9 @@ class TimetableOrchestrationEngine:
 
 
 
-    def __init__(self) -> None:
+    def __init__(self, repository: TimetableRepository | None = None) -> None:
 
-        self.supabase = get_service_supabase()
+        self.repository = repository or get_timetable_repository()
 
 
 
@@ -519,267 +550,277 @@ class TimetableOrchestrationEngine:
 
 
 
-    def run(
+    def ensure_not_frozen(self, department_id: str | None) -> None:
 
-        self,
+        """Refuse to replace a department timetable that is frozen and HOD-approved."""
 
-        *,
+        try:
 
-        user_id: str | None,
+            frozen_versions = self.repository.fetch_versions(department_id=department_id, is_frozen=True)
 
-        department_id: str | None = None,
+            if frozen_versions:
 
-        persist: bool = True,
+                frozen_approved = [v for v in frozen_versions if v.get("approval_status") == "HOD_APPROVED"]
 
-        reason: str | None = None,
+                if frozen_approved:
 
-    ) -> dict:
+                    raise ValueError(
 
-        final_result: dict | None = None
+                        "Cannot create a new timetable: A frozen and approved timetable already exists for this department. "
 
-        for event in self.run_stream(
+                        "Please contact HOD to unfreeze the current timetable before generating a new one."
 
-            user_id=user_id,
+                    )
 
-            department_id=department_id,
+        except ValueError:
 
-            persist=persist,
+            raise
 
-            reason=reason,
+        except Exception as e:
 
-        ):
+            print(f"Warning: Failed to check for frozen timetables: {e}")
 
-            if event.get("type") == "result":
 
-                final_result = event.get("result")
 
+    def persist_version(
 
+        self,
 
-        if not final_result:
+        *,
 
-            raise ValueError("Timetable orchestration did not produce a final result.")
+        department_id: str | None,
 
+        user_id: str | None,
 
+        reason: str,
 
-        return final_result
+        entries: list[dict],
 
+    ) -> str | None:
 
+        """Replace the department's versions with one active version holding ``entries``."""
 
-    def run_stream(
+        self.ensure_not_frozen(department_id)
 
-        self,
 
-        *,
+        # Delete ALL old timetable versions and their entries for this department
 
-        user_id: str | None,
+        try:
 
-        department_id: str | None = None,
+            old_versions = self.repository.fetch_versions(department_id=department_id)
 
-        persist: bool = True,
+            old_version_ids = [v.get("version_id") for v in old_versions if v.get("version_id")]
 
-        reason: str | None = None,
+            if old_version_ids:
 
-    ) -> Iterator[dict]:
+                print(f"[ORCHESTRATOR] Deleting {len(old_version_ids)} old timetable versions and their entries")
 
-        run_id = str(uuid4())
+                self.repository.delete_versions(old_version_ids)
 
-        stages: list[dict] = []
+                print(f"[ORCHESTRATOR] Successfully deleted old timetables")
 
-        pass_trace: list[dict[str, Any]] = []
+        except Exception as e:
 
-        strict_gate_enabled = "strict" in (reason or "").casefold()
+            print(f"Warning: Failed to delete old timetables: {e}")
 
-        llm_hooks_enabled = bool(settings.bedrock_model) and "no-llm-hook" not in (reason or "").casefold()
 
+        version_insert = self.repository.create_version(
 
+            {
 
-        def seeded_rank(*parts: object) -> int:
+                "created_by": user_id or settings.anonymous_user_id,
 
-            token = "|".join(str(part) for part in parts)
+                "reason": reason,
 
-            digest = hashlib.sha1(f"{run_id}|{attempt_idx}|{token}".encode("utf-8")).hexdigest()
+                "is_active": True,
 
-            return int(digest[:8], 16)
+                "department_id": department_id,
 
+            }
 
+        )
 
-        def emit_stage(stage_payload: dict) -> dict:
+        version_id = version_insert.get("version_id") if version_insert else None
 
-            stages.append(stage_payload)
+        if version_id:
 
-            return {
+            self.repository.insert_entries([{**entry, "version_id": version_id} for entry in entries])
 
-                "type": "stage",
+        invalidate_effective_versions(department_id)
 
-                "run_id": run_id,
+        return version_id
 
-                "stage_index": len(stages),
 
-                "stage": stage_payload,
 
-            }
+    def run(
 
+        self,
 
+        *,
 
-        # 1) Data ingestion agent
+        user_id: str | None,
 
-        load_query = self.supabase.table("load_distribution").select(
+        department_id: str | None = None,
 
-            "faculty_name, year, division, subject, theory_hrs, lab_hrs, tutorial_hrs, batch"
+        persist: bool = True,
 
-        )
+        reason: str | None = None,
 
-        if department_id:
+        options: GenerationOptions | None = None,
 
-            load_query = load_query.eq("department_id", department_id)
+    ) -> dict:
 
-        elif user_id:
+        final_result: dict | None = None
 
-            load_query = load_query.eq("uploaded_by", user_id)
+        for event in self.run_stream(
 
-        load_rows = load_query.execute().data or []
+            user_id=user_id,
 
-        if not load_rows:
+            department_id=department_id,
 
-            raise ValueError("No load distribution rows found. Upload load data before creating timetable.")
+            persist=persist,
 
+            reason=reason,
 
+            options=options,
 
-        faculty_query = self.supabase.table("faculty").select(
+        ):
 
-            "faculty_id, faculty_name, department_id, max_load_per_week, preferred_start_time, preferred_end_time, is_active"
+            if event.get("type") == "result":
 
-        )
+                final_result = event.get("result")
 
-        if department_id:
 
-            faculty_query = faculty_query.eq("department_id", department_id)
 
-        faculty_rows = [row for row in (faculty_query.execute().data or []) if row.get("is_active", True)]
+        if not final_result:
+
+            raise ValueError("Timetable orchestration did not produce a final result.")
+
 
 
+        return final_result
 
-        division_query = self.supabase.table("divisions").select("division_id, division_name, year, department_id")
 
-        if department_id:
 
-            division_query = division_query.eq("department_id", department_id)
+    def run_stream(
 
-        division_rows = division_query.execute().data or []
+        self,
 
+        *,
 
+        user_id: str | None,
 
-        subject_query = self.supabase.table("subjects").select(
+        department_id: str | None = None,
 
-            "subject_id, subject_name, year, department_id, subject_type"
+        persist: bool = True,
 
-        )
+        reason: str | None = None,
 
-        if department_id:
+        options: GenerationOptions | None = None,
 
-            subject_query = subject_query.eq("department_id", department_id)
+    ) -> Iterator[dict]:
 
-        subject_rows = subject_query.execute().data or []
+        run_id = str(uuid4())
 
+        generation_options = options or GenerationOptions.from_settings()
 
+        if "local-search" in (reason or "").casefold():
 
-        room_query = self.supabase.table("rooms").select("room_id, room_type, is_active, department_id")
+            generation_options.local_search = True
 
-        if department_id:
+        if "cp-sat" in (reason or "").casefold() or "cpsat" in (reason or "").casefold():
 
-            room_query = room_query.eq("department_id", department_id)
+            generation_options.solver = "cpsat"
 
-        room_rows = [row for row in (room_query.execute().data or []) if row.get("is_active", True)]
+        stages: list[dict] = []
 
+        pass_trace: list[dict[str, Any]] = []
 
+        strict_gate_enabled = "strict" in (reason or "").casefold()
 
-        batch_query = self.supabase.table("batches").select("batch_id, division_id, is_active, batch_code")
+        llm_hooks_enabled = bool(settings.bedrock_model) and "no-llm-hook" not in (reason or "").casefold()
 
-        batch_rows = [row for row in (batch_query.execute().data or []) if row.get("is_active", True)]
 
-        if department_id:
 
-            allowed_divisions = {str(r["division_id"]) for r in division_rows if r.get("division_id")}
+        def seeded_rank(*parts: object) -> int:
 
-            batch_rows = [
+            token = "|".join(str(part) for part in parts)
 
-                row
+            digest = hashlib.sha1(f"{run_id}|{attempt_idx}|{token}".encode("utf-8")).hexdigest()
 
-                for row in batch_rows
+            return int(digest[:8], 16)
 
-                if str(row.get("division_id") or "") in allowed_divisions
 
-            ]
 
+        def emit_stage(stage_payload: dict) -> dict:
+
+            stages.append(stage_payload)
 
+            return {
 
-        day_rows = (
+                "type": "stage",
 
-            self.supabase.table("days")
+                "run_id": run_id,
 
-            .select("day_id, day_name, is_working_day")
+                "stage_index": len(stages),
 
-            .eq("is_working_day", True)
+                "stage": stage_payload,
 
-            .order("day_id")
+            }
 
-            .execute()
 
-            .data
 
-            or []
+        # 1) Data ingestion agent
 
-        )
+        load_rows = self.repository.fetch_load_distribution(
 
-        
+            department_id=department_id,
 
-        all_day_rows = (
+            uploaded_by=None if department_id else user_id,
 
-            self.supabase.table("days")
+        )
 
-            .select("day_id, day_name, is_working_day")
+        if not load_rows:
 
-            .order("day_id")
+            raise ValueError("No load distribution rows found. Upload load data before creating timetable.")
 
-            .execute()
 
-            .data
+        faculty_rows = [row for row in self.repository.fetch_faculty(department_id=department_id) if row.get("is_active", True)]
 
-            or []
 
-        )
+        division_rows = self.repository.fetch_divisions(department_id=department_id)
 
-        all_slot_rows = (
 
-            self.supabase.table("time_slots")
+        subject_rows = self.repository.fetch_subjects(department_id=department_id)
 
-            .select("slot_id, slot_order, is_break, start_time, end_time")
 
-            .order("slot_order")
+        room_rows = [row for row in self.repository.fetch_rooms(department_id=department_id) if row.get("is_active", True)]
 
-            .execute()
 
-            .data
+        batch_rows = [row for row in self.repository.fetch_batches() if row.get("is_active", True)]
 
-            or []
+        if department_id:
 
-        )
+            allowed_divisions = {str(r["division_id"]) for r in division_rows if r.get("division_id")}
+
+            batch_rows = [
+
+                row
 
-        slot_rows = (
+                for row in batch_rows
 
-            self.supabase.table("time_slots")
+                if str(row.get("division_id") or "") in allowed_divisions
 
-            .select("slot_id, slot_order, is_break, start_time, end_time")
+            ]
 
-            .order("slot_order")
 
-            .execute()
+        all_day_rows = self.repository.fetch_days()
 
-            .data
+        day_rows = [row for row in all_day_rows if row.get("is_working_day")]
 
-            or []
+        all_slot_rows = self.repository.fetch_time_slots()
 
-        )
+        slot_rows = list(all_slot_rows)
 
 
 
@@ -1347,15 +1388,64 @@ class TimetableOrchestrationEngine:
 
         
 
-        division_shift_assignments: dict[str, tuple[str, tuple[int, int]]] = {}
-
+        # Incremental regeneration: keep every still-valid placement of the base version.
+        base_entries: list[dict[str, Any]] | None = None
+        if generation_options.base_version_id:
+            base_version = self.repository.fetch_version(generation_options.base_version_id)
+            if not base_version:
+                raise ValueError(f"Base version {generation_options.base_version_id} not found")
+            if department_id and base_version.get("department_id") and str(base_version["department_id"]) != str(department_id):
+                raise ValueError("Base version belongs to a different department")
+            base_entries = self.repository.fetch_entries(generation_options.base_version_id)
+
+        # Shift windows: round-robin baseline, improved by the resource-pressure planner.
         shift_keys = list(shift_windows.keys())
+        round_robin_shifts = {
+            division_id: shift_keys[idx % len(shift_keys)] for idx, division_id in enumerate(ordered_division_ids)
+        }
+        shift_window_bounds = {name: window for name, (_, window) in shift_windows.items()}
+        shift_planner = ShiftAssignmentPlanner(
+            shift_window_bounds,
+            slot_rows,
+            working_days=len(day_rows),
+            theory_rooms=sum(1 for room in room_rows if str(room.get("room_type", "")).upper() != "LAB") or len(room_rows),
+            lab_rooms=sum(1 for room in room_rows if str(room.get("room_type", "")).upper() == "LAB") or len(room_rows),
+            faculty_windows={
+                str(row["faculty_id"]): (
+                    _parse_time_to_minutes(row.get("preferred_start_time")),
+                    _parse_time_to_minutes(row.get("preferred_end_time")),
+                )
+                for row in faculty_rows
+                if row.get("faculty_id")
+            },
+        )
+        shift_demands = demands_from_tasks(tasks)
+        if base_entries is not None:
+            # A warm start keeps the base version's windows so its placements stay valid.
+            base_shifts = {**round_robin_shifts, **windows_from_entries(base_entries, shift_window_bounds, slot_rows)}
+            shift_plan = ShiftPlan(
+                assignments={division_id: base_shifts[division_id] for division_id in ordered_division_ids},
+                peak_pressure=shift_planner.score(shift_demands, base_shifts)[0],
+                baseline_peak_pressure=shift_planner.score(shift_demands, round_robin_shifts)[0],
+                moved_from_baseline=sum(1 for division_id in ordered_division_ids if base_shifts[division_id] != round_robin_shifts[division_id]),
+                metrics={**shift_planner.describe(shift_demands, base_shifts), "source": "base_version"},
+            )
+        elif generation_options.shift_planner:
+            shift_plan = shift_planner.plan(shift_demands, ordered_division_ids, round_robin_shifts)
+            shift_plan.metrics["source"] = "pressure_planner"
+        else:
+            round_robin_score = shift_planner.score(shift_demands, round_robin_shifts)[0]
+            shift_plan = ShiftPlan(
+                assignments=dict(round_robin_shifts),
+                peak_pressure=round_robin_score,
+                baseline_peak_pressure=round_robin_score,
+                moved_from_baseline=0,
+                metrics={**shift_planner.describe(shift_demands, round_robin_shifts), "source": "round_robin"},
+            )
+        division_shift_assignments: dict[str, tuple[str, tuple[int, int]]] = {
+            division_id: shift_windows[shift_key] for division_id, shift_key in shift_plan.assignments.items()
+        }
 
-        for idx, division_id in enumerate(ordered_division_ids):
-
-            shift_key = shift_keys[idx % len(shift_keys)]
-
-            division_shift_assignments[division_id] = shift_windows[shift_key]
 
 
 
@@ -1440,11 +1530,67 @@ class TimetableOrchestrationEngine:
                 },
 
                 "message": "Session-level scheduling tasks generated.",
-
             }
+        )
 
+        yield emit_stage(
+            {
+                "agent": "Shift Assignment Optimizer",
+                "status": "completed",
+                "metrics": shift_plan.as_dict(),
+                "message": (
+                    f"Shift windows assigned; peak resource pressure {shift_plan.peak_pressure:.2f} "
+                    f"(round-robin {shift_plan.baseline_peak_pressure:.2f})."
+                ),
+            }
         )
 
+        # Capacity pre-check: counting bounds that no placement can beat.
+        precheck_mode = "fail_fast" if strict_gate_enabled else generation_options.precheck
+        precheck_dropped: list[_SessionTask] = []
+        if precheck_mode != "off" or generation_options.precheck_only:
+            capacity_report = CapacityAnalyzer(
+                slot_rows=slot_rows,
+                working_days=len(day_rows),
+                division_windows=division_shift_assignments,
+                theory_rooms=sum(1 for room in room_rows if str(room.get("room_type", "")).upper() != "LAB"),
+                lab_rooms=sum(1 for room in room_rows if str(room.get("room_type", "")).upper() == "LAB"),
+                names={
+                    "faculty": {str(row["faculty_id"]): str(row.get("faculty_name") or "") for row in faculty_rows if row.get("faculty_id")},
+                    "division": {str(row["division_id"]): str(row.get("division_name") or "") for row in division_rows if row.get("division_id")},
+                },
+            ).analyse(tasks)
+            if capacity_report.infeasible and precheck_mode == "continue" and not generation_options.precheck_only:
+                precheck_dropped = capacity_report.unfittable_tasks
+            precheck_payload = {**capacity_report.as_dict(), "mode": precheck_mode, "skipped_sessions": len(precheck_dropped)}
+            yield emit_stage(
+                {
+                    "agent": "Capacity Pre-check",
+                    "status": "infeasible" if capacity_report.infeasible else "completed",
+                    "metrics": precheck_payload,
+                    "message": (
+                        f"Inputs cannot be fully scheduled: {capacity_report.explanation(limit=3)}"
+                        if capacity_report.infeasible
+                        else f"No capacity bound violated ({len(capacity_report.tight)} tight resources)."
+                    ),
+                }
+            )
+            if generation_options.precheck_only:
+                yield {
+                    "type": "result",
+                    "run_id": run_id,
+                    "result": {"run_id": run_id, "precheck": precheck_payload, "stages": stages},
+                }
+                return
+            if capacity_report.infeasible and precheck_mode == "fail_fast":
+                raise ValueError(f"Capacity pre-check failed: {capacity_report.explanation()}")
+            if precheck_dropped:
+                dropped_ids = {id(task) for task in precheck_dropped}
+                tasks = [task for task in tasks if id(task) not in dropped_ids]
+                if not tasks:
+                    raise ValueError(f"Capacity pre-check left no schedulable tasks: {capacity_report.explanation()}")
+
+
 
 
         # 3) Resource allocation + constraints/conflict detection/resolution + optimization
@@ -1463,35 +1609,54 @@ class TimetableOrchestrationEngine:
 
 
 
+        # Occupancy state lives in trailed containers: rollbacks (backtracking, repack, attempts)
+        # undo only the changes made since their checkpoint instead of snapshotting and rebuilding.
+        state_trail = SolverTrail()
+
         # Division occupancy is tracked separately for full-division sessions and per-batch sessions.
 
         # This allows parallel labs for different batches while still preventing invalid overlaps.
 
-        used_division_full_slot: set[tuple[str, int, str]] = set()
-
-        used_division_any_batch_slot: set[tuple[str, int, str]] = set()
-
-        used_division_batch_slot: set[tuple[str, str, int, str]] = set()
-
-        division_slot_lab_subjects: dict[tuple[str, int, str], set[str]] = {}
-
-        used_faculty_slot: set[tuple[str, int, str]] = set()
-
-        used_room_slot: set[tuple[str, int, str]] = set()
-        division_day_slots: dict[tuple[str, int], set[str]] = {}
-        division_day_slot_orders: dict[tuple[str, int], set[int]] = {}
-        division_batch_day_slot_orders: dict[tuple[str, str, int], set[int]] = {}
+        used_division_full_slot: set[tuple[str, int, str]] = TrailedSet(state_trail)
+
+        used_division_any_batch_slot: set[tuple[str, int, str]] = TrailedSet(state_trail)
+
+        used_division_batch_slot: set[tuple[str, str, int, str]] = TrailedSet(state_trail)
+
+        division_slot_lab_subjects: dict[tuple[str, int, str], set[str]] = TrailedDict(state_trail)
+
+        used_faculty_slot: set[tuple[str, int, str]] = TrailedSet(state_trail)
+
+        used_room_slot: set[tuple[str, int, str]] = TrailedSet(state_trail)
+        # Institute mode: cells of shared rooms/faculty held by other departments stay occupied.
+        reserved_room_slots: set[tuple[str, int, str]] = set()
+        reserved_faculty_slots: set[tuple[Any, int, str]] = set()
+        if generation_options.reserved_resource_slots:
+            local_room_ids: dict[str, list[str]] = {}
+            for room in room_rows:
+                local_room_ids.setdefault(room_resource_key(room), []).append(str(room["room_id"]))
+            local_faculty_ids: dict[str, list[Any]] = {}
+            for faculty in faculty_rows:
+                local_faculty_ids.setdefault(faculty_resource_key(faculty), []).append(faculty["faculty_id"])
+            for resource_key, day_id, slot_id in generation_options.reserved_resource_slots:
+                for room_id in local_room_ids.get(resource_key, ()):
+                    reserved_room_slots.add((room_id, int(day_id), str(slot_id)))
+                for faculty_id in local_faculty_ids.get(resource_key, ()):
+                    reserved_faculty_slots.add((faculty_id, int(day_id), str(slot_id)))
+        division_day_slots: dict[tuple[str, int], set[str]] = TrailedDict(state_trail)
+        division_day_slot_orders: dict[tuple[str, int], set[int]] = TrailedDict(state_trail)
+        division_batch_day_slot_orders: dict[tuple[str, str, int], set[int]] = TrailedDict(state_trail)
         # Track theory + lab hours per division per day (8-hour max constraint)
 
-        division_day_theory_lab_hours: dict[tuple[str, int], int] = {}
+        division_day_theory_lab_hours: dict[tuple[str, int], int] = TrailedDict(state_trail)
 
         # Track theory + lab hours per faculty per day (8-hour max constraint)
 
-        faculty_day_theory_lab_hours: dict[tuple[str, int], int] = {}
+        faculty_day_theory_lab_hours: dict[tuple[str, int], int] = TrailedDict(state_trail)
 
-        faculty_load_counter: dict[str, int] = {}
+        faculty_load_counter: dict[str, int] = TrailedDict(state_trail)
 
-        room_usage_counter: dict[str, int] = {}
+        room_usage_counter: dict[str, int] = TrailedDict(state_trail)
 
         faculty_limit: dict[str, int] = {
 
@@ -1523,7 +1688,7 @@ class TimetableOrchestrationEngine:
 
         allocated_entries: list[dict] = []
 
-        scheduled_task_assignments: dict[str, dict[str, Any]] = {}
+        scheduled_task_assignments: dict[str, dict[str, Any]] = TrailedDict(state_trail)
 
         unresolved_task_pool: list[_SessionTask] = []
 
@@ -1559,7 +1724,7 @@ class TimetableOrchestrationEngine:
 
         }
 
-        lab_group_slot_binding: dict[str, tuple[int, tuple[str, ...]]] = {}
+        lab_group_slot_binding: dict[str, tuple[int, tuple[str, ...]]] = TrailedDict(state_trail)
 
         required_parallel_labs_by_division: dict[str, int] = {}
 
@@ -1569,8 +1734,32 @@ class TimetableOrchestrationEngine:
 
                 required_parallel_labs_by_division[str(division_id)] = len(batch_ids)
 
-        division_slot_parallel_labs: dict[tuple[str, int, str], list[tuple[str, str]]] = {}
-        division_subject_day_slot_orders: dict[tuple[str, str, int], set[int]] = {}
+        division_slot_parallel_labs: dict[tuple[str, int, str], list[tuple[str, str]]] = TrailedDict(state_trail)
+        # Maintained beside division_slot_parallel_labs so deadlock repair never rescans all assignments.
+        lab_assignment_keys_by_window: dict[tuple[str, int, str], set[str]] = TrailedDict(state_trail)
+        lab_window_slots_by_division_day: dict[tuple[str, int], set[str]] = TrailedDict(state_trail)
+        assignment_keys_by_group: dict[str, set[str]] = TrailedDict(state_trail)
+        # ("division" | "faculty" | "room", id, day_id, slot_id) -> keys of the sessions placed there
+        assignment_keys_by_cell: dict[tuple[str, Any, int, str], set[str]] = TrailedDict(state_trail)
+        parallel_lab_repair_stats = {
+            "deadlocked_windows": 0,
+            "repair_attempts": 0,
+            "repaired_windows": 0,
+            "repaired_sessions": 0,
+            "group_units_moved": 0,
+            "rolled_back": 0,
+            "skipped_pin_budget": 0,
+            "elapsed_ms": 0.0,
+        }
+
+        def parallel_lab_repair_report() -> dict[str, Any]:
+            attempts = parallel_lab_repair_stats["repair_attempts"]
+            return {
+                **parallel_lab_repair_stats,
+                "elapsed_ms": round(parallel_lab_repair_stats["elapsed_ms"], 2),
+                "success_rate": round(parallel_lab_repair_stats["repaired_windows"] / attempts, 3) if attempts else None,
+            }
+        division_subject_day_slot_orders: dict[tuple[str, str, int], set[int]] = TrailedDict(state_trail)
         division_daily_hard_limit = 6
 
         faculty_daily_hard_limit = 6
@@ -1579,7 +1768,16 @@ class TimetableOrchestrationEngine:
 
         attempt_idx = 0
 
+        heavy_subject_cache: dict[str, bool] = {}
+
         def is_heavy_subject(subject_id: str) -> bool:
+            # Called from every placement check; the answer only depends on the subject.
+            cached = heavy_subject_cache.get(subject_id)
+            if cached is None:
+                cached = heavy_subject_cache[subject_id] = _is_heavy_subject_uncached(subject_id)
+            return cached
+
+        def _is_heavy_subject_uncached(subject_id: str) -> bool:
             if not subject_id:
                 return False
             row = subject_by_code_fallback.get(str(subject_id).casefold())
@@ -1626,6 +1824,8 @@ class TimetableOrchestrationEngine:
             division_slot_lab_subjects.clear()
             used_faculty_slot.clear()
             used_room_slot.clear()
+            used_faculty_slot.update(reserved_faculty_slots)
+            used_room_slot.update(reserved_room_slots)
             division_day_slots.clear()
             division_day_slot_orders.clear()
             division_batch_day_slot_orders.clear()
@@ -1637,6 +1837,10 @@ class TimetableOrchestrationEngine:
             unresolved_task_pool.clear()
             lab_group_slot_binding.clear()
             division_slot_parallel_labs.clear()
+            lab_assignment_keys_by_window.clear()
+            lab_window_slots_by_division_day.clear()
+            assignment_keys_by_group.clear()
+            assignment_keys_by_cell.clear()
             division_subject_day_slot_orders.clear()
             nonlocal unresolved_tasks, candidate_rejections, unresolved_task_samples, repack_moves
             unresolved_tasks = 0
@@ -2267,13 +2471,61 @@ class TimetableOrchestrationEngine:
 
 
 
+        def _placement_indexes() -> dict[str, Any]:
+            indexes = {
+                "used_division_full_slot": used_division_full_slot,
+                "used_division_any_batch_slot": used_division_any_batch_slot,
+                "used_division_batch_slot": used_division_batch_slot,
+                "division_slot_lab_subjects": division_slot_lab_subjects,
+                "used_faculty_slot": used_faculty_slot,
+                "used_room_slot": used_room_slot,
+                "division_day_slots": division_day_slots,
+                "assignment_keys_by_cell": assignment_keys_by_cell,
+                "division_day_slot_orders": division_day_slot_orders,
+                "division_batch_day_slot_orders": division_batch_day_slot_orders,
+                "division_day_theory_lab_hours": division_day_theory_lab_hours,
+                "faculty_day_theory_lab_hours": faculty_day_theory_lab_hours,
+                "faculty_load_counter": faculty_load_counter,
+                "room_usage_counter": room_usage_counter,
+                "lab_group_slot_binding": lab_group_slot_binding,
+                "division_slot_parallel_labs": division_slot_parallel_labs,
+                "lab_assignment_keys_by_window": lab_assignment_keys_by_window,
+                "lab_window_slots_by_division_day": lab_window_slots_by_division_day,
+                "assignment_keys_by_group": assignment_keys_by_group,
+                "division_subject_day_slot_orders": division_subject_day_slot_orders,
+            }
+            return {name: _index_fingerprint(index) for name, index in indexes.items()}
+
+        def _raise_on_state_drift(stage: str) -> None:
+            """Debug check: the incrementally kept indexes must equal a rebuild from the placed sessions."""
+            nonlocal unresolved_tasks, candidate_rejections, repack_moves
+            trailed = _placement_indexes()
+            placements = [
+                (value["task"], int(value["day_id"]), list(value["slot_ids"]), str(value["room_id"]))
+                for value in scheduled_task_assignments.values()
+            ]
+            counters = (unresolved_tasks, candidate_rejections, list(unresolved_task_samples), repack_moves)
+            pool = list(unresolved_task_pool)
+            mark = state_trail.checkpoint()
+            clear_all_state()
+            for placement in placements:
+                _apply_assignment(*placement)
+            rebuilt = _placement_indexes()
+            state_trail.rollback(mark)
+            unresolved_tasks, candidate_rejections, samples, repack_moves = counters
+            unresolved_task_samples.extend(samples)
+            unresolved_task_pool.extend(pool)
+            drifted = sorted(name for name in trailed if trailed[name] != rebuilt[name])
+            if drifted:
+                raise RuntimeError(f"Scheduler state drifted from its placements after the {stage}: {', '.join(drifted)}")
+
         # Hard cap for shift model: at most 8 occupied teaching slots per day.
 
         max_sessions_per_day = 8
 
 
 
-        best_assignment_snapshot = None
+        best_attempt_found = False
         best_validity = 1  # 1 is invalid, 0 is valid
         best_unresolved = 99999
         best_score = -1
@@ -2284,70 +2536,581 @@ class TimetableOrchestrationEngine:
         best_unresolved_task_samples = []
         best_validation_errors = []
 
-        # We will run 3 candidate attempts
-        for attempt in range(3):
-            attempt_idx = attempt
-            clear_all_state()
-            candidate_rejections = 0
-            repaired_from_deadlocks = 0
-            repack_moves = 0
+        # Placement primitives shared by every attempt and by the post-attempt stages.
 
-            for task in tasks_ordered:
+        slot_row_by_id = {str(slot.get("slot_id")): slot for slot in slot_rows_ordered}
+
+        def _placement_cells(task: _SessionTask, day_id: int, slot_id: str, room_id: str) -> tuple[tuple[str, Any, int, str], ...]:
+            return (
+                ("division", task.division_id, day_id, slot_id),
+                ("faculty", task.faculty_id, day_id, slot_id),
+                ("room", room_id, day_id, slot_id),
+            )
+
+        def _index_assignment(task: _SessionTask, day_id: int, slot_ids: list[str]) -> None:
+            key = task_key(task)
+            room_id = str(scheduled_task_assignments[key]["room_id"])
+            if task.group_id:
+                assignment_keys_by_group.setdefault(task.group_id, set()).add(key)
+            for slot_id in slot_ids:
+                for cell in _placement_cells(task, day_id, slot_id, room_id):
+                    assignment_keys_by_cell.setdefault(cell, set()).add(key)
+            if task.session_type == "LAB" and task.batch_id:
+                for slot_id in slot_ids:
+                    lab_assignment_keys_by_window.setdefault((task.division_id, day_id, slot_id), set()).add(key)
+                    lab_window_slots_by_division_day.setdefault((task.division_id, day_id), set()).add(slot_id)
+
+        def _unindex_assignment(task: _SessionTask, day_id: int, slot_ids: list[str]) -> None:
+            key = task_key(task)
+            room_id = str(scheduled_task_assignments[key]["room_id"])
+            if task.group_id:
+                group_keys = assignment_keys_by_group.get(task.group_id)
+                if group_keys is not None:
+                    group_keys.discard(key)
+                    if not group_keys:
+                        assignment_keys_by_group.pop(task.group_id, None)
+            for slot_id in slot_ids:
+                for cell in _placement_cells(task, day_id, slot_id, room_id):
+                    cell_keys = assignment_keys_by_cell.get(cell)
+                    if cell_keys is not None:
+                        cell_keys.discard(key)
+                        if not cell_keys:
+                            assignment_keys_by_cell.pop(cell, None)
+            if task.session_type == "LAB" and task.batch_id:
+                for slot_id in slot_ids:
+                    window_keys = lab_assignment_keys_by_window.get((task.division_id, day_id, slot_id))
+                    if window_keys is None:
+                        continue
+                    window_keys.discard(key)
+                    if not window_keys:
+                        lab_assignment_keys_by_window.pop((task.division_id, day_id, slot_id), None)
+                        day_slots = lab_window_slots_by_division_day.get((task.division_id, day_id))
+                        if day_slots is not None:
+                            day_slots.discard(slot_id)
+                            if not day_slots:
+                                lab_window_slots_by_division_day.pop((task.division_id, day_id), None)
+
+        def _has_incomplete_parallel_window(division_id: str, day_id: int, required_parallel: int) -> bool:
+            return any(
+                0 < len(division_slot_parallel_labs.get((division_id, day_id, slot_id), ())) < required_parallel
+                for slot_id in lab_window_slots_by_division_day.get((division_id, day_id), ())
+            )
     
-                scheduled = False
     
-                room_candidates = (lab_rooms + theory_rooms) if task.session_type == "LAB" else theory_rooms
     
-                preferred_shift_name, preferred_shift_window = division_shift_assignments.get(
+        def _remove_assignment(assignment: dict[str, Any]) -> None:
+            # Exact inverse of _apply_assignment. Sessions can share a cell (parallel batch labs,
+            # or a conflicting timetable), so cells the other sessions still hold are marked again.
+            task: _SessionTask = assignment["task"]
+            day_id = int(assignment["day_id"])
+            slot_ids = [str(slot_id) for slot_id in assignment["slot_ids"]]
+            room_id = str(assignment["room_id"])
+            key = task_key(task)
+            _unindex_assignment(task, day_id, slot_ids)
+            shared_slots: dict[str, list[str]] = {}
+            for slot_id in slot_ids:
+                for cell in _placement_cells(task, day_id, slot_id, room_id):
+                    for other_key in assignment_keys_by_cell.get(cell, ()):
+                        other_slots = shared_slots.setdefault(other_key, [])
+                        if slot_id not in other_slots:
+                            other_slots.append(slot_id)
+            for slot_id in slot_ids:
+                used_room_slot.discard((room_id, day_id, slot_id))
+                used_faculty_slot.discard((task.faculty_id, day_id, slot_id))
+                if task.batch_id:
+                    used_division_batch_slot.discard((task.division_id, str(task.batch_id), day_id, slot_id))
+                    used_division_any_batch_slot.discard((task.division_id, day_id, slot_id))
+                    if task.session_type == "LAB":
+                        subject_key = (task.division_id, day_id, slot_id)
+                        subject_set = division_slot_lab_subjects.get(subject_key)
+                        if subject_set:
+                            subject_set.discard(task.subject_id)
+                            if not subject_set:
+                                division_slot_lab_subjects.pop(subject_key, None)
+                        parallel_key = (task.division_id, day_id, slot_id)
+                        entries = division_slot_parallel_labs.get(parallel_key, [])
+                        entries = [entry for entry in entries if not (entry[0] == str(task.batch_id) and entry[1] == task.subject_id)]
+                        if entries:
+                            division_slot_parallel_labs[parallel_key] = entries
+                        else:
+                            division_slot_parallel_labs.pop(parallel_key, None)
+                else:
+                    used_division_full_slot.discard((task.division_id, day_id, slot_id))
+                if task.session_type != "TUTORIAL":
+                    day_key = (task.division_id, day_id)
+                    occupied = division_day_slots.get(day_key)
+                    if occupied:
+                        occupied.discard(slot_id)
+                        if not occupied:
+                            division_day_slots.pop(day_key, None)
+                    occupied_orders = division_day_slot_orders.get(day_key)
+                    if occupied_orders:
+                        occupied_orders.discard(slot_order_by_id.get(slot_id, 0))
+                        if not occupied_orders:
+                            division_day_slot_orders.pop(day_key, None)
+            discard_task_slot_orders(task, day_id, slot_ids)
+            discard_theory_subject_slots(task, day_id, slot_ids)
+            for other_key, other_slots in shared_slots.items():
+                other = scheduled_task_assignments[other_key]
+                _occupy_cells(other["task"], day_id, other_slots, str(other["room_id"]))
+            for slot_id in slot_ids:
+                if (room_id, day_id, slot_id) in reserved_room_slots:
+                    used_room_slot.add((room_id, day_id, slot_id))
+                if (task.faculty_id, day_id, slot_id) in reserved_faculty_slots:
+                    used_faculty_slot.add((task.faculty_id, day_id, slot_id))
+            room_usage_counter[room_id] = max(room_usage_counter.get(room_id, 0) - len(slot_ids), 0)
+            faculty_load_counter[task.faculty_id] = max(faculty_load_counter.get(task.faculty_id, 0) - len(slot_ids), 0)
+            if task.session_type in ("THEORY", "LAB"):
+                div_day_key = (task.division_id, day_id)
+                faculty_day_key = (task.faculty_id, day_id)
+                division_day_theory_lab_hours[div_day_key] = max(division_day_theory_lab_hours.get(div_day_key, 0) - len(slot_ids), 0)
+                faculty_day_theory_lab_hours[faculty_day_key] = max(faculty_day_theory_lab_hours.get(faculty_day_key, 0) - len(slot_ids), 0)
+            if task.group_id and task.group_id in lab_group_slot_binding:
+                bound_day, bound_slots = lab_group_slot_binding.get(task.group_id, (None, tuple()))
+                if bound_day == day_id and tuple(slot_ids) == tuple(bound_slots):
+                    if not assignment_keys_by_group.get(task.group_id):
+                        lab_group_slot_binding.pop(task.group_id, None)
+            scheduled_task_assignments.pop(key, None)
     
-                    task.division_id,
     
-                    ("SHIFT_08_14", (8 * 60, 14 * 60)),
     
-                )
+        def _can_place(
     
-                preferred_lunch_slot_order = lunch_slot_order_for_task(task, preferred_shift_name)
-                lab_group_id = (
+            task: _SessionTask,
     
-                    task.group_id
+            day_id: int,
     
-                    if task.session_type == "LAB"
+            slot_ids: list[str],
     
-                    and task.batch_id
+            room_id: str,
     
-                    and task.group_id
+            *,
     
-                    and task.group_id in strict_parallel_lab_groups
+            relax_gapless: bool = False,
     
-                    else None
+            relax_parallel_gate: bool = False,
     
-                )
+            relax_division_daily: bool = False,
     
+            relax_shift_window: bool = False,
     
+            relax_parallel_binding: bool = False,
     
-                task_duration = max(task.duration_slots, 1)
+            relax_faculty_daily: bool = False,
     
-                group_size = 1
+            relax_daily_slot_cap: bool = False,
     
-                for current_hour_limit in (division_daily_hard_limit,):
+        ) -> bool:
     
-                    for day in sorted(
+            candidate_slots = [slot_row_by_id.get(slot_id) for slot_id in slot_ids]
     
-                        day_rows,
+            if any(slot is None for slot in candidate_slots):
+                return False
     
-                        key=lambda row: (theory_subject_day_count(task, int(row.get("day_id") or 0)), seeded_rank(
-                            task.division_id,
+            shift_name, _ = division_shift_assignments.get(task.division_id, ("SHIFT_08_14", (8 * 60, 14 * 60)))
+            if uses_lunch_slot(task, shift_name, slot_ids):
+                return False
     
-                            task.subject_id,
+            if task.session_type != "TUTORIAL":
+                _, preferred_shift_window = division_shift_assignments.get(task.division_id, ("SHIFT_08_14", (8 * 60, 14 * 60)))
+                if not relax_shift_window and not _block_within_window([slot for slot in candidate_slots if slot], preferred_shift_window):
+                    return False
     
-                            task.faculty_id,
+            if any(
+                int(candidate_slots[idx + 1].get("slot_order") or 0) - int(candidate_slots[idx].get("slot_order") or 0) != 1
     
-                            task.batch_id or "",
-                            task.group_id or "",
-                            row.get("day_id"),
+                for idx in range(len(candidate_slots) - 1)
     
-                        )),
-                    ):
+            ):
+    
+                return False
+    
+    
+    
+            full_div_keys = [(task.division_id, day_id, slot_id) for slot_id in slot_ids]
+    
+            batch_div_keys = [(task.division_id, str(task.batch_id), day_id, slot_id) for slot_id in slot_ids]
+    
+            fac_keys = [(task.faculty_id, day_id, slot_id) for slot_id in slot_ids]
+    
+    
+    
+            if task.batch_id:
+    
+                if any(div_key in used_division_full_slot for div_key in full_div_keys):
+    
+                    return False
+    
+                if any(batch_key in used_division_batch_slot for batch_key in batch_div_keys):
+    
+                    return False
+    
+            else:
+    
+                if any(div_key in used_division_full_slot for div_key in full_div_keys):
+    
+                    return False
+    
+                if any(div_key in used_division_any_batch_slot for div_key in full_div_keys):
+    
+                    return False
+    
+    
+    
+            if any(fac_key in used_faculty_slot for fac_key in fac_keys):
+    
+                return False
+    
+            # CONSTRAINT: Prevent consecutive same-subject theory
+            if task.session_type == "THEORY" and theory_subject_adjacency_count(task, day_id, slot_ids) > 0:
+                return False
+    
+            # CONSTRAINT: Avoid consecutive cognitively heavy subjects
+            if task.session_type == "THEORY" and is_heavy_subject(task.subject_id):
+                if is_adjacent_to_heavy_subject(task, day_id, slot_ids):
+                    return False
+    
+            if any((room_id, day_id, slot_id) in used_room_slot for slot_id in slot_ids):
+    
+                return False
+    
+    
+    
+            day_key = (task.division_id, day_id)
+    
+            occupied = division_day_slots.setdefault(day_key, set())
+    
+            occupied_orders = division_day_slot_orders.setdefault(day_key, set())
+    
+            if task.session_type != "TUTORIAL":
+    
+                new_slot_count = sum(1 for slot_id in slot_ids if slot_id not in occupied)
+    
+                daily_slot_cap = max_sessions_per_day + 2 if relax_daily_slot_cap else max_sessions_per_day
+    
+                if len(occupied) + new_slot_count > daily_slot_cap:
+    
+                    return False
+    
+    
+    
+                proposed_orders = occupied_slot_orders_for_task_day(task, day_id)
+                proposed_orders.update(slot_order_by_id.get(slot_id, 0) for slot_id in slot_ids)
+    
+                shift_name, _ = division_shift_assignments.get(task.division_id, ("SHIFT_08_14", (8 * 60, 14 * 60)))
+    
+                lunch_slot = lunch_slot_order_for_task(task, shift_name)
+                if not relax_gapless and not _is_gapless_day_pattern(proposed_orders, lunch_slot):
+    
+                    return False
+    
+    
+    
+            if task.session_type in ("THEORY", "LAB"):
+    
+                division_limit = division_daily_hard_limit + 2 if relax_division_daily else division_daily_hard_limit
+    
+                if division_day_theory_lab_hours.get((task.division_id, day_id), 0) + len(slot_ids) > division_limit:
+    
+                    return False
+    
+                faculty_limit = 999 if relax_faculty_daily else faculty_daily_hard_limit
+    
+                if faculty_day_theory_lab_hours.get((task.faculty_id, day_id), 0) + len(slot_ids) > faculty_limit:
+    
+                    return False
+    
+    
+    
+            if task.session_type == "LAB" and task.batch_id:
+    
+                required_parallel = required_parallel_labs_by_division.get(task.division_id)
+    
+                if required_parallel:
+    
+                    opening_new_parallel_window = True
+    
+                    for slot_id in slot_ids:
+    
+                        parallel_key = (task.division_id, day_id, slot_id)
+    
+                        current_entries = division_slot_parallel_labs.get(parallel_key, [])
+    
+                        current_batches = {entry[0] for entry in current_entries}
+    
+                        if str(task.batch_id) in current_batches:
+    
+                            return False
+    
+                        if len(current_entries) >= required_parallel:
+    
+                            return False
+    
+                        if current_entries:
+    
+                            opening_new_parallel_window = False
+    
+    
+    
+                    if (
+                        not relax_parallel_gate
+                        and opening_new_parallel_window
+                        and _has_incomplete_parallel_window(task.division_id, day_id, required_parallel)
+                    ):
+    
+                        return False
+    
+    
+    
+            if task.group_id and task.group_id in strict_parallel_lab_groups:
+    
+                bound_slot = lab_group_slot_binding.get(task.group_id)
+    
+                if bound_slot:
+    
+                    bound_day_id, bound_slot_ids = bound_slot
+    
+                    if not relax_parallel_binding and day_id != bound_day_id:
+    
+                        return False
+    
+                    if not relax_parallel_binding and tuple(slot_ids) != tuple(bound_slot_ids):
+    
+                        return False
+    
+    
+    
+            return True
+    
+    
+    
+        def _occupy_cells(task: _SessionTask, day_id: int, slot_ids: list[str], room_id: str) -> None:
+            """Mark the cells a placement holds; idempotent, so cells shared with other sessions can be re-marked."""
+            for slot_id in slot_ids:
+                used_room_slot.add((room_id, day_id, slot_id))
+                used_faculty_slot.add((task.faculty_id, day_id, slot_id))
+                if task.batch_id:
+                    used_division_batch_slot.add((task.division_id, str(task.batch_id), day_id, slot_id))
+                    used_division_any_batch_slot.add((task.division_id, day_id, slot_id))
+                    if task.session_type == "LAB":
+                        division_slot_lab_subjects.setdefault((task.division_id, day_id, slot_id), set()).add(task.subject_id)
+                else:
+                    used_division_full_slot.add((task.division_id, day_id, slot_id))
+                if task.session_type != "TUTORIAL":
+                    day_key = (task.division_id, day_id)
+                    division_day_slots.setdefault(day_key, set()).add(slot_id)
+                    division_day_slot_orders.setdefault(day_key, set()).add(slot_order_by_id.get(slot_id, 0))
+            record_task_slot_orders(task, day_id, slot_ids)
+            record_theory_subject_slots(task, day_id, slot_ids)
+
+        def _apply_assignment(task: _SessionTask, day_id: int, slot_ids: list[str], room_id: str) -> None:
+            _occupy_cells(task, day_id, slot_ids, room_id)
+            if task.batch_id and task.session_type == "LAB":
+                for slot_id in slot_ids:
+                    division_slot_parallel_labs.setdefault((task.division_id, day_id, slot_id), []).append((str(task.batch_id), task.subject_id))
+            room_usage_counter[room_id] = room_usage_counter.get(room_id, 0) + len(slot_ids)
+            faculty_load_counter[task.faculty_id] = faculty_load_counter.get(task.faculty_id, 0) + len(slot_ids)
+            if task.session_type in ("THEORY", "LAB"):
+                division_day_theory_lab_hours[(task.division_id, day_id)] = division_day_theory_lab_hours.get((task.division_id, day_id), 0) + len(slot_ids)
+                faculty_day_theory_lab_hours[(task.faculty_id, day_id)] = faculty_day_theory_lab_hours.get((task.faculty_id, day_id), 0) + len(slot_ids)
+            if task.group_id and task.group_id in strict_parallel_lab_groups:
+                lab_group_slot_binding.setdefault(task.group_id, (day_id, tuple(slot_ids)))
+            scheduled_task_assignments[task_key(task)] = {
+                "task": task,
+                "day_id": day_id,
+                "slot_ids": list(slot_ids),
+                "room_id": room_id,
+            }
+            _index_assignment(task, day_id, slot_ids)
+
+
+
+        # Incremental regeneration: keep every still-valid placement of the base version.
+        base_pins = BasePins()
+        if base_entries is not None:
+            base_pins = pins_from_base_entries(tasks, base_entries, slot_order_by_id, task_key)
+            if generation_options.solver == "cpsat":
+                print("Warning: CP-SAT re-solves every session; incremental regeneration uses the greedy scheduler")
+                generation_options.solver = "greedy"
+        if (reserved_room_slots or reserved_faculty_slots) and generation_options.solver == "cpsat":
+            print("Warning: CP-SAT does not model cells reserved by other departments; institute runs use the greedy scheduler")
+            generation_options.solver = "greedy"
+        task_by_key = {task_key(task): task for task in tasks}
+        known_room_ids = {str(room["room_id"]) for room in lab_rooms + theory_rooms}
+        applied_pins: set[str] = set()
+        rejected_pins = 0
+        def displaced_pin_count() -> int:
+            displaced = 0
+            for key in applied_pins:
+                day_id, slot_ids, room_id = base_pins.placements[key]
+                current = scheduled_task_assignments.get(key)
+                if current is None or (int(current["day_id"]), list(current["slot_ids"]), str(current["room_id"])) != (day_id, slot_ids, room_id):
+                    displaced += 1
+            return displaced
+        def pin_move_budget() -> int:
+            return max(generation_options.max_displaced_sessions - displaced_pin_count(), 0)
+
+        # Dynamic ordering: most-constrained-first over the same windows the greedy pass scans.
+        def _ordering_blocks(task: _SessionTask) -> list[tuple[int, list[str]]]:
+            shift_name, shift_window = division_shift_assignments.get(task.division_id, ("SHIFT_08_14", (8 * 60, 14 * 60)))
+            task_duration = max(task.duration_slots, 1)
+            blocks: list[tuple[int, list[str]]] = []
+            for day in day_rows:
+                for start_index in range(len(slot_rows_ordered) - task_duration + 1):
+                    candidate_slots = slot_rows_ordered[start_index : start_index + task_duration]
+                    if task.session_type != "TUTORIAL" and not _block_within_window(candidate_slots, shift_window):
+                        continue
+                    if any(
+                        int(candidate_slots[i + 1].get("slot_order") or 0) - int(candidate_slots[i].get("slot_order") or 0) != 1
+                        for i in range(len(candidate_slots) - 1)
+                    ):
+                        continue
+                    slot_ids = [str(item["slot_id"]) for item in candidate_slots]
+                    if uses_lunch_slot(task, shift_name, slot_ids):
+                        continue
+                    blocks.append((int(day["day_id"]), slot_ids))
+            return blocks
+
+        def _ordering_value_rank(task: _SessionTask, day_id: int, slot_ids: list[str]) -> tuple:
+            parallel_fill = 0
+            required_parallel = required_parallel_labs_by_division.get(task.division_id) if task.session_type == "LAB" and task.batch_id else None
+            if required_parallel:
+                for slot_id in slot_ids:
+                    entries = division_slot_parallel_labs.get((task.division_id, day_id, slot_id), [])
+                    if 0 < len(entries) < required_parallel:
+                        parallel_fill += 1
+            _, shift_window = division_shift_assignments.get(task.division_id, ("SHIFT_08_14", (8 * 60, 14 * 60)))
+            return (
+                -parallel_fill,
+                theory_subject_day_count(task, day_id),
+                candidate_start_priority([slot_row_by_id[slot_id] for slot_id in slot_ids], shift_window),
+                theory_subject_adjacency_count(task, day_id, slot_ids),
+                seeded_rank(task.division_id, task.subject_id, task.batch_id or "", day_id, ",".join(slot_ids)),
+            )
+
+        def _run_dynamic_ordering(pending: list[_SessionTask]) -> dict[str, Any]:
+            room_count = len(lab_rooms) + len(theory_rooms)
+            room_ids_by_pool = {
+                True: [str(room["room_id"]) for room in lab_rooms],
+                False: [str(room["room_id"]) for room in theory_rooms],
+            }
+            placer = MostConstrainedFirstPlacer(
+                key=task_key,
+                blocks=_ordering_blocks,
+                free_rooms=lambda task, day_id, slot_ids: [
+                    room_id
+                    for room_id in room_ids_by_pool[task.session_type == "LAB"]
+                    if all((room_id, day_id, slot_id) not in used_room_slot for slot_id in slot_ids)
+                ],
+                pick_rooms=lambda task, day_id, slot_ids: select_rooms_for_block(
+                    lab_rooms if task.session_type == "LAB" else theory_rooms, day_id, slot_ids, room_count
+                ),
+                can_place=_can_place,
+                apply=_apply_assignment,
+                remove=lambda task: _remove_assignment(scheduled_task_assignments[task_key(task)]),
+                resources=lambda task: (("division", task.division_id), ("faculty", task.faculty_id)),
+                week_resources=lambda task: (("group", task.group_id),) if task.group_id in strict_parallel_lab_groups else (),
+                room_pool=lambda task: task.session_type == "LAB",
+                value_rank=_ordering_value_rank,
+            )
+            return placer.run(pending).as_dict()
+
+        task_ordering_report: dict[str, Any] = {"mode": "static"}
+        best_task_ordering_report: dict[str, Any] = task_ordering_report
+
+        # We will run 3 candidate attempts (one when warm-starting from pinned placements)
+        for attempt in range(1 if base_pins.placements else 3):
+            attempt_idx = attempt
+            # The state holds the best attempt so far; a worse attempt is undone back to it.
+            attempt_mark = state_trail.checkpoint() if best_attempt_found else None
+            clear_all_state()
+            candidate_rejections = 0
+            repaired_from_deadlocks = 0
+            repack_moves = 0
+            applied_pins.clear()
+            rejected_pins = 0
+            for key, (day_id, slot_ids, room_id) in base_pins.placements.items():
+                # Pins only have to be conflict-free; the base may itself have used relaxed passes.
+                if room_id in known_room_ids and _can_place(
+                    task_by_key[key],
+                    day_id,
+                    slot_ids,
+                    room_id,
+                    relax_gapless=True,
+                    relax_parallel_gate=True,
+                    relax_division_daily=True,
+                    relax_faculty_daily=True,
+                    relax_daily_slot_cap=True,
+                ):
+                    _apply_assignment(task_by_key[key], day_id, slot_ids, room_id)
+                    applied_pins.add(key)
+                else:
+                    rejected_pins += 1
+            if generation_options.task_ordering == "dynamic":
+                # Whatever the dynamic pass cannot place falls through to the static greedy loop.
+                task_ordering_report = _run_dynamic_ordering(
+                    [task for task in tasks_ordered if task_key(task) not in scheduled_task_assignments]
+                )
+            for task in tasks_ordered:
+    
+                if task_key(task) in scheduled_task_assignments:
+    
+                    continue
+    
+                scheduled = False
+    
+                room_candidates = (lab_rooms + theory_rooms) if task.session_type == "LAB" else theory_rooms
+    
+                preferred_shift_name, preferred_shift_window = division_shift_assignments.get(
+    
+                    task.division_id,
+    
+                    ("SHIFT_08_14", (8 * 60, 14 * 60)),
+    
+                )
+    
+                preferred_lunch_slot_order = lunch_slot_order_for_task(task, preferred_shift_name)
+                lab_group_id = (
+    
+                    task.group_id
+    
+                    if task.session_type == "LAB"
+    
+                    and task.batch_id
+    
+                    and task.group_id
+    
+                    and task.group_id in strict_parallel_lab_groups
+    
+                    else None
+    
+                )
+    
+    
+    
+                task_duration = max(task.duration_slots, 1)
+    
+                group_size = 1
+    
+                for current_hour_limit in (division_daily_hard_limit,):
+    
+                    for day in sorted(
+    
+                        day_rows,
+    
+                        key=lambda row: (theory_subject_day_count(task, int(row.get("day_id") or 0)), seeded_rank(
+                            task.division_id,
+    
+                            task.subject_id,
+    
+                            task.faculty_id,
+    
+                            task.batch_id or "",
+                            task.group_id or "",
+                            row.get("day_id"),
+    
+                        )),
+                    ):
     
                         day_id = int(day["day_id"])
     
@@ -2541,17 +3304,7 @@ class TimetableOrchestrationEngine:
     
     
     
-                                    incomplete_window_exists = any(
-    
-                                        key[0] == task.division_id
-    
-                                        and key[1] == day_id
-    
-                                        and 0 < len(entries) < required_parallel
-    
-                                        for key, entries in division_slot_parallel_labs.items()
-    
-                                    )
+                                    incomplete_window_exists = _has_incomplete_parallel_window(task.division_id, day_id, required_parallel)
     
                                     if incomplete_window_exists and opening_new_parallel_window:
     
@@ -2761,16 +3514,12 @@ class TimetableOrchestrationEngine:
     
     
                             scheduled_task_assignments[task_key(task)] = {
-    
                                 "task": task,
-    
                                 "day_id": day_id,
-    
                                 "slot_ids": list(slot_ids),
-    
                                 "room_id": selected_room_id,
-    
                             }
+                            _index_assignment(task, day_id, slot_ids)
     
     
     
@@ -2960,17 +3709,7 @@ class TimetableOrchestrationEngine:
     
     
     
-                                    incomplete_window_exists = any(
-    
-                                        key[0] == task.division_id
-    
-                                        and key[1] == day_id
-    
-                                        and 0 < len(entries) < required_parallel
-    
-                                        for key, entries in division_slot_parallel_labs.items()
-    
-                                    )
+                                    incomplete_window_exists = _has_incomplete_parallel_window(task.division_id, day_id, required_parallel)
     
                                     if incomplete_window_exists and opening_new_parallel_window:
     
@@ -3141,16 +3880,12 @@ class TimetableOrchestrationEngine:
     
     
                             scheduled_task_assignments[task_key(task)] = {
-    
                                 "task": task,
-    
                                 "day_id": day_id,
-    
                                 "slot_ids": list(slot_ids),
-    
                                 "room_id": selected_room_id,
-    
                             }
+                            _index_assignment(task, day_id, slot_ids)
     
     
     
@@ -3184,443 +3919,15 @@ class TimetableOrchestrationEngine:
     
                                 "subject_id": task.subject_id,
     
-                                "batch_id": task.batch_id,
-    
-                                "session_type": task.session_type,
-    
-                                "reason": "no_feasible_slot",
-    
-                            }
-    
-                        )
-    
-    
-    
-            slot_row_by_id = {str(slot.get("slot_id")): slot for slot in slot_rows_ordered}
-    
-    
-    
-            def _remove_assignment(assignment: dict[str, Any]) -> None:
-    
-                task: _SessionTask = assignment["task"]
-    
-                day_id = int(assignment["day_id"])
-    
-                slot_ids = [str(slot_id) for slot_id in assignment["slot_ids"]]
-    
-                room_id = str(assignment["room_id"])
-    
-                key = task_key(task)
-    
-    
-    
-                for slot_id in slot_ids:
-    
-                    used_room_slot.discard((room_id, day_id, slot_id))
-    
-                    used_faculty_slot.discard((task.faculty_id, day_id, slot_id))
-    
-                    if task.batch_id:
-    
-                        used_division_batch_slot.discard((task.division_id, str(task.batch_id), day_id, slot_id))
-    
-                        used_division_any_batch_slot.discard((task.division_id, day_id, slot_id))
-    
-                        if task.session_type == "LAB":
-    
-                            subject_key = (task.division_id, day_id, slot_id)
-    
-                            subject_set = division_slot_lab_subjects.get(subject_key)
-    
-                            if subject_set:
-    
-                                subject_set.discard(task.subject_id)
-    
-                                if not subject_set:
-    
-                                    division_slot_lab_subjects.pop(subject_key, None)
-    
-    
-    
-                            parallel_key = (task.division_id, day_id, slot_id)
-    
-                            entries = division_slot_parallel_labs.get(parallel_key, [])
-    
-                            entries = [entry for entry in entries if not (entry[0] == str(task.batch_id) and entry[1] == task.subject_id)]
-    
-                            if entries:
-    
-                                division_slot_parallel_labs[parallel_key] = entries
-    
-                            else:
-    
-                                division_slot_parallel_labs.pop(parallel_key, None)
-    
-                    else:
-    
-                        used_division_full_slot.discard((task.division_id, day_id, slot_id))
-    
-    
-    
-                    if task.session_type != "TUTORIAL":
-    
-                        day_key = (task.division_id, day_id)
-    
-                        occupied = division_day_slots.get(day_key)
-    
-                        if occupied:
-    
-                            occupied.discard(slot_id)
-    
-                            if not occupied:
-    
-                                division_day_slots.pop(day_key, None)
-    
-    
-    
-                        occupied_orders = division_day_slot_orders.get(day_key)
-    
-                        if occupied_orders:
-    
-                            occupied_orders.discard(slot_order_by_id.get(slot_id, 0))
-    
-                            if not occupied_orders:
-    
-                                division_day_slot_orders.pop(day_key, None)
-    
-                discard_task_slot_orders(task, day_id, slot_ids)
-                discard_theory_subject_slots(task, day_id, slot_ids)
-    
-    
-                room_usage_counter[room_id] = max(room_usage_counter.get(room_id, 0) - len(slot_ids), 0)
-    
-                faculty_load_counter[task.faculty_id] = max(faculty_load_counter.get(task.faculty_id, 0) - len(slot_ids), 0)
-    
-    
-    
-                if task.session_type in ("THEORY", "LAB"):
-    
-                    div_day_key = (task.division_id, day_id)
-    
-                    faculty_day_key = (task.faculty_id, day_id)
-    
-                    division_day_theory_lab_hours[div_day_key] = max(division_day_theory_lab_hours.get(div_day_key, 0) - len(slot_ids), 0)
-    
-                    faculty_day_theory_lab_hours[faculty_day_key] = max(faculty_day_theory_lab_hours.get(faculty_day_key, 0) - len(slot_ids), 0)
-    
-    
-    
-                if task.group_id and task.group_id in lab_group_slot_binding:
-    
-                    bound_day, bound_slots = lab_group_slot_binding.get(task.group_id, (None, tuple()))
-    
-                    if bound_day == day_id and tuple(slot_ids) == tuple(bound_slots):
-    
-                        still_bound = any(
-    
-                            existing["task"].group_id == task.group_id
-    
-                            for existing in scheduled_task_assignments.values()
-    
-                            if existing["task"].group_id != task.group_id or task_key(existing["task"]) != key
-    
-                        )
-    
-                        if not still_bound:
-    
-                            lab_group_slot_binding.pop(task.group_id, None)
-    
-    
-    
-                scheduled_task_assignments.pop(key, None)
-    
-    
-    
-            def _can_place(
-    
-                task: _SessionTask,
-    
-                day_id: int,
-    
-                slot_ids: list[str],
-    
-                room_id: str,
-    
-                *,
-    
-                relax_gapless: bool = False,
-    
-                relax_parallel_gate: bool = False,
-    
-                relax_division_daily: bool = False,
-    
-                relax_shift_window: bool = False,
-    
-                relax_parallel_binding: bool = False,
-    
-                relax_faculty_daily: bool = False,
-    
-                relax_daily_slot_cap: bool = False,
-    
-            ) -> bool:
-    
-                candidate_slots = [slot_row_by_id.get(slot_id) for slot_id in slot_ids]
-    
-                if any(slot is None for slot in candidate_slots):
-                    return False
-    
-                shift_name, _ = division_shift_assignments.get(task.division_id, ("SHIFT_08_14", (8 * 60, 14 * 60)))
-                if uses_lunch_slot(task, shift_name, slot_ids):
-                    return False
-    
-                if task.session_type != "TUTORIAL":
-                    _, preferred_shift_window = division_shift_assignments.get(task.division_id, ("SHIFT_08_14", (8 * 60, 14 * 60)))
-                    if not relax_shift_window and not _block_within_window([slot for slot in candidate_slots if slot], preferred_shift_window):
-                        return False
-    
-                if any(
-                    int(candidate_slots[idx + 1].get("slot_order") or 0) - int(candidate_slots[idx].get("slot_order") or 0) != 1
-    
-                    for idx in range(len(candidate_slots) - 1)
-    
-                ):
-    
-                    return False
-    
-    
-    
-                full_div_keys = [(task.division_id, day_id, slot_id) for slot_id in slot_ids]
-    
-                batch_div_keys = [(task.division_id, str(task.batch_id), day_id, slot_id) for slot_id in slot_ids]
-    
-                fac_keys = [(task.faculty_id, day_id, slot_id) for slot_id in slot_ids]
-    
-    
-    
-                if task.batch_id:
-    
-                    if any(div_key in used_division_full_slot for div_key in full_div_keys):
-    
-                        return False
-    
-                    if any(batch_key in used_division_batch_slot for batch_key in batch_div_keys):
-    
-                        return False
-    
-                else:
-    
-                    if any(div_key in used_division_full_slot for div_key in full_div_keys):
-    
-                        return False
-    
-                    if any(div_key in used_division_any_batch_slot for div_key in full_div_keys):
-    
-                        return False
-    
-    
-    
-                if any(fac_key in used_faculty_slot for fac_key in fac_keys):
-    
-                    return False
-    
-                # CONSTRAINT: Prevent consecutive same-subject theory
-                if task.session_type == "THEORY" and theory_subject_adjacency_count(task, day_id, slot_ids) > 0:
-                    return False
-    
-                # CONSTRAINT: Avoid consecutive cognitively heavy subjects
-                if task.session_type == "THEORY" and is_heavy_subject(task.subject_id):
-                    if is_adjacent_to_heavy_subject(task, day_id, slot_ids):
-                        return False
-    
-                if any((room_id, day_id, slot_id) in used_room_slot for slot_id in slot_ids):
-    
-                    return False
-    
-    
-    
-                day_key = (task.division_id, day_id)
-    
-                occupied = division_day_slots.setdefault(day_key, set())
-    
-                occupied_orders = division_day_slot_orders.setdefault(day_key, set())
-    
-                if task.session_type != "TUTORIAL":
-    
-                    new_slot_count = sum(1 for slot_id in slot_ids if slot_id not in occupied)
-    
-                    daily_slot_cap = max_sessions_per_day + 2 if relax_daily_slot_cap else max_sessions_per_day
-    
-                    if len(occupied) + new_slot_count > daily_slot_cap:
-    
-                        return False
-    
-    
-    
-                    proposed_orders = occupied_slot_orders_for_task_day(task, day_id)
-                    proposed_orders.update(slot_order_by_id.get(slot_id, 0) for slot_id in slot_ids)
-    
-                    shift_name, _ = division_shift_assignments.get(task.division_id, ("SHIFT_08_14", (8 * 60, 14 * 60)))
-    
-                    lunch_slot = lunch_slot_order_for_task(task, shift_name)
-                    if not relax_gapless and not _is_gapless_day_pattern(proposed_orders, lunch_slot):
-    
-                        return False
-    
-    
-    
-                if task.session_type in ("THEORY", "LAB"):
-    
-                    division_limit = division_daily_hard_limit + 2 if relax_division_daily else division_daily_hard_limit
-    
-                    if division_day_theory_lab_hours.get((task.division_id, day_id), 0) + len(slot_ids) > division_limit:
-    
-                        return False
-    
-                    faculty_limit = 999 if relax_faculty_daily else faculty_daily_hard_limit
-    
-                    if faculty_day_theory_lab_hours.get((task.faculty_id, day_id), 0) + len(slot_ids) > faculty_limit:
-    
-                        return False
-    
-    
-    
-                if task.session_type == "LAB" and task.batch_id:
-    
-                    required_parallel = required_parallel_labs_by_division.get(task.division_id)
-    
-                    if required_parallel:
-    
-                        opening_new_parallel_window = True
-    
-                        for slot_id in slot_ids:
-    
-                            parallel_key = (task.division_id, day_id, slot_id)
-    
-                            current_entries = division_slot_parallel_labs.get(parallel_key, [])
-    
-                            current_batches = {entry[0] for entry in current_entries}
-    
-                            if str(task.batch_id) in current_batches:
-    
-                                return False
-    
-                            if len(current_entries) >= required_parallel:
-    
-                                return False
-    
-                            if current_entries:
-    
-                                opening_new_parallel_window = False
-    
-    
-    
-                        incomplete_window_exists = any(
-    
-                            key[0] == task.division_id and key[1] == day_id and 0 < len(entries) < required_parallel
-    
-                            for key, entries in division_slot_parallel_labs.items()
-    
-                        )
-    
-                        if not relax_parallel_gate and incomplete_window_exists and opening_new_parallel_window:
-    
-                            return False
-    
-    
-    
-                if task.group_id and task.group_id in strict_parallel_lab_groups:
-    
-                    bound_slot = lab_group_slot_binding.get(task.group_id)
-    
-                    if bound_slot:
-    
-                        bound_day_id, bound_slot_ids = bound_slot
-    
-                        if not relax_parallel_binding and day_id != bound_day_id:
-    
-                            return False
-    
-                        if not relax_parallel_binding and tuple(slot_ids) != tuple(bound_slot_ids):
-    
-                            return False
-    
-    
-    
-                return True
-    
-    
-    
-            def _apply_assignment(task: _SessionTask, day_id: int, slot_ids: list[str], room_id: str) -> None:
-    
-                for slot_id in slot_ids:
-    
-                    used_room_slot.add((room_id, day_id, slot_id))
-    
-                    used_faculty_slot.add((task.faculty_id, day_id, slot_id))
-    
-                    if task.batch_id:
-    
-                        used_division_batch_slot.add((task.division_id, str(task.batch_id), day_id, slot_id))
-    
-                        used_division_any_batch_slot.add((task.division_id, day_id, slot_id))
-    
-                        if task.session_type == "LAB":
-    
-                            subject_key = (task.division_id, day_id, slot_id)
-    
-                            division_slot_lab_subjects.setdefault(subject_key, set()).add(task.subject_id)
-    
-                            parallel_key = (task.division_id, day_id, slot_id)
-    
-                            division_slot_parallel_labs.setdefault(parallel_key, []).append((str(task.batch_id), task.subject_id))
-    
-                    else:
-    
-                        used_division_full_slot.add((task.division_id, day_id, slot_id))
-    
-    
-    
-                    if task.session_type != "TUTORIAL":
-    
-                        day_key = (task.division_id, day_id)
-    
-                        division_day_slots.setdefault(day_key, set()).add(slot_id)
-    
-                        division_day_slot_orders.setdefault(day_key, set()).add(slot_order_by_id.get(slot_id, 0))
-    
-                record_task_slot_orders(task, day_id, slot_ids)
-                record_theory_subject_slots(task, day_id, slot_ids)
-    
-    
-                room_usage_counter[room_id] = room_usage_counter.get(room_id, 0) + len(slot_ids)
-    
-                faculty_load_counter[task.faculty_id] = faculty_load_counter.get(task.faculty_id, 0) + len(slot_ids)
-    
-                if task.session_type in ("THEORY", "LAB"):
-    
-                    division_day_theory_lab_hours[(task.division_id, day_id)] = division_day_theory_lab_hours.get((task.division_id, day_id), 0) + len(slot_ids)
-    
-                    faculty_day_theory_lab_hours[(task.faculty_id, day_id)] = faculty_day_theory_lab_hours.get((task.faculty_id, day_id), 0) + len(slot_ids)
-    
-    
-    
-                if task.group_id and task.group_id in strict_parallel_lab_groups:
-    
-                    lab_group_slot_binding.setdefault(task.group_id, (day_id, tuple(slot_ids)))
-    
-    
-    
-                scheduled_task_assignments[task_key(task)] = {
-    
-                    "task": task,
+                                "batch_id": task.batch_id,
     
-                    "day_id": day_id,
+                                "session_type": task.session_type,
     
-                    "slot_ids": list(slot_ids),
+                                "reason": "no_feasible_slot",
     
-                    "room_id": room_id,
+                            }
     
-                }
+                        )
     
     
     
@@ -3756,114 +4063,121 @@ class TimetableOrchestrationEngine:
     
     
     
+            def _joint_lab_blocks(unit: list[_SessionTask]) -> list[tuple[int, list[str]]]:
+                """Blocks where every lab in ``unit`` can sit side by side, those completing a window first."""
+                lead = unit[0]
+                duration = max(lead.duration_slots, 1)
+                _, shift_window = division_shift_assignments.get(lead.division_id, ("SHIFT_08_14", (8 * 60, 14 * 60)))
+                unit_batches = {str(task.batch_id) for task in unit}
+                required_parallel = required_parallel_labs_by_division.get(lead.division_id, len(unit))
+                ranked: list[tuple[tuple[int, int, int, int, int], int, list[str]]] = []
+                for day in day_rows:
+                    day_id = int(day["day_id"])
+                    day_load = len(division_day_slots.get((lead.division_id, day_id), set()))
+                    for start_index in range(len(slot_rows_ordered) - duration + 1):
+                        candidate_slots = slot_rows_ordered[start_index : start_index + duration]
+                        if not _block_within_window(candidate_slots, shift_window):
+                            continue
+                        slot_ids = [str(item["slot_id"]) for item in candidate_slots]
+                        fits = True
+                        completes = 0
+                        filled = 0
+                        for slot_id in slot_ids:
+                            entries = division_slot_parallel_labs.get((lead.division_id, day_id, slot_id), [])
+                            if len(entries) + len(unit) > required_parallel or unit_batches & {entry[0] for entry in entries}:
+                                fits = False
+                                break
+                            filled += 1 if entries else 0
+                            completes += 1 if entries and len(entries) + len(unit) == required_parallel else 0
+                        if not fits:
+                            continue
+                        first_order = slot_order_by_id.get(slot_ids[0], 9999)
+                        tie = seeded_rank(task_key(lead), day_id, ",".join(slot_ids), attempt_idx)
+                        ranked.append(((-completes, -filled, day_load, first_order, tie), day_id, slot_ids))
+                ranked.sort(key=lambda item: item[0])
+                return [(day_id, slot_ids) for _, day_id, slot_ids in ranked]
+
+            def _place_lab_unit(unit: list[_SessionTask]) -> bool:
+                """Place the whole unit in one block (all or nothing)."""
+                for day_id, slot_ids in _joint_lab_blocks(unit):
+                    mark = state_trail.checkpoint()
+                    placed: list[_SessionTask] = []
+                    for task in sorted(unit, key=lambda item: item.faculty_id):
+                        room_ids = select_rooms_for_block(lab_rooms, day_id, slot_ids, len(unit) + 1)
+                        room_id = next((room for room in room_ids if _can_place(task, day_id, slot_ids, room)), None)
+                        if room_id is None:
+                            break
+                        _apply_assignment(task, day_id, slot_ids, room_id)
+                        placed.append(task)
+                    if len(placed) == len(unit):
+                        state_trail.commit(mark)
+                        return True
+                    state_trail.rollback(mark)
+                return False
+
             def _repair_parallel_deadlocks() -> int:
-    
+                """Move the labs of each incomplete parallel window (with their strict groups) as one unit.
+
+                A unit goes to a block the rest of its batch set can share, ideally one that completes
+                another window; when no joint block exists its labs are re-placed one by one.
+                """
+                started = time.perf_counter()
                 repaired = 0
-    
                 deadlock_keys = [
-    
                     key
-    
                     for key, entries in division_slot_parallel_labs.items()
-    
                     if 0 < len(entries) < required_parallel_labs_by_division.get(key[0], 0)
-    
                 ]
-    
-    
-    
-                for division_id, day_id, slot_id in deadlock_keys:
-    
-                    affected_assignments = [
-    
-                        assignment
-    
-                        for assignment in list(scheduled_task_assignments.values())
-    
-                        if assignment["task"].division_id == division_id
-    
-                        and assignment["task"].session_type == "LAB"
-    
-                        and int(assignment["day_id"]) == int(day_id)
-    
-                        and slot_id in assignment["slot_ids"]
-    
-                    ]
-    
+                parallel_lab_repair_stats["deadlocked_windows"] += len(deadlock_keys)
+                for window in deadlock_keys:
+                    entries = division_slot_parallel_labs.get(window, [])
+                    if not 0 < len(entries) < required_parallel_labs_by_division.get(window[0], 0):
+                        continue
+                    unit_keys = set(lab_assignment_keys_by_window.get(window, ()))
+                    for key in list(unit_keys):
+                        group_id = scheduled_task_assignments[key]["task"].group_id
+                        if group_id and group_id in strict_parallel_lab_groups:
+                            unit_keys |= assignment_keys_by_group.get(group_id, set())
+                    affected_assignments = [scheduled_task_assignments[key] for key in sorted(unit_keys) if key in scheduled_task_assignments]
                     if not affected_assignments:
-    
                         continue
-    
-    
-    
-                    original_payload = [
-    
-                        {
-    
-                            "task": entry["task"],
-    
-                            "day_id": entry["day_id"],
-    
-                            "slot_ids": list(entry["slot_ids"]),
-    
-                            "room_id": entry["room_id"],
-    
-                        }
-    
-                        for entry in affected_assignments
-    
-                    ]
-    
-    
-    
+                    if applied_pins and sum(1 for entry in affected_assignments if task_key(entry["task"]) in applied_pins) > pin_move_budget():
+                        parallel_lab_repair_stats["skipped_pin_budget"] += 1
+                        continue
+                    parallel_lab_repair_stats["repair_attempts"] += 1
+                    repair_mark = state_trail.checkpoint()
                     for entry in affected_assignments:
-    
                         _remove_assignment(entry)
-    
-    
-    
-                    resolved = True
-    
-                    for entry in sorted(original_payload, key=lambda item: item["task"].faculty_id):
-    
-                        options = _candidate_options(entry["task"], max_options=10)
-    
-                        if not options:
-    
-                            resolved = False
-    
-                            break
-    
-                        selected_day, selected_slots, selected_room = options[0]
-    
-                        _apply_assignment(entry["task"], selected_day, selected_slots, selected_room)
-    
-    
-    
+                    unit = [entry["task"] for entry in affected_assignments]
+                    batches = [str(task.batch_id) for task in unit]
+                    resolved = (
+                        len(set(batches)) == len(batches)
+                        and len({task.duration_slots for task in unit}) == 1
+                        and _place_lab_unit(unit)
+                    )
                     if resolved:
-    
-                        repaired += len(original_payload)
-    
+                        parallel_lab_repair_stats["group_units_moved"] += 1
+                    else:
+                        resolved = True
+                        for task in sorted(unit, key=lambda item: item.faculty_id):
+                            options = _candidate_options(task, max_options=10)
+                            if not options:
+                                resolved = False
+                                break
+                            selected_day, selected_slots, selected_room = options[0]
+                            _apply_assignment(task, selected_day, selected_slots, selected_room)
+                    if resolved:
+                        state_trail.commit(repair_mark)
+                        repaired += len(unit)
+                        parallel_lab_repair_stats["repaired_windows"] += 1
+                        parallel_lab_repair_stats["repaired_sessions"] += len(unit)
                         continue
-    
-    
-    
-                    for entry in original_payload:
-    
-                        if task_key(entry["task"]) in scheduled_task_assignments:
-    
-                            _remove_assignment(scheduled_task_assignments[task_key(entry["task"])])
-    
-                    for entry in original_payload:
-    
-                        _apply_assignment(entry["task"], int(entry["day_id"]), list(entry["slot_ids"]), str(entry["room_id"]))
-    
-    
-    
+                    parallel_lab_repair_stats["rolled_back"] += 1
+                    state_trail.rollback(repair_mark)
+                parallel_lab_repair_stats["elapsed_ms"] += (time.perf_counter() - started) * 1000
                 return repaired
-    
-    
-    
+
+
             def _place_unresolved_backtracking(
     
                 pending: list[_SessionTask],
@@ -3999,9 +4313,8 @@ class TimetableOrchestrationEngine:
     
     
                 for day_id, slot_ids, room_id in options:
-    
+                    mark = state_trail.checkpoint()
                     _apply_assignment(current, day_id, slot_ids, room_id)
-    
                     if _place_unresolved_backtracking(
     
                         remainder,
@@ -4032,14 +4345,9 @@ class TimetableOrchestrationEngine:
     
                     ):
     
+                        state_trail.commit(mark)
                         return True
-    
-                    current_assignment = scheduled_task_assignments.get(task_key(current))
-    
-                    if current_assignment:
-    
-                        _remove_assignment(current_assignment)
-    
+                    state_trail.rollback(mark)
                 return False
     
     
@@ -4166,6 +4474,24 @@ class TimetableOrchestrationEngine:
     
     
     
+                if applied_pins:
+    
+                    # Warm-started runs may only move a bounded number of pinned sessions.
+    
+                    pinned_budget = pin_move_budget()
+    
+                    movable_candidates = [
+    
+                        assignment
+    
+                        for assignment in movable_candidates
+    
+                        if task_key(assignment["task"]) not in applied_pins
+    
+                        or (pinned_budget := pinned_budget - 1) >= 0
+    
+                    ]
+    
                 if not movable_candidates:
     
                     return 0
@@ -4191,18 +4517,10 @@ class TimetableOrchestrationEngine:
                 )
     
                 selected = movable_candidates[:max_movable]
-    
-                removed_snapshots = [_snapshot_assignment(entry) for entry in selected]
-    
-    
-    
+                repack_mark = state_trail.checkpoint()
                 for entry in selected:
-    
                     _remove_assignment(entry)
-    
-    
-    
-                repack_pending = unresolved_now + [entry["task"] for entry in removed_snapshots]
+                repack_pending = unresolved_now + [entry["task"] for entry in selected]
     
                 limit = min(max(len(repack_pending) + 24, 36), 120)
     
@@ -4255,7 +4573,7 @@ class TimetableOrchestrationEngine:
                     )
     
                 if success:
-    
+                    state_trail.commit(repack_mark)
                     return max(len(scheduled_task_assignments) - before_count, 0)
     
     
@@ -4311,25 +4629,10 @@ class TimetableOrchestrationEngine:
                 after_count = len(scheduled_task_assignments)
     
                 if after_count > before_count:
-    
+                    state_trail.commit(repack_mark)
                     return after_count - before_count
-    
-    
-    
                 # Rollback failed repack attempt.
-    
-                for task in repack_pending:
-    
-                    existing = scheduled_task_assignments.get(task_key(task))
-    
-                    if existing:
-    
-                        _remove_assignment(existing)
-    
-                for snapshot in removed_snapshots:
-    
-                    _apply_assignment(snapshot["task"], snapshot["day_id"], list(snapshot["slot_ids"]), snapshot["room_id"])
-    
+                state_trail.rollback(repack_mark)
                 return 0
     
     
@@ -4555,7 +4858,7 @@ class TimetableOrchestrationEngine:
             curr_validity = 0 if is_valid else 1
             
             is_better = False
-            if best_assignment_snapshot is None:
+            if not best_attempt_found:
                 is_better = True
             else:
                 if curr_validity < best_validity:
@@ -4574,33 +4877,293 @@ class TimetableOrchestrationEngine:
                 best_quality_opt = copy.deepcopy(attempt_score_dict)
                 best_candidate_rejections = candidate_rejections
                 best_repaired_from_deadlocks = repaired_from_deadlocks
+                best_task_ordering_report = task_ordering_report
                 best_repack_moves = repack_moves
                 best_unresolved_task_samples = copy.deepcopy(unresolved_task_samples)
                 best_validation_errors = list(validation_errors)
-                
-                best_assignment_snapshot = {}
-                for k, v in scheduled_task_assignments.items():
-                    best_assignment_snapshot[k] = {
-                        "task": v["task"],
-                        "day_id": v["day_id"],
-                        "slot_ids": list(v["slot_ids"]),
-                        "room_id": v["room_id"]
-                    }
-
-        # Restore the best candidate state
-        clear_all_state()
-        if best_assignment_snapshot:
-            for v in best_assignment_snapshot.values():
-                _apply_assignment(v["task"], v["day_id"], v["slot_ids"], v["room_id"])
+                best_attempt_found = True
+                if attempt_mark is not None:
+                    state_trail.commit(attempt_mark)
+            elif attempt_mark is not None:
+                state_trail.rollback(attempt_mark)
+        # The occupancy state already holds the best candidate.
+        if generation_options.verify_state:
+            _raise_on_state_drift("attempt loop")
                 
         # Restore metrics and quality optimization output
         candidate_rejections = best_candidate_rejections
         repaired_from_deadlocks = best_repaired_from_deadlocks
+        task_ordering_report = best_task_ordering_report
         repack_moves = best_repack_moves
         quality_optimization = best_quality_opt
         unresolved_task_samples = best_unresolved_task_samples
         validation_errors = best_validation_errors
         unresolved_tasks = best_unresolved
+        incremental_report: dict[str, Any] | None = None
+        if base_entries is not None:
+            incremental_report = {
+                "base_version_id": generation_options.base_version_id,
+                **base_pins.as_dict(),
+                "pins_applied": len(applied_pins),
+                "pins_rejected": rejected_pins,
+                "displaced_pins": displaced_pin_count(),
+                "max_displaced_sessions": generation_options.max_displaced_sessions,
+                "scheduled_fresh": len(tasks) - unresolved_tasks - len(applied_pins) + displaced_pin_count(),
+                "unscheduled": unresolved_tasks,
+            }
+            yield emit_stage(
+                {
+                    "agent": "Incremental Planner",
+                    "status": "completed",
+                    "metrics": incremental_report,
+                    "message": "Reused base-version placements and scheduled only added or changed sessions.",
+                }
+            )
+        cpsat_report: dict[str, Any] | None = None
+        if generation_options.solver == "cpsat" and not cpsat_available():
+            cpsat_report = {"status": "UNAVAILABLE", "error": cpsat_import_error()}
+            yield emit_stage(
+                {
+                    "agent": "CP-SAT Solver",
+                    "status": "skipped",
+                    "metrics": cpsat_report,
+                    "message": "ortools is not installed; kept the greedy timetable.",
+                }
+            )
+        elif generation_options.solver == "cpsat" and tasks:
+            cpsat_tasks = {task_key(task): task for task in tasks}
+            def _cpsat_candidate_blocks(task: _SessionTask) -> list[tuple[int, list[str]]]:
+                shift_name, shift_window = division_shift_assignments.get(task.division_id, ("SHIFT_08_14", (8 * 60, 14 * 60)))
+                duration = max(task.duration_slots, 1)
+                blocks: list[tuple[int, list[str]]] = []
+                for start_index in range(len(slot_rows_ordered) - duration + 1):
+                    candidate_slots = slot_rows_ordered[start_index : start_index + duration]
+                    if task.session_type != "TUTORIAL" and not _block_within_window(candidate_slots, shift_window):
+                        continue
+                    if any(
+                        int(candidate_slots[i + 1].get("slot_order") or 0) - int(candidate_slots[i].get("slot_order") or 0) != 1
+                        for i in range(len(candidate_slots) - 1)
+                    ):
+                        continue
+                    slot_ids = [str(item["slot_id"]) for item in candidate_slots]
+                    if uses_lunch_slot(task, shift_name, slot_ids):
+                        continue
+                    blocks.extend((int(day["day_id"]), slot_ids) for day in day_rows)
+                return blocks
+            day_patterns: list[tuple[str, str | None, int | None]] = []
+            for division_id in sorted({str(task.division_id) for task in tasks}):
+                shift_name, _ = division_shift_assignments.get(division_id, ("SHIFT_08_14", (8 * 60, 14 * 60)))
+                batch_ids = [str(batch_id) for batch_id in batches_by_division.get(division_id, [])]
+                if not batch_ids:
+                    day_patterns.append((division_id, None, shift_lunch_slot_order.get(shift_name)))
+                for batch_id in batch_ids:
+                    day_patterns.append((division_id, batch_id, batch_lunch_slot_order.get((division_id, batch_id), shift_lunch_slot_order.get(shift_name))))
+            greedy_snapshot = {key: _snapshot_assignment(value) for key, value in scheduled_task_assignments.items()}
+            greedy_errors = list(validation_errors)
+            greedy_unresolved = len(tasks) - len(scheduled_task_assignments)
+            cpsat_result = CpSatTimetableSolver(
+                CpSatProblem(
+                    tasks=cpsat_tasks,
+                    candidate_blocks=_cpsat_candidate_blocks,
+                    slot_order_by_id=slot_order_by_id,
+                    theory_room_ids=[str(room["room_id"]) for room in theory_rooms],
+                    lab_room_ids=[str(room["room_id"]) for room in lab_rooms],
+                    batches_by_division={str(div): [str(b) for b in ids] for div, ids in batches_by_division.items()},
+                    day_patterns=day_patterns,
+                    break_orders={slot_order_by_id.get(str(slot.get("slot_id")), 0) for slot in slot_rows_ordered if slot.get("is_break")},
+                    heavy_subject_ids={str(task.subject_id) for task in tasks if is_heavy_subject(task.subject_id)},
+                    parallel_group_ids=set(strict_parallel_lab_groups),
+                    division_daily_limit=division_daily_hard_limit,
+                    faculty_daily_limit=faculty_daily_hard_limit,
+                    # The greedy result seeds the search, so CP-SAT starts no worse than it.
+                    hint={key: (value["day_id"], value["slot_ids"], value["room_id"]) for key, value in greedy_snapshot.items()},
+                ),
+                time_limit_seconds=generation_options.cpsat_seconds,
+                workers=generation_options.cpsat_workers,
+            ).solve()
+            # Replay the solution through the scheduler's own checks before trusting it.
+            replay_mark = state_trail.checkpoint()
+            clear_all_state()
+            cpsat_rejected = 0
+            for key, (day_id, slot_ids, room_id) in cpsat_result.placements.items():
+                task = cpsat_tasks[key]
+                if _can_place(task, day_id, slot_ids, room_id, relax_gapless=True, relax_parallel_gate=True):
+                    _apply_assignment(task, day_id, slot_ids, room_id)
+                else:
+                    cpsat_rejected += 1
+            cpsat_unresolved = len(tasks) - len(scheduled_task_assignments)
+            _, cpsat_errors = validate_timetable(scheduled_task_assignments)
+            # Same ranking as the candidate attempts: validity first, then coverage.
+            cpsat_adopted = bool(cpsat_result.placements) and (bool(cpsat_errors), cpsat_unresolved, len(cpsat_errors)) <= (
+                bool(greedy_errors),
+                greedy_unresolved,
+                len(greedy_errors),
+            )
+            if cpsat_adopted:
+                state_trail.commit(replay_mark)
+                quality_optimization = compute_quality_score(scheduled_task_assignments)
+                validation_errors = list(cpsat_errors)
+                unresolved_tasks = cpsat_unresolved
+                unresolved_reason = "proven_unschedulable_under_hard_constraints" if cpsat_result.complete is False else "not_placed_within_cpsat_time_limit"
+                unresolved_task_samples = [
+                    {
+                        "division_id": task.division_id,
+                        "faculty_id": task.faculty_id,
+                        "subject_id": task.subject_id,
+                        "batch_id": task.batch_id,
+                        "session_type": task.session_type,
+                        "reason": unresolved_reason,
+                    }
+                    for key, task in cpsat_tasks.items()
+                    if key not in scheduled_task_assignments
+                ][:20]
+            else:
+                state_trail.rollback(replay_mark)
+            cpsat_report = {
+                **cpsat_result.as_dict(),
+                "adopted": cpsat_adopted,
+                "rejected_by_replay": cpsat_rejected,
+                "greedy_unscheduled": greedy_unresolved,
+                "greedy_validation_errors": len(greedy_errors),
+                "cpsat_validation_errors": len(cpsat_errors),
+            }
+            if cpsat_result.complete is False:
+                cpsat_message = (
+                    f"CP-SAT proved that at least {cpsat_report['proven_unschedulable']} session(s) cannot be placed "
+                    "under the hard constraints; relaxation is required."
+                )
+            elif cpsat_result.complete:
+                cpsat_message = "CP-SAT placed every session under the hard constraints."
+            else:
+                cpsat_message = "CP-SAT hit its time limit before proving the remaining sessions unschedulable."
+            yield emit_stage(
+                {
+                    "agent": "CP-SAT Solver",
+                    "status": "infeasible" if cpsat_result.complete is False else "completed",
+                    "metrics": cpsat_report,
+                    "message": cpsat_message + ("" if cpsat_adopted else " Kept the greedy timetable."),
+                }
+            )
+            if strict_gate_enabled and cpsat_result.complete is False:
+                raise ValueError(f"CP-SAT strict model infeasible: {cpsat_message}")
+        local_search_report: dict[str, Any] | None = None
+        if generation_options.local_search and scheduled_task_assignments:
+            quality_before = compute_quality_score(scheduled_task_assignments)
+            errors_before = validate_timetable(scheduled_task_assignments)[1]
+            original_placements = {key: _snapshot_assignment(value) for key, value in scheduled_task_assignments.items()}
+            break_orders = {slot_order_by_id.get(str(slot.get("slot_id")), 0) for slot in slot_rows_ordered if slot.get("is_break")}
+
+            def _idle_gaps_ok(orders_before: set[int], orders_after: set[int]) -> bool:
+                # validate_timetable flags a batch day with more than two idle slots (the count is in the message).
+                def _idle(orders: set[int]) -> int:
+                    return sum(1 for order in range(min(orders), max(orders)) if order not in orders and order not in break_orders) if orders else 0
+
+                idle_after = _idle(orders_after)
+                return idle_after <= 2 or idle_after == _idle(orders_before)
+
+            def _batch_day_orders(task: _SessionTask, day_id: int) -> list[set[int]]:
+                batch_ids = [str(task.batch_id)] if task.batch_id else [str(batch_id) for batch_id in batches_by_division.get(str(task.division_id), [])]
+                if not batch_ids:
+                    return [set(division_day_slot_orders.get((task.division_id, day_id), set()))]
+                return [set(division_batch_day_slot_orders.get((task.division_id, batch_id, day_id), set())) for batch_id in batch_ids]
+
+            def _strict_can_place(task: _SessionTask, day_id: int, slot_ids: list[str], room_id: str) -> bool:
+                # validate_timetable flags more than two theory sessions of a subject per day.
+                if task.session_type == "THEORY" and len(division_subject_day_slot_orders.get((task.division_id, task.subject_id, day_id), set())) + len(slot_ids) > 2:
+                    return False
+                added_orders = {slot_order_by_id.get(str(slot_id), 0) for slot_id in slot_ids}
+                if not all(_idle_gaps_ok(orders, orders | added_orders) for orders in _batch_day_orders(task, day_id)):
+                    return False
+                return _can_place(task, day_id, slot_ids, room_id)
+            def _vacated_day_ok(task: _SessionTask, day_id: int, vacated_slot_ids: list[str]) -> bool:
+                shift_name, _ = division_shift_assignments.get(task.division_id, ("SHIFT_08_14", (8 * 60, 14 * 60)))
+                removed_orders = {slot_order_by_id.get(str(slot_id), 0) for slot_id in vacated_slot_ids}
+                patterns: list[tuple[set[int], int | None]] = []
+                batch_ids = [str(task.batch_id)] if task.batch_id else [str(batch_id) for batch_id in batches_by_division.get(str(task.division_id), [])]
+                for batch_id in batch_ids:
+                    patterns.append(
+                        (
+                            division_batch_day_slot_orders.get((task.division_id, batch_id, day_id), set()),
+                            batch_lunch_slot_order.get((str(task.division_id), batch_id), shift_lunch_slot_order.get(shift_name)),
+                        )
+                    )
+                if not batch_ids:
+                    patterns.append((division_day_slot_orders.get((task.division_id, day_id), set()), shift_lunch_slot_order.get(shift_name)))
+                # Lifting a session must not open a gap in a day that was gapless.
+                return all(
+                    (_is_gapless_day_pattern(set(orders), lunch) or not _is_gapless_day_pattern(set(orders) | removed_orders, lunch))
+                    and _idle_gaps_ok(set(orders) | removed_orders, set(orders))
+                    for orders, lunch in patterns
+                )
+            # Every task carries a group_id; only parallel batches share one and must move together.
+            group_sizes = Counter(value["task"].group_id for value in scheduled_task_assignments.values())
+            local_search = LocalSearchOptimizer(
+                assignments=scheduled_task_assignments,
+                movable_keys=[
+                    key
+                    for key, value in scheduled_task_assignments.items()
+                    if value["task"].session_type in ("THEORY", "TUTORIAL")
+                    and group_sizes[value["task"].group_id] <= 1
+                    and key not in applied_pins
+                ],
+                objective=SoftObjective(
+                    slot_order_by_id=slot_order_by_id,
+                    batches_by_division={str(div): [str(b) for b in ids] for div, ids in batches_by_division.items()},
+                    break_orders={slot_order_by_id.get(str(s.get("slot_id")), 0) for s in slot_rows_ordered if s.get("is_break")},
+                    is_heavy_subject=is_heavy_subject,
+                    max_order=max(slot_order_by_id.values()) if slot_order_by_id else 6,
+                ),
+                day_ids=[int(day["day_id"]) for day in day_rows],
+                slot_ids_ordered=[str(slot["slot_id"]) for slot in slot_rows_ordered],
+                can_place=_strict_can_place,
+                apply=_apply_assignment,
+                remove=_remove_assignment,
+                source_ok=_vacated_day_ok,
+                room_pool=lambda task: [str(room["room_id"]) for room in (lab_rooms if task.session_type == "LAB" else theory_rooms)],
+                seed=int(hashlib.sha1(run_id.encode("utf-8")).hexdigest()[:8], 16),
+                time_budget_seconds=generation_options.local_search_seconds,
+            )
+            search_result = local_search.run()
+            quality_after = compute_quality_score(scheduled_task_assignments)
+            _, errors_after = validate_timetable(scheduled_task_assignments)
+            # Any violation the search introduced (even at an unchanged count) undoes the whole run.
+            reverted = bool(set(errors_after) - set(errors_before))
+            if reverted:
+                for key, snapshot in original_placements.items():
+                    current = scheduled_task_assignments.get(key)
+                    if current and (current["day_id"], current["slot_ids"], current["room_id"]) != (snapshot["day_id"], snapshot["slot_ids"], snapshot["room_id"]):
+                        _remove_assignment(current)
+                for key, snapshot in original_placements.items():
+                    if key not in scheduled_task_assignments:
+                        _apply_assignment(snapshot["task"], snapshot["day_id"], snapshot["slot_ids"], snapshot["room_id"])
+                quality_after, errors_after = quality_before, errors_before
+            if generation_options.verify_state:
+                _raise_on_state_drift("local search")
+            quality_optimization = quality_after
+            validation_errors = list(errors_after)
+            local_search_report = {
+                **search_result.as_dict(),
+                "reverted": reverted,
+                "quality_before": quality_before,
+                "quality_after": quality_after,
+            }
+            yield emit_stage(
+                {
+                    "agent": "Local Search Optimizer",
+                    "status": "completed",
+                    "metrics": {
+                        **search_result.as_dict(),
+                        "reverted": reverted,
+                        "quality_score_before": quality_before["overall_quality_score"],
+                        "quality_score_after": quality_after["overall_quality_score"],
+                        "idle_slots_before": quality_before["total_idle_slots"],
+                        "idle_slots_after": quality_after["total_idle_slots"],
+                        "validation_errors_before": len(errors_before),
+                        "validation_errors_after": len(errors_after),
+                    },
+                    "message": "Soft constraints improved with simulated annealing over session moves and swaps.",
+                }
+            )
 
         allocated_entries = []
 
@@ -4640,6 +5203,8 @@ class TimetableOrchestrationEngine:
 
 
 
+        if incremental_report is not None and base_entries is not None:
+            incremental_report = {**incremental_report, **entry_churn(base_entries, allocated_entries)}
         # Measure real timetable conflicts after allocation; these should ideally be zero.
 
         room_slot_counts: dict[tuple[int, str, str], int] = {}
@@ -4665,6 +5230,21 @@ class TimetableOrchestrationEngine:
         detected_conflicts = room_conflicts + faculty_conflicts
 
 
+        if precheck_dropped:
+            # Sessions the capacity pre-check ruled out count as unscheduled.
+            tasks = tasks + precheck_dropped
+            unresolved_tasks += len(precheck_dropped)
+            unresolved_task_samples = (unresolved_task_samples or []) + [
+                {
+                    "division_id": task.division_id,
+                    "faculty_id": task.faculty_id,
+                    "subject_id": task.subject_id,
+                    "batch_id": task.batch_id,
+                    "session_type": task.session_type,
+                    "reason": "exceeds_capacity_precheck",
+                }
+                for task in precheck_dropped[:20]
+            ]
         scheduled_sessions = max(len(tasks) - unresolved_tasks, 0)
         # NOTE: "sessions" here refers to planned tasks (blocks), not slot rows.
         # Example: a 2-hour LAB is 1 session-task but becomes 2 timetable entry rows (2 slots).
@@ -4847,6 +5427,8 @@ class TimetableOrchestrationEngine:
                     "candidate_rejections": candidate_rejections,
 
                     "repaired_from_deadlocks": repaired_from_deadlocks,
+                    "parallel_lab_repair": parallel_lab_repair_report(),
+                    "task_ordering": task_ordering_report,
 
                     "repack_moves": repack_moves,
 
@@ -4865,112 +5447,17 @@ class TimetableOrchestrationEngine:
         version_id: str | None = None
 
         if persist and allocated_entries:
-
-            # Check if there's a frozen timetable in this department
-
-            try:
-
-                frozen_check = self.supabase.table("timetable_versions").select("version_id, is_frozen, approval_status").eq("is_frozen", True)
-
-                if department_id:
-
-                    frozen_check = frozen_check.eq("department_id", department_id)
-
-                frozen_versions = frozen_check.execute().data or []
-
-                
-
-                if frozen_versions:
-
-                    frozen_approved = [v for v in frozen_versions if v.get("approval_status") == "HOD_APPROVED"]
-
-                    if frozen_approved:
-
-                        raise ValueError(
-
-                            "Cannot create a new timetable: A frozen and approved timetable already exists for this department. "
-
-                            "Please contact HOD to unfreeze the current timetable before generating a new one."
-
-                        )
-
-            except ValueError:
-
-                raise
-
-            except Exception as e:
-
-                print(f"Warning: Failed to check for frozen timetables: {e}")
-
-            
-
-            # Delete ALL old timetable versions and their entries for this department
-
-            try:
-
-                # Get all existing version IDs for this department
-
-                old_versions_query = self.supabase.table("timetable_versions").select("version_id")
-
-                if department_id:
-
-                    old_versions_query = old_versions_query.eq("department_id", department_id)
-
-                old_versions = old_versions_query.execute().data or []
-
-                old_version_ids = [v.get("version_id") for v in old_versions if v.get("version_id")]
-
-                
-
-                # Delete all entries for old versions
-
-                if old_version_ids:
-
-                    print(f"[ORCHESTRATOR] Deleting {len(old_version_ids)} old timetable versions and their entries")
-
-                    for old_version_id in old_version_ids:
-
-                        # Delete entries first (foreign key constraint)
-
-                        self.supabase.table("timetable_entries").delete().eq("version_id", old_version_id).execute()
-
-                    # Delete versions
-
-                    self.supabase.table("timetable_versions").delete().in_("version_id", old_version_ids).execute()
-
-                    print(f"[ORCHESTRATOR] Successfully deleted old timetables")
-
-            except Exception as e:
-
-                print(f"Warning: Failed to delete old timetables: {e}")
-
-
-
-            version_payload = {
-
-                "created_by": user_id or settings.anonymous_user_id,
-
-                "reason": reason or f"Agent orchestration run {run_id}",
-
-                "is_active": True,
-
-                "department_id": department_id,
-
-            }
-
-            version_insert = self.supabase.table("timetable_versions").insert(version_payload).execute().data or []
-
-            if version_insert:
-
-                version_id = version_insert[0].get("version_id")
-
-
-
-            if version_id:
-
-                rows_to_insert = [{**entry, "version_id": version_id} for entry in allocated_entries]
-
-                self.supabase.table("timetable_entries").insert(rows_to_insert).execute()
+            version_id = self.persist_version(
+                department_id=department_id,
+                user_id=user_id,
+                reason=reason
+                or (
+                    f"Incremental regeneration from {generation_options.base_version_id}"
+                    if base_entries is not None
+                    else f"Agent orchestration run {run_id}"
+                ),
+                entries=allocated_entries,
+            )
 
 
 
@@ -5039,15 +5526,28 @@ class TimetableOrchestrationEngine:
                 "unscheduled_sessions": unresolved_tasks,
 
                 "detected_conflicts": detected_conflicts,
-
                 "repaired_from_deadlocks": repaired_from_deadlocks,
-
+                "parallel_lab_repair": parallel_lab_repair_report(),
+                "task_ordering": task_ordering_report,
+                "state_trail": state_trail.stats(),
                 "repack_moves": repack_moves,
-
                 "unresolved_task_samples": unresolved_task_samples,
 
                 "quality_optimization": quality_optimization,
 
+                "local_search": local_search_report,
+
+                "solver": generation_options.solver,
+
+                "cpsat": cpsat_report,
+
+                "incremental": incremental_report,
+                "shared_reservations": {
+                    "room_slots": len(reserved_room_slots),
+                    "faculty_slots": len(reserved_faculty_slots),
+                },
+
+
                 "validation": {
                     "is_valid": len(validation_errors) == 0,
                     "errors": validation_errors
@@ -0,0 +1,224 @@
+"""Most-constrained-first placement with incrementally maintained domains.
+
+The static order sorts tasks once up front. This placer keeps, for every unplaced task,
+the number of (day, start, room) placements still open, refreshes only the entries a
+placement can affect, and always places the task with the smallest domain next. Each
+placement is forward-checked: a value that empties another task's domain is undone and
+the next value is tried. Tasks it cannot place are left for the greedy pass.
+"""
+from __future__ import annotations
+
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Hashable, Iterable
+
+TASK_ORDERINGS = ("static", "dynamic")
+
+Block = tuple[int, list[str]]
+
+
+@dataclass
+class OrderingReport:
+    mode: str = "dynamic"
+    tasks: int = 0
+    placed: int = 0
+    left_for_greedy: int = 0
+    wipeouts_detected: int = 0
+    forward_check_rejections: int = 0
+    domain_evaluations: int = 0
+    elapsed_ms: float = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        payload = asdict(self)
+        payload["elapsed_ms"] = round(self.elapsed_ms, 2)
+        return payload
+
+
+class MostConstrainedFirstPlacer:
+    """
+    Places tasks through the orchestrator's own primitives.
+
+    ``resources(task)`` names what a task shares with others (division, faculty, ...):
+    a placement on one day re-evaluates that day for every task sharing a resource.
+    ``week_resources(task)`` does the same across the whole week (strict lab groups are
+    bound to one block). Tasks drawing on the same ``room_pool`` only get their room
+    counts refreshed for overlapping blocks.
+    """
+
+    def __init__(
+        self,
+        *,
+        key: Callable[[Any], str],
+        blocks: Callable[[Any], list[Block]],
+        free_rooms: Callable[[Any, int, list[str]], list[str]],
+        can_place: Callable[[Any, int, list[str], str], bool],
+        apply: Callable[[Any, int, list[str], str], None],
+        remove: Callable[[Any], None],
+        resources: Callable[[Any], Iterable[Hashable]],
+        room_pool: Callable[[Any], Hashable],
+        value_rank: Callable[[Any, int, list[str]], Any],
+        pick_rooms: Callable[[Any, int, list[str]], list[str]] | None = None,
+        week_resources: Callable[[Any], Iterable[Hashable]] | None = None,
+        max_values: int = 6,
+    ) -> None:
+        self.key = key
+        self.blocks_for = blocks
+        self.free_rooms = free_rooms
+        self.can_place = can_place
+        self.apply = apply
+        self.remove = remove
+        self.resources = resources
+        self.room_pool = room_pool
+        self.value_rank = value_rank
+        # Domain counting only needs the free rooms; placement may prefer them in a balanced order.
+        self.pick_rooms = pick_rooms or free_rooms
+        self.week_resources = week_resources or (lambda task: ())
+        self.max_values = max(int(max_values), 1)
+        self.report = OrderingReport()
+
+    def _evaluate(self, task: Any, block: Block) -> int:
+        self.report.domain_evaluations += 1
+        day_id, slot_ids = block
+        rooms = self.free_rooms(task, day_id, slot_ids)
+        if not rooms or not self.can_place(task, day_id, slot_ids, rooms[0]):
+            return 0
+        return len(rooms)
+
+    def run(self, tasks: list[Any]) -> OrderingReport:
+        """Place ``tasks`` (given in static priority order, which breaks ties)."""
+        started = time.perf_counter()
+        report = self.report
+        report.tasks = len(tasks)
+        by_key = {self.key(task): task for task in tasks}
+        order = {key: index for index, key in enumerate(by_key)}
+        blocks: dict[str, list[Block]] = {}
+        blocks_by_day: dict[str, dict[int, list[int]]] = {}
+        domain: dict[str, list[int]] = {}
+        size: dict[str, int] = {}
+        sharing: dict[Hashable, set[str]] = defaultdict(set)
+        week_sharing: dict[Hashable, set[str]] = defaultdict(set)
+        pool_members: dict[Hashable, set[str]] = defaultdict(set)
+        for key, task in by_key.items():
+            blocks[key] = self.blocks_for(task)
+            by_day: dict[int, list[int]] = defaultdict(list)
+            for index, (day_id, _slot_ids) in enumerate(blocks[key]):
+                by_day[day_id].append(index)
+            blocks_by_day[key] = by_day
+            domain[key] = [self._evaluate(task, block) for block in blocks[key]]
+            size[key] = sum(domain[key])
+            for resource in self.resources(task):
+                sharing[resource].add(key)
+            for resource in self.week_resources(task):
+                week_sharing[resource].add(key)
+            pool_members[self.room_pool(task)].add(key)
+
+        unplaced = set(by_key)
+
+        def refresh(task: Any, day_id: int, slot_ids: list[str], log: list[tuple[str, int, int]]) -> list[str]:
+            """Re-evaluate what a placement touched; returns tasks whose domain it emptied."""
+            full: dict[str, Iterable[int]] = {}
+            for resource in self.week_resources(task):
+                for other in week_sharing.get(resource, ()):
+                    if other in unplaced:
+                        full[other] = range(len(blocks[other]))
+            for resource in self.resources(task):
+                for other in sharing.get(resource, ()):
+                    if other in unplaced and other not in full:
+                        full[other] = blocks_by_day[other].get(day_id, ())
+            placed_slots = set(slot_ids)
+            wiped: list[str] = []
+            for other in pool_members.get(self.room_pool(task), ()):
+                if other not in unplaced:
+                    continue
+                before = size[other]
+                other_task = by_key[other]
+                if other in full:
+                    indices = full[other]
+                    rooms_only = False
+                else:
+                    indices = [
+                        index
+                        for index in blocks_by_day[other].get(day_id, ())
+                        if placed_slots.intersection(blocks[other][index][1])
+                    ]
+                    rooms_only = True
+                for index in indices:
+                    old = domain[other][index]
+                    if rooms_only:
+                        if not old:
+                            continue
+                        other_day, other_slots = blocks[other][index]
+                        new = len(self.free_rooms(other_task, other_day, other_slots))
+                    else:
+                        new = self._evaluate(other_task, blocks[other][index])
+                    if new != old:
+                        log.append((other, index, old))
+                        domain[other][index] = new
+                        size[other] += new - old
+                if before and not size[other]:
+                    wiped.append(other)
+            # Tasks sharing a resource but drawing on another room pool.
+            for other, indices in full.items():
+                if other in pool_members.get(self.room_pool(task), ()):
+                    continue
+                before = size[other]
+                for index in indices:
+                    old = domain[other][index]
+                    new = self._evaluate(by_key[other], blocks[other][index])
+                    if new != old:
+                        log.append((other, index, old))
+                        domain[other][index] = new
+                        size[other] += new - old
+                if before and not size[other]:
+                    wiped.append(other)
+            return wiped
+
+        def undo(log: list[tuple[str, int, int]]) -> None:
+            for other, index, old in reversed(log):
+                size[other] += old - domain[other][index]
+                domain[other][index] = old
+
+        while unplaced:
+            key = min(unplaced, key=lambda item: (size[item], order[item]))
+            unplaced.discard(key)
+            task = by_key[key]
+            if not size[key]:
+                report.left_for_greedy += 1
+                continue
+            values = sorted(
+                (index for index, count in enumerate(domain[key]) if count),
+                key=lambda index: self.value_rank(task, blocks[key][index][0], blocks[key][index][1]),
+            )[: self.max_values]
+            fallback: tuple[int, list[str], str] | None = None
+            committed = False
+            for index in values:
+                day_id, slot_ids = blocks[key][index]
+                room_id = next(
+                    (room for room in self.pick_rooms(task, day_id, slot_ids) if self.can_place(task, day_id, slot_ids, room)),
+                    None,
+                )
+                if room_id is None:
+                    continue
+                self.apply(task, day_id, slot_ids, room_id)
+                log: list[tuple[str, int, int]] = []
+                if not refresh(task, day_id, slot_ids, log):
+                    committed = True
+                    break
+                report.forward_check_rejections += 1
+                self.remove(task)
+                undo(log)
+                if fallback is None:
+                    fallback = (day_id, slot_ids, room_id)
+            if not committed and fallback is not None:
+                # Every value empties some domain; take the best one and let the greedy pass retry the loser.
+                day_id, slot_ids, room_id = fallback
+                self.apply(task, day_id, slot_ids, room_id)
+                report.wipeouts_detected += len(refresh(task, day_id, slot_ids, []))
+                committed = True
+            if committed:
+                report.placed += 1
+            else:
+                report.left_for_greedy += 1
+        report.elapsed_ms = (time.perf_counter() - started) * 1000.0
+        return report
@@ -0,0 +1,718 @@
+"""Data-access repository for the tables used by the timetable services."""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Iterable
+from uuid import uuid4
+
+# Columns read by the orchestrator, critic, resolver and audit helpers. The
+# Supabase backend selects exactly these; the SQLite backend stores exactly these.
+TABLE_COLUMNS: dict[str, tuple[str, ...]] = {
+    "load_distribution": (
+        "load_distribution_id",
+        "faculty_name",
+        "year",
+        "division",
+        "subject",
+        "theory_hrs",
+        "lab_hrs",
+        "tutorial_hrs",
+        "batch",
+        "total_hrs_per_week",
+        "department_id",
+        "uploaded_by",
+        "created_at",
+    ),
+    "faculty": (
+        "faculty_id",
+        "faculty_name",
+        "email",
+        "department_id",
+        "max_load_per_week",
+        "preferred_start_time",
+        "preferred_end_time",
+        "is_active",
+    ),
+    "divisions": ("division_id", "division_name", "year", "department_id"),
+    "subjects": ("subject_id", "subject_name", "year", "department_id", "subject_type"),
+    "rooms": ("room_id", "room_number", "room_type", "capacity", "is_active", "department_id"),
+    "batches": ("batch_id", "division_id", "batch_code", "is_active"),
+    "days": ("day_id", "day_name", "is_working_day"),
+    "time_slots": ("slot_id", "slot_order", "start_time", "end_time", "is_break"),
+    "timetable_versions": (
+        "version_id",
+        "department_id",
+        "created_by",
+        "reason",
+        "is_active",
+        "is_frozen",
+        "approval_status",
+        "verified_by",
+        "verified_at",
+        "approved_by",
+        "approved_at",
+        "frozen_at",
+        "auto_delete_at",
+        "expiry_notified_at",
+        "parent_version_id",
+        "created_at",
+    ),
+    "timetable_entries": (
+        "entry_id",
+        "version_id",
+        "division_id",
+        "subject_id",
+        "faculty_id",
+        "room_id",
+        "day_id",
+        "slot_id",
+        "batch_id",
+        "session_type",
+        "created_at",
+    ),
+    "timetable_entry_removals": ("removal_id", "version_id", "entry_key", "created_at"),
+}
+
+TABLE_PRIMARY_KEYS: dict[str, str] = {
+    "load_distribution": "load_distribution_id",
+    "faculty": "faculty_id",
+    "divisions": "division_id",
+    "subjects": "subject_id",
+    "rooms": "room_id",
+    "batches": "batch_id",
+    "days": "day_id",
+    "time_slots": "slot_id",
+    "timetable_versions": "version_id",
+    "timetable_entries": "entry_id",
+    "timetable_entry_removals": "removal_id",
+}
+
+_BOOLEAN_COLUMNS = {"is_active", "is_working_day", "is_break", "is_frozen"}
+_INTEGER_COLUMNS = {"day_id", "slot_order", "capacity", "max_load_per_week"}
+
+# SQLite secondary indexes matching the filters the services actually issue.
+_SQLITE_INDEXES: tuple[tuple[str, str], ...] = (
+    ("load_distribution", "department_id"),
+    ("load_distribution", "uploaded_by"),
+    ("faculty", "department_id"),
+    ("divisions", "department_id"),
+    ("subjects", "department_id"),
+    ("rooms", "department_id"),
+    ("batches", "division_id"),
+    ("timetable_versions", "department_id"),
+    ("timetable_versions", "parent_version_id"),
+    ("timetable_entries", "version_id"),
+    ("timetable_entry_removals", "version_id"),
+)
+
+_ENTRY_PAGE_SIZE = 1000
+
+
+def _delta_versions_enabled() -> bool:
+    """Copy-on-write versions need sql/timetable_version_deltas.sql; off, that schema is never touched."""
+    from app.config import settings
+
+    return bool(settings.timetable_delta_versions)
+
+
+class TimetableRepository(ABC):
+    """Read/write interface for timetable master data, versions and entries.
+
+    Filters mirror what the services used to push into the Supabase query builder;
+    anything not listed here (``is_active`` on rooms/faculty, batch scoping) is still
+    applied by the caller.
+    """
+
+    backend = "abstract"
+
+    @abstractmethod
+    def fetch_load_distribution(
+        self,
+        *,
+        department_id: str | None = None,
+        uploaded_by: str | None = None,
+    ) -> list[dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def fetch_faculty(self, *, department_id: str | None = None) -> list[dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def fetch_divisions(self, *, department_id: str | None = None) -> list[dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def fetch_subjects(self, *, department_id: str | None = None) -> list[dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def fetch_rooms(self, *, department_id: str | None = None) -> list[dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def fetch_batches(self) -> list[dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def fetch_days(self, *, working_only: bool = False) -> list[dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def fetch_time_slots(self) -> list[dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def fetch_version(self, version_id: str) -> dict[str, Any] | None:
+        ...
+
+    @abstractmethod
+    def fetch_versions(
+        self,
+        *,
+        department_id: str | None = None,
+        is_frozen: bool | None = None,
+    ) -> list[dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def create_version(self, payload: dict[str, Any]) -> dict[str, Any] | None:
+        ...
+
+    @abstractmethod
+    def update_version(self, version_id: str, payload: dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def fetch_child_versions(self, version_ids: list[str]) -> list[dict[str, Any]]:
+        """Versions stored as deltas against any of ``version_ids``."""
+
+    @abstractmethod
+    def fetch_parent_links(self, version_ids: list[str]) -> dict[str, str | None]:
+        """``version_id -> parent_version_id`` of the versions that still exist, in one read."""
+
+    @abstractmethod
+    def deactivate_active_versions(self, *, department_id: str | None = None) -> None:
+        ...
+
+    def delete_versions(self, version_ids: list[str]) -> None:
+        """Delete versions and their entries; delta versions reading through them are flattened first."""
+        from app.services.timetable_version_deltas import detach_children, invalidate_version_entries
+
+        if not version_ids:
+            return
+        if _delta_versions_enabled():
+            detach_children(self, version_ids)
+        self._delete_version_rows(version_ids)
+        invalidate_version_entries(*version_ids)
+
+    @abstractmethod
+    def _delete_version_rows(self, version_ids: list[str]) -> None:
+        """Delete removals, entries, then the versions (FK order)."""
+
+    def fetch_entries(self, version_id: str) -> list[dict[str, Any]]:
+        """Every entry of a version, merged through its parents when stored as a delta."""
+        from app.services.timetable_version_deltas import materialize_entries
+
+        return materialize_entries(self, version_id)
+
+    @abstractmethod
+    def fetch_version_rows(self, version_id: str) -> list[dict[str, Any]]:
+        """Only the entry rows stored under ``version_id`` itself."""
+
+    @abstractmethod
+    def insert_entries(self, rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def fetch_entry_removals(self, version_id: str) -> list[str]:
+        """Content keys of the parent entries a delta version drops."""
+
+    @abstractmethod
+    def insert_entry_removals(self, version_id: str, entry_keys: list[str]) -> None:
+        ...
+
+    @abstractmethod
+    def delete_entry_removals(self, version_ids: list[str]) -> None:
+        ...
+
+
+class SupabaseTimetableRepository(TimetableRepository):
+    """Repository backed by the Supabase/PostgREST query builder."""
+
+    backend = "supabase"
+
+    def __init__(self, supabase: Any) -> None:
+        self.supabase = supabase
+
+    def _select(self, table: str):
+        return self.supabase.table(table).select(", ".join(TABLE_COLUMNS[table]))
+
+    def fetch_load_distribution(
+        self,
+        *,
+        department_id: str | None = None,
+        uploaded_by: str | None = None,
+    ) -> list[dict[str, Any]]:
+        query = self._select("load_distribution")
+        if department_id:
+            query = query.eq("department_id", department_id)
+        elif uploaded_by:
+            query = query.eq("uploaded_by", uploaded_by)
+        return query.execute().data or []
+
+    def _fetch_department_scoped(self, table: str, department_id: str | None) -> list[dict[str, Any]]:
+        query = self._select(table)
+        if department_id:
+            query = query.eq("department_id", department_id)
+        return query.execute().data or []
+
+    def fetch_faculty(self, *, department_id: str | None = None) -> list[dict[str, Any]]:
+        return self._fetch_department_scoped("faculty", department_id)
+
+    def fetch_divisions(self, *, department_id: str | None = None) -> list[dict[str, Any]]:
+        return self._fetch_department_scoped("divisions", department_id)
+
+    def fetch_subjects(self, *, department_id: str | None = None) -> list[dict[str, Any]]:
+        return self._fetch_department_scoped("subjects", department_id)
+
+    def fetch_rooms(self, *, department_id: str | None = None) -> list[dict[str, Any]]:
+        return self._fetch_department_scoped("rooms", department_id)
+
+    def fetch_batches(self) -> list[dict[str, Any]]:
+        return self._select("batches").execute().data or []
+
+    def fetch_days(self, *, working_only: bool = False) -> list[dict[str, Any]]:
+        query = self._select("days")
+        if working_only:
+            query = query.eq("is_working_day", True)
+        return query.order("day_id").execute().data or []
+
+    def fetch_time_slots(self) -> list[dict[str, Any]]:
+        return self._select("time_slots").order("slot_order").execute().data or []
+
+    def fetch_version(self, version_id: str) -> dict[str, Any] | None:
+        rows = (
+            self.supabase.table("timetable_versions")
+            .select("*")
+            .eq("version_id", version_id)
+            .limit(1)
+            .execute()
+            .data
+            or []
+        )
+        return rows[0] if rows else None
+
+    def fetch_versions(
+        self,
+        *,
+        department_id: str | None = None,
+        is_frozen: bool | None = None,
+    ) -> list[dict[str, Any]]:
+        query = self.supabase.table("timetable_versions").select("*")
+        if department_id:
+            query = query.eq("department_id", department_id)
+        if is_frozen is not None:
+            query = query.eq("is_frozen", is_frozen)
+        return query.order("created_at", desc=True).execute().data or []
+
+    def create_version(self, payload: dict[str, Any]) -> dict[str, Any] | None:
+        inserted = self.supabase.table("timetable_versions").insert(payload).execute().data or []
+        return inserted[0] if inserted else None
+
+    def update_version(self, version_id: str, payload: dict[str, Any]) -> None:
+        self.supabase.table("timetable_versions").update(payload).eq("version_id", version_id).execute()
+
+    def fetch_child_versions(self, version_ids: list[str]) -> list[dict[str, Any]]:
+        if not version_ids or not _delta_versions_enabled():
+            return []
+        return (
+            self.supabase.table("timetable_versions")
+            .select("version_id, parent_version_id, department_id")
+            .in_("parent_version_id", version_ids)
+            .execute()
+            .data
+            or []
+        )
+
+    def fetch_parent_links(self, version_ids: list[str]) -> dict[str, str | None]:
+        if not version_ids:
+            return {}
+        rows = (
+            self.supabase.table("timetable_versions")
+            .select("version_id, parent_version_id")
+            .in_("version_id", version_ids)
+            .execute()
+            .data
+            or []
+        )
+        return {str(row["version_id"]): row.get("parent_version_id") and str(row["parent_version_id"]) for row in rows}
+
+    def deactivate_active_versions(self, *, department_id: str | None = None) -> None:
+        query = self.supabase.table("timetable_versions").update({"is_active": False}).eq("is_active", True)
+        if department_id:
+            query = query.eq("department_id", department_id)
+        query.execute()
+
+    def _delete_version_rows(self, version_ids: list[str]) -> None:
+        if _delta_versions_enabled():
+            self.delete_entry_removals(version_ids)
+        self.supabase.table("timetable_entries").delete().in_("version_id", version_ids).execute()
+        self.supabase.table("timetable_versions").delete().in_("version_id", version_ids).execute()
+
+    def fetch_version_rows(self, version_id: str) -> list[dict[str, Any]]:
+        """Paginated fetch of all rows for a version (PostgREST range limit safe)."""
+        rows: list[dict[str, Any]] = []
+        start = 0
+        while True:
+            chunk = (
+                self.supabase.table("timetable_entries")
+                .select("*")
+                .eq("version_id", version_id)
+                .range(start, start + _ENTRY_PAGE_SIZE - 1)
+                .execute()
+                .data
+                or []
+            )
+            rows.extend(chunk)
+            if len(chunk) < _ENTRY_PAGE_SIZE:
+                break
+            start += _ENTRY_PAGE_SIZE
+        return rows
+
+    def insert_entries(self, rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        if not rows:
+            return []
+        return self.supabase.table("timetable_entries").insert(rows).execute().data or []
+
+    def fetch_entry_removals(self, version_id: str) -> list[str]:
+        if not _delta_versions_enabled():
+            return []
+        keys: list[str] = []
+        start = 0
+        while True:
+            chunk = (
+                self.supabase.table("timetable_entry_removals")
+                .select("entry_key")
+                .eq("version_id", version_id)
+                .range(start, start + _ENTRY_PAGE_SIZE - 1)
+                .execute()
+                .data
+                or []
+            )
+            keys.extend(str(row["entry_key"]) for row in chunk)
+            if len(chunk) < _ENTRY_PAGE_SIZE:
+                return keys
+            start += _ENTRY_PAGE_SIZE
+
+    def insert_entry_removals(self, version_id: str, entry_keys: list[str]) -> None:
+        if entry_keys:
+            self.supabase.table("timetable_entry_removals").insert(
+                [{"version_id": version_id, "entry_key": key} for key in entry_keys]
+            ).execute()
+
+    def delete_entry_removals(self, version_ids: list[str]) -> None:
+        if version_ids:
+            self.supabase.table("timetable_entry_removals").delete().in_("version_id", version_ids).execute()
+
+
+class SQLiteTimetableRepository(TimetableRepository):
+    """Embedded SQLite repository for local batch jobs, profiling and benchmarks.
+
+    ``path=":memory:"`` (the default) keeps everything in process memory. Use
+    :meth:`load_rows` or :meth:`from_repository` to seed it.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path: str = ":memory:") -> None:
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._create_schema()
+
+    def _create_schema(self) -> None:
+        with self._lock, self._conn:
+            for table, columns in TABLE_COLUMNS.items():
+                pk = TABLE_PRIMARY_KEYS[table]
+                column_sql = ", ".join(f"{col} PRIMARY KEY" if col == pk else col for col in columns)
+                self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({column_sql})")
+                # Files created before a column was added get it appended.
+                existing = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+                for column in columns:
+                    if column not in existing:
+                        self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+            for table, column in _SQLITE_INDEXES:
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table} ({column})")
+
+    @staticmethod
+    def _to_sqlite(column: str, value: Any) -> Any:
+        if value is None:
+            return None
+        if column in _BOOLEAN_COLUMNS:
+            return 1 if value else 0
+        if isinstance(value, (dict, list)):
+            return json.dumps(value)
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return value
+
+    @staticmethod
+    def _from_sqlite(row: sqlite3.Row) -> dict[str, Any]:
+        out: dict[str, Any] = {}
+        for column in row.keys():
+            value = row[column]
+            if column in _BOOLEAN_COLUMNS and value is not None:
+                value = bool(value)
+            out[column] = value
+        return out
+
+    def _query(self, sql: str, params: Iterable[Any] = ()) -> list[dict[str, Any]]:
+        with self._lock:
+            return [self._from_sqlite(row) for row in self._conn.execute(sql, tuple(params)).fetchall()]
+
+    def _select_where(
+        self,
+        table: str,
+        filters: dict[str, Any] | None = None,
+        order_by: str | None = None,
+    ) -> list[dict[str, Any]]:
+        clauses: list[str] = []
+        params: list[Any] = []
+        for column, value in (filters or {}).items():
+            if value is None:
+                continue
+            clauses.append(f"{column} = ?")
+            params.append(self._to_sqlite(column, value))
+        sql = f"SELECT {', '.join(TABLE_COLUMNS[table])} FROM {table}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        if order_by:
+            sql += f" ORDER BY {order_by}"
+        return self._query(sql, params)
+
+    def load_rows(self, table: str, rows: Iterable[dict[str, Any]]) -> int:
+        """Upsert raw rows into ``table``; unknown keys are dropped. Returns the row count."""
+        columns = TABLE_COLUMNS[table]
+        pk = TABLE_PRIMARY_KEYS[table]
+        payload = []
+        for row in rows:
+            values = dict(row)
+            if values.get(pk) in (None, "") and pk not in _INTEGER_COLUMNS:
+                values[pk] = str(uuid4())
+            payload.append(tuple(self._to_sqlite(col, values.get(col)) for col in columns))
+        if not payload:
+            return 0
+        placeholders = ", ".join("?" for _ in columns)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+                payload,
+            )
+        return len(payload)
+
+    @classmethod
+    def from_repository(
+        cls,
+        source: TimetableRepository,
+        *,
+        department_id: str | None = None,
+        path: str = ":memory:",
+        include_versions: bool = True,
+    ) -> SQLiteTimetableRepository:
+        """Snapshot master data (and optionally versions/entries) from another backend."""
+        repo = cls(path)
+        repo.load_rows("load_distribution", source.fetch_load_distribution(department_id=department_id))
+        repo.load_rows("faculty", source.fetch_faculty(department_id=department_id))
+        division_rows = source.fetch_divisions(department_id=department_id)
+        repo.load_rows("divisions", division_rows)
+        repo.load_rows("subjects", source.fetch_subjects(department_id=department_id))
+        repo.load_rows("rooms", source.fetch_rooms(department_id=department_id))
+        batch_rows = source.fetch_batches()
+        if department_id:
+            allowed = {str(row.get("division_id")) for row in division_rows if row.get("division_id")}
+            batch_rows = [row for row in batch_rows if str(row.get("division_id") or "") in allowed]
+        repo.load_rows("batches", batch_rows)
+        repo.load_rows("days", source.fetch_days())
+        repo.load_rows("time_slots", source.fetch_time_slots())
+        if include_versions:
+            versions = source.fetch_versions(department_id=department_id)
+            repo.load_rows("timetable_versions", versions)
+            for version in versions:
+                if version.get("version_id"):
+                    version_id = str(version["version_id"])
+                    repo.load_rows("timetable_entries", source.fetch_version_rows(version_id))
+                    repo.insert_entry_removals(version_id, source.fetch_entry_removals(version_id))
+        return repo
+
+    def fetch_load_distribution(
+        self,
+        *,
+        department_id: str | None = None,
+        uploaded_by: str | None = None,
+    ) -> list[dict[str, Any]]:
+        if department_id:
+            return self._select_where("load_distribution", {"department_id": department_id})
+        return self._select_where("load_distribution", {"uploaded_by": uploaded_by})
+
+    def fetch_faculty(self, *, department_id: str | None = None) -> list[dict[str, Any]]:
+        return self._select_where("faculty", {"department_id": department_id})
+
+    def fetch_divisions(self, *, department_id: str | None = None) -> list[dict[str, Any]]:
+        return self._select_where("divisions", {"department_id": department_id})
+
+    def fetch_subjects(self, *, department_id: str | None = None) -> list[dict[str, Any]]:
+        return self._select_where("subjects", {"department_id": department_id})
+
+    def fetch_rooms(self, *, department_id: str | None = None) -> list[dict[str, Any]]:
+        return self._select_where("rooms", {"department_id": department_id})
+
+    def fetch_batches(self) -> list[dict[str, Any]]:
+        return self._select_where("batches")
+
+    def fetch_days(self, *, working_only: bool = False) -> list[dict[str, Any]]:
+        return self._select_where("days", {"is_working_day": True if working_only else None}, order_by="day_id")
+
+    def fetch_time_slots(self) -> list[dict[str, Any]]:
+        return self._select_where("time_slots", order_by="slot_order")
+
+    def fetch_version(self, version_id: str) -> dict[str, Any] | None:
+        rows = self._select_where("timetable_versions", {"version_id": version_id})
+        return rows[0] if rows else None
+
+    def fetch_versions(
+        self,
+        *,
+        department_id: str | None = None,
+        is_frozen: bool | None = None,
+    ) -> list[dict[str, Any]]:
+        return self._select_where(
+            "timetable_versions",
+            {"department_id": department_id, "is_frozen": is_frozen},
+            order_by="created_at DESC",
+        )
+
+    def create_version(self, payload: dict[str, Any]) -> dict[str, Any] | None:
+        row = {
+            "is_frozen": False,
+            "approval_status": "DRAFT",
+            **payload,
+            "version_id": payload.get("version_id") or str(uuid4()),
+            "created_at": payload.get("created_at") or datetime.utcnow().isoformat(),
+        }
+        self.load_rows("timetable_versions", [row])
+        return self.fetch_version(str(row["version_id"]))
+
+    def update_version(self, version_id: str, payload: dict[str, Any]) -> None:
+        columns = [column for column in payload if column in TABLE_COLUMNS["timetable_versions"]]
+        if not columns:
+            return
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        params = [self._to_sqlite(column, payload[column]) for column in columns]
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE timetable_versions SET {assignments} WHERE version_id = ?", [*params, version_id])
+
+    def fetch_child_versions(self, version_ids: list[str]) -> list[dict[str, Any]]:
+        if not version_ids:
+            return []
+        placeholders = ", ".join("?" for _ in version_ids)
+        return self._query(
+            "SELECT version_id, parent_version_id, department_id FROM timetable_versions "
+            f"WHERE parent_version_id IN ({placeholders})",
+            version_ids,
+        )
+
+    def fetch_parent_links(self, version_ids: list[str]) -> dict[str, str | None]:
+        if not version_ids:
+            return {}
+        placeholders = ", ".join("?" for _ in version_ids)
+        rows = self._query(
+            f"SELECT version_id, parent_version_id FROM timetable_versions WHERE version_id IN ({placeholders})",
+            version_ids,
+        )
+        return {str(row["version_id"]): row.get("parent_version_id") and str(row["parent_version_id"]) for row in rows}
+
+    def deactivate_active_versions(self, *, department_id: str | None = None) -> None:
+        sql = "UPDATE timetable_versions SET is_active = 0 WHERE is_active = 1"
+        params: list[Any] = []
+        if department_id:
+            sql += " AND department_id = ?"
+            params.append(department_id)
+        with self._lock, self._conn:
+            self._conn.execute(sql, params)
+
+    def _delete_version_rows(self, version_ids: list[str]) -> None:
+        placeholders = ", ".join("?" for _ in version_ids)
+        with self._lock, self._conn:
+            for table in ("timetable_entry_removals", "timetable_entries", "timetable_versions"):
+                self._conn.execute(f"DELETE FROM {table} WHERE version_id IN ({placeholders})", version_ids)
+
+    def fetch_version_rows(self, version_id: str) -> list[dict[str, Any]]:
+        return self._select_where("timetable_entries", {"version_id": version_id})
+
+    def insert_entries(self, rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        now = datetime.utcnow().isoformat()
+        payload = [
+            {**row, "entry_id": row.get("entry_id") or str(uuid4()), "created_at": row.get("created_at") or now}
+            for row in rows
+        ]
+        self.load_rows("timetable_entries", payload)
+        return payload
+
+    def fetch_entry_removals(self, version_id: str) -> list[str]:
+        return [str(row["entry_key"]) for row in self._select_where("timetable_entry_removals", {"version_id": version_id})]
+
+    def insert_entry_removals(self, version_id: str, entry_keys: list[str]) -> None:
+        now = datetime.utcnow().isoformat()
+        self.load_rows(
+            "timetable_entry_removals",
+            ({"version_id": version_id, "entry_key": key, "created_at": now} for key in entry_keys),
+        )
+
+    def delete_entry_removals(self, version_ids: list[str]) -> None:
+        if not version_ids:
+            return
+        placeholders = ", ".join("?" for _ in version_ids)
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM timetable_entry_removals WHERE version_id IN ({placeholders})", version_ids)
+
+
+def as_timetable_repository(source: Any) -> TimetableRepository:
+    """Accept either a repository or a raw Supabase client (legacy call sites)."""
+    if isinstance(source, TimetableRepository):
+        return source
+    return SupabaseTimetableRepository(source)
+
+
+_default_repository: TimetableRepository | None = None
+_default_repository_lock = threading.Lock()
+
+
+def get_timetable_repository() -> TimetableRepository:
+    """Process-wide repository selected by ``settings.data_backend``."""
+    global _default_repository
+    if _default_repository is not None:
+        return _default_repository
+    with _default_repository_lock:
+        if _default_repository is None:
+            from app.config import settings
+
+            if str(settings.data_backend).lower() == "sqlite":
+                _default_repository = SQLiteTimetableRepository(settings.sqlite_database_path)
+            else:
+                from app.supabase_client import get_service_supabase
+
+                _default_repository = SupabaseTimetableRepository(get_service_supabase())
+    return _default_repository
+
+
+def set_timetable_repository(repository: TimetableRepository | None) -> None:
+    """Override the process-wide repository (benchmarks, batch jobs)."""
+    global _default_repository
+    with _default_repository_lock:
+        _default_repository = repository
@@ -25,6 +25,72 @@ FACULTY_DAILY_CAP_RELAXED = 8
 MAX_SESSIONS_PER_DAY_STRICT = 8
 
 
+@dataclass
+class GenerationOptions:
+    """Per-run switches for the optional stages of timetable generation."""
+
+    # Pick division shift windows by resource pressure instead of round-robin.
+    shift_planner: bool = True
+    # Capacity pre-check: "off", "continue" (skip sessions that cannot fit) or "fail_fast".
+    precheck: str = "continue"
+    # Stop after the pre-check and return its report (nothing is scheduled or saved).
+    precheck_only: bool = False
+    # "static" (task_priority order) or "dynamic" (most-constrained-first with forward checking).
+    task_ordering: str = "static"
+    local_search: bool = False
+    local_search_seconds: float = 5.0
+    # "greedy" (built-in heuristic) or "cpsat" (OR-Tools, optional dependency).
+    solver: str = "greedy"
+    cpsat_seconds: float = 30.0
+    cpsat_workers: int = 0
+    # Warm start: pin placements from this version and only schedule what changed.
+    base_version_id: str | None = None
+    max_displaced_sessions: int = 12
+    # Institute mode: (shared resource key, day_id, slot_id) cells other departments already hold.
+    reserved_resource_slots: set[tuple[str, int, str]] = field(default_factory=set)
+    # Debug: check the incrementally kept placement indexes against a full rebuild (tests).
+    verify_state: bool = False
+
+    @classmethod
+    def from_settings(cls, **overrides: Any) -> GenerationOptions:
+        from app.config import settings
+
+        options = cls(
+            shift_planner=getattr(settings, "timetable_shift_planner_enabled", True) is not False,
+            precheck=str(getattr(settings, "timetable_precheck_mode", None) or "continue").strip().lower(),
+            task_ordering=str(getattr(settings, "timetable_task_ordering", None) or "static").strip().lower(),
+            local_search=bool(getattr(settings, "timetable_local_search_enabled", False)),
+            local_search_seconds=float(getattr(settings, "timetable_local_search_seconds", None) or 5.0),
+            solver=str(getattr(settings, "timetable_solver", None) or "greedy").strip().lower(),
+            cpsat_seconds=float(getattr(settings, "timetable_cpsat_seconds", None) or 30.0),
+            cpsat_workers=int(getattr(settings, "timetable_cpsat_workers", None) or 0),
+            max_displaced_sessions=int(getattr(settings, "timetable_incremental_max_displaced", None) or 12),
+        )
+        for name, value in overrides.items():
+            if value is not None and hasattr(options, name):
+                setattr(options, name, value)
+        return options
+
+
+def _identity_token(value: Any) -> str:
+    return " ".join(str(value or "").split()).casefold()
+
+
+def room_resource_key(room: dict[str, Any]) -> str:
+    """Identity of a physical room across departments (room rows are per department)."""
+    number = _identity_token(room.get("room_number"))
+    return f"room:{number}" if number else f"room-id:{room.get('room_id')}"
+
+
+def faculty_resource_key(faculty: dict[str, Any]) -> str:
+    """Identity of a teacher across departments: email, else name, else the row id."""
+    email = _identity_token(faculty.get("email"))
+    if email:
+        return f"faculty:{email}"
+    name = _identity_token(faculty.get("faculty_name"))
+    return f"faculty-name:{name}" if name else f"faculty-id:{faculty.get('faculty_id')}"
+
+
 @dataclass
 class RelaxFlags:
     gapless: bool = False
@@ -0,0 +1,299 @@
+"""Division shift assignment by resource pressure.
+
+Each division teaches its theory and lab sessions inside one shift window, and the
+windows overlap, so the demand on a time slot is the sum over every division whose
+window covers it. The planner spreads each division's weekly hours evenly over its
+window's teaching slots, builds per-slot demand histograms (theory rooms, lab rooms,
+each faculty member) and picks windows that keep the peak pressure, demand divided
+by capacity, as low as possible.
+"""
+from __future__ import annotations
+
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Iterable
+
+from app.services.timetable_scheduling_types import SHIFT_LUNCH_SLOT_TIMES
+
+# Penalty per faculty whose preferred hours do not meet a division's window at all.
+_FACULTY_WINDOW_MISS = 1.0
+
+
+def _minutes(value: Any) -> int | None:
+    parts = str(value or "").strip().split(":")
+    try:
+        return int(parts[0]) * 60 + int(parts[1])
+    except (ValueError, IndexError):
+        return None
+
+
+@dataclass
+class DivisionDemand:
+    """Weekly slot-hours a division needs inside its shift window."""
+
+    theory_hours: int = 0
+    lab_hours: int = 0
+    faculty_hours: dict[str, int] = field(default_factory=dict)
+
+
+def demands_from_tasks(tasks: Iterable[Any]) -> dict[str, DivisionDemand]:
+    """Window-bound demand per division; tutorials may leave the window and are skipped.
+
+    Parallel lab batches each hold their own lab room, so every batch task counts.
+    """
+    demands: dict[str, DivisionDemand] = defaultdict(DivisionDemand)
+    for task in tasks:
+        if task.session_type == "TUTORIAL":
+            continue
+        hours = max(int(task.duration_slots or 1), 1)
+        demand = demands[str(task.division_id)]
+        if task.session_type == "LAB":
+            demand.lab_hours += hours
+        else:
+            demand.theory_hours += hours
+        faculty_id = str(task.faculty_id)
+        demand.faculty_hours[faculty_id] = demand.faculty_hours.get(faculty_id, 0) + hours
+    return dict(demands)
+
+
+@dataclass
+class ShiftPlan:
+    assignments: dict[str, str]
+    peak_pressure: float
+    baseline_peak_pressure: float
+    moved_from_baseline: int
+    metrics: dict[str, Any] = field(default_factory=dict)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "assignments": dict(self.assignments),
+            "peak_pressure": round(self.peak_pressure, 3),
+            "baseline_peak_pressure": round(self.baseline_peak_pressure, 3),
+            "moved_from_baseline": self.moved_from_baseline,
+            **self.metrics,
+        }
+
+
+class ShiftAssignmentPlanner:
+    """Assigns each division a window minimising (peak pressure, sum of squared pressure)."""
+
+    def __init__(
+        self,
+        windows: dict[str, tuple[int, int]],
+        slot_rows: list[dict[str, Any]],
+        *,
+        working_days: int,
+        theory_rooms: int,
+        lab_rooms: int,
+        faculty_windows: dict[str, tuple[int | None, int | None]] | None = None,
+        max_rounds: int = 25,
+    ) -> None:
+        self.window_names = list(windows)
+        self.working_days = max(int(working_days), 1)
+        self.theory_capacity = max(int(theory_rooms), 1)
+        self.lab_capacity = max(int(lab_rooms), 1)
+        self.faculty_windows = faculty_windows or {}
+        self.max_rounds = max(int(max_rounds), 0)
+
+        self._slot_bounds: dict[str, tuple[int, int]] = {}
+        self.slot_labels: dict[str, str] = {}
+        ordered = sorted(slot_rows, key=lambda row: (int(row.get("slot_order") or 0), str(row.get("start_time") or "")))
+        for row in ordered:
+            start, end = _minutes(row.get("start_time")), _minutes(row.get("end_time"))
+            if start is None or end is None or row.get("is_break") or not row.get("slot_id"):
+                continue
+            slot_id = str(row["slot_id"])
+            self._slot_bounds[slot_id] = (start, end)
+            self.slot_labels[slot_id] = str(row.get("start_time") or "")[:5]
+
+        self.window_slots: dict[str, list[str]] = {}
+        for name, (window_start, window_end) in windows.items():
+            lunch = SHIFT_LUNCH_SLOT_TIMES.get(name)
+            lunch_bounds = (_minutes(lunch[0]), _minutes(lunch[1])) if lunch else None
+            self.window_slots[name] = [
+                slot_id
+                for slot_id, bounds in self._slot_bounds.items()
+                if window_start <= bounds[0] and bounds[1] <= window_end and bounds != lunch_bounds
+            ]
+        self._faculty_slot_cache: dict[tuple[str, str], list[str]] = {}
+
+    def _faculty_slots(self, faculty_id: str, window: str) -> list[str]:
+        key = (faculty_id, window)
+        slots = self._faculty_slot_cache.get(key)
+        if slots is None:
+            start_limit, end_limit = self.faculty_windows.get(faculty_id, (None, None))
+            slots = [
+                slot_id
+                for slot_id in self.window_slots[window]
+                if (start_limit is None or self._slot_bounds[slot_id][0] >= start_limit)
+                and (end_limit is None or self._slot_bounds[slot_id][1] <= end_limit)
+            ]
+            self._faculty_slot_cache[key] = slots
+        return slots
+
+    def histograms(
+        self, demands: dict[str, DivisionDemand], assignments: dict[str, str]
+    ) -> tuple[dict[str, float], dict[str, float], dict[str, dict[str, float]], int]:
+        """Per-slot demand (room-hours per day) for theory rooms, lab rooms and each faculty."""
+        theory: dict[str, float] = defaultdict(float)
+        lab: dict[str, float] = defaultdict(float)
+        faculty: dict[str, dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        window_misses = 0
+        for division_id, demand in demands.items():
+            window = assignments.get(division_id)
+            slots = self.window_slots.get(window or "", [])
+            if not slots:
+                continue
+            spread = float(len(slots) * self.working_days)
+            for slot_id in slots:
+                theory[slot_id] += demand.theory_hours / spread
+                lab[slot_id] += demand.lab_hours / spread
+            for faculty_id, hours in demand.faculty_hours.items():
+                faculty_slots = self._faculty_slots(faculty_id, window)
+                if not faculty_slots:
+                    window_misses += 1
+                    faculty_slots = slots
+                share = hours / float(len(faculty_slots) * self.working_days)
+                for slot_id in faculty_slots:
+                    faculty[faculty_id][slot_id] += share
+        return theory, lab, faculty, window_misses
+
+    def score(self, demands: dict[str, DivisionDemand], assignments: dict[str, str]) -> tuple[float, float]:
+        theory, lab, faculty, window_misses = self.histograms(demands, assignments)
+        pressures = [value / self.theory_capacity for value in theory.values()]
+        pressures += [value / self.lab_capacity for value in lab.values()]
+        for per_slot in faculty.values():
+            pressures.extend(per_slot.values())
+        peak = max(pressures, default=0.0) + _FACULTY_WINDOW_MISS * window_misses
+        return (round(peak, 9), round(sum(value * value for value in pressures), 9))
+
+    def plan(
+        self,
+        demands: dict[str, DivisionDemand],
+        division_ids: list[str],
+        baseline: dict[str, str],
+    ) -> ShiftPlan:
+        """Start from the better of ``baseline`` and a greedy fill, then improve by moves and swaps."""
+        windows = [name for name in self.window_names if self.window_slots.get(name)]
+        if not windows:
+            return ShiftPlan(dict(baseline), 0.0, 0.0, 0)
+        baseline_score = self.score(demands, baseline)
+
+        greedy: dict[str, str] = {}
+        by_load = sorted(
+            division_ids,
+            key=lambda division_id: -(
+                demands.get(division_id, DivisionDemand()).theory_hours
+                + demands.get(division_id, DivisionDemand()).lab_hours
+            ),
+        )
+        for division_id in by_load:
+            greedy[division_id] = min(
+                windows,
+                key=lambda name: (self.score(demands, {**greedy, division_id: name}), name != baseline.get(division_id)),
+            )
+        greedy_score = self.score(demands, greedy)
+        if greedy_score < baseline_score:
+            current, current_score = greedy, greedy_score
+        else:
+            current, current_score = dict(baseline), baseline_score
+
+        rounds = 0
+        for rounds in range(1, self.max_rounds + 1):
+            best_move: tuple[tuple[float, float], dict[str, str]] | None = None
+            for division_id in division_ids:
+                for name in windows:
+                    if name == current.get(division_id):
+                        continue
+                    candidate = {**current, division_id: name}
+                    candidate_score = self.score(demands, candidate)
+                    if candidate_score < current_score and (best_move is None or candidate_score < best_move[0]):
+                        best_move = (candidate_score, candidate)
+            for first_index, first in enumerate(division_ids):
+                for second in division_ids[first_index + 1 :]:
+                    if current.get(first) == current.get(second):
+                        continue
+                    candidate = {**current, first: current[second], second: current[first]}
+                    candidate_score = self.score(demands, candidate)
+                    if candidate_score < current_score and (best_move is None or candidate_score < best_move[0]):
+                        best_move = (candidate_score, candidate)
+            if best_move is None:
+                break
+            current_score, current = best_move
+
+        return ShiftPlan(
+            assignments=current,
+            peak_pressure=current_score[0],
+            baseline_peak_pressure=baseline_score[0],
+            moved_from_baseline=sum(1 for division_id in division_ids if current.get(division_id) != baseline.get(division_id)),
+            metrics={**self.describe(demands, current), "improvement_rounds": rounds},
+        )
+
+    def describe(self, demands: dict[str, DivisionDemand], assignments: dict[str, str]) -> dict[str, Any]:
+        """Per-window load and per-slot demand histograms for stage events."""
+        theory, lab, faculty, window_misses = self.histograms(demands, assignments)
+        windows: dict[str, Any] = {}
+        for name in self.window_names:
+            members = [division_id for division_id, window in assignments.items() if window == name]
+            slots = self.window_slots.get(name, [])
+            windows[name] = {
+                "divisions": len(members),
+                "teaching_slots": len(slots),
+                "theory_hours": sum(demands.get(division_id, DivisionDemand()).theory_hours for division_id in members),
+                "lab_hours": sum(demands.get(division_id, DivisionDemand()).lab_hours for division_id in members),
+                "peak_theory_pressure": round(max((theory[slot] / self.theory_capacity for slot in slots), default=0.0), 3),
+                "peak_lab_pressure": round(max((lab[slot] / self.lab_capacity for slot in slots), default=0.0), 3),
+            }
+        faculty_divisions = Counter(
+            faculty_id for demand in demands.values() for faculty_id in demand.faculty_hours
+        )
+        faculty_peaks = {
+            faculty_id: max(per_slot.values(), default=0.0) for faculty_id, per_slot in faculty.items()
+        }
+        busiest = sorted(faculty_peaks.items(), key=lambda item: -item[1])[:5]
+        return {
+            "windows": windows,
+            "histogram": [
+                {
+                    "slot": self.slot_labels.get(slot_id, slot_id),
+                    "theory_rooms": round(theory.get(slot_id, 0.0), 2),
+                    "lab_rooms": round(lab.get(slot_id, 0.0), 2),
+                }
+                for slot_id in self._slot_bounds
+                if theory.get(slot_id) or lab.get(slot_id)
+            ],
+            "capacity": {"theory_rooms": self.theory_capacity, "lab_rooms": self.lab_capacity},
+            "shared_faculty": sum(1 for count in faculty_divisions.values() if count > 1),
+            "peak_faculty_pressure": round(max(faculty_peaks.values(), default=0.0), 3),
+            "busiest_faculty": [{"faculty_id": faculty_id, "pressure": round(peak, 3)} for faculty_id, peak in busiest],
+            "faculty_window_misses": window_misses,
+        }
+
+
+def windows_from_entries(
+    entries: list[dict[str, Any]],
+    windows: dict[str, tuple[int, int]],
+    slot_rows: list[dict[str, Any]],
+) -> dict[str, str]:
+    """Infer each division's window from placed theory/lab entries (the window holding most of them)."""
+    bounds = {
+        str(row.get("slot_id")): (_minutes(row.get("start_time")), _minutes(row.get("end_time")))
+        for row in slot_rows
+        if row.get("slot_id")
+    }
+    hits: dict[str, Counter] = defaultdict(Counter)
+    for entry in entries:
+        if str(entry.get("session_type") or "THEORY").upper() == "TUTORIAL":
+            continue
+        start, end = bounds.get(str(entry.get("slot_id")), (None, None))
+        if start is None or end is None:
+            continue
+        for name, (window_start, window_end) in windows.items():
+            if window_start <= start and end <= window_end:
+                hits[str(entry.get("division_id"))][name] += 1
+    inferred: dict[str, str] = {}
+    order = list(windows)
+    for division_id, counter in hits.items():
+        # Entries in an overlap count for every window covering it; ties go to the earlier window.
+        inferred[division_id] = max(counter, key=lambda name: (counter[name], -order.index(name)))
+    return inferred
@@ -0,0 +1,214 @@
+"""Undo log (trail) for the scheduler's occupancy state.
+
+The placement indexes are built from trailed containers. While a checkpoint is open,
+every change to them is appended to one shared log, so a checkpoint is just the log
+length and a rollback undoes only the changes made since it, newest first. Checkpoints
+nest; nothing is recorded while none is open. Sets and lists stored into a trailed dict
+(``setdefault(key, set())``) become trailed themselves.
+"""
+from __future__ import annotations
+
+from typing import Any, Iterable
+
+_MISSING = object()
+
+# Log entry kinds: (kind, container, key, previous value)
+_SET_ADD = 0
+_SET_DISCARD = 1
+_DICT_SET = 2
+_LIST_APPEND = 3
+_RESTORE = 4
+
+
+class SolverTrail:
+    def __init__(self) -> None:
+        self._log: list[tuple[int, Any, Any, Any]] = []
+        self._open = 0
+        self.checkpoints = 0
+        self.rollbacks = 0
+        self.undone_changes = 0
+        self.max_log_length = 0
+
+    def checkpoint(self) -> int:
+        self._open += 1
+        self.checkpoints += 1
+        return len(self._log)
+
+    def commit(self, mark: int) -> None:
+        """Keep the changes since ``mark``; an enclosing checkpoint can still undo them."""
+        self._close()
+
+    def rollback(self, mark: int) -> int:
+        """Undo every change recorded since ``mark``; returns how many were undone."""
+        log = self._log
+        undone = len(log) - mark
+        self.max_log_length = max(self.max_log_length, len(log))
+        while len(log) > mark:
+            kind, target, key, previous = log.pop()
+            if kind == _SET_ADD:
+                set.discard(target, key)
+            elif kind == _SET_DISCARD:
+                set.add(target, key)
+            elif kind == _DICT_SET:
+                if previous is _MISSING:
+                    dict.pop(target, key, None)
+                else:
+                    dict.__setitem__(target, key, previous)
+            elif kind == _LIST_APPEND:
+                list.pop(target)
+            else:
+                type(target).restore(target, previous)
+        self.rollbacks += 1
+        self.undone_changes += undone
+        self._close()
+        return undone
+
+    def _close(self) -> None:
+        if self._open <= 0:
+            raise RuntimeError("No open trail checkpoint")
+        self._open -= 1
+        if not self._open:
+            self.max_log_length = max(self.max_log_length, len(self._log))
+            self._log.clear()
+
+    def adopt(self, value: Any) -> Any:
+        if type(value) is set:
+            return TrailedSet(self, value)
+        if type(value) is list:
+            return TrailedList(self, value)
+        return value
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "checkpoints": self.checkpoints,
+            "rollbacks": self.rollbacks,
+            "undone_changes": self.undone_changes,
+            "max_log_length": self.max_log_length,
+        }
+
+
+class TrailedSet(set):
+    __slots__ = ("_trail",)
+
+    def __init__(self, trail: SolverTrail, items: Iterable[Any] = ()) -> None:
+        set.__init__(self, items)
+        self._trail = trail
+
+    def add(self, item: Any) -> None:
+        if self._trail._open and item not in self:
+            self._trail._log.append((_SET_ADD, self, item, None))
+        set.add(self, item)
+
+    def discard(self, item: Any) -> None:
+        if item in self:
+            if self._trail._open:
+                self._trail._log.append((_SET_DISCARD, self, item, None))
+            set.discard(self, item)
+
+    def remove(self, item: Any) -> None:
+        if item not in self:
+            raise KeyError(item)
+        self.discard(item)
+
+    def pop(self) -> Any:
+        item = set.pop(self)
+        if self._trail._open:
+            self._trail._log.append((_SET_DISCARD, self, item, None))
+        return item
+
+    def update(self, *others: Iterable[Any]) -> None:
+        for other in others:
+            for item in other:
+                self.add(item)
+
+    def difference_update(self, *others: Iterable[Any]) -> None:
+        for other in others:
+            for item in list(other):
+                self.discard(item)
+
+    def clear(self) -> None:
+        if self._trail._open and self:
+            self._trail._log.append((_RESTORE, self, None, set(self)))
+        set.clear(self)
+
+    def restore(self, items: set[Any]) -> None:
+        set.clear(self)
+        set.update(self, items)
+
+
+class TrailedDict(dict):
+    __slots__ = ("_trail",)
+
+    def __init__(self, trail: SolverTrail) -> None:
+        dict.__init__(self)
+        self._trail = trail
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        if self._trail._open:
+            self._trail._log.append((_DICT_SET, self, key, dict.get(self, key, _MISSING)))
+        dict.__setitem__(self, key, self._trail.adopt(value))
+
+    def __delitem__(self, key: Any) -> None:
+        if self._trail._open and key in self:
+            self._trail._log.append((_DICT_SET, self, key, dict.__getitem__(self, key)))
+        dict.__delitem__(self, key)
+
+    def setdefault(self, key: Any, default: Any = None) -> Any:
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def pop(self, key: Any, *default: Any) -> Any:
+        if self._trail._open and key in self:
+            self._trail._log.append((_DICT_SET, self, key, dict.__getitem__(self, key)))
+        return dict.pop(self, key, *default)
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self) -> None:
+        if self._trail._open and self:
+            self._trail._log.append((_RESTORE, self, None, dict(self)))
+        dict.clear(self)
+
+    def restore(self, items: dict[Any, Any]) -> None:
+        dict.clear(self)
+        dict.update(self, items)
+
+
+class TrailedList(list):
+    __slots__ = ("_trail",)
+
+    def __init__(self, trail: SolverTrail, items: Iterable[Any] = ()) -> None:
+        list.__init__(self, items)
+        self._trail = trail
+
+    def append(self, item: Any) -> None:
+        if self._trail._open:
+            self._trail._log.append((_LIST_APPEND, self, None, None))
+        list.append(self, item)
+
+    def _record(self) -> None:
+        if self._trail._open:
+            self._trail._log.append((_RESTORE, self, None, list(self)))
+
+    def extend(self, items: Iterable[Any]) -> None:
+        self._record()
+        list.extend(self, items)
+
+    def remove(self, item: Any) -> None:
+        self._record()
+        list.remove(self, item)
+
+    def pop(self, index: int = -1) -> Any:
+        self._record()
+        return list.pop(self, index)
+
+    def clear(self) -> None:
+        self._record()
+        list.clear(self)
+
+    def restore(self, items: list[Any]) -> None:
+        list.clear(self)
+        list.extend(self, items)
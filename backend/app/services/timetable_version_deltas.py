@@ -0,0 +1,515 @@
+"""Copy-on-write timetable versions.
+
+A version with a ``parent_version_id`` stores only what changed against its parent: its
+own ``timetable_entries`` rows are the sessions it added (or moved somewhere new) and
+``timetable_entry_removals`` lists the parent sessions it drops. A removal names a session
+by its content key rather than its ``entry_id``, so flattening an ancestor (which copies
+rows under new ids) never breaks a descendant. Reads walk the chain root first and merge.
+
+Other workers may compact or edit a version at any time, so the caches only hold what a
+read can check or what cannot change: a cached chain is re-checked against the stored
+parent links (one query) before use, and only the merged rows of the ancestors are
+cached, because a version's rows never change while a delta version reads through it.
+The version's own rows and removals are read on every request.
+
+Rows are shared down a chain, so a version's rows may only change once no delta version
+still reads through it: writers call :func:`detach_children` first (or fork the row into
+the edited version with :func:`fork_entry`). See ``sql/timetable_version_deltas.sql``.
+"""
+from __future__ import annotations
+
+from collections import Counter, defaultdict
+from typing import Any
+
+from app.config import settings
+from app.services.timetable_repository import TimetableRepository, as_timetable_repository
+from app.services.ttl_cache import TTLCache
+
+# Columns that make two rows the same session; everything else is bookkeeping.
+ENTRY_KEY_COLUMNS = (
+    "division_id",
+    "batch_id",
+    "subject_id",
+    "session_type",
+    "faculty_id",
+    "room_id",
+    "day_id",
+    "slot_id",
+)
+# What a session is, regardless of where and by whom it is taught.
+_ASSIGNMENT_COLUMNS = ("division_id", "batch_id", "subject_id", "session_type")
+_ROW_BOOKKEEPING = {"entry_id", "created_at", "updated_at"}
+
+_LINEAGE_TTL_SECONDS = 600.0
+_MERGED_TTL_SECONDS = 120.0
+_PAGE_SIZE = 1000
+
+_lineages = TTLCache(ttl_seconds=_LINEAGE_TTL_SECONDS, max_entries=1024)
+_merged = TTLCache(ttl_seconds=_MERGED_TTL_SECONDS, max_entries=32)
+
+
+def _key_value(row: dict[str, Any], column: str) -> str:
+    value = row.get(column)
+    if value in (None, ""):
+        return "THEORY" if column == "session_type" else ""
+    if column == "session_type":
+        return str(value).upper()
+    if column == "day_id":
+        return str(int(value))
+    return str(value)
+
+
+def entry_key(row: dict[str, Any]) -> str:
+    return "|".join(_key_value(row, column) for column in ENTRY_KEY_COLUMNS)
+
+
+def _row_from_key(key: str) -> dict[str, Any]:
+    row: dict[str, Any] = {}
+    for column, value in zip(ENTRY_KEY_COLUMNS, key.split("|")):
+        if column == "day_id":
+            row[column] = int(value) if value else None
+        else:
+            row[column] = value or None
+    return row
+
+
+def _clean_row(row: dict[str, Any], version_id: str) -> dict[str, Any]:
+    """A row ready to insert into ``version_id``: no id, timestamps or embedded joins."""
+    clean = {
+        column: value
+        for column, value in row.items()
+        if column not in _ROW_BOOKKEEPING and not isinstance(value, (dict, list))
+    }
+    clean["version_id"] = version_id
+    return clean
+
+
+def _lineage_current(repository: TimetableRepository, chain: tuple[str, ...]) -> bool:
+    """Whether ``chain`` still matches the stored parent links (a compaction cuts it short)."""
+    if len(chain) == 1:
+        # Only compaction changes a parent link, and it only ever clears one.
+        return True
+    links = repository.fetch_parent_links(list(chain))
+    expected = [*chain[1:], None]
+    return all(version_id in links and links[version_id] == parent for version_id, parent in zip(chain, expected))
+
+
+def version_lineage(source: Any, version_id: str) -> list[str]:
+    """``[version_id, parent, grandparent, ...]`` up to the first fully stored version."""
+    repository = as_timetable_repository(source)
+    version_id = str(version_id)
+    cached = _lineages.get(version_id)
+    if cached is not None and _lineage_current(repository, cached):
+        return list(cached)
+    chain = [version_id]
+    row = repository.fetch_version(version_id)
+    while row and row.get("parent_version_id"):
+        parent_id = str(row["parent_version_id"])
+        if parent_id in chain:
+            raise ValueError(f"Timetable version {version_id} has a cyclic parent chain.")
+        parent_chain = _lineages.get(parent_id)
+        if parent_chain is not None and _lineage_current(repository, parent_chain):
+            chain.extend(parent_chain)
+            break
+        chain.append(parent_id)
+        row = repository.fetch_version(parent_id)
+        if row is None:
+            raise ValueError(f"Parent version {parent_id} of timetable version {version_id} no longer exists.")
+    _lineages.set(version_id, tuple(chain))
+    return chain
+
+
+def is_delta_version(source: Any, version_id: str) -> bool:
+    return len(version_lineage(source, version_id)) > 1
+
+
+def _merge(levels: list[tuple[list[dict[str, Any]], list[str]]], version_id: str) -> list[dict[str, Any]]:
+    """Apply ``(own rows, removed keys)`` levels root first; rows come back labelled ``version_id``."""
+    rows: list[dict[str, Any]] = list(levels[0][0])
+    for own_rows, removed_keys in levels[1:]:
+        if removed_keys:
+            pending = Counter(removed_keys)
+            kept = []
+            for row in rows:
+                key = entry_key(row)
+                if pending[key]:
+                    pending[key] -= 1
+                    continue
+                kept.append(row)
+            rows = kept
+        rows.extend(own_rows)
+    return [{**row, "version_id": version_id} for row in rows]
+
+
+def _merge_lineage(
+    repository: TimetableRepository,
+    lineage: list[str],
+    level_rows,
+    cache_key: tuple,
+) -> list[dict[str, Any]]:
+    """Merge ``lineage`` (a delta version first) from ``level_rows(level_id)``.
+
+    The ancestors' merged rows are cached under the whole chain, so a compaction (which
+    changes the chain) or a new child of an edited ancestor never reads them; the version's
+    own level is read fresh.
+    """
+    version_id, parent_id = lineage[0], lineage[1]
+
+    def _load() -> list[dict[str, Any]]:
+        ancestors = list(reversed(lineage[1:]))
+        levels = [
+            (level_rows(level_id), repository.fetch_entry_removals(level_id) if depth else [])
+            for depth, level_id in enumerate(ancestors)
+        ]
+        return _merge(levels, parent_id)
+
+    inherited = _merged.get_or_load((version_id, tuple(lineage), *cache_key), _load)
+    return _merge([(inherited, []), (level_rows(version_id), repository.fetch_entry_removals(version_id))], version_id)
+
+
+def materialize_entries(repository: TimetableRepository, version_id: str) -> list[dict[str, Any]]:
+    """Every entry of ``version_id``; delta versions are merged through their chain."""
+    version_id = str(version_id)
+    lineage = version_lineage(repository, version_id)
+    if len(lineage) == 1:
+        return repository.fetch_version_rows(version_id)
+    return _merge_lineage(repository, lineage, repository.fetch_version_rows, (repository.backend, "*", ()))
+
+
+def _top_level_columns(columns: str) -> set[str]:
+    names: set[str] = set()
+    depth = 0
+    current = ""
+    for char in columns + ",":
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        if char == "," and depth == 0:
+            names.add(current.strip())
+            current = ""
+        else:
+            current += char
+    return names
+
+
+def fetch_version_entries(supabase: Any, version_id: str, columns: str = "*", **filters: Any) -> list[dict[str, Any]]:
+    """``timetable_entries`` rows of a version selected as ``columns`` (embedded joins allowed).
+
+    Fully stored versions cost the same single query as before; delta versions are merged
+    through their chain (the key columns are added to ``columns`` for that) and cached.
+    """
+    version_id = str(version_id)
+    lineage = version_lineage(supabase, version_id)
+    if len(lineage) == 1:
+        query = supabase.table("timetable_entries").select(columns).eq("version_id", version_id)
+        for column, value in filters.items():
+            query = query.eq(column, value)
+        return query.execute().data or []
+
+    selected = _top_level_columns(columns)
+    if "*" not in selected:
+        missing = [column for column in ENTRY_KEY_COLUMNS + ("entry_id",) if column not in selected]
+        if missing:
+            columns = ", ".join([columns, *missing])
+    repository = as_timetable_repository(supabase)
+
+    def _level_rows(level_id: str) -> list[dict[str, Any]]:
+        rows: list[dict[str, Any]] = []
+        start = 0
+        while True:
+            query = supabase.table("timetable_entries").select(columns).eq("version_id", level_id)
+            for column, value in filters.items():
+                query = query.eq(column, value)
+            chunk = query.range(start, start + _PAGE_SIZE - 1).execute().data or []
+            rows.extend(chunk)
+            if len(chunk) < _PAGE_SIZE:
+                return rows
+            start += _PAGE_SIZE
+
+    cache_key = (repository.backend, columns, tuple(sorted((k, str(v)) for k, v in filters.items())))
+    return _merge_lineage(repository, lineage, _level_rows, cache_key)
+
+
+def invalidate_version_entries(*version_ids: str | None) -> None:
+    """Drop merged rows read through these versions after their entries change (no ids = everything)."""
+    ids = {str(version_id) for version_id in version_ids if version_id}
+    if not version_ids:
+        _merged.clear()
+        _lineages.clear()
+        return
+    _merged.invalidate_where(lambda key: not ids.isdisjoint(key[1]))
+
+
+def _invalidate_structure() -> None:
+    """Parent links changed: every cached chain (and anything merged through one) is suspect."""
+    _lineages.clear()
+    _merged.clear()
+
+
+def plan_delta(
+    parent_rows: list[dict[str, Any]],
+    rows: list[dict[str, Any]],
+) -> tuple[list[str], list[dict[str, Any]]]:
+    """``(removed keys, added rows)`` turning ``parent_rows`` into ``rows`` (multiset by content)."""
+    remaining = Counter(entry_key(row) for row in parent_rows)
+    added: list[dict[str, Any]] = []
+    for row in rows:
+        key = entry_key(row)
+        if remaining[key]:
+            remaining[key] -= 1
+        else:
+            added.append(row)
+    removed = [key for key, count in remaining.items() for _ in range(count)]
+    return removed, added
+
+
+def compact_version(repository: TimetableRepository, version_id: str) -> int:
+    """Store ``version_id`` in full (copying what it inherits); returns the rows copied."""
+    version_id = str(version_id)
+    lineage = version_lineage(repository, version_id)
+    if len(lineage) == 1:
+        return 0
+    own_ids = {str(row.get("entry_id")) for row in repository.fetch_version_rows(version_id)}
+    inherited = [
+        _clean_row(row, version_id)
+        for row in materialize_entries(repository, version_id)
+        if str(row.get("entry_id")) not in own_ids
+    ]
+    repository.insert_entries(inherited)
+    repository.update_version(version_id, {"parent_version_id": None})
+    repository.delete_entry_removals([version_id])
+    _invalidate_structure()
+    return len(inherited)
+
+
+def detach_children(repository: TimetableRepository, version_ids: list[str]) -> list[str]:
+    """Flatten delta versions that read through ``version_ids`` (and are not among them).
+
+    Call before changing or deleting the rows of ``version_ids``.
+    """
+    ids = {str(version_id) for version_id in version_ids if version_id}
+    if not ids:
+        return []
+    detached = []
+    for child in repository.fetch_child_versions(sorted(ids)):
+        child_id = str(child.get("version_id"))
+        if child_id not in ids:
+            compact_version(repository, child_id)
+            detached.append(child_id)
+    return detached
+
+
+def create_delta_version(
+    repository: TimetableRepository,
+    *,
+    parent_version_id: str,
+    payload: dict[str, Any],
+    rows: list[dict[str, Any]],
+    parent_rows: list[dict[str, Any]] | None = None,
+) -> tuple[dict[str, Any] | None, dict[str, Any]]:
+    """Create a version holding ``rows`` as a delta against ``parent_version_id``.
+
+    Writes only the changed rows and the removal keys. Chains longer than
+    ``timetable_delta_max_chain`` are flattened straight away.
+    """
+    parent_version_id = str(parent_version_id)
+    if parent_rows is None:
+        parent_rows = materialize_entries(repository, parent_version_id)
+    removed, added = plan_delta(parent_rows, rows)
+    version = repository.create_version({**payload, "parent_version_id": parent_version_id})
+    if not version:
+        return None, {}
+    version_id = str(version.get("version_id"))
+    repository.insert_entry_removals(version_id, removed)
+    repository.insert_entries([_clean_row(row, version_id) for row in added])
+    stats: dict[str, Any] = {
+        "storage": "delta",
+        "parent_version_id": parent_version_id,
+        "added": len(added),
+        "removed": len(removed),
+        "unchanged": len(rows) - len(added),
+        "chain_length": len(version_lineage(repository, version_id)) - 1,
+    }
+    max_chain = int(settings.timetable_delta_max_chain or 0)
+    if max_chain and stats["chain_length"] > max_chain:
+        stats["compacted_rows"] = compact_version(repository, version_id)
+        stats["storage"] = "full"
+    return version, stats
+
+
+def fork_entry(
+    repository: TimetableRepository,
+    version_id: str,
+    entry: dict[str, Any],
+    changes: dict[str, Any] | None = None,
+) -> dict[str, Any] | None:
+    """Copy-on-write edit of a row ``version_id`` inherits: drop it there, then add the edited copy.
+
+    ``changes=None`` only drops it. Returns the new row (if one was added).
+    """
+    version_id = str(version_id)
+    detach_children(repository, [version_id])
+    repository.insert_entry_removals(version_id, [entry_key(entry)])
+    forked = None
+    if changes is not None:
+        forked = {**_clean_row(entry, version_id), **changes, "version_id": version_id}
+        forked = (repository.insert_entries([forked]) or [None])[0]
+    invalidate_version_entries(version_id)
+    return forked
+
+
+def inherits_entry(source: Any, version_id: str, entry: dict[str, Any]) -> bool:
+    """Whether ``entry`` (a stored row of an ancestor) is still part of ``version_id``."""
+    owner_id = str(entry.get("version_id") or "")
+    lineage = version_lineage(source, version_id)
+    if owner_id == str(version_id) or owner_id not in lineage:
+        return False
+    return any(
+        str(row.get("entry_id")) == str(entry.get("entry_id"))
+        for row in materialize_entries(as_timetable_repository(source), version_id)
+    )
+
+
+def compact_long_chains(
+    repository: TimetableRepository,
+    *,
+    max_chain: int | None = None,
+    department_id: str | None = None,
+) -> dict[str, Any]:
+    """Flatten every delta version whose chain is longer than ``max_chain``."""
+    limit = int(settings.timetable_delta_max_chain if max_chain is None else max_chain)
+    versions = repository.fetch_versions(department_id=department_id)
+    compacted: list[dict[str, Any]] = []
+    delta_versions = 0
+    for version in versions:
+        if not version.get("parent_version_id"):
+            continue
+        delta_versions += 1
+        version_id = str(version.get("version_id"))
+        chain_length = len(version_lineage(repository, version_id)) - 1
+        if chain_length > limit:
+            compacted.append(
+                {
+                    "version_id": version_id,
+                    "chain_length": chain_length,
+                    "rows_copied": compact_version(repository, version_id),
+                }
+            )
+    return {
+        "max_chain": limit,
+        "versions_scanned": len(versions),
+        "delta_versions": delta_versions,
+        "compacted": compacted,
+    }
+
+
+def _net_changes(
+    repository: TimetableRepository,
+    versions: list[str],
+) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+    """``(removed, added)`` rows accumulated over ``versions`` (root-most first)."""
+    added: dict[str, list[dict[str, Any]]] = defaultdict(list)
+    removed: Counter[str] = Counter()
+    for level_id in versions:
+        for key in repository.fetch_entry_removals(level_id):
+            if added[key]:
+                added[key].pop()
+            else:
+                removed[key] += 1
+        for row in repository.fetch_version_rows(level_id):
+            key = entry_key(row)
+            if removed[key]:
+                removed[key] -= 1
+            else:
+                added[key].append(row)
+    removed_rows = [_row_from_key(key) for key, count in removed.items() for _ in range(count)]
+    return removed_rows, [row for rows in added.values() for row in rows]
+
+
+def _diff_row(row: dict[str, Any]) -> dict[str, Any]:
+    payload = {column: row.get(column) for column in ENTRY_KEY_COLUMNS}
+    if row.get("entry_id"):
+        payload["entry_id"] = row.get("entry_id")
+    return payload
+
+
+def _classify(removed: list[dict[str, Any]], added: list[dict[str, Any]]) -> dict[str, list[dict[str, Any]]]:
+    def assignment(row: dict[str, Any]) -> tuple[str, ...]:
+        return tuple(_key_value(row, column) for column in _ASSIGNMENT_COLUMNS)
+
+    def placement(row: dict[str, Any]) -> tuple[str, str, str]:
+        return (_key_value(row, "day_id"), _key_value(row, "slot_id"), _key_value(row, "room_id"))
+
+    removed_by_assignment: dict[tuple[str, ...], list[dict[str, Any]]] = defaultdict(list)
+    added_by_assignment: dict[tuple[str, ...], list[dict[str, Any]]] = defaultdict(list)
+    for row in removed:
+        removed_by_assignment[assignment(row)].append(row)
+    for row in added:
+        added_by_assignment[assignment(row)].append(row)
+
+    result: dict[str, list[dict[str, Any]]] = {"moved": [], "faculty_reassigned": [], "added": [], "removed": []}
+    for key in list(removed_by_assignment) + [key for key in added_by_assignment if key not in removed_by_assignment]:
+        olds = sorted(removed_by_assignment.get(key, []), key=placement)
+        news = sorted(added_by_assignment.get(key, []), key=placement)
+        # Same day, slot and room: only the teacher changed.
+        unmatched_new = []
+        for new in news:
+            old = next((row for row in olds if placement(row) == placement(new)), None)
+            if old is None:
+                unmatched_new.append(new)
+                continue
+            olds.remove(old)
+            result["faculty_reassigned"].append(
+                {
+                    "entry": _diff_row(new),
+                    "from_faculty_id": old.get("faculty_id"),
+                    "to_faculty_id": new.get("faculty_id"),
+                }
+            )
+        for old, new in zip(olds, unmatched_new):
+            result["moved"].append(
+                {
+                    "from": _diff_row(old),
+                    "to": _diff_row(new),
+                    "faculty_changed": _key_value(old, "faculty_id") != _key_value(new, "faculty_id"),
+                    "room_changed": _key_value(old, "room_id") != _key_value(new, "room_id"),
+                }
+            )
+        result["removed"].extend(_diff_row(row) for row in olds[len(unmatched_new):])
+        result["added"].extend(_diff_row(row) for row in unmatched_new[len(olds):])
+    return result
+
+
+def diff_versions(repository: TimetableRepository, base_version_id: str, target_version_id: str) -> dict[str, Any]:
+    """What changed from ``base_version_id`` to ``target_version_id``.
+
+    When the base is an ancestor of the target only the deltas in between are read;
+    otherwise both versions are materialised.
+    """
+    base_version_id = str(base_version_id)
+    target_version_id = str(target_version_id)
+    lineage = version_lineage(repository, target_version_id)
+    if base_version_id in lineage:
+        between = lineage[: lineage.index(base_version_id)]
+        removed, added = _net_changes(repository, list(reversed(between)))
+        method = "delta_chain"
+    else:
+        base_rows = materialize_entries(repository, base_version_id)
+        removed_keys, added = plan_delta(base_rows, materialize_entries(repository, target_version_id))
+        pending = Counter(removed_keys)
+        removed = []
+        for row in base_rows:
+            key = entry_key(row)
+            if pending[key]:
+                pending[key] -= 1
+                removed.append(row)
+        method = "materialized"
+    changes = _classify(removed, added)
+    return {
+        "base_version_id": base_version_id,
+        "target_version_id": target_version_id,
+        "method": method,
+        "summary": {name: len(rows) for name, rows in changes.items()},
+        **changes,
+    }
@@ -0,0 +1,19 @@
+-- ============================================
+-- MAINTENANCE SCHEDULER
+-- ============================================
+-- With MAINTENANCE_LEADER_ELECTION=lease, the API process holding the
+-- unexpired row below runs the leader-only maintenance jobs (timetable
+-- expiry/auto-delete, password reset OTP cleanup). The holder renews it a few
+-- times per lease period; another process takes over once it has expired.
+-- The default "file" election needs no table.
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS maintenance_leases (
+    lease_name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+-- OTP cleanup deletes by expiry in one statement
+CREATE INDEX IF NOT EXISTS idx_password_reset_otps_expires_at
+    ON password_reset_otps (expires_at);
@@ -0,0 +1,20 @@
+-- ============================================
+-- EMAIL OUTBOX COLUMNS ON notification_log
+-- ============================================
+-- Rows with status = 'PENDING' and a non-null email_html are delivered by the
+-- API's email outbox worker, which sets status to 'SENT' (with delivered_at)
+-- or retries with backoff until it gives up with status = 'FAILED'.
+-- Rows without email_html remain in-app notifications only.
+-- ============================================
+
+ALTER TABLE notification_log ADD COLUMN IF NOT EXISTS email_subject TEXT;
+ALTER TABLE notification_log ADD COLUMN IF NOT EXISTS email_html TEXT;
+ALTER TABLE notification_log ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE notification_log ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMPTZ;
+ALTER TABLE notification_log ADD COLUMN IF NOT EXISTS last_error TEXT;
+ALTER TABLE notification_log ADD COLUMN IF NOT EXISTS delivered_at TIMESTAMPTZ;
+
+-- Worker claim query: due outbox rows in order
+CREATE INDEX IF NOT EXISTS idx_notification_log_outbox_due
+    ON notification_log (next_attempt_at)
+    WHERE status IN ('PENDING', 'SENDING') AND email_html IS NOT NULL;
@@ -0,0 +1,18 @@
+-- ============================================
+-- NOTIFICATION INBOX READ STATE + INDEXES
+-- ============================================
+-- Notifications are no longer deleted when read: read_at is set instead, so
+-- the inbox can page through history and count unread rows cheaply.
+-- GET /notifications pages newest-first on (sent_at, notification_id).
+-- ============================================
+
+ALTER TABLE notification_log ADD COLUMN IF NOT EXISTS read_at TIMESTAMPTZ;
+
+-- Keyset pagination per recipient
+CREATE INDEX IF NOT EXISTS idx_notification_log_inbox
+    ON notification_log (recipient_email, sent_at DESC, notification_id DESC);
+
+-- Unread counts and unread-only pages
+CREATE INDEX IF NOT EXISTS idx_notification_log_inbox_unread
+    ON notification_log (recipient_email, sent_at DESC, notification_id DESC)
+    WHERE read_at IS NULL;
@@ -0,0 +1,29 @@
+-- ============================================
+-- COPY-ON-WRITE TIMETABLE VERSIONS
+-- ============================================
+-- A version with parent_version_id set stores only what changed against its
+-- parent: its own timetable_entries rows are added/moved sessions, and
+-- timetable_entry_removals lists the parent sessions it drops by content key
+-- (division|batch|subject|session_type|faculty|room|day|slot), not entry_id.
+-- Versions without a parent are stored in full, as before.
+-- The API flattens dependent delta versions before deleting or editing a
+-- parent, so the parent reference never dangles.
+-- ============================================
+
+ALTER TABLE timetable_versions
+    ADD COLUMN IF NOT EXISTS parent_version_id UUID REFERENCES timetable_versions(version_id);
+
+CREATE INDEX IF NOT EXISTS idx_timetable_versions_parent
+    ON timetable_versions (parent_version_id)
+    WHERE parent_version_id IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS timetable_entry_removals (
+    removal_id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    version_id UUID NOT NULL REFERENCES timetable_versions(version_id) ON DELETE CASCADE,
+    entry_key TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Merge-on-read fetches every removal of one version
+CREATE INDEX IF NOT EXISTS idx_timetable_entry_removals_version
+    ON timetable_entry_removals (version_id);
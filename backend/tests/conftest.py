@@ -0,0 +1,96 @@
+"""Shared test setup: importable ``app`` package and dummy required settings."""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+for _name, _value in {
+    "SUPABASE_URL": "http://localhost:54321",
+    "SUPABASE_ANON_KEY": "test-anon-key",
+    "SUPABASE_SERVICE_ROLE_KEY": "test-service-role-key",
+    "SMTP_SERVER": "localhost",
+    "SMTP_PORT": "1025",
+    "SMTP_USERNAME": "test",
+    "SMTP_PASSWORD": "test",
+    "MAINTENANCE_ENABLED": "false",
+    "EMAIL_OUTBOX_ENABLED": "false",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+
+def seed_department(repository, *, divisions: int = 3, tutorials: bool = True, department_id: str = "D1") -> None:
+    """Load a small timetable department: 3 batches per division, labs and batch tutorials."""
+    day_names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+    repository.load_rows(
+        "days",
+        [{"day_id": index + 1, "day_name": name, "is_working_day": index < 5} for index, name in enumerate(day_names)],
+    )
+    repository.load_rows(
+        "time_slots",
+        [
+            {
+                "slot_id": f"S{index + 1}",
+                "slot_order": index + 1,
+                "start_time": f"{hour:02d}:00",
+                "end_time": f"{hour + 1:02d}:00",
+                "is_break": hour == 12,
+            }
+            for index, hour in enumerate(range(8, 18))
+        ],
+    )
+    repository.load_rows(
+        "rooms",
+        [
+            {"room_id": f"{prefix}{index}", "room_number": f"{prefix}{index}", "room_type": room_type, "is_active": True, "department_id": department_id}
+            for prefix, room_type in (("R", "CLASSROOM"), ("L", "LAB"))
+            for index in range(4)
+        ],
+    )
+    repository.load_rows(
+        "faculty",
+        [
+            {"faculty_id": f"F{index}", "faculty_name": f"Prof Fac{chr(65 + index)}", "department_id": department_id, "is_active": True, "email": f"f{index}@example.com"}
+            for index in range(8)
+        ],
+    )
+    repository.load_rows(
+        "subjects",
+        [{"subject_id": f"SUB{index}", "subject_name": f"Subject {index}", "year": "SY", "department_id": department_id} for index in range(5)],
+    )
+    division_rows, batch_rows, load_rows = [], [], []
+    for division in range(divisions):
+        name = f"SY-{chr(65 + division)}"
+        division_rows.append({"division_id": f"DV{division}", "division_name": name, "year": "SY", "department_id": department_id})
+        batch_rows.extend(
+            {"batch_id": f"DV{division}B{batch}", "division_id": f"DV{division}", "batch_code": f"{chr(65 + division)}{batch + 1}", "is_active": True}
+            for batch in range(3)
+        )
+        load_rows.extend(
+            {
+                "faculty_name": f"Prof Fac{chr(65 + (subject + division) % 8)}",
+                "year": "SY",
+                "division": name,
+                "subject": f"SUB{subject}",
+                "theory_hrs": 3,
+                "lab_hrs": 2 if subject < 2 else 0,
+                "tutorial_hrs": 1 if tutorials and subject >= 3 else 0,
+                "department_id": department_id,
+            }
+            for subject in range(5)
+        )
+    repository.load_rows("divisions", division_rows)
+    repository.load_rows("batches", batch_rows)
+    repository.load_rows("load_distribution", load_rows)
+
+
+@pytest.fixture
+def seeded_repository():
+    """SQLite timetable repository holding one department (see ``seed_department``)."""
+    from app.services.timetable_repository import SQLiteTimetableRepository
+
+    repository = SQLiteTimetableRepository()
+    seed_department(repository)
+    return repository
@@ -0,0 +1,78 @@
+"""Analytics read the caller's department's versions only."""
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.dependencies.auth import CurrentUser, get_current_user_with_profile
+from app.routers import analytics as analytics_router
+
+
+class _VersionsTable:
+    def __init__(self, rows):
+        self.rows = rows
+        self.version_id = None
+
+    def eq(self, column, value):
+        if column == "version_id":
+            self.version_id = value
+        return self
+
+    def __getattr__(self, _name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        return SimpleNamespace(data=[row for row in self.rows if row["version_id"] == self.version_id])
+
+
+@pytest.fixture
+def read_versions(monkeypatch):
+    seen = []
+    rows = [{"version_id": "v-d1", "department_id": "D1"}, {"version_id": "v-d2", "department_id": "D2"}]
+    monkeypatch.setattr(
+        analytics_router,
+        "get_service_supabase",
+        lambda: SimpleNamespace(table=lambda _name: _VersionsTable(rows)),
+    )
+    monkeypatch.setattr(
+        analytics_router,
+        "get_effective_version_id",
+        lambda supabase, department_id, role: seen.append(("default", department_id, role)) or "v-d1",
+    )
+    monkeypatch.setattr(
+        analytics_router,
+        "fetch_version_entries",
+        lambda supabase, version_id, _select: seen.append(("entries", version_id)) or [],
+    )
+    return seen
+
+
+def _client(role, department_id=" D1 "):
+    app = FastAPI()
+    app.include_router(analytics_router.router)
+    app.dependency_overrides[get_current_user_with_profile] = lambda: CurrentUser(
+        uid="u1", email="u1@example.com", role=role, department_id=department_id
+    )
+    return TestClient(app)
+
+
+def test_default_version_is_the_callers_department(read_versions):
+    response = _client("HOD").get("/analytics/timetable-conflicts")
+
+    assert response.status_code == 200, response.text
+    assert read_versions == [("default", "D1", "HOD"), ("entries", "v-d1")]
+
+
+def test_other_departments_version_is_not_found(read_versions):
+    response = _client("HOD").get("/analytics/timetable-conflicts", params={"version_id": "v-d2"})
+
+    assert response.status_code == 404
+    assert read_versions == []
+
+
+def test_caller_without_department_sees_no_version(read_versions):
+    response = _client("COORDINATOR", department_id=None).get("/analytics/timetable-conflicts")
+
+    assert response.status_code == 404
+    assert read_versions == []
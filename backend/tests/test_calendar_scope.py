@@ -0,0 +1,88 @@
+"""Calendar endpoints read the caller's department only."""
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.dependencies.auth import CurrentUser, get_current_user
+from app.routers import calendar as calendar_router
+
+
+class _Calendar:
+    version_id = "v-d1"
+
+    def cancelled_on(self, day, division_id=None):
+        return []
+
+
+class _VersionsTable:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __getattr__(self, _name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        return SimpleNamespace(data=self.rows)
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    seen = []
+    versions = {"v-d2": {"version_id": "v-d2", "department_id": "D2"}}
+
+    def fake_calendar(supabase, version=None, department_id=None, role=None, **_kwargs):
+        seen.append((version and version["version_id"], department_id, role))
+        return _Calendar()
+
+    monkeypatch.setattr(calendar_router, "get_timetable_calendar", fake_calendar)
+    monkeypatch.setattr(
+        calendar_router,
+        "get_service_supabase",
+        lambda: SimpleNamespace(table=lambda _name: _VersionsTable(list(versions.values()))),
+    )
+    return seen
+
+
+def _client(role, department_id=" D1 "):
+    app = FastAPI()
+    app.include_router(calendar_router.router)
+    app.dependency_overrides[get_current_user] = lambda: CurrentUser(
+        uid="u1", email="u1@example.com", role=role, department_id=department_id
+    )
+    return TestClient(app)
+
+
+def test_default_calendar_is_the_callers_department(calls):
+    response = _client("FACULTY").get("/calendar/cancellations", params={"date": "2026-01-05"})
+
+    assert response.status_code == 200, response.text
+    assert calls == [(None, "D1", "FACULTY")]
+
+
+def test_other_departments_version_is_not_found(calls):
+    response = _client("FACULTY").get(
+        "/calendar/cancellations", params={"date": "2026-01-05", "version_id": "v-d2"}
+    )
+
+    assert response.status_code == 404
+    assert calls == []
+
+
+def test_caller_without_department_sees_no_version(calls):
+    client = _client("FACULTY", department_id=None)
+
+    assert client.get("/calendar/cancellations", params={"date": "2026-01-05"}).status_code == 404
+    response = client.get("/calendar/cancellations", params={"date": "2026-01-05", "version_id": "v-d2"})
+    assert response.status_code == 404
+    assert calls == []
+
+
+def test_admin_without_department_reads_any_version(calls):
+    response = _client("ADMIN", department_id=None).get(
+        "/calendar/cancellations", params={"date": "2026-01-05", "version_id": "v-d2"}
+    )
+
+    assert response.status_code == 200, response.text
+    assert calls == [("v-d2", None, "ADMIN")]
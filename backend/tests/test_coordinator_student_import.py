@@ -0,0 +1,160 @@
+"""Coordinator student CSV upload, end to end through the router."""
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.dependencies.auth import CurrentUser, get_current_user_with_profile
+from app.routers import auth as auth_router
+
+
+class _Query:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.filters = []
+        self.payload = None
+
+    def select(self, *_args, **_kwargs):
+        return self
+
+    def in_(self, column, values):
+        self.filters.append((column, set(values)))
+        return self
+
+    def upsert(self, payload, **_kwargs):
+        self.payload = payload if isinstance(payload, list) else [payload]
+        return self
+
+    def execute(self):
+        rows = self.db.tables.setdefault(self.table, [])
+        if self.payload is not None:
+            for record in self.payload:
+                rows[:] = [row for row in rows if row.get("user_id") != record.get("user_id")]
+                rows.append(dict(record))
+            return SimpleNamespace(data=self.payload)
+        data = [row for row in rows if all(row.get(column) in values for column, values in self.filters)]
+        return SimpleNamespace(data=data)
+
+
+class _AuthAdmin:
+    def __init__(self):
+        self.users = {}
+        self.created = []
+
+    def create_user(self, attributes):
+        email = attributes["email"]
+        if email in self.users:
+            raise ValueError("A user with this email address has already been registered")
+        user = SimpleNamespace(id=f"uid-{email}", email=email)
+        self.users[email] = user
+        self.created.append(email)
+        return SimpleNamespace(user=user)
+
+    def list_users(self, page=1, per_page=50):
+        users = list(self.users.values())
+        return users[(page - 1) * per_page:page * per_page]
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.tables = {}
+        self.auth = SimpleNamespace(admin=_AuthAdmin())
+
+    def table(self, name):
+        return _Query(self, name)
+
+
+CSV = (
+    "name,email,prn,department_id,division\n"
+    "Asha,asha@example.com,PRN1,D1,SY-A\n"
+    "Bala,bala@example.com,PRN2,D1,SY-A\n"
+    "Chitra,chitra@example.com,PRN3,D1,SY-B\n"
+)
+
+
+@pytest.fixture
+def client_and_db(monkeypatch):
+    db = FakeSupabase()
+    monkeypatch.setattr(auth_router, "get_service_supabase", lambda: db)
+    app = FastAPI()
+    app.include_router(auth_router.router)
+    app.dependency_overrides[get_current_user_with_profile] = lambda: CurrentUser(
+        uid="coordinator-1", email="coord@example.com", role="COORDINATOR", department_id="D1"
+    )
+    return TestClient(app), db
+
+
+def _upload(client, content=CSV):
+    return client.post(
+        "/auth/coordinator/students/upload",
+        params={"dry_run": "false"},
+        files={"file": ("students.csv", content, "text/csv")},
+    )
+
+
+def test_upload_creates_accounts_and_profiles(client_and_db):
+    client, db = client_and_db
+
+    response = _upload(client)
+
+    assert response.status_code == 200, response.text
+    data = response.json()["data"]
+    assert data["status"] == "completed"
+    assert (data["created"], data["skipped"], data["failed"]) == (3, 0, 0)
+    profiles = {row["email"]: row for row in db.tables["user_profiles"]}
+    assert set(profiles) == {"asha@example.com", "bala@example.com", "chitra@example.com"}
+    assert profiles["bala@example.com"]["user_id"] == "uid-bala@example.com"
+    assert profiles["bala@example.com"]["role"] == "STUDENT"
+
+
+def test_reupload_resumes_after_partial_import(client_and_db):
+    client, db = client_and_db
+    # Earlier run: Asha fully imported, Bala's auth user created but the profile never saved
+    db.auth.admin.create_user({"email": "asha@example.com"})
+    db.auth.admin.create_user({"email": "bala@example.com"})
+    db.tables["user_profiles"] = [
+        {"user_id": "uid-asha@example.com", "email": "asha@example.com", "role": "STUDENT"}
+    ]
+
+    response = _upload(client)
+
+    assert response.status_code == 200, response.text
+    data = response.json()["data"]
+    assert data["status"] == "completed"
+    assert (data["created"], data["skipped"], data["failed"]) == (2, 1, 0)
+    statuses = {row["email"]: row["status"] for row in data["rows"]}
+    assert statuses == {
+        "asha@example.com": "skipped",
+        "bala@example.com": "created",
+        "chitra@example.com": "created",
+    }
+    profiles = {row["email"]: row["user_id"] for row in db.tables["user_profiles"]}
+    assert profiles["bala@example.com"] == "uid-bala@example.com"
+    assert len(profiles) == 3
+
+    again = _upload(client).json()["data"]
+    assert (again["created"], again["skipped"], again["failed"]) == (0, 3, 0)
+
+
+@pytest.mark.parametrize(
+    ("uid", "role", "department_id", "visible"),
+    [
+        ("coordinator-1", "COORDINATOR", "D1", True),
+        ("coordinator-2", "COORDINATOR", " D1 ", True),
+        ("coordinator-3", "COORDINATOR", "D2", False),
+        ("coordinator-4", "COORDINATOR", None, False),
+        ("admin-1", "ADMIN", None, True),
+    ],
+)
+def test_import_job_is_visible_to_its_department_only(client_and_db, uid, role, department_id, visible):
+    client, _ = client_and_db
+    job_id = _upload(client).json()["data"]["job_id"]
+    client.app.dependency_overrides[get_current_user_with_profile] = lambda: CurrentUser(
+        uid=uid, email=f"{uid}@example.com", role=role, department_id=department_id
+    )
+
+    response = client.get(f"/auth/coordinator/students/import-jobs/{job_id}")
+
+    assert response.status_code == (200 if visible else 404), response.text
@@ -0,0 +1,38 @@
+"""Division student CSV upload is authorized before anything is reported back."""
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.dependencies.auth import CurrentUser, get_current_user_with_profile
+from app.routers import divisions as divisions_router
+
+
+class _DivisionsTable:
+    def __getattr__(self, _name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        return SimpleNamespace(data=[{"division_id": "DV1", "department_id": "D1"}])
+
+
+def _dry_run(monkeypatch, department_id):
+    monkeypatch.setattr(divisions_router, "get_service_supabase", lambda: SimpleNamespace(table=lambda _name: _DivisionsTable()))
+    app = FastAPI()
+    app.include_router(divisions_router.router)
+    app.dependency_overrides[get_current_user_with_profile] = lambda: CurrentUser(
+        uid="coordinator-1", email="coord@example.com", role="COORDINATOR", department_id=department_id
+    )
+    return TestClient(app).post(
+        f"{divisions_router.router.prefix}/DV1/students/upload",
+        params={"dry_run": "true"},
+        files={"file": ("students.csv", "name,email,prn\nAsha,asha@example.com,PRN1\n", "text/csv")},
+    )
+
+
+@pytest.mark.parametrize(("department_id", "expected"), [("D1", 200), ("D2", 403)])
+def test_dry_run_checks_the_divisions_department(monkeypatch, department_id, expected):
+    response = _dry_run(monkeypatch, department_id)
+
+    assert response.status_code == expected, response.text
@@ -0,0 +1,49 @@
+"""Institute generation saves every department or reports exactly which ones it saved."""
+import pytest
+
+from app.services import institute_generation
+from app.services.institute_generation import InstituteCoordinator
+
+ENTRY = {"division_id": "DV0", "subject_id": "SUB0", "faculty_id": "F0", "room_id": "R0", "day_id": 1, "slot_id": "S1"}
+
+
+@pytest.fixture
+def solves(monkeypatch):
+    failing = set()
+
+    def solve(department_id, user_id, reason, options, repository=None):
+        if department_id in failing:
+            raise ValueError(f"No load distribution rows for {department_id}")
+        return {"run_id": department_id, "final_timetable": [dict(ENTRY)], "summary": {"requested_sessions": 1}}
+
+    monkeypatch.setattr(institute_generation, "_solve_department", solve)
+    return failing
+
+
+def test_nothing_is_saved_when_a_department_has_no_timetable(seeded_repository, solves):
+    solves.add("D2")
+
+    result = InstituteCoordinator(repository=seeded_repository).run(["D1", "D2"])
+
+    assert result["coordination"]["persisted"] is False
+    assert result["coordination"]["persisted_departments"] == []
+    assert seeded_repository.fetch_versions() == []
+
+
+def test_a_failed_save_reports_the_departments_already_saved(seeded_repository, solves, monkeypatch):
+    coordinator = InstituteCoordinator(repository=seeded_repository)
+    persist_version = coordinator.engine.persist_version
+
+    def persist(*, department_id, **kwargs):
+        if department_id == "D2":
+            raise RuntimeError("database unavailable")
+        return persist_version(department_id=department_id, **kwargs)
+
+    monkeypatch.setattr(coordinator.engine, "persist_version", persist)
+
+    coordination = coordinator.run(["D1", "D2", "D3"])["coordination"]
+
+    assert coordination["persisted"] is False
+    assert coordination["persisted_departments"] == ["D1"]
+    assert coordination["persist_failed_department"] == "D2"
+    assert [version["department_id"] for version in seeded_repository.fetch_versions()] == ["D1"]
@@ -0,0 +1,54 @@
+"""Interactive PDF renders are turned away while a bulk export fills the pool."""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+
+from app.config import settings
+from app.routers import pdf as pdf_router
+from app.services import pdf_export
+from app.services.pdf_export import ExportItem, RenderStats, iter_rendered
+
+
+@pytest.fixture
+def one_worker_pool(monkeypatch):
+    monkeypatch.setattr(settings, "pdf_render_workers", 1)
+    monkeypatch.setattr(settings, "pdf_render_queue_depth", 0)
+    monkeypatch.setattr(pdf_export, "_stats", RenderStats())
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(pdf_export, "_render_pool", pool)
+    yield
+    pool.shutdown(wait=True)
+
+
+def test_interactive_render_gets_429_while_bulk_export_saturates_pool(one_worker_pool):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_render(payload):
+        started.set()
+        release.wait(5)
+        return b"%PDF"
+
+    items = [ExportItem("division", str(i), f"divisions/{i}.pdf", {}) for i in range(2)]
+
+    async def scenario():
+        results = iter_rendered(items, slow_render)
+        first = asyncio.ensure_future(results.__anext__())
+        await asyncio.to_thread(started.wait, 5)
+
+        with pytest.raises(HTTPException) as busy:
+            await pdf_router._render_in_pool(lambda payload: b"%PDF", {}, "division")
+
+        release.set()
+        rendered = [await first] + [result async for result in results]
+        return busy.value, rendered
+
+    busy, rendered = asyncio.run(scenario())
+
+    assert busy.status_code == 429
+    assert int(busy.headers["Retry-After"]) >= 1
+    assert [result.error for result in rendered] == [None, None]
+    stats = pdf_export.render_stats()
+    assert (stats["in_flight"], stats["rejected"], stats["completed"]) == (0, 1, 2)
@@ -0,0 +1,95 @@
+"""Revised day timetable emails: direct send by default, outbox only when enabled."""
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import settings
+from app.routers import slot_adjustments
+from app.services import email_outbox
+
+
+class _Query:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.filters = {}
+        self.payload = None
+
+    def select(self, *_args, **_kwargs):
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def insert(self, payload):
+        self.payload = payload if isinstance(payload, list) else [payload]
+        return self
+
+    def execute(self):
+        rows = self.db.tables.setdefault(self.table, [])
+        if self.payload is not None:
+            rows.extend(dict(row) for row in self.payload)
+            return SimpleNamespace(data=self.payload)
+        return SimpleNamespace(data=[row for row in rows if all(row.get(k) == v for k, v in self.filters.items())])
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.tables = {
+            "students": [
+                {"email": "asha@example.com", "full_name": "Asha", "division_id": "SY-A"},
+                {"email": "", "full_name": "No Mail", "division_id": "SY-A"},
+            ]
+        }
+
+    def table(self, name):
+        return _Query(self, name)
+
+
+SLOTS = [
+    {
+        "division_id": "SY-A",
+        "status": "NO_REPLACEMENT",
+        "days": {"day_name": "Monday"},
+        "time_slots": {"start_time": "09:00", "end_time": "10:00"},
+        "subjects": {"subject_name": "Maths"},
+    }
+]
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    sent = []
+    monkeypatch.setattr(
+        slot_adjustments, "send_revised_timetable_update_email", lambda **kwargs: sent.append(kwargs) or True
+    )
+    monkeypatch.setattr(email_outbox, "wake_email_outbox", lambda: None)
+    return sent
+
+
+def _publish(db):
+    slot_adjustments._notify_students_and_email_revised_timetable(
+        db, request_id="R1", leave={"leave_id": "L1", "start_date": "2026-10-19"}, slots=SLOTS
+    )
+    return db.tables["notification_log"]
+
+
+def test_emails_are_sent_directly_without_the_outbox(monkeypatch, sent):
+    monkeypatch.setattr(settings, "email_outbox_enabled", False)
+
+    rows = _publish(FakeSupabase())
+
+    assert [email["to_email"] for email in sent] == ["asha@example.com"]
+    assert [(row["recipient_email"], row["status"]) for row in rows] == [("asha@example.com", "SENT")]
+    assert "email_html" not in rows[0]
+
+
+def test_emails_are_queued_when_the_outbox_is_enabled(monkeypatch, sent):
+    monkeypatch.setattr(settings, "email_outbox_enabled", True)
+
+    rows = _publish(FakeSupabase())
+
+    assert sent == []
+    assert [(row["recipient_email"], row["status"]) for row in rows] == [("asha@example.com", "PENDING")]
+    assert "Maths" in rows[0]["email_html"]
@@ -0,0 +1,36 @@
+"""The local-search stage may only trade soft-constraint quality, never add violations."""
+import uuid
+
+import pytest
+from pydantic import ValidationError
+
+from app.routers.agent_routes import TimetableOrchestrationRequest
+from app.services import timetable_orchestrator
+from app.services.timetable_orchestrator import TimetableOrchestrationEngine
+from app.services.timetable_scheduling_types import GenerationOptions
+
+
+def _validation_errors(repository, monkeypatch, run_id, **options):
+    monkeypatch.setattr(timetable_orchestrator, "uuid4", lambda: uuid.uuid5(uuid.NAMESPACE_DNS, run_id))
+    result = TimetableOrchestrationEngine(repository).run(
+        user_id=None,
+        department_id="D1",
+        reason="no-llm-hook",
+        persist=False,
+        options=GenerationOptions(**options),
+    )
+    return result["summary"]["validation"]["errors"]
+
+
+@pytest.mark.parametrize("run_id", ["d", "e"])
+def test_local_search_adds_no_validation_errors(seeded_repository, monkeypatch, run_id):
+    greedy = _validation_errors(seeded_repository, monkeypatch, run_id)
+    searched = _validation_errors(seeded_repository, monkeypatch, run_id, local_search=True, local_search_seconds=1)
+
+    assert set(searched) <= set(greedy)
+
+
+def test_local_search_time_budget_is_bounded():
+    assert TimetableOrchestrationRequest(local_search_seconds=60).local_search_seconds == 60
+    with pytest.raises(ValidationError):
+        TimetableOrchestrationRequest(local_search_seconds=600)
@@ -0,0 +1,68 @@
+"""Timetable repository behaviour that does not need a database."""
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import settings
+from app.services.timetable_repository import (
+    SQLiteTimetableRepository,
+    SupabaseTimetableRepository,
+    TimetableRepository,
+)
+
+
+class RecordingSupabase:
+    """Accepts any query chain and records which tables were touched."""
+
+    def __init__(self):
+        self.tables = []
+
+    def table(self, name):
+        self.tables.append(name)
+        return self
+
+    def __getattr__(self, _name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        return SimpleNamespace(data=[])
+
+
+def test_delete_versions_leaves_delta_schema_alone_when_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "timetable_delta_versions", False)
+    supabase = RecordingSupabase()
+
+    SupabaseTimetableRepository(supabase).delete_versions(["v1", "v2"])
+
+    assert supabase.tables == ["timetable_entries", "timetable_versions"]
+
+
+def test_delete_versions_detaches_children_when_enabled(monkeypatch):
+    monkeypatch.setattr(settings, "timetable_delta_versions", True)
+    supabase = RecordingSupabase()
+
+    SupabaseTimetableRepository(supabase).delete_versions(["v1"])
+
+    assert supabase.tables == [
+        "timetable_versions",
+        "timetable_entry_removals",
+        "timetable_entries",
+        "timetable_versions",
+    ]
+
+
+def test_repository_interface_is_abstract():
+    with pytest.raises(TypeError):
+        TimetableRepository()
+
+    class Partial(TimetableRepository):
+        def fetch_faculty(self, *, department_id=None):
+            return []
+
+    with pytest.raises(TypeError, match="fetch_version_rows"):
+        Partial()
+
+
+def test_backends_implement_the_whole_interface():
+    assert SupabaseTimetableRepository(RecordingSupabase()).backend == "supabase"
+    assert SQLiteTimetableRepository().fetch_versions() == []
@@ -0,0 +1,93 @@
+"""The solver trail must put the occupancy state back exactly as it was at a checkpoint."""
+import uuid
+
+from app.services import timetable_orchestrator
+from app.services.timetable_orchestrator import TimetableOrchestrationEngine
+from app.services.timetable_scheduling_types import GenerationOptions
+from app.services.timetable_trail import SolverTrail, TrailedDict, TrailedSet
+
+
+def test_nested_rollback_undoes_only_the_inner_changes():
+    trail = SolverTrail()
+    cells = TrailedSet(trail, {"a"})
+    outer = trail.checkpoint()
+    cells.add("b")
+    inner = trail.checkpoint()
+    cells.add("c")
+    cells.discard("a")
+
+    assert trail.rollback(inner) == 2
+    assert cells == {"a", "b"}
+
+    trail.rollback(outer)
+    assert cells == {"a"}
+
+
+def test_inner_commit_can_still_be_undone_by_the_outer_checkpoint():
+    trail = SolverTrail()
+    index = TrailedDict(trail)
+    index["kept"] = 1
+    outer = trail.checkpoint()
+    inner = trail.checkpoint()
+    index["kept"] = 2
+    index["new"] = 3
+    trail.commit(inner)
+
+    assert index == {"kept": 2, "new": 3}
+
+    trail.rollback(outer)
+    assert index == {"kept": 1}
+
+
+def test_adopted_containers_are_restored_through_a_clear():
+    trail = SolverTrail()
+    index = TrailedDict(trail)
+    index.setdefault("cell", set()).add("k1")
+    index.setdefault("labs", []).append(("B1", "S1"))
+    mark = trail.checkpoint()
+    index["cell"].add("k2")
+    index["labs"].append(("B2", "S2"))
+    index["labs"].clear()
+    index["cell"].clear()
+    index.clear()
+    index.setdefault("cell", set()).add("k3")
+
+    trail.rollback(mark)
+
+    assert index == {"cell": {"k1"}, "labs": [("B1", "S1")]}
+    assert isinstance(index["cell"], TrailedSet)
+
+
+def test_changes_outside_a_checkpoint_are_not_recorded():
+    trail = SolverTrail()
+    cells = TrailedSet(trail)
+    cells.add("a")
+    mark = trail.checkpoint()
+    cells.add("b")
+    trail.commit(mark)
+
+    assert trail._log == []
+    assert trail.rollback(trail.checkpoint()) == 0
+    assert cells == {"a", "b"}
+
+
+def _summary(repository, monkeypatch, **options):
+    monkeypatch.setattr(timetable_orchestrator, "uuid4", lambda: uuid.uuid5(uuid.NAMESPACE_DNS, "d"))
+    result = TimetableOrchestrationEngine(repository).run(
+        user_id=None,
+        department_id="D1",
+        reason="no-llm-hook",
+        persist=False,
+        options=GenerationOptions(local_search=True, local_search_seconds=1, **options),
+    )
+    return result["summary"]
+
+
+def test_scheduler_state_matches_a_rebuild_from_its_placements(seeded_repository, monkeypatch):
+    # verify_state raises if a placement index drifted from a rebuild after the attempt loop
+    # or the local search; the check itself must leave the run untouched.
+    plain = _summary(seeded_repository, monkeypatch)
+    verified = _summary(seeded_repository, monkeypatch, verify_state=True)
+
+    for field in ("scheduled_sessions", "unscheduled_sessions", "unresolved_task_samples", "validation"):
+        assert verified[field] == plain[field]
@@ -0,0 +1,123 @@
+"""Copy-on-write timetable versions over the SQLite backend."""
+import pytest
+
+from app.config import settings
+from app.services import timetable_version_deltas as deltas
+from app.services.timetable_repository import SQLiteTimetableRepository
+
+
+def _row(subject, day=1, slot="S1", room="R1", faculty="F1", **extra):
+    return {
+        "division_id": "DV1",
+        "batch_id": None,
+        "subject_id": subject,
+        "session_type": "THEORY",
+        "faculty_id": faculty,
+        "room_id": room,
+        "day_id": day,
+        "slot_id": slot,
+        **extra,
+    }
+
+
+def _sessions(rows):
+    return sorted((row["subject_id"], row["day_id"], row["slot_id"], row["room_id"], row["faculty_id"]) for row in rows)
+
+
+@pytest.fixture
+def repository(monkeypatch):
+    monkeypatch.setattr(settings, "timetable_delta_versions", True)
+    monkeypatch.setattr(settings, "timetable_delta_max_chain", 8)
+    deltas.invalidate_version_entries()
+    yield SQLiteTimetableRepository()
+    deltas.invalidate_version_entries()
+
+
+def _full_version(repository, rows):
+    version = repository.create_version({"department_id": "D1"})
+    repository.insert_entries([{**row, "version_id": version["version_id"]} for row in rows])
+    return version["version_id"]
+
+
+def _delta_version(repository, parent_id, rows):
+    version, _ = deltas.create_delta_version(repository, parent_version_id=parent_id, payload={"department_id": "D1"}, rows=rows)
+    return version["version_id"]
+
+
+def test_merge_applies_removals_once_per_key_and_labels_rows():
+    root = [_row("A"), _row("A"), _row("B")]
+    merged = deltas._merge([(root, []), ([_row("C")], [deltas.entry_key(_row("A"))])], "v2")
+
+    assert _sessions(merged) == _sessions([_row("A"), _row("B"), _row("C")])
+    assert {row["version_id"] for row in merged} == {"v2"}
+    assert "version_id" not in root[0]
+
+
+def test_plan_delta_is_a_multiset_difference():
+    parent = [_row("A"), _row("A"), _row("B")]
+    removed, added = deltas.plan_delta(parent, [_row("A"), _row("B", slot="S2"), _row("C")])
+
+    assert sorted(removed) == sorted([deltas.entry_key(_row("A")), deltas.entry_key(_row("B"))])
+    assert _sessions(added) == _sessions([_row("B", slot="S2"), _row("C")])
+
+
+def test_net_changes_cancel_out_across_levels(repository):
+    root = _full_version(repository, [_row("A"), _row("B")])
+    middle = _delta_version(repository, root, [_row("A", slot="S2"), _row("B")])
+    # Moves A back where it was and drops B.
+    top = _delta_version(repository, middle, [_row("A")])
+
+    removed, added = deltas._net_changes(repository, [middle, top])
+
+    assert _sessions(removed) == _sessions([_row("B")])
+    assert added == []
+
+
+def test_classify_tells_moves_reassignments_and_additions_apart():
+    removed = [_row("A"), _row("B"), _row("C")]
+    added = [_row("A", day=2, room="R2"), _row("B", faculty="F2"), _row("D")]
+
+    changes = deltas._classify(removed, added)
+
+    assert [(move["from"]["day_id"], move["to"]["day_id"], move["room_changed"]) for move in changes["moved"]] == [(1, 2, True)]
+    assert [(item["from_faculty_id"], item["to_faculty_id"]) for item in changes["faculty_reassigned"]] == [("F1", "F2")]
+    assert [row["subject_id"] for row in changes["removed"]] == ["C"]
+    assert [row["subject_id"] for row in changes["added"]] == ["D"]
+
+
+def test_fork_entry_edits_only_the_delta_version(repository):
+    root = _full_version(repository, [_row("A"), _row("B")])
+    child = _delta_version(repository, root, [_row("A"), _row("B")])
+    inherited = next(row for row in repository.fetch_version_rows(root) if row["subject_id"] == "A")
+
+    forked = deltas.fork_entry(repository, child, inherited, {"room_id": "R9"})
+
+    assert forked["version_id"] == child
+    assert _sessions(deltas.materialize_entries(repository, child)) == _sessions([_row("A", room="R9"), _row("B")])
+    assert _sessions(repository.fetch_version_rows(root)) == _sessions([_row("A"), _row("B")])
+
+
+def test_reads_follow_a_compaction_done_by_another_worker(repository):
+    root = _full_version(repository, [_row("A"), _row("B")])
+    child = _delta_version(repository, root, [_row("A"), _row("C")])
+    assert _sessions(deltas.materialize_entries(repository, child)) == _sessions([_row("A"), _row("C")])
+
+    # What compact_version does, without touching this process's caches.
+    repository.insert_entries([{**_row("A"), "version_id": child}])
+    repository.update_version(child, {"parent_version_id": None})
+    repository.delete_entry_removals([child])
+
+    assert deltas.version_lineage(repository, child) == [child]
+    assert _sessions(deltas.materialize_entries(repository, child)) == _sessions([_row("A"), _row("C")])
+
+
+def test_reads_follow_an_edit_done_by_another_worker(repository):
+    root = _full_version(repository, [_row("A"), _row("B")])
+    child = _delta_version(repository, root, [_row("A"), _row("B")])
+    deltas.materialize_entries(repository, child)
+
+    # What fork_entry does in another process: nothing here is invalidated.
+    repository.insert_entry_removals(child, [deltas.entry_key(_row("B"))])
+    repository.insert_entries([{**_row("B", slot="S3"), "version_id": child}])
+
+    assert _sessions(deltas.materialize_entries(repository, child)) == _sessions([_row("A"), _row("B", slot="S3")])
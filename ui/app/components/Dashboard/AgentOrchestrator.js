@@ -43,6 +43,26 @@ function parseSseEvent(rawEventBlock) {
   return { event, data: parsedData };
 }
 
+// Rows from one columnar `entries` chunk; `dictionaries` accumulates values across chunks.
+function decodeEntriesChunk(chunk, dictionaries) {
+  Object.entries(chunk.dictionaries || {}).forEach(([column, values]) => {
+    dictionaries[column] = (dictionaries[column] || []).concat(values);
+  });
+  const columns = Object.entries(chunk.columns || {});
+  const rows = [];
+  for (let index = 0; index < (chunk.count || 0); index += 1) {
+    const row = {};
+    columns.forEach(([column, codes]) => {
+      const value = dictionaries[column][codes[index]];
+      if (value !== null && value !== undefined) {
+        row[column] = value;
+      }
+    });
+    rows.push(row);
+  }
+  return rows;
+}
+
 export default function AgentOrchestrator({ onTimetableCreated, onViewTimetable }) {
   const { showToast } = useToast();
   const [loadingReadiness, setLoadingReadiness] = useState(true);
@@ -188,6 +208,7 @@ export default function AgentOrchestrator({ onTimetableCreated, onViewTimetable
           department_id: planInput.department_id || null,
           reason: `UI run context: ${JSON.stringify(runContext)}`,
           dry_run: false,
+          result_format: 'compact',
         }),
       });
 
@@ -200,6 +221,8 @@ export default function AgentOrchestrator({ onTimetableCreated, onViewTimetable
       const decoder = new TextDecoder();
       let buffer = '';
       let completed = false;
+      const entryDictionaries = {};
+      let streamedEntries = [];
 
       const upsertStage = (stagePayload) => {
         setResult((prev) => {
@@ -247,9 +270,23 @@ export default function AgentOrchestrator({ onTimetableCreated, onViewTimetable
             continue;
           }
 
+          if (parsed.event === 'entries') {
+            streamedEntries = streamedEntries.concat(decodeEntriesChunk(parsed.data, entryDictionaries));
+            continue;
+          }
+
           if (parsed.event === 'result') {
             const payload = parsed.data?.result || null;
-            setResult(payload);
+            setResult((prev) => {
+              if (!payload) {
+                return null;
+              }
+              return {
+                ...payload,
+                stages: payload.stages || prev?.stages || [],
+                final_timetable: payload.final_timetable || streamedEntries,
+              };
+            });
             if (payload?.version_id && onTimetableCreated) {
               onTimetableCreated(payload.version_id);
             }
@@ -23,15 +23,21 @@ export default function NotificationBell({ userEmail, limit }) {
         query.set('limit', String(limit));
       }
 
-      const res = await fetch(`${API_BASE_URL}/notifications?${query.toString()}`, {
-        headers: { Authorization: `Bearer ${token}` },
-      });
+      const headers = { Authorization: `Bearer ${token}` };
+      const [res, countRes] = await Promise.all([
+        fetch(`${API_BASE_URL}/notifications?${query.toString()}`, { headers }),
+        fetch(`${API_BASE_URL}/notifications/unread-count?recipient_email=${encodeURIComponent(userEmail)}`, { headers }),
+      ]);
 
       if (res.ok) {
         const data = await res.json();
         const notifs = data.data || [];
         setNotifications(notifs);
-        setUnreadCount(notifs.length);
+        if (!countRes.ok) setUnreadCount(notifs.length);
+      }
+      if (countRes.ok) {
+        const countData = await countRes.json();
+        setUnreadCount(countData.data?.unread_count ?? 0);
       }
     } catch (error) {
       console.error('Failed to fetch notifications:', error);
@@ -55,7 +61,7 @@ export default function NotificationBell({ userEmail, limit }) {
   const markAsRead = async (notificationId) => {
     try {
       const token = localStorage.getItem('authToken') || '';
-      await fetch(`${API_BASE_URL}/notifications/${notificationId}/read`, {
+      await fetch(`${API_BASE_URL}/notifications/${notificationId}/read?recipient_email=${encodeURIComponent(userEmail)}`, {
         method: 'POST',
         headers: { Authorization: `Bearer ${token}` },
       });
@@ -486,6 +486,7 @@ export default function TimetableViewer({
           department_id: null,
           dry_run: false,
           reason: 'Regenerated from timetable tab',
+          result_format: 'compact',
         }),
       });
 
@@ -579,21 +580,28 @@ export default function TimetableViewer({
       }
 
       setSavingEdits(true);
+      // Entries a version inherits from its parent are forked on edit and come back with a new id.
+      const savedIds = {};
       for (const update of updates) {
         const response = await fetch(`${API_BASE_URL}/timetable-entries/${encodeURIComponent(update.entryId)}`, {
           method: 'PUT',
           headers: authHeaders({ 'Content-Type': 'application/json' }),
-          body: JSON.stringify(update.changed),
+          body: JSON.stringify(versionId ? { ...update.changed, version_id: versionId } : update.changed),
         });
         const payload = await response.json().catch(() => null);
         if (!response.ok) {
           throw new Error(payload?.detail || `Failed to update entry ${update.entryId}.`);
         }
+        const savedId = payload?.data?.[0]?.entry_id;
+        if (savedId) {
+          savedIds[update.entryId] = savedId;
+        }
       }
 
       setEntries((prev) => prev.map((row) => {
         const patch = editedByEntryId[row.entry_id];
-        return patch ? { ...row, ...patch } : row;
+        if (!patch) return row;
+        return { ...row, ...patch, entry_id: savedIds[row.entry_id] || row.entry_id };
       }));
 
       setEditedByEntryId({});
@@ -36,7 +36,7 @@ export default function StudentDashboard() {
   const markAsRead = async (notificationId) => {
     try {
       const token = localStorage.getItem('authToken') || '';
-      await fetch(`${API_BASE_URL}/notifications/${notificationId}/read`, {
+      await fetch(`${API_BASE_URL}/notifications/${notificationId}/read?recipient_email=${encodeURIComponent(profile?.email || '')}`, {
         method: 'POST',
         headers: { Authorization: `Bearer ${token}` },
       });